@@ -1,7 +1,21 @@
 from fastapi import APIRouter
 
+from app.core.breaker import breaker_states
+from app.core.metrics import metrics
+
 router = APIRouter()
 
 @router.get("/health")
 async def health():
-    return {"ok": True}
+    # ok = the process is serving; "degraded" = some model's LLM circuit is open / probing
+    breakers = breaker_states()
+    return {
+        "ok": True,
+        "degraded": any(b["state"] != "closed" for b in breakers.values()),
+        "llm_breakers": breakers,
+    }
+
+@router.get("/metrics")
+async def get_metrics():
+    # Per-worker in-process metrics (counters, gauges, latency summaries)
+    return metrics.snapshot()
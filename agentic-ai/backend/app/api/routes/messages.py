@@ -2,24 +2,30 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Callable, Optional, Dict, Any
-import json, asyncio
+import json, asyncio, time
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 
 from app.db.mongo import get_db
+from app.core.settings import settings
+from app.core.breaker import CircuitOpen
+from app.core.deadline import request_deadline, run_stage
+from app.core.metrics import metrics
+from app.core.usage import request_usage
 from app.api.deps import get_current_user
 from app.core.security import decode_token
 from app.services.progress import broker
 from app.repositories.chats_repo import verify_chat_owner, touch_chat_activity
 from app.repositories.chat_repo import get_chat_state
-from app.repositories.messages_repo import list_messages as repo_list, insert_message
+from app.repositories.messages_repo import list_messages as repo_list, insert_message, set_message_validation, get_last_assistant_context
 from app.repositories.vault_repo import get_active_vault_version
 from app.api.routes.uia import intake as uia_intake_route, IntakeRequest
 from app.services.insight_engine import stage01_auto_infer
 from app.services.insight_survey import build_surveys
+from app.services.smalltalk import classify_turn, fast_reply, record_turn
 from app.components.component10 import component10
-from app.components.component5 import component5, _get_last_assistant_message
-from app.rag.scripts.component8_rag import component8_rag_answer
+from app.components.component5 import component5
+from app.rag.engine import component8_rag_answer, llm_validate, RetrievalBusy
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
@@ -45,6 +51,48 @@ def make_stepper(rid: Optional[str]) -> Callable[[int, str], Any]:
             await broker.publish(rid, {"type": "step", "label": label})
     return step
 
+# Strong refs to in-flight background validations (asyncio only keeps weak refs to tasks)
+_BG_TASKS: set[asyncio.Task] = set()
+
+async def _validate_in_background(db, *, user_id: str, chat_id: str, msg_id: str, rid: Optional[str], pending: dict):
+    """
+    Runs the RAG self-check after the draft has been persisted and returned.
+    A revision patches the stored message and is pushed as a 'revision' event.
+    """
+    try:
+        # runs after the turn returned: not bound by the turn's deadline, not in its usage summary
+        with request_deadline(None), request_usage(False):
+            final = await llm_validate(pending["question"], pending["kept_ids"], pending["draft"],
+                                       records=pending.get("records"))
+            if final and final != pending["draft"]:
+                await set_message_validation(db, user_id=user_id, chat_id=chat_id, msg_id=msg_id, status="revised", content=final)
+                print(" ------| Background validation: revised message", msg_id)
+                await broker.publish(rid, {"type": "revision", "message_id": msg_id, "content": final})
+            else:
+                await set_message_validation(db, user_id=user_id, chat_id=chat_id, msg_id=msg_id, status="passed")
+                await broker.publish(rid, {"type": "validated", "message_id": msg_id})
+    except Exception as e:
+        print(" ------| Background validation error:", e)
+        try:
+            await set_message_validation(db, user_id=user_id, chat_id=chat_id, msg_id=msg_id, status="failed")
+        except Exception:
+            pass
+        await broker.publish(rid, {"type": "validated", "message_id": msg_id})
+
+def _turn_usage(ledger) -> dict:
+    """Per-turn LLM usage summary, also exported as turn.* timings."""
+    summary = ledger.summary()
+    metrics.observe("turn.llm_calls", summary["calls"])
+    metrics.observe("turn.prompt_tokens", summary["prompt_tokens"])
+    metrics.observe("turn.cached_tokens", summary["cached_tokens"])
+    metrics.observe("turn.completion_tokens", summary["completion_tokens"])
+    metrics.observe("turn.cost_usd", summary["cost_usd"])
+    metrics.observe("turn.llm_ms", summary["llm_ms"])
+    print(f" ----| Turn LLM usage: {summary['calls']} calls, {summary['prompt_tokens']}+{summary['completion_tokens']} tokens "
+          f"({summary['cached_tokens']} cached), "
+          f"${summary['cost_usd']:.4f}")
+    return summary
+
 def _skills_already_recorded(chat_state: Optional[dict]) -> bool:
     if not chat_state:
         return False
@@ -115,7 +163,12 @@ async def component7(
     # Stage-01 (keep as-is; we still allow auto-inference/batch-expansion to run)
     await step(3, "Insights: Stage-01 starting")
     print("### Stage 1: Auto Inference")
-    result = await stage01_auto_infer(db, chatId=chat_id, user_text=prompt)
+    try:
+        result = await stage01_auto_infer(db, chatId=chat_id, user_text=prompt)
+    except CircuitOpen as e:
+        # no auto-inference this turn; pending surveys below still work from stored state
+        print(" ------| Stage-01 skipped:", e)
+        result = {}
 
     auto_taken = int(result.get("autoTakenCount", 0))
     question_only = int(result.get("questionOnlyCount", 0))
@@ -193,179 +246,221 @@ async def send(chat_id: str, payload: SendReq, user=Depends(get_current_user)):
 
     rid = payload.request_id or None
     step = make_stepper(rid)
+    t_start = time.perf_counter()
 
-    try:
-        # 0) Save user message (outside C06)
-        await step(0, "Queuing request")
-        await insert_message(db, user["id"], chat_id, "user", content=payload.prompt)
-
-        # ---- Component 05 (Decision Gate) ----
-        c05 = await component5(
-            db=db,
-            chat_id=chat_id,
-            user_id=user["id"],
-            user_msg=payload.prompt,
-            step=step,
-        )
-        print("=="*30)
-        # print(f" ----| Component 5 result: {c05}")
-
-        if not c05.get("proceed", False):
-            # Build a simple assistant response: content only
-            assistant_msg = {
-                "role": "assistant",
-                "type": "text",
-                "content": c05.get("message") or "This request falls outside the User Analysis Agent’s scope.",
-                "surveyType": None,
-                "survey": None,
-                "enc_question": "",
-            }
+    # the turn budget: every stage below (and the LLM gateway) sees what is left of it;
+    # usage collects every LLM call of the turn (tokens, cost, time per component.stage)
+    with request_deadline(settings.TURN_DEADLINE_S), request_usage() as usage:
+        try:
+            # 0) Save user message (outside C06)
+            await step(0, "Queuing request")
+            await insert_message(db, user["id"], chat_id, "user", content=payload.prompt)
+            # the assistant's previous turn, read once for C05 and the fast path
+            prev = await get_last_assistant_context(db, user["id"], chat_id)
+
+            # ---- Component 05 (Decision Gate) ----
+            c05 = await component5(
+                db=db,
+                chat_id=chat_id,
+                user_id=user["id"],
+                user_msg=payload.prompt,
+                step=step,
+                last=prev["actionable"],
+            )
+            print("=="*30)
+            # print(f" ----| Component 5 result: {c05}")
+
+            if not c05.get("proceed", False):
+                # Build a simple assistant response: content only
+                assistant_msg = {
+                    "role": "assistant",
+                    "type": "text",
+                    "content": c05.get("message") or "This request falls outside the User Analysis Agent’s scope.",
+                    "surveyType": None,
+                    "survey": None,
+                    "enc_question": "",
+                }
+
+                await insert_message(
+                    db,
+                    user_id=user["id"],
+                    chat_id=chat_id,
+                    role="assistant",
+                    content=assistant_msg["content"],
+                    type="text",
+                    survey_type=None,
+                    survey=None,
+                    enc_question="",
+                    scope_label="out_of_scope",
+                    usage=_turn_usage(usage),
+                )
+
+                await broker.publish(rid, {"type": "done"})
+                record_turn(fast_path=False, elapsed_ms=(time.perf_counter() - t_start) * 1000)
+                return assistant_msg
+
+            # ---- Component 06 (UIA) ----
+            # out of budget: no survey this turn (intent detection runs again next turn)
+            c06 = await run_stage("c06", component6(
+                db,
+                chat_id=chat_id,
+                user_id=user["id"],
+                prompt=payload.prompt,
+                step=step,
+            ), {"uia_action": "none", "surveyType": None}, reserve=settings.TURN_C10_RESERVE_S)
+            print("=="*30)
+            # print(f" ----| Component 6 result: {c06}")
+
+            # await touch_chat_activity(db, chat_id)
 
-            await insert_message(
+            # ---- Component 07 (Insights) ----
+            c07 = await run_stage("c07", component7(
                 db,
+                chat_id=chat_id,
                 user_id=user["id"],
+                prompt=payload.prompt,
+                step=step,
+            ), {
+                "autoTakenCount": 0, "questionOnlyCount": 0, "touchedBatchIds": [], "pendingByBatch": {},
+                "surveysPrepared": 0, "survey_type": "insight_survey", "survey": None, "skipReason": "deadline",
+            }, reserve=settings.TURN_C10_RESERVE_S)
+            print("=="*30)
+            # print(f" ----| Component 7 result: {c07}")
+
+            # ---- Component 08 (RAG) ----
+            chat_state = await get_chat_state(db, chat_id)
+            ec_current: Optional[str] = chat_state.get("employment_category_id") if chat_state else None
+            prev_enc = (prev["actionable"] or {}).get("enc_question") or ""
+
+            # Fast path: small-talk / trivial turns skip RAG entirely
+            trivial = None
+            if settings.FAST_PATH_ENABLED:
+                prev_turn = prev["last"] or {}
+                trivial = await classify_turn(payload.prompt, prev_enc=prev_enc,
+                                              prev_assistant=f"{prev_turn.get('content') or ''} {prev_turn.get('enc_question') or ''}")
+
+            c08 = None
+            if trivial:
+                print(f" ----| Fast path ({trivial}) | skipping Component 8 |")
+                await step(2.4, "Quick reply")
+                c08 = {"used": True, "answer_md": await fast_reply(trivial, payload.prompt), "sources": [], "fast_path": trivial}
+            else:
+                try:
+                    # out of budget: c08 stays None, same as the error path
+                    c08 = await run_stage("c08", component8_rag_answer(
+                        user_question=payload.prompt, prev_enc=prev_enc, step=step,
+                    ), None, reserve=settings.TURN_C10_RESERVE_S)
+                except RetrievalBusy as e:
+                    print("Component 8 (RAG) skipped, retrieval busy:", e)
+                except Exception as e:
+                    print("Component 8 (RAG) error:", e)
+            # print("=="*30);print(f" ----| Component 8 result: {c08}")
+
+            # ---- Component 10 (Encouragement Question) ----
+            c10 = await component10(
+                db,
                 chat_id=chat_id,
-                role="assistant",
-                content=assistant_msg["content"],
-                type="text",
-                survey_type=None,
-                survey=None,
-                enc_question="",
-                scope_label="out_of_scope",
+                user_id=user["id"],
+                user_msg=payload.prompt,
+                c06=c06,
+                c07=c07,
+                step=step,
             )
-
-            await broker.publish(rid, {"type": "done"})
-            return assistant_msg
-
-        # ---- Component 06 (UIA) ----
-        c06 = await component6(
-            db,
-            chat_id=chat_id,
-            user_id=user["id"],
-            prompt=payload.prompt,
-            step=step,
-        )
-        print("=="*30)
-        # print(f" ----| Component 6 result: {c06}")
-
-        # await touch_chat_activity(db, chat_id)
-
-        # ---- Component 07 (Insights) ----
-        c07 = await component7(
-            db,
-            chat_id=chat_id,
-            user_id=user["id"],
-            prompt=payload.prompt,
-            step=step,
-        )
-        print("=="*30)
-        # print(f" ----| Component 7 result: {c07}")
-
-        # ---- Component 08 (RAG) ----
-        chat_state = await get_chat_state(db, chat_id)
-        ec_current: Optional[str] = chat_state.get("employment_category_id") if chat_state else None
-        last = await _get_last_assistant_message(db, chat_id=chat_id, user_id=user["id"])
-        prev_enc = (last or {}).get("enc_question") or ""
-
-        c08 = None
-        try:
-            c08 = await component8_rag_answer(user_question=payload.prompt, prev_enc=prev_enc, step=step)
-        except Exception as e:
-            print("Component 8 (RAG) error:", e)
-        # print("=="*30);print(f" ----| Component 8 result: {c08}")
-
-        # ---- Component 10 (Encouragement Question) ----
-        c10 = await component10(
-            db,
-            chat_id=chat_id,
-            user_id=user["id"],
-            user_msg=payload.prompt,
-            c06=c06,
-            c07=c07,
-            step=step,
-        )
-        print("=="*30)
-        # print(f" ----| Component 10 result: {c10}")
-
-
-        # ---------------- Build final assistant message ----------------
-        # Choose survey if any (one survey at a time)
-        survey_type: str | None = None
-        survey_obj: dict | None = None
-
-        # C06 survey takes precedence (EC or Skills)
-        if c06.get("survey") and c06.get("survey_type"):
-            survey_type = c06["survey_type"]
-            survey_obj = c06["survey"]
-        # Otherwise, C07 insight survey (only if prepared)
-        elif c07.get("surveysPrepared", 0) > 0 and c07.get("survey"):
-            survey_type = c07.get("survey_type") or "insight_survey"
-            survey_obj = c07["survey"]
-
-        # Encouragement question only if we're NOT sending a survey now
-        enc_q: str = ""
+            print("=="*30)
+            # print(f" ----| Component 10 result: {c10}")
+
+
+            # ---------------- Build final assistant message ----------------
+            # Choose survey if any (one survey at a time)
+            survey_type: str | None = None
+            survey_obj: dict | None = None
+
+            # C06 survey takes precedence (EC or Skills)
+            if c06.get("survey") and c06.get("survey_type"):
+                survey_type = c06["survey_type"]
+                survey_obj = c06["survey"]
+            # Otherwise, C07 insight survey (only if prepared)
+            elif c07.get("surveysPrepared", 0) > 0 and c07.get("survey"):
+                survey_type = c07.get("survey_type") or "insight_survey"
+                survey_obj = c07["survey"]
+
+            # Encouragement question only if we're NOT sending a survey now
+            enc_q: str = ""
         
-        if c10 and c10.get("stage") != "none" and c10.get("question"):
-            enc_q = c10["question"]
+            if c10 and c10.get("stage") != "none" and c10.get("question"):
+                enc_q = c10["question"]
 
-        if c10 and c10.get("stage") == "none":
-            qFull = "All the insights have been gathered. No further questions at this time. Now you can proceed to planning if you wish to!"
-            enc_q = qFull
+            if c10 and c10.get("stage") == "none":
+                qFull = "All the insights have been gathered. No further questions at this time. Now you can proceed to planning if you wish to!"
+                enc_q = qFull
 
 
-        content_text = ""
-        rag_srcs: list = []
+            content_text = ""
+            rag_srcs: list = []
+            pending_validation = (c08 or {}).get("pending_validation")
 
-        if c08 and c08.get("used") and c08.get("answer_md"):
-            content_text = c08["answer_md"]
-            rag_srcs = c08.get("sources") or [] 
+            if c08 and c08.get("used") and c08.get("answer_md"):
+                content_text = c08["answer_md"]
+                rag_srcs = c08.get("sources") or [] 
 
-        assistant_msg = {
-            "id": "",
-            "role": "assistant",
-            "content": content_text,
-            "surveyType": survey_type,
-            "survey": survey_obj,
-            "enc_question": enc_q,
-            "sources": rag_srcs,
-        }
-
-        # Save assistant message
-        msgId = await insert_message(
-                db,
-                user_id=user["id"],
-                chat_id=chat_id,
-                role="assistant",
-                content=assistant_msg["content"],
-                type="text" if survey_type is None else "survey",
-                survey_type=assistant_msg["surveyType"],
-                survey=assistant_msg["survey"],
-                enc_question=assistant_msg["enc_question"],
-                sources=assistant_msg["sources"],
-            )
+            assistant_msg = {
+                "id": "",
+                "role": "assistant",
+                "content": content_text,
+                "surveyType": survey_type,
+                "survey": survey_obj,
+                "enc_question": enc_q,
+                "sources": rag_srcs,
+            }
 
-        assistant_msg = {
-            "id": msgId,
-            "role": "assistant",
-            "content": content_text,
-            "surveyType": survey_type,
-            "survey": survey_obj,
-            "enc_question": enc_q,
-            "sources": rag_srcs,
-        }
+            # Save assistant message
+            msgId = await insert_message(
+                    db,
+                    user_id=user["id"],
+                    chat_id=chat_id,
+                    role="assistant",
+                    content=assistant_msg["content"],
+                    type="text" if survey_type is None else "survey",
+                    survey_type=assistant_msg["surveyType"],
+                    survey=assistant_msg["survey"],
+                    enc_question=assistant_msg["enc_question"],
+                    sources=assistant_msg["sources"],
+                    validation="pending" if pending_validation else None,
+                    usage=_turn_usage(usage),
+                )
 
-        await broker.publish(rid, {"type": "done"})
+            assistant_msg = {
+                "id": msgId,
+                "role": "assistant",
+                "content": content_text,
+                "surveyType": survey_type,
+                "survey": survey_obj,
+                "enc_question": enc_q,
+                "sources": rag_srcs,
+            }
 
-        print("=="*30);print(" --| Message processing complete |")
-        # print(" --| Assistant message:\n", json.dumps(assistant_msg, indent=2) )
-        print("====================================================")
+            if pending_validation:
+                task = asyncio.create_task(_validate_in_background(
+                    db, user_id=user["id"], chat_id=chat_id, msg_id=msgId, rid=rid, pending=pending_validation,
+                ))
+                _BG_TASKS.add(task)
+                task.add_done_callback(_BG_TASKS.discard)
+                assistant_msg["validation"] = "pending"
+                await broker.publish(rid, {"type": "done", "validation": "pending", "message_id": msgId})
+            else:
+                await broker.publish(rid, {"type": "done"})
+            record_turn(fast_path=bool(trivial), elapsed_ms=(time.perf_counter() - t_start) * 1000)
+
+            print("=="*30);print(" --| Message processing complete |")
+            # print(" --| Assistant message:\n", json.dumps(assistant_msg, indent=2) )
+            print("====================================================")
         
-        return assistant_msg
+            return assistant_msg
 
-    except Exception as e:
-        # surface an SSE error event for the loader
-        await broker.publish(rid, {"type": "error", "message": "Processing failed"})
-        raise
+        except Exception as e:
+            # surface an SSE error event for the loader
+            await broker.publish(rid, {"type": "error", "message": "Processing failed"})
+            raise
 
 @router.get("/{chat_id}/progress")
 async def stream_progress(chat_id: str, request: Request, request_id: str, access_token: str):
@@ -400,7 +495,10 @@ async def stream_progress(chat_id: str, request: Request, request_id: str, acces
                 payload = json.dumps(evt)
                 yield f"data: {payload}\n\n"
 
-                if evt.get("type") in ("done", "error"):
+                # keep the stream open past "done" while a background validation is pending
+                if evt.get("type") == "done" and evt.get("validation") == "pending":
+                    continue
+                if evt.get("type") in ("done", "error", "revision", "validated"):
                     break
         finally:
             broker.close(request_id)
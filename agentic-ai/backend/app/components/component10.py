@@ -15,7 +15,9 @@ from app.repositories.vault_repo  import list_ec_options, list_skill_options_for
 from app.services.insight_completion import list_fully_taken_batches
 from app.repositories.chat_repo import get_chat_state
 
+from app.core.deadline import within
 from app.core.llm import complete_json as llm_complete_json
+from app.core.routing import Escalate, routed
 
 
 Stage = Literal["employment_category", "skills", "insights", "none"]
@@ -129,10 +131,11 @@ async def component10(
                     insight=insight,  # dict with {insightId, question, isMultiSelect, answers:{A:{text,aliases},...}}
                     language=language,
                 )
-                result = await _call_llm_single_question(prompt, expect_stage="insights")
-
                 # Guard: ensure question actually includes at least one canonical answer token
+                # (a small-model question that misses them is escalated before we fall back)
                 canonical = _canonical_answer_list(insight.get("answers") or {})
+                result = await _call_llm_single_question(prompt, expect_stage="insights", canonical=canonical)
+
                 if not _question_mentions_any(result["question"], canonical):
                     # Deterministic safe fallback (still one sentence)
                     fallback_q = _deterministic_insight_question(insight)
@@ -485,29 +488,51 @@ async def _call_llm_single_question(
     prompt: str,
     *,
     expect_stage: Literal["employment_category", "skills", "insights"],
+    canonical: Optional[List[str]] = None,
 ) -> EncouragementResult:
     """
     Calls the LLM and enforces a tiny JSON schema: {"stage":"...","question":"..."}.
+    With `canonical` options (insights stage) LLM_SMALL_MODEL is tried first; its confidence
+    is the share of the options the question names (the prompt requires all of them), and a
+    question below LLM_ROUTE_MIN_CONFIDENCE (or unparseable/empty) is escalated to the main
+    model. The other stages have nothing to measure a small model's answer by, so they go
+    to the main model directly.
     If parsing fails, returns a safe fallback question for the expected stage.
     """
-    # print(" ------| C10: LLM prompt:\n", prompt)
-    try:
-        # print(" ------| C10: LLM prompt completion call...")
-        raw = await llm_complete_json(
+    async def ask(model: str) -> str:
+        return await llm_complete_json(
+            tag=f"c10.{expect_stage}",
+            model=model,
             prompt=prompt,
             temperature=0.7,
             max_tokens=180,
+            cache=True,
+            cacheable=True,
+            hedge=True,
         )
-        data = _extract_json_object(raw)
-        stage = data.get("stage")
+
+    def parse(raw: str) -> Tuple[EncouragementResult, float]:
+        try:
+            data = _extract_json_object(raw)
+        except ValueError as e:
+            raise Escalate("c10: bad JSON") from e
         question = (data.get("question") or "").strip()
-        if stage != expect_stage:
-            stage = expect_stage
         if question and not question.endswith("?"):
             question += "?"
         if not question:
-            raise ValueError("Empty question")
-        return {"stage": stage, "question": question}
+            raise Escalate("c10: empty question")
+        coverage = _option_coverage(question, canonical or [])
+        if canonical and not coverage:
+            raise Escalate("c10: no canonical option mentioned")
+        return {"stage": expect_stage, "question": question}, coverage
+
+    async def ask_main() -> EncouragementResult:
+        return parse(await ask(settings.OPENAI_MODEL))[0]
+
+    # print(" ------| C10: LLM prompt:\n", prompt)
+    try:
+        # gets whatever is left of the turn budget; out of budget -> fallback question below
+        return await within(routed("c10", ask, parse) if canonical else ask_main(), stage="c10")
     except Exception:
         # Fallback phrasing
         fallback = {
@@ -613,6 +638,15 @@ def _question_mentions_any(question: str, tokens: List[str]) -> bool:
     s = (question or "").lower()
     return any((t or "").lower() in s for t in tokens if t)
 
+
+def _option_coverage(question: str, tokens: List[str]) -> float:
+    """Share of `tokens` the question names verbatim (case-insensitive); 1.0 when there are none."""
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return 1.0
+    s = (question or "").lower()
+    return sum(t.lower() in s for t in tokens) / len(tokens)
+
 # helpers (near other helpers)
 
 def _make_context_hook(user_msg: str, insight: dict) -> str:
@@ -1,17 +1,24 @@
 # app/components/component5.py
 from __future__ import annotations
 
+import asyncio
 import json
 from typing import Any, Dict, Optional, TypedDict
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
+from app.core.breaker import CircuitOpen
+from app.core.deadline import within
 from app.core.llm import complete_json as llm_complete_json
+from app.core.routing import Escalate, routed
+from app.core.settings import settings
+from app.services import gate_classifier
 
 class C05Result(TypedDict, total=False):
     proceed: bool
     message: Optional[str]  # present only when proceed == False
+    source: str             # "local" when the classifier decided (no LLM call)
 
 FRIENDLY_FALLBACK = (
     "This User Analysis Agent doesn’t write or run code; it clarifies your Data Scientist path by identifying your role, "
@@ -151,10 +158,12 @@ You MUST return *only* a JSON object in the exact format required. Do not add an
 
 JSON format
 • In scope:
-{"proceed": true}
+{"proceed": true, "confidence": <0.0-1.0>}
 
 • Out of scope:
-{"proceed": false, "message": "<friendly message>"} 
+{"proceed": false, "message": "<friendly message>", "confidence": <0.0-1.0>}
+
+`confidence` is how sure you are of the in/out-of-scope decision.
 
 ---
 [RULES FOR OUT-OF-SCOPE MESSAGES]
@@ -198,6 +207,17 @@ USER PROMPT:
 """.strip()
 
 
+def _parse_gate(raw: str) -> tuple[Dict[str, Any], float]:
+    """Routing parse hook: the verdict and its self-reported confidence (missing = confident)."""
+    data = _extract_json(raw)
+    if not isinstance(data.get("proceed"), bool):
+        raise Escalate("gate: no proceed verdict")
+    try:
+        conf = float(data.get("confidence", 1.0))
+    except (TypeError, ValueError):
+        conf = 0.0
+    return data, conf
+
 def _extract_json(text: str) -> Dict[str, Any]:
     if not text:
         return {}
@@ -242,6 +262,8 @@ async def _get_last_assistant_message(
     return doc or None
 
 
+_UNSET: Any = object()
+
 async def component5(
     *,
     db: AsyncIOMotorDatabase,
@@ -249,9 +271,12 @@ async def component5(
     user_id: str,
     user_msg: str,
     step,
+    last: Dict[str, Any] | None = _UNSET,
 ) -> C05Result:
     """
     Decision Gate with in-flight prompt awareness.
+    last: the last assistant message the user may be answering, when the caller already
+    read it (messages_repo.get_last_assistant_context()["actionable"]); read here otherwise.
     Returns:
       - {"proceed": true}
       - {"proceed": false, "message": "..."}
@@ -262,7 +287,8 @@ async def component5(
     await step(0.45, "Decision gate (context)")
 
     # 1) If the user is replying to our last prompt/survey, always proceed.
-    last = await _get_last_assistant_message(db, chat_id=chat_id, user_id=user_id)
+    if last is _UNSET:
+        last = await _get_last_assistant_message(db, chat_id=chat_id, user_id=user_id)
     prev_enc = (last or {}).get("enc_question") or ""
     print(" ------| Previous encouragement question:", prev_enc)
     prev_survey_type = (last or {}).get("surveyType") or None
@@ -274,13 +300,54 @@ async def component5(
     await step(0.5, "Decision gate (LLM)")
     prompt = _build_gate_prompt(user_msg, prev_enc_question=prev_enc, prev_survey_type=prev_survey_type)
     # print(prompt)
+
+    # local classifier verdict, computed at most once (routing tier / shadow log / LLM failure)
+    local_pred: Dict[str, Any] = {}
+
+    async def predict_local():
+        if "p" not in local_pred:
+            local_pred["p"] = await gate_classifier.predict(user_msg, prev_enc) if gate_classifier.MODE != "off" else None
+        return local_pred["p"]
+
+    async def local():
+        pred = await predict_local()
+        if pred is None:
+            return None
+        proceed, p = pred
+        conf = gate_classifier.confidence(p)
+        # only confident in-scope verdicts are decided here: a refusal needs the LLM gate's
+        # explainer and encouragement-question reminder, not a bare FRIENDLY_FALLBACK
+        if not proceed or conf < settings.GATE_CLASSIFIER_MIN_CONFIDENCE:
+            return None
+        return {"proceed": True, "source": "local"}, conf
+
     try:
-        raw = await llm_complete_json(
-            prompt=prompt,
-            temperature=0.6,
-            max_tokens=80,
+        async def ask(model: str) -> str:
+            return await llm_complete_json(
+                tag="c05.gate",
+                model=model,
+                prompt=prompt,
+                temperature=0.6,
+                max_tokens=80,
+                # same short replies ("yes", "python") recur; any sampled verdict is fine to reuse
+                cache=True,
+                cacheable=True,
+                hedge=True,
+            )
+
+        # local classifier, then small model, then main model on low confidence / bad JSON
+        # (app/core/routing.py); out of budget -> DeadlineExceeded -> FRIENDLY_FALLBACK below
+        data = await within(
+            routed("gate", ask, _parse_gate, local=local if gate_classifier.MODE == "on" else None),
+            stage="c05", reserve=settings.TURN_C10_RESERVE_S,
         )
-        data = _extract_json(raw)
+        if data.get("source") == "local":
+            print(" ------| Decision gate: local classifier verdict, proceed =", data["proceed"])
+            return {"proceed": True}
+        if gate_classifier.LOG_PATH:
+            # file append: keep it off the event loop
+            await asyncio.to_thread(gate_classifier.log_gate_decision, user_msg, prev_enc, prev_survey_type,
+                                    data, await predict_local())
         proceed = bool(data.get("proceed"))
         if not proceed:
             msg = (data.get("message") or "").strip()
@@ -291,5 +358,13 @@ async def component5(
                 msg = msg.replace("?", ".")
             return {"proceed": False, "message": msg}
         return {"proceed": True}
+    except CircuitOpen:
+        # provider down: let the turn through to the local fallbacks downstream
+        # (rule-based intents, retrieval-only C08, deterministic C10) instead of refusing it
+        return {"proceed": True}
     except Exception:
+        # LLM gate failed: a local verdict (however unsure) beats refusing every message
+        pred = local_pred.get("p")
+        if pred is not None:
+            return {"proceed": True} if pred[0] else {"proceed": False, "message": FRIENDLY_FALLBACK}
         return {"proceed": False, "message": FRIENDLY_FALLBACK}
@@ -0,0 +1,100 @@
+# app/core/breaker.py
+# Per-model circuit breaker for the LLM gateway. After LLM_BREAKER_FAILURES consecutive
+# provider failures (timeouts, connection errors, 5xx) the circuit opens and calls fail
+# fast with CircuitOpen, so callers drop straight into their local fallbacks instead of
+# waiting out OPENAI_REQUEST_TIMEOUT. After LLM_BREAKER_OPEN_S it goes half-open and lets
+# LLM_BREAKER_PROBES calls through: a success closes it, a failure re-opens it.
+from __future__ import annotations
+
+import time
+from typing import Any, Dict
+
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(RuntimeError):
+    """The model's circuit is open: the call was not sent."""
+
+
+class CircuitBreaker:
+    def __init__(self, model: str, failures: int = settings.LLM_BREAKER_FAILURES,
+                 open_s: float = settings.LLM_BREAKER_OPEN_S, probes: int = settings.LLM_BREAKER_PROBES):
+        self.model = model
+        self.threshold = max(1, failures)
+        self.open_s = open_s
+        self.probes = max(1, probes)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = 0
+        self.opened_count = 0
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            print(f" ------| LLM breaker {self.model}: {self.state} -> {state}")
+        self.state = state
+        metrics.gauge(f"llm.breaker.{self.model}", _STATE_GAUGE[state])
+
+    def acquire(self) -> bool:
+        """
+        Reserve a call. Raises CircuitOpen when the circuit is open (or half-open with
+        its probes already in flight). Returns True when the call is a half-open probe,
+        which must be followed by success()/failure()/release(probe=True).
+        """
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_s:
+            self._set(HALF_OPEN)
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self.probing < self.probes:
+            self.probing += 1
+            metrics.incr("llm.breaker.probes")
+            return True
+        metrics.incr("llm.breaker.rejected")
+        retry_in = max(0.0, self.open_s - (time.monotonic() - self.opened_at))
+        raise CircuitOpen(f"LLM circuit for {self.model} is {self.state} (retry in {retry_in:.0f}s)")
+
+    def release(self, probe: bool) -> None:
+        if probe:
+            self.probing = max(0, self.probing - 1)
+
+    def success(self, probe: bool) -> None:
+        self.release(probe)
+        self.failures = 0
+        self._set(CLOSED)
+
+    def failure(self, probe: bool) -> None:
+        self.release(probe)
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.opened_count += 1
+                metrics.incr("llm.breaker.opened")
+            self.opened_at = time.monotonic()
+            self._set(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"state": self.state, "consecutive_failures": self.failures,
+                               "times_opened": self.opened_count}
+        if self.state == OPEN:
+            out["retry_in_s"] = round(max(0.0, self.open_s - (time.monotonic() - self.opened_at)), 1)
+        return out
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+def breaker_for(model: str) -> CircuitBreaker:
+    b = _BREAKERS.get(model)
+    if b is None:
+        b = _BREAKERS[model] = CircuitBreaker(model)
+    return b
+
+def is_open(model: str) -> bool:
+    b = _BREAKERS.get(model)
+    return b is not None and b.state != CLOSED
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    return {m: b.snapshot() for m, b in sorted(_BREAKERS.items())}
@@ -0,0 +1,73 @@
+# app/core/deadline.py
+# Request-level deadline budget. /messages opens a scope (request_deadline) and the
+# absolute deadline travels in a contextvar through every stage, the LLM gateway and
+# any task spawned from the request. Stages await with what is left (within / run_stage)
+# and fall back to their existing degraded answer when it runs out.
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+from app.core.metrics import metrics
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's budget ran out (before or while awaiting a stage)."""
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Budget for everything awaited inside the block; None / <= 0 clears it (no deadline)."""
+    token = _DEADLINE.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget (None: no deadline)."""
+    d = _DEADLINE.get()
+    return None if d is None else d - time.monotonic()
+
+def budget(reserve: float = 0.0) -> Optional[float]:
+    """remaining() minus time held back for later stages."""
+    left = remaining()
+    return None if left is None else left - reserve
+
+
+async def within(aw: Awaitable[Any], *, stage: str, reserve: float = 0.0) -> Any:
+    """
+    Await `aw` with the remaining budget (minus `reserve`). Raises DeadlineExceeded when
+    the budget is already gone (aw is not started) or runs out while waiting.
+    """
+    b = budget(reserve)
+    if b is None:
+        return await aw
+    if b <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        metrics.incr(f"deadline.skipped.{stage}")
+        raise DeadlineExceeded(f"{stage}: no budget left")
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.wait_for(aw, b)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded):
+            raise
+        metrics.incr(f"deadline.expired.{stage}")
+        raise DeadlineExceeded(f"{stage}: budget of {b:.2f}s exceeded") from None
+    finally:
+        metrics.observe(f"deadline.stage_ms.{stage}", round((time.perf_counter() - t0) * 1000, 1))
+
+async def run_stage(stage: str, aw: Awaitable[Any], fallback: Any, *, reserve: float = 0.0) -> Any:
+    """within(), returning `fallback` instead of raising when the budget runs out."""
+    try:
+        return await within(aw, stage=stage, reserve=reserve)
+    except DeadlineExceeded as e:
+        print(f" ----| {e} | using fallback")
+        return fallback
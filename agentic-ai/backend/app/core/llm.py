@@ -1,9 +1,358 @@
 # app/core/llm.py
+# LLM gateway: every OpenAI call goes through chat() / respond(), which share the
+# pooled client from openai_client.py and add, per model,
+#   - a concurrency cap (in-flight calls),
+#   - token buckets for requests/min and tokens/min (tokens estimated up front,
+#     reconciled with the reported usage afterwards),
+#   - retries with full-jitter exponential backoff on 429 / timeouts / 5xx
+#     (honouring Retry-After when the API sends one),
+#   - an opt-in response cache (cache=True; see llm_cache.py),
+#   - single-flight: identical concurrent shareable requests make one API call,
+#   - the request deadline (deadline.py): per-attempt timeouts are clamped to the budget
+#     left and no retry is started that cannot finish in it,
+#   - opt-in hedging (hedge=True): a duplicate request after the model's p95 latency,
+#   - a per-model circuit breaker (breaker.py): while open, calls raise CircuitOpen at once,
+#   - usage accounting (usage.py): tokens, cost and wall time per tag="<component>.<stage>".
 from __future__ import annotations
-from typing import Optional
 
-from openai import APIError, RateLimitError, APITimeoutError
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+
+from openai import APIConnectionError, APIError, APIStatusError, APITimeoutError, RateLimitError
+from openai.types.chat import ChatCompletion
+from openai.types.responses import Response
+
+from app.core.breaker import CircuitOpen, breaker_for
+from app.core.deadline import DeadlineExceeded, remaining
+from app.core.llm_cache import cache_key, deterministic, response_cache
+from app.core.metrics import metrics
 from app.core.openai_client import client, DEFAULT_MODEL, REQUEST_TIMEOUT
+from app.core.settings import settings
+from app.core.singleflight import SingleFlight
+from app.core.usage import charge as charge_usage, current_tag, record as record_usage, request_usage, usage_tag
+
+_DEFAULT_OUTPUT_TOKENS = 512   # output budget assumed when the call sets no max tokens
+
+
+# ---------- limits ----------
+class TokenBucket:
+    """
+    `capacity` tokens, refilled continuously at capacity/min. acquire() reserves its tokens
+    under the lock (the balance may go negative, so callers are served in FIFO order) and
+    sleeps off the deficit outside it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._t = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def _lock_for_loop(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self, n: float = 1.0) -> float:
+        """
+        Take n tokens (capped at capacity); returns seconds waited. Raises DeadlineExceeded,
+        with the tokens given back, when the wait would outlast the request deadline.
+        """
+        n = min(float(n), self.capacity)
+        async with self._lock_for_loop():
+            self._refill()
+            self.tokens -= n
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay <= 0:
+            return 0.0
+        left = remaining()
+        if left is not None and delay > left:
+            self.adjust(n)
+            raise DeadlineExceeded(f"rate limit wait {delay:.2f}s exceeds the request deadline")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.adjust(n)
+            raise
+        return delay
+
+    def adjust(self, delta: float) -> None:
+        """Credit (positive) or debit (negative) tokens after the fact."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class ModelLimiter:
+    def __init__(self, rpm: int, tpm: int, concurrency: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = max(1, concurrency)
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem, self._loop = asyncio.Semaphore(self.concurrency), loop
+        return self._sem
+
+
+def _model_overrides() -> Dict[str, Dict[str, int]]:
+    try:
+        return json.loads(settings.LLM_MODEL_LIMITS) if settings.LLM_MODEL_LIMITS else {}
+    except Exception:
+        print(" ------| LLM_MODEL_LIMITS is not valid JSON; using defaults")
+        return {}
+
+_OVERRIDES = _model_overrides()
+_LIMITERS: Dict[str, ModelLimiter] = {}
+
+def limiter_for(model: str) -> ModelLimiter:
+    lim = _LIMITERS.get(model)
+    if lim is None:
+        o = _OVERRIDES.get(model, {})
+        lim = ModelLimiter(o.get("rpm", settings.LLM_RPM), o.get("tpm", settings.LLM_TPM),
+                           o.get("concurrency", settings.LLM_MAX_CONCURRENCY))
+        _LIMITERS[model] = lim
+    return lim
+
+
+# ---------- token estimates ----------
+def _text_len(x: Any) -> int:
+    if isinstance(x, str):
+        return len(x)
+    if isinstance(x, dict):
+        return sum(_text_len(v) for k, v in x.items() if k in ("content", "text", "input"))
+    if isinstance(x, (list, tuple)):
+        return sum(_text_len(v) for v in x)
+    return 0
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """~4 chars/token over the prompt, plus the requested (or assumed) output budget."""
+    prompt = _text_len(kwargs.get("messages") or kwargs.get("input") or "") + _text_len(kwargs.get("instructions") or "")
+    out = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or kwargs.get("max_output_tokens") \
+        or _DEFAULT_OUTPUT_TOKENS
+    return prompt // 4 + int(out)
+
+
+# ---------- retries ----------
+def _provider_failure(e: Exception) -> bool:
+    """Counts against the circuit breaker: the provider is slow, unreachable or erroring."""
+    if isinstance(e, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+def _retry_after(e: Exception) -> Optional[float]:
+    resp = getattr(e, "response", None)
+    try:
+        v = resp.headers.get("retry-after") if resp is not None else None
+        return float(v) if v else None
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, e: Optional[Exception] = None) -> float:
+    hinted = _retry_after(e) if e is not None else None
+    cap = min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, cap)   # full jitter: spreads a burst of 429s apart
+    return max(delay, hinted) if hinted is not None else delay
+
+
+# ---------- gateway ----------
+async def _call(kind: str, create, kwargs: Dict[str, Any]):
+    model = kwargs.get("model") or DEFAULT_MODEL
+    kwargs["model"] = model
+    lim = limiter_for(model)
+    brk = breaker_for(model) if settings.LLM_BREAKER_ENABLED else None
+    est = estimate_tokens(kwargs)
+    attempt = 0
+    t_call = time.perf_counter()
+    while True:
+        probe = brk.acquire() if brk is not None else False   # CircuitOpen: fail fast, nothing sent
+        try:
+            waited = await lim.requests.acquire(1)
+            try:
+                waited += await lim.tokens.acquire(est)
+            except BaseException:
+                lim.requests.adjust(1)   # nothing was sent
+                raise
+            if waited:
+                metrics.observe("llm.throttle_wait_ms", round(waited * 1000, 1))
+            left = remaining()
+            if left is not None and left <= 0:
+                lim.requests.adjust(1)
+                lim.tokens.adjust(est)
+                raise DeadlineExceeded(f"LLM {kind} {model}: request deadline passed")
+            call_kwargs = kwargs
+            clamped = False
+            if left is not None:   # per-attempt timeout never outlives the request's budget
+                t = kwargs.get("timeout")
+                clamped = t is None or left < float(t)
+                call_kwargs = {**kwargs, "timeout": left if t is None else min(float(t), left)}
+            t0 = time.perf_counter()
+            try:
+                async with lim.semaphore():
+                    resp = await create(**call_kwargs)
+            except Exception as e:
+                lim.tokens.adjust(est)   # a rejected/failed call did not spend its token budget
+                metrics.incr(f"llm.errors.{type(e).__name__}")
+                if brk is not None:
+                    # a timeout we imposed to fit the request deadline says nothing about the provider
+                    if _provider_failure(e) and not (clamped and isinstance(e, APITimeoutError)):
+                        brk.failure(probe)
+                    else:
+                        brk.success(probe)   # the provider answered (4xx / 429)
+                    probe = False
+                if not _retryable(e) or attempt >= settings.LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt, e)
+                left = remaining()
+                if left is not None and delay >= left:
+                    raise   # the retry could not finish inside the request deadline
+                attempt += 1
+                metrics.incr("llm.retries")
+                print(f" ------| LLM {kind} {model}: {type(e).__name__}, retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            if brk is not None:
+                brk.success(probe)
+                probe = False
+        finally:
+            if brk is not None:
+                brk.release(probe)   # cancelled / out of budget before the provider answered
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        metrics.observe(f"llm.{kind}_ms", ms)
+        metrics.observe(f"llm.latency_ms.{model}", ms)
+        metrics.incr(f"llm.requests.{model}")
+        usage = getattr(resp, "usage", None)
+        actual = getattr(usage, "total_tokens", None) if usage is not None else None
+        if actual is not None:
+            lim.tokens.adjust(est - actual)   # refund over-estimates, charge under-estimates
+            metrics.incr(f"llm.tokens.{model}", actual)
+        record_usage(model, resp, round((time.perf_counter() - t_call) * 1000, 1))   # incl. throttle + retries
+        return resp
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait before hedging: the model's observed p95 (LLM_HEDGE_QUANTILE) latency."""
+    name = f"llm.latency_ms.{model}"
+    t = metrics.timings.get(name)
+    if t is None or t["count"] < settings.LLM_HEDGE_MIN_SAMPLES:
+        return settings.LLM_HEDGE_DELAY_MS / 1000
+    return (metrics.percentile(name, settings.LLM_HEDGE_QUANTILE) or settings.LLM_HEDGE_DELAY_MS) / 1000
+
+async def _hedged_call(kind: str, create, kwargs: Dict[str, Any]):
+    """
+    _call(), plus one duplicate request if the first hasn't answered after hedge_delay().
+    Whichever succeeds first wins and the other is cancelled. No hedge when the model is
+    already at its concurrency cap or the request deadline would pass before the delay.
+    """
+    model = kwargs.setdefault("model", DEFAULT_MODEL)
+    delay = hedge_delay(model)
+    left = remaining()
+    if left is not None and left <= delay:
+        return await _call(kind, create, kwargs)
+    first = asyncio.ensure_future(_call(kind, create, dict(kwargs)))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+        if limiter_for(model).semaphore().locked():
+            return await first
+        metrics.incr("llm.hedge.fired")
+        second = asyncio.ensure_future(_call(kind, create, dict(kwargs)))
+        tasks.add(second)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is second:
+                        metrics.incr("llm.hedge.won")
+                    return t.result()
+        return first.result()   # both failed: surface the original request's error
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+_RESPONSE_TYPES = {"chat": ChatCompletion, "responses": Response}
+_FLIGHT = SingleFlight("llm")
+
+async def _dispatch(kind: str, create, kwargs: Dict[str, Any], hedge: bool):
+    if hedge and settings.LLM_HEDGE_ENABLED:
+        return await _hedged_call(kind, create, kwargs)
+    return await _call(kind, create, kwargs)
+
+async def _fetch(kind: str, create, kwargs: Dict[str, Any], key: str, use_cache: bool, hedge: bool):
+    if use_cache:
+        t0 = time.perf_counter()
+        hit = await response_cache.get(key)
+        if hit is not None:
+            try:
+                # built without validation, the same way the SDK builds API responses
+                resp = _RESPONSE_TYPES[kind].construct(**hit)
+                record_usage(kwargs["model"], resp, round((time.perf_counter() - t0) * 1000, 1), cached=True)
+                return resp
+            except Exception as e:
+                print(f" ------| LLM cache: stale entry for {kind} ({type(e).__name__}); refetching")
+    resp = await _dispatch(kind, create, kwargs, hedge)
+    if use_cache:
+        response_cache.put(key, kind, kwargs["model"], resp.model_dump(mode="json"))
+    return resp
+
+async def _fetch_shared(kind: str, create, kwargs: Dict[str, Any], key: str, use_cache: bool, hedge: bool):
+    """_fetch() plus the usage it recorded, for _shared_call to charge to every waiter."""
+    with request_usage() as ledger:
+        resp = await _fetch(kind, create, kwargs, key, use_cache, hedge)
+    return resp, ledger.calls
+
+async def _cached_call(kind: str, create, kwargs: Dict[str, Any], cache: bool, cacheable: bool,
+                       hedge: bool = False, tag: str = ""):
+    with usage_tag(tag or current_tag()):
+        return await _shared_call(kind, create, kwargs, cache, cacheable, hedge)
+
+async def _shared_call(kind: str, create, kwargs: Dict[str, Any], cache: bool, cacheable: bool, hedge: bool):
+    """
+    Requests at temperature 0 (or top_p 0) are shareable as-is; sampled ones (temperature > 0)
+    only if the call site says cacheable=True, i.e. any one of the possible answers is fine to
+    reuse. Identical shareable requests in flight at the same time make one API call;
+    cache=True additionally opts the call site into the response cache; hedge=True into
+    hedged requests (LLM_HEDGE_ENABLED). The shared call runs outside any one request's
+    deadline and ledger; each waiter is bounded by its own deadline and charged its usage.
+    """
+    if not (cacheable or deterministic(kwargs)):
+        return await _dispatch(kind, create, kwargs, hedge)
+    kwargs.setdefault("model", DEFAULT_MODEL)
+    key = cache_key(kind, kwargs)
+    use_cache = cache and settings.LLM_CACHE_ENABLED
+    (resp, calls), coalesced = await _FLIGHT.join(key, lambda: _fetch_shared(kind, create, kwargs, key, use_cache, hedge))
+    charge_usage(calls, coalesced=coalesced)
+    return resp
+
+async def chat(*, cache: bool = False, cacheable: bool = False, hedge: bool = False, tag: str = "", **kwargs):
+    """client.chat.completions.create(**kwargs) through the gateway. tag: "<component>.<stage>"."""
+    return await _cached_call("chat", client.chat.completions.create, kwargs, cache, cacheable, hedge, tag)
+
+async def respond(*, cache: bool = False, cacheable: bool = False, hedge: bool = False, tag: str = "", **kwargs):
+    """client.responses.create(**kwargs) through the gateway. tag: "<component>.<stage>"."""
+    return await _cached_call("responses", client.responses.create, kwargs, cache, cacheable, hedge, tag)
+
 
 # Return the raw model string (Component 10 will parse/validate)
 async def complete_json(
@@ -12,18 +361,22 @@ async def complete_json(
     temperature: float = 0.3,
     max_tokens: int = 120,
     system: Optional[str] = None,
+    cache: bool = False,
+    cacheable: bool = False,
+    hedge: bool = False,
+    tag: str = "",
+    model: Optional[str] = None,
 ) -> str:
     """
     Calls the chat completion API with JSON response mode enforced and returns the raw content.
     The caller is responsible for JSON parsing/validation.
+    cache / cacheable / hedge: see _shared_call (opt-in response cache, hedged requests).
+    tag: "<component>.<stage>" for usage accounting. model: defaults to OPENAI_MODEL.
     """
     sys = system or "You are a precise JSON generator. Output ONLY one JSON object, no markdown."
     try:
-        # Bind timeout on the call
-        _cl = client.with_options(timeout=REQUEST_TIMEOUT)
-
-        resp = await _cl.chat.completions.create(
-            model=DEFAULT_MODEL,
+        resp = await chat(
+            model=model or DEFAULT_MODEL,
             messages=[
                 {"role": "system", "content": sys},
                 {"role": "user", "content": prompt},
@@ -32,11 +385,17 @@ async def complete_json(
             response_format={"type": "json_object"},
             temperature=temperature,
             max_tokens=max_tokens,
+            # Bind timeout on the call
+            timeout=REQUEST_TIMEOUT,
+            cache=cache,
+            cacheable=cacheable,
+            hedge=hedge,
+            tag=tag,
         )
         content = (resp.choices[0].message.content or "").strip()
         return content
     except (RateLimitError, APITimeoutError) as e:
-        # Bubble up; Component 10 has its own fallback
+        # Bubble up (after the gateway's retries); Component 10 has its own fallback
         raise
     except APIError as e:
         raise
@@ -0,0 +1,120 @@
+# app/core/llm_cache.py
+# Response cache for the LLM gateway: an in-process LRU in front of a Mongo TTL
+# collection (llm_cache). Keyed by (kind, model, system prompt hash, user content
+# hash, params hash). Only used by call sites that opt in (llm.chat(..., cache=True)).
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import timezone
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+_MONGO_TIMEOUT_S = 0.25   # a cache read must never cost more than a fraction of an LLM call
+_MONGO_RETRY_S = 60.0     # after a Mongo failure, use the LRU tier only for this long
+
+# params that don't change the answer (transport / bookkeeping only)
+_IGNORED_PARAMS = {"timeout", "extra_headers", "extra_query", "extra_body", "user", "metadata", "store"}
+
+
+def _h(obj: Any) -> str:
+    data = obj if isinstance(obj, str) else json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:20]
+
+def cache_key(kind: str, kwargs: Dict[str, Any]) -> str:
+    msgs = kwargs.get("messages") or kwargs.get("input") or []
+    if isinstance(msgs, str):
+        msgs = [{"role": "user", "content": msgs}]
+    system = [m for m in msgs if isinstance(m, dict) and m.get("role") in ("system", "developer")]
+    rest = [m for m in msgs if m not in system]
+    system_h = _h([kwargs.get("instructions") or "", system])
+    params = {k: v for k, v in kwargs.items()
+              if k not in ("model", "messages", "input", "instructions") and k not in _IGNORED_PARAMS}
+    return f"{kind}:{kwargs.get('model')}:{system_h}:{_h(rest)}:{_h(params)}"
+
+def deterministic(kwargs: Dict[str, Any]) -> bool:
+    """temperature 0 (or top_p 0): the same request should yield the same answer."""
+    return kwargs.get("temperature") == 0 or kwargs.get("top_p") == 0
+
+
+class ResponseCache:
+    def __init__(self, size: int = settings.LLM_CACHE_SIZE, ttl_s: int = settings.LLM_CACHE_TTL_S,
+                 use_mongo: bool = settings.LLM_CACHE_MONGO):
+        self.size = max(1, size)
+        self.ttl_s = ttl_s
+        self.use_mongo = use_mongo
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._writes: set = set()   # strong refs to background Mongo writes
+        self._mongo_down_until = 0.0
+
+    def _hit(self, tier: str) -> None:
+        metrics.incr(f"llm.cache.hit_{tier}")
+        self._rate()
+
+    def _rate(self) -> None:
+        hits = metrics.count("llm.cache.hit_lru") + metrics.count("llm.cache.hit_mongo")
+        total = hits + metrics.count("llm.cache.miss")
+        metrics.gauge("llm.cache.hit_rate", round(hits / total, 4) if total else 0.0)
+
+    def _mongo_ok(self) -> bool:
+        return self.use_mongo and time.monotonic() >= self._mongo_down_until
+
+    def _mongo_failed(self, e: BaseException) -> None:
+        if self._mongo_ok():
+            print(" ------| LLM cache: Mongo tier unavailable, in-process tier only for a while:", type(e).__name__, e)
+        self._mongo_down_until = time.monotonic() + _MONGO_RETRY_S
+
+    def _remember(self, key: str, payload: Dict[str, Any], expires: float) -> None:
+        self._lru[key] = (expires, payload)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._lru.get(key)
+        if item is not None:
+            if item[0] > time.time():
+                self._lru.move_to_end(key)
+                self._hit("lru")
+                return item[1]
+            del self._lru[key]
+        if self._mongo_ok():
+            try:
+                from app.db.mongo import get_db
+                from app.repositories.llm_cache_repo import get_cached_response
+                doc = await asyncio.wait_for(get_cached_response(get_db(), key), _MONGO_TIMEOUT_S)
+            except Exception as e:   # includes the wait_for timeout
+                self._mongo_failed(e)
+                doc = None
+            if doc:
+                self._remember(key, doc["response"], doc["expires_at"].replace(tzinfo=timezone.utc).timestamp())
+                self._hit("mongo")
+                return doc["response"]
+        metrics.incr("llm.cache.miss")
+        self._rate()
+        return None
+
+    def put(self, key: str, kind: str, model: str, payload: Dict[str, Any]) -> None:
+        self._remember(key, payload, time.time() + self.ttl_s)
+        if not self._mongo_ok():
+            return
+
+        async def write():
+            try:
+                from app.db.mongo import get_db
+                from app.repositories.llm_cache_repo import put_cached_response
+                await asyncio.wait_for(put_cached_response(get_db(), key, kind, model, payload, self.ttl_s), 2.0)
+            except Exception as e:
+                self._mongo_failed(e)
+
+        task = asyncio.get_running_loop().create_task(write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,76 @@
+# app/core/metrics.py
+# Tiny in-process metrics registry (per worker). Counters, gauges and latency
+# summaries with a bounded sample window for percentiles. Exposed on GET /metrics.
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict
+
+_WINDOW = 512  # samples kept per timing for p50/p95
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def incr(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            t = self.timings.get(name)
+            if t is None:
+                t = {"count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=_WINDOW)}
+                self.timings[name] = t
+            t["count"] += 1
+            t["sum"] += value
+            t["max"] = max(t["max"], value)
+            t["samples"].append(value)
+
+    def count(self, name: str) -> float:
+        return self.counters.get(name, 0)
+
+    def mean(self, name: str) -> float | None:
+        t = self.timings.get(name)
+        if not t or not t["count"]:
+            return None
+        return t["sum"] / t["count"]
+
+    def percentile(self, name: str, q: float) -> float | None:
+        with self._lock:
+            t = self.timings.get(name)
+            if not t or not t["samples"]:
+                return None
+            xs = sorted(t["samples"])
+        idx = min(len(xs) - 1, max(0, int(round(q * (len(xs) - 1)))))
+        return xs[idx]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {}
+            for name, t in self.timings.items():
+                xs = sorted(t["samples"])
+                timings[name] = {
+                    "count": t["count"],
+                    "avg": round(t["sum"] / t["count"], 3) if t["count"] else None,
+                    "p50": round(xs[len(xs) // 2], 3) if xs else None,
+                    "p95": round(xs[min(len(xs) - 1, int(0.95 * (len(xs) - 1)))], 3) if xs else None,
+                    "max": round(t["max"], 3),
+                }
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": timings,
+            }
+
+
+metrics = Metrics()
@@ -1,4 +1,7 @@
 # openai_client.py
+# The one AsyncOpenAI client, on a shared, tuned httpx pool. Call it through the
+# gateway in app/core/llm.py (limits + retries); the SDK's own retries are off.
+import httpx
 from openai import AsyncOpenAI
 from app.core.settings import settings
 from dotenv import load_dotenv
@@ -7,8 +10,18 @@ import os
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Async client (matches your `await ...` usage)
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-
 DEFAULT_MODEL = settings.OPENAI_MODEL
 REQUEST_TIMEOUT = settings.OPENAI_REQUEST_TIMEOUT
+
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        keepalive_expiry=60,
+    ),
+)
+
+# Async client (matches your `await ...` usage)
+# OPENAI_BASE_URL points the app at another OpenAI-compatible server (e.g. the load-test mock)
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None,
+                     http_client=http_client, max_retries=0)
@@ -0,0 +1,103 @@
+# app/core/routing.py
+# Tiered model routing for classification-style calls (C05 gate, C06 intents, C10 insight questions).
+# A route tries its cheap tiers first: an optional local classifier, then LLM_SMALL_MODEL.
+# It escalates to the main model (OPENAI_MODEL) only when a tier's answer can't be parsed,
+# fails validation, reports a confidence below LLM_ROUTE_MIN_CONFIDENCE, or the call errors.
+# Metrics: route.<name>.calls, .served.<tier>, .escalated.<reason>, .escalated_calls, gauge
+# route.<name>.escalation_rate (share of calls served above their first model tier), timings
+# route.<name>.<tier>_ms. A local classifier deferring to the models (no opinion or low
+# confidence) is counted as route.<name>.local_abstain, not as an escalation.
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import metrics
+from app.core.openai_client import DEFAULT_MODEL
+from app.core.settings import settings
+
+Parsed = Tuple[Any, float]   # (result, confidence in [0, 1])
+
+
+class Escalate(ValueError):
+    """Raised by a route's parse(): the tier's answer is unusable (bad JSON, failed checks)."""
+
+
+def _tiers(local: Optional[Callable[[], Awaitable[Optional[Parsed]]]]) -> List[Tuple[str, Optional[str]]]:
+    tiers: List[Tuple[str, Optional[str]]] = [("local", None)] if local is not None else []
+    small = settings.LLM_SMALL_MODEL
+    if small and small != DEFAULT_MODEL:
+        tiers.append(("small", small))
+    tiers.append(("large", DEFAULT_MODEL))
+    return tiers
+
+def _local_abstain(name: str) -> None:
+    metrics.incr(f"route.{name}.local_abstain")
+    print(f" ------| Route {name}: local tier abstained")
+
+def _escalated(name: str, tier: str, reason: str) -> None:
+    metrics.incr(f"route.{name}.escalated.{reason}")
+    print(f" ------| Route {name}: {tier} tier escalated ({reason})")
+
+async def routed(
+    name: str,
+    call: Callable[[str], Awaitable[Any]],
+    parse: Callable[[Any], Parsed],
+    *,
+    local: Optional[Callable[[], Awaitable[Optional[Parsed]]]] = None,
+) -> Any:
+    """
+    call(model) -> raw model output; parse(raw) -> (result, confidence) or raises Escalate.
+    await local() -> (result, confidence), or None when the local classifier has no opinion.
+    The last tier's answer is returned whatever its confidence; its parse errors propagate
+    to the caller's existing fallback.
+    """
+    metrics.incr(f"route.{name}.calls")
+    tiers = _tiers(local)
+    first_model = 1 if local is not None else 0   # escalations are counted from here on
+    for i, (tier, model) in enumerate(tiers):
+        last = i == len(tiers) - 1
+        t0 = time.perf_counter()
+        try:
+            if tier == "local":
+                parsed = await local()
+                if parsed is None:
+                    _local_abstain(name)
+                    continue
+            else:
+                raw = await call(model)
+                if last:
+                    result, _ = parse(raw)
+                    return _served(name, tier, result, escalated=i > first_model)
+                parsed = parse(raw)
+        except DeadlineExceeded:
+            raise   # no budget left for a bigger model either
+        except Escalate:
+            if last:
+                raise
+            _escalated(name, tier, "parse")
+            continue
+        except Exception as e:
+            if last:
+                raise
+            _escalated(name, tier, f"error_{type(e).__name__}")
+            continue
+        finally:
+            metrics.observe(f"route.{name}.{tier}_ms", round((time.perf_counter() - t0) * 1000, 1))
+        result, confidence = parsed
+        if confidence >= settings.LLM_ROUTE_MIN_CONFIDENCE:
+            return _served(name, tier, result, escalated=i > first_model)
+        if tier == "local":
+            _local_abstain(name)
+        else:
+            _escalated(name, tier, "confidence")
+    raise RuntimeError(f"route {name}: no tier produced an answer")   # unreachable: large is always last
+
+def _served(name: str, tier: str, result: Any, escalated: bool) -> Any:
+    metrics.incr(f"route.{name}.served.{tier}")
+    if escalated:
+        metrics.incr(f"route.{name}.escalated_calls")
+    served = sum(metrics.count(f"route.{name}.served.{t}") for t in ("local", "small", "large"))
+    metrics.gauge(f"route.{name}.escalation_rate", round(metrics.count(f"route.{name}.escalated_calls") / served, 4))
+    return result
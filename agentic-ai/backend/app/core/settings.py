@@ -11,6 +11,46 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_REQUEST_TIMEOUT: int = 12
+    # OpenAI-compatible endpoint, e.g. http://127.0.0.1:8099/v1 for scripts/mock_openai_server.py ("" = api.openai.com)
+    OPENAI_BASE_URL: str = ""
+
+    # LLM gateway (app/core/llm.py): shared connection pool, per-model limits, retries
+    LLM_MAX_CONNECTIONS: int = 64
+    LLM_MAX_CONCURRENCY: int = 16          # in-flight calls per model
+    LLM_RPM: int = 500                     # requests/min per model (token bucket)
+    LLM_TPM: int = 200_000                 # tokens/min per model (estimated up front, reconciled with usage)
+    # per-model overrides, JSON: {"gpt-4.1": {"rpm": 500, "tpm": 30000, "concurrency": 8}}
+    LLM_MODEL_LIMITS: str = ""
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE: float = 0.5          # seconds; full-jitter exponential backoff
+    LLM_BACKOFF_MAX: float = 8.0
+    # response cache for opted-in call sites (in-process LRU + Mongo TTL collection)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_SIZE: int = 2048             # LRU entries per worker
+    LLM_CACHE_TTL_S: int = 86400
+    LLM_CACHE_MONGO: bool = True
+    # hedging for opted-in call sites (hedge=True): a duplicate request is sent when the first
+    # hasn't answered after the model's p95 latency; the first answer wins, the other is cancelled
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20        # below this many latency samples, use LLM_HEDGE_DELAY_MS
+    LLM_HEDGE_DELAY_MS: float = 2500.0
+    # per-model circuit breaker: open after N consecutive provider failures (timeouts / 5xx),
+    # fail fast for LLM_BREAKER_OPEN_S, then let LLM_BREAKER_PROBES half-open probes through
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_OPEN_S: float = 30.0
+    LLM_BREAKER_PROBES: int = 1
+    # tiered routing for classification-style calls (gate, intents, C10): try this smaller model
+    # first and escalate to OPENAI_MODEL on a parse failure or confidence below the threshold
+    LLM_SMALL_MODEL: str = ""
+    LLM_ROUTE_MIN_CONFIDENCE: float = 0.7
+    # usage accounting: USD per 1M tokens, JSON {"model": [input, output]} (adds to / overrides built-ins)
+    LLM_PRICES: str = ""
+
+    # /messages turn deadline (seconds, 0 = none): stages get what is left and fall back when it runs out
+    TURN_DEADLINE_S: float = 25.0
+    TURN_C10_RESERVE_S: float = 3.0        # held back from C05–C08 so the encouragement question still runs
 
     # Auth / JWT
     JWT_SECRET: str = "change-me"
@@ -21,11 +61,30 @@ class Settings(BaseSettings):
     # --- Component 07 (Insights) ---
     # Vault version to enforce on startup
     INSIGHT_VAULT_VERSION: str = "v2025-10-13"
+    # The Stage-01 prompt prefix is re-read from the vault this often, so edits to a live version show up
+    INSIGHT_PREFIX_TTL_S: float = 300.0
     # Optional separate model/params (fall back to OPENAI_MODEL if empty)
     INSIGHTS_MODEL: str | None = None
     INSIGHTS_TEMPERATURE: float = 0.2
     INSIGHTS_TOP_P: float = 0.3
 
+    # --- Fast path (small-talk / trivial turns skip Component 08) ---
+    FAST_PATH_ENABLED: bool = True
+    # "template" = canned reply, "llm" = one short completion (falls back to template)
+    FAST_PATH_REPLY_MODE: str = "template"
+    # nearest-centroid acceptance: min cosine to a trivial centroid, and margin over the "question" centroid
+    FAST_PATH_MIN_SIM: float = 0.72
+    FAST_PATH_MIN_MARGIN: float = 0.08
+
+    # --- Local C05 gate classifier (linear model on the RAG encoder, scripts/train_gate_classifier.py) ---
+    # "on" = decide confident cases locally, defer the rest to the LLM gate; "shadow" = LLM decides,
+    # the local verdict is only logged next to it; "off" = LLM only
+    GATE_CLASSIFIER_MODE: str = "on"
+    GATE_CLASSIFIER_MODEL: str = ""   # default: app/rag/5_index/gate_classifier.json
+    # LLM gate verdicts are appended here (always in shadow mode, otherwise only if set)
+    GATE_CLASSIFIER_LOG: str = ""
+    GATE_CLASSIFIER_MIN_CONFIDENCE: float = 0.9
+
 settings = Settings()
 
 # convenience accessor for C07 model choice (fallback to main model)
@@ -0,0 +1,64 @@
+# app/core/singleflight.py
+# Single-flight: concurrent calls with the same key share one in-flight execution.
+# The first caller starts the coroutine; callers arriving before it finishes await the
+# same task (result or exception). Nothing is cached once it completes.
+# The shared execution belongs to no single request: it runs without the starting
+# request's deadline or usage ledger, and every caller bounds its own wait with within().
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.deadline import DeadlineExceeded, budget, request_deadline, within
+from app.core.metrics import metrics
+from app.core.usage import request_usage
+
+
+async def _detached(fn: Callable[[], Awaitable[Any]]) -> Any:
+    with request_deadline(None), request_usage(False):
+        return await fn()
+
+
+class SingleFlight:
+    """
+    `await group.do(key, lambda: coro())`. Results are shared objects: callers must treat
+    them as read-only. Metrics: singleflight.<name>.calls / .coalesced.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return (await self.join(key, fn))[0]
+
+    async def join(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """do(), plus whether this caller joined an execution another caller started."""
+        loop = asyncio.get_running_loop()
+        k = (id(loop), key)   # tasks never cross event loops
+        metrics.incr(f"singleflight.{self.name}.calls")
+        task: Optional[asyncio.Task] = self._inflight.get(k)
+        coalesced = task is not None
+        stage = f"singleflight.{self.name}"
+        left = budget()
+        if not coalesced and left is not None and left <= 0:
+            metrics.incr(f"deadline.skipped.{stage}")
+            raise DeadlineExceeded(f"{stage}: no budget left")   # don't start work nobody can wait for
+        if coalesced:
+            metrics.incr(f"singleflight.{self.name}.coalesced")
+        else:
+            # the shared call runs as its own task, so cancelling any one waiter
+            # (including the first) doesn't cancel it for the others
+            task = loop.create_task(_detached(fn))
+            self._inflight[k] = task
+            task.add_done_callback(lambda t: self._done(k, t))
+        return await within(asyncio.shield(task), stage=stage), coalesced
+
+    def _done(self, k: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        if self._inflight.get(k) is task:
+            del self._inflight[k]
+        if not task.cancelled():
+            task.exception()   # retrieved: no warning if every waiter went away
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,153 @@
+# app/core/usage.py
+# LLM usage accounting. Every gateway call is tagged "<component>.<stage>" (llm.chat(tag=...))
+# and recorded with its prompt/completion tokens (from the response's usage fields), the part
+# of the prompt served from the provider's prompt cache, wall time and estimated cost:
+#   - exported as metrics: llm.usage.<tag>.{calls,prompt_tokens,cached_tokens,completion_tokens,
+#     cost_usd} counters and llm.usage_ms.<tag> timings,
+#   - appended to the current request's UsageLedger (request_usage()), whose summary()
+#     /messages stores on the assistant message. A single-flight shared call is charged to
+#     every request that waited on it (charge()), flagged coalesced for all but the first.
+from __future__ import annotations
+
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+UNTAGGED = "untagged"
+
+# USD per 1M (input, output, cached input) tokens; LLM_PRICES (JSON) adds or overrides models
+_DEFAULT_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1-nano": (0.10, 0.40, 0.025),
+}
+
+def _prices() -> Dict[str, Tuple[float, float, float]]:
+    prices = dict(_DEFAULT_PRICES)
+    try:
+        for model, p in (json.loads(settings.LLM_PRICES) if settings.LLM_PRICES else {}).items():
+            prices[model] = (float(p[0]), float(p[1]), float(p[2]) if len(p) > 2 else float(p[0]))
+    except Exception:
+        print(" ------| LLM_PRICES is not valid JSON ({model: [in, out, cached_in?]}); using defaults")
+    return prices
+
+_PRICES = _prices()
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimated cost; dated snapshots ("gpt-4.1-mini-2025-04-14") use their base model's price."""
+    p = _PRICES.get(model)
+    if p is None:
+        base = max((m for m in _PRICES if model.startswith(m + "-")), key=len, default=None)
+        p = _PRICES.get(base) if base else None
+    if p is None:
+        return 0.0
+    cached = min(cached_tokens, prompt_tokens)
+    return ((prompt_tokens - cached) * p[0] + cached * p[2] + completion_tokens * p[1]) / 1_000_000
+
+def usage_tokens(resp: Any) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens from a chat completion or a Responses API result."""
+    u = getattr(resp, "usage", None)
+    if u is None:
+        return 0, 0, 0
+    prompt = getattr(u, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(u, "input_tokens", 0)
+    completion = getattr(u, "completion_tokens", None)
+    if completion is None:
+        completion = getattr(u, "output_tokens", 0)
+    details = getattr(u, "prompt_tokens_details", None) or getattr(u, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return int(prompt or 0), int(completion or 0), int(cached or 0)
+
+
+class UsageLedger:
+    """The LLM calls of one request (one /messages turn)."""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        by_tag: Dict[str, Dict[str, Any]] = {}
+        for c in self.calls:
+            t = by_tag.setdefault(c["tag"], {"calls": 0, "cached": 0, "coalesced": 0, "prompt_tokens": 0,
+                                             "cached_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "ms": 0.0})
+            t["calls"] += 1
+            t["cached"] += int(c["cached"])
+            t["coalesced"] += int(c.get("coalesced", False))
+            t["prompt_tokens"] += c["prompt_tokens"]
+            t["cached_tokens"] += c["cached_tokens"]
+            t["completion_tokens"] += c["completion_tokens"]
+            t["cost_usd"] += c["cost_usd"]
+            t["ms"] += c["ms"]
+        for t in by_tag.values():
+            t["cost_usd"] = round(t["cost_usd"], 6)
+            t["ms"] = round(t["ms"], 1)
+        return {
+            "calls": len(self.calls),
+            "prompt_tokens": sum(t["prompt_tokens"] for t in by_tag.values()),
+            "cached_tokens": sum(t["cached_tokens"] for t in by_tag.values()),
+            "completion_tokens": sum(t["completion_tokens"] for t in by_tag.values()),
+            "cost_usd": round(sum(t["cost_usd"] for t in by_tag.values()), 6),
+            "llm_ms": round(sum(t["ms"] for t in by_tag.values()), 1),
+            "by_stage": by_tag,
+        }
+
+
+_LEDGER: ContextVar[Optional[UsageLedger]] = ContextVar("llm_usage_ledger", default=None)
+_TAG: ContextVar[str] = ContextVar("llm_usage_tag", default=UNTAGGED)
+
+@contextmanager
+def request_usage(enabled: bool = True) -> Iterator[Optional[UsageLedger]]:
+    """Collect the LLM calls awaited inside the block; enabled=False detaches from the outer ledger."""
+    ledger = UsageLedger() if enabled else None
+    token = _LEDGER.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _LEDGER.reset(token)
+
+@contextmanager
+def usage_tag(tag: str) -> Iterator[None]:
+    token = _TAG.set(tag or UNTAGGED)
+    try:
+        yield
+    finally:
+        _TAG.reset(token)
+
+def current_tag() -> str:
+    return _TAG.get()
+
+def record(model: str, resp: Any, ms: float, *, cached: bool = False) -> None:
+    tag = _TAG.get()
+    prompt, completion, prefix_cached = (0, 0, 0) if cached else usage_tokens(resp)
+    cost = cost_usd(model, prompt, completion, prefix_cached)
+    metrics.incr(f"llm.usage.{tag}.calls")
+    if cached:
+        metrics.incr(f"llm.usage.{tag}.cached")
+    else:
+        metrics.incr(f"llm.usage.{tag}.prompt_tokens", prompt)
+        metrics.incr(f"llm.usage.{tag}.cached_tokens", prefix_cached)
+        if prompt:
+            metrics.observe(f"llm.usage.{tag}.cached_frac", round(prefix_cached / prompt, 3))
+        metrics.incr(f"llm.usage.{tag}.completion_tokens", completion)
+        metrics.incr(f"llm.usage.{tag}.cost_usd", cost)
+    metrics.observe(f"llm.usage_ms.{tag}", ms)
+    ledger = _LEDGER.get()
+    if ledger is not None:
+        ledger.calls.append({"tag": tag, "model": model, "cached": cached, "coalesced": False, "prompt_tokens": prompt,
+                             "cached_tokens": prefix_cached, "completion_tokens": completion, "cost_usd": cost, "ms": ms})
+
+def charge(calls: List[Dict[str, Any]], *, coalesced: bool) -> None:
+    """Add calls recorded by a shared (single-flight) execution to the current ledger, under the current tag."""
+    ledger = _LEDGER.get()
+    if ledger is None:
+        return
+    tag = _TAG.get()
+    for c in calls:
+        ledger.calls.append({**c, "tag": tag, "coalesced": coalesced})
@@ -18,6 +18,9 @@ INSIGHT_VAULT = "insight_vault"
 CHAT_INSIGHT_SESSIONS = "chat_insight_sessions" # one row per chat
 CHAT_INSIGHT_STATES = "chat_insight_states"     # one row per {chatId, insightId}
 
+# --- LLM gateway ---
+LLM_CACHE = "llm_cache"                         # persistent tier of the LLM response cache
+
 async def ensure_collections(db: AsyncIOMotorDatabase) -> None:
     # Segment vault versions
     await db[SEGMENT_VAULT].create_index("vault_version", unique=True)
@@ -82,4 +85,9 @@ async def ensure_collections(db: AsyncIOMotorDatabase) -> None:
     # Per-chat states: one per {chatId, insightId}
     await db[CHAT_INSIGHT_STATES].create_index([("chatId", 1), ("insightId", 1)], unique=True)
     await db[CHAT_INSIGHT_STATES].create_index([("chatId", 1), ("batchId", 1), ("taken", 1)])
-    await db[CHAT_INSIGHT_STATES].create_index([("chatId", 1), ("taken", 1)])
\ No newline at end of file
+    await db[CHAT_INSIGHT_STATES].create_index([("chatId", 1), ("taken", 1)])
+
+    # --- LLM gateway ---
+    # Response cache: one doc per key; TTL index for expiry
+    await db[LLM_CACHE].create_index("key", unique=True)
+    await db[LLM_CACHE].create_index("expires_at", expireAfterSeconds=0)
\ No newline at end of file
@@ -7,6 +7,7 @@ import asyncio
 from app.db.mongo import get_db
 from app.db.init_db import ensure_collections
 from app.services.seed_insight_vault import verify_or_seed
+from app.services.insight_engine import stage01_prefix
 
 from app.api.routes.health import router as health_router
 from app.api.routes.vault import router as vault_router
@@ -34,6 +35,7 @@ async def on_startup():
     db = get_db()
     await ensure_collections(db)
     await verify_or_seed(db)
+    await stage01_prefix(db)   # serialize the Stage-01 vault prefix once, before the first turn
     asyncio.create_task(broker.gc_loop())
 
 app.include_router(health_router)
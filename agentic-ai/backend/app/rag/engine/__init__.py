@@ -0,0 +1,23 @@
+# app/rag/engine — retrieval engine shared by the API (Component 08) and the RAG CLIs.
+from app.rag.engine.index import (
+    RagIndex, get_index, load_chunk_record, clear_chunk_cache, tokenize_lex, rrf_fuse,
+)
+from app.rag.engine.batcher import EmbeddingBatcher
+from app.rag.engine.executor import RetrievalBusy, retrieval_executor
+from app.rag.engine.stages import (
+    compose_answer_question, llm_plan_queries, llm_rerank, llm_relevance_filter,
+    llm_sufficiency_gate, pack_context, llm_answer, llm_validate,
+)
+from app.rag.engine.sufficiency import (
+    SUFFICIENCY_FEATURES, sufficiency_features, estimate_sufficiency, sufficiency_gate,
+)
+from app.rag.engine.orchestrator import component8_rag_answer
+
+__all__ = [
+    "RagIndex", "get_index", "load_chunk_record", "clear_chunk_cache", "tokenize_lex", "rrf_fuse",
+    "EmbeddingBatcher", "RetrievalBusy", "retrieval_executor",
+    "compose_answer_question", "llm_plan_queries", "llm_rerank", "llm_relevance_filter",
+    "llm_sufficiency_gate", "pack_context", "llm_answer", "llm_validate",
+    "SUFFICIENCY_FEATURES", "sufficiency_features", "estimate_sufficiency", "sufficiency_gate",
+    "component8_rag_answer",
+]
@@ -0,0 +1,106 @@
+# app/rag/engine/batcher.py
+# Dynamic micro-batching of query embeddings: concurrent callers queue their
+# strings, one worker task collects them for a few ms (or up to max_batch texts),
+# encodes them in a single forward pass off the loop and resolves each future.
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.rag.engine.config import EMBED_BATCH_MAX, EMBED_BATCH_WAIT_MS
+
+_Item = Tuple[List[str], asyncio.Future, float]
+
+
+class EmbeddingBatcher:
+    """
+    One per encoder. `await embed(texts)` returns the same (n, dim) float32 rows
+    encode_fn(texts) would, but requests that arrive together share a batch instead
+    of running batch-of-one passes in parallel threads (GIL + torch thread contention).
+
+    Metrics: embed.queue_depth (gauge, texts waiting), embed.batch_size / embed.batch_requests
+    (texts / callers per forward pass), embed.wait_ms (queueing), embed.encode_ms.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch: int = EMBED_BATCH_MAX, max_wait_ms: float = EMBED_BATCH_WAIT_MS,
+                 run: Optional[Callable[..., Awaitable[Any]]] = None):
+        self.encode_fn = encode_fn
+        self.run = run or asyncio.to_thread   # where the forward pass executes
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        # bound to the running loop; CLIs may call asyncio.run() more than once
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._pending = 0
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        queue = self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending += len(texts)
+        metrics.gauge("embed.queue_depth", self._pending)
+        queue.put_nowait((texts, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self) -> List[_Item]:
+        first = await self._queue.get()
+        batch, size = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), left)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # identical strings across callers are encoded once
+            uniq = list(dict.fromkeys(t for texts, _, _ in batch for t in texts))
+            n_texts = sum(len(texts) for texts, _, _ in batch)
+            self._pending -= n_texts
+            metrics.gauge("embed.queue_depth", self._pending)
+            now = time.perf_counter()
+            for _, _, t_in in batch:
+                metrics.observe("embed.wait_ms", round((now - t_in) * 1000, 2))
+            metrics.observe("embed.batch_size", len(uniq))
+            metrics.observe("embed.batch_requests", len(batch))
+            metrics.incr("embed.batches")
+            try:
+                vecs = await self.run(self.encode_fn, uniq)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            metrics.observe("embed.encode_ms", round((time.perf_counter() - now) * 1000, 2))
+            row = {t: i for i, t in enumerate(uniq)}
+            for texts, fut, _ in batch:
+                if not fut.done():   # caller may have been cancelled
+                    fut.set_result(vecs[[row[t] for t in texts]])
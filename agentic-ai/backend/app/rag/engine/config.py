@@ -0,0 +1,50 @@
+# app/rag/engine/config.py
+# Paths and RAG_* knobs shared by the engine, the API and the RAG CLIs.
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+BASE   = Path(__file__).resolve().parents[1]   # app/rag
+IDX    = BASE / "5_index"
+CHUNKS = BASE / "4_chunks"
+
+LLM_MODEL     = os.environ.get("RAG_LLM_MODEL", "gpt-4o-mini")
+PLANNER_MODEL = os.environ.get("RAG_PLANNER_MODEL", LLM_MODEL)
+RERANK_MODEL  = os.environ.get("RAG_RERANK_MODEL", LLM_MODEL)
+
+ALLOW_GENERAL = os.environ.get("RAG_ALLOW_GENERAL_KNOWLEDGE", "false").lower() == "true"
+MAX_GENERAL_P = float(os.environ.get("RAG_MAX_GENERAL_PERCENT", "0.25"))
+
+# "inline" = validate before returning (original), "background" = return the draft now and
+# let the caller validate after persisting, "off" = skip validation
+VALIDATE_MODE = os.environ.get("RAG_VALIDATE_MODE", "inline").lower()
+
+# "llm" = llm_sufficiency_gate (original), "estimator" = score-based estimate (no LLM call),
+# "shadow" = use the LLM verdict but also compute + log the estimate for calibration
+SUFFICIENCY_MODE = os.environ.get("RAG_SUFFICIENCY_MODE", "llm").lower()
+SUFFICIENCY_MODEL = Path(os.environ.get("RAG_SUFFICIENCY_MODEL", str(IDX / "sufficiency_model.json")))
+# features + LLM verdicts are appended here (always in shadow mode, otherwise only if set)
+SUFFICIENCY_LOG = os.environ.get("RAG_SUFFICIENCY_LOG", "")
+SUFFICIENCY_THRESHOLD = 0.7
+
+# query-embedding micro-batching (engine/batcher.py): flush after this many texts or ms
+EMBED_BATCH_MAX     = int(os.environ.get("RAG_EMBED_BATCH_MAX", "64"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("RAG_EMBED_BATCH_WAIT_MS", "3"))
+
+# retrieval sidecar (engine/server.py); when either is set, get_index() returns a RemoteIndex
+RETRIEVAL_URL = os.environ.get("RAG_RETRIEVAL_URL", "")    # e.g. http://127.0.0.1:8765
+RETRIEVAL_UDS = os.environ.get("RAG_RETRIEVAL_UDS", "")    # e.g. /tmp/rag-retrieval.sock
+RETRIEVAL_TIMEOUT = float(os.environ.get("RAG_RETRIEVAL_TIMEOUT", "10"))
+
+# CPU-bound retrieval (engine/executor.py): worker threads, how many calls may wait behind
+# them before RetrievalBusy, and torch/FAISS threads per call (workers x threads ~ cores)
+RETRIEVAL_WORKERS = int(os.environ.get("RAG_RETRIEVAL_WORKERS", str(min(4, os.cpu_count() or 1))))
+RETRIEVAL_QUEUE   = int(os.environ.get("RAG_RETRIEVAL_QUEUE", "16"))
+RETRIEVAL_INTRAOP_THREADS = int(os.environ.get(
+    "RAG_INTRAOP_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, RETRIEVAL_WORKERS)))))
+
+ALLOWED_DOCS = {"DOC01", "DOC02", "DOC03", "DOC04", "DOC05", "DOC06"}
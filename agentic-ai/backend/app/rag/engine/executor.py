@@ -0,0 +1,103 @@
+# app/rag/engine/executor.py
+# Dedicated, bounded executor for CPU-bound retrieval work (query encoding, FAISS,
+# BM25, fusion). Keeps it off the default to_thread pool, caps how much can queue,
+# and pins torch / FAISS intra-op threads so concurrent searches don't oversubscribe cores.
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.metrics import metrics
+from app.rag.engine.config import RETRIEVAL_WORKERS, RETRIEVAL_QUEUE
+
+
+class RetrievalBusy(RuntimeError):
+    """Raised instead of queueing when the retrieval executor is saturated."""
+
+
+def configure_intraop_threads(n: int) -> None:
+    """torch + FAISS (OpenMP) threads per search; workers x n should not exceed the cores."""
+    n = max(1, n)
+    try:
+        import torch
+        torch.set_num_threads(n)
+    except Exception:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(n)
+    except Exception:
+        pass
+
+
+class RetrievalExecutor:
+    """
+    `await run(fn, *args)` runs fn on one of `workers` threads. At most `max_queue` calls
+    wait behind the running ones; beyond that run() raises RetrievalBusy immediately
+    (reject, don't pile up). Metrics: retrieval.queue_wait_ms, retrieval.run_ms,
+    retrieval.in_flight (gauge), retrieval.rejected.
+    """
+
+    def __init__(self, workers: int = RETRIEVAL_WORKERS, max_queue: int = RETRIEVAL_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def saturated(self) -> bool:
+        return self._in_flight >= self.workers + self.max_queue
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="retrieval")
+        return self._pool
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            metrics.gauge("retrieval.in_flight", self._in_flight)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                metrics.incr("retrieval.rejected")
+                raise RetrievalBusy(f"retrieval executor saturated ({self._in_flight} in flight)")
+            self._in_flight += 1
+            metrics.gauge("retrieval.in_flight", self._in_flight)
+        t_submit = time.perf_counter()
+
+        def timed():
+            t_start = time.perf_counter()
+            metrics.observe("retrieval.queue_wait_ms", round((t_start - t_submit) * 1000, 2))
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe("retrieval.run_ms", round((time.perf_counter() - t_start) * 1000, 2))
+
+        try:
+            fut = self._executor().submit(timed)
+        except Exception:
+            self._release()
+            raise
+        # the slot is released when the future settles: fn finished (even if the caller was
+        # cancelled) or the queued call was cancelled by shutdown() before it ever ran
+        fut.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(fut)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+retrieval_executor = RetrievalExecutor()
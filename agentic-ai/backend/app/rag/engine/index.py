@@ -0,0 +1,295 @@
+# app/rag/engine/index.py
+# Index handle: Phase-04 artifacts (meta + BM25 + FAISS + embedder) loaded once,
+# with hybrid (vector + BM25, RRF-fused) search and a chunk-record cache.
+from __future__ import annotations
+
+import asyncio
+import json
+import pickle
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.rag.engine.batcher import EmbeddingBatcher
+from app.rag.engine.config import IDX, CHUNKS, RETRIEVAL_URL, RETRIEVAL_UDS, RETRIEVAL_INTRAOP_THREADS
+from app.rag.engine.executor import retrieval_executor, configure_intraop_threads
+from app.core.singleflight import SingleFlight
+
+if TYPE_CHECKING:  # heavy deps are imported in RagIndex.load, so API workers using a
+    import faiss   # retrieval sidecar (RemoteIndex) never load torch / FAISS / BM25
+    from rank_bm25 import BM25Okapi
+    from sentence_transformers import SentenceTransformer
+    from app.rag.engine.remote import RemoteIndex
+
+Signals = Dict[str, Dict[str, float]]
+
+# identical concurrent searches / query embeddings (double submits, popular prompts) run once
+_SEARCH_FLIGHT = SingleFlight("rag.search")
+_EMBED_FLIGHT = SingleFlight("rag.embed")
+
+
+# ---------- Helpers ----------
+def load_meta(path: Path) -> List[Dict[str, Any]]:
+    rows = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            rows.append(json.loads(line))
+    return rows
+
+def tokenize_lex(s: str):
+    # keep exact original lexical behavior
+    return re.findall(r"[A-Za-z0-9_]+", s.lower())
+
+def rrf_fuse(ranklists: Dict[str, Dict[str, int]], k: int = 60) -> Dict[str, float]:
+    # original RRF accumulation (sum)
+    scores: Dict[str, float] = {}
+    for ranks in ranklists.values():
+        for cid, r in ranks.items():
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + r)
+    return scores
+
+def latest_chunks_path(doc_id: str) -> Path | None:
+    paths = sorted((CHUNKS / doc_id).glob("*_chunks.jsonl"))
+    return paths[-1] if paths else None
+
+
+# ---------- Chunk records ----------
+# chunks live under CHUNKS/<DOCID>/*_chunks.jsonl; each doc file is parsed once
+_CHUNK_CACHE: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_CHUNK_LOCK = threading.Lock()
+
+def _doc_chunks(doc_id: str) -> Dict[str, Dict[str, Any]]:
+    recs = _CHUNK_CACHE.get(doc_id)
+    if recs is not None:
+        return recs
+    with _CHUNK_LOCK:
+        recs = _CHUNK_CACHE.get(doc_id)
+        if recs is not None:
+            return recs
+        recs = {}
+        fp = latest_chunks_path(doc_id)
+        if fp:
+            with fp.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    r = json.loads(line)
+                    if r.get("chunk_id"):
+                        recs[r["chunk_id"]] = r
+        _CHUNK_CACHE[doc_id] = recs
+        return recs
+
+def load_chunk_record(chunk_id: str) -> Dict[str, Any] | None:
+    return _doc_chunks(chunk_id.split(":")[0]).get(chunk_id)
+
+def clear_chunk_cache() -> None:
+    with _CHUNK_LOCK:
+        _CHUNK_CACHE.clear()
+
+
+# ---------- Index handle ----------
+class RagIndex:
+    """
+    meta order == FAISS order. All search methods are synchronous (CPU-bound);
+    the async wrappers run them on the bounded retrieval executor so the event loop
+    stays free (RetrievalBusy when it is saturated).
+    Async query embedding goes through an EmbeddingBatcher, so concurrent requests
+    share one forward pass.
+    """
+
+    def __init__(self, meta: List[Dict[str, Any]], bm25: BM25Okapi, bm25_ids: List[str],
+                 model: SentenceTransformer, index: faiss.Index, cfg: Dict[str, Any],
+                 alias_meta: Optional[List[Dict[str, Any]]] = None,
+                 vectors: Optional[np.ndarray] = None):
+        self.meta = meta
+        self.meta_map = {m["chunk_id"]: m for m in meta}
+        # near-duplicates collapsed at build time (phase4 --dedup): not searchable themselves,
+        # reachable through their representative's "aliases"
+        for m in alias_meta or []:
+            self.meta_map.setdefault(m["chunk_id"], m)
+        self.aliases: Dict[str, List[str]] = {m["chunk_id"]: m["aliases"] for m in meta if m.get("aliases")}
+        self.bm25 = bm25
+        self.bm25_ids = bm25_ids
+        self.model = model
+        self.index = index
+        self.cfg = cfg
+        # compressed stores (phase4 --vector-store fp16|sq8|pq): the FAISS index holds codes,
+        # `vectors` is the mmap'd float32 originals used to re-score the candidates exactly
+        self.vectors = vectors
+        self.rescore_factor = int((cfg.get("vector_store") or {}).get("rescore_factor", 4))
+        self.batcher = EmbeddingBatcher(self.encode, run=retrieval_executor.run)
+
+    @classmethod
+    def load(cls, idx_dir: Path = IDX) -> "RagIndex":
+        import faiss
+        from sentence_transformers import SentenceTransformer
+        configure_intraop_threads(RETRIEVAL_INTRAOP_THREADS)
+
+        meta = load_meta(idx_dir / "meta.jsonl")
+        with open(idx_dir / "bm25.pkl", "rb") as f:
+            bm25 = pickle.load(f)
+        bm25_ids = json.loads((idx_dir / "bm25_doc_ids.json").read_text(encoding="utf-8"))
+        cfg = json.loads((idx_dir / "index_config.json").read_text(encoding="utf-8"))
+        model = SentenceTransformer(cfg["model_name"])  # same embedder used in build step
+        index = faiss.read_index(str(idx_dir / "vector.faiss"))
+        alias_path = idx_dir / "aliases.jsonl"
+        alias_meta = load_meta(alias_path) if alias_path.exists() else None
+        rescore = (cfg.get("vector_store") or {}).get("rescore_vectors")
+        vectors = np.load(idx_dir / rescore, mmap_mode="r") if rescore and (idx_dir / rescore).exists() else None
+        return cls(meta, bm25, bm25_ids, model, index, cfg, alias_meta, vectors)
+
+    # --- embeddings ---
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True).astype("float32")
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        return await _EMBED_FLIGHT.do((id(self), tuple(texts)), lambda: self.batcher.embed(texts))
+
+    # --- aliases ---
+    def _allowed(self, cid: str, allow: Optional[set]) -> Optional[str]:
+        """cid if its doc passes the filter, else its first alias that does (None if neither)."""
+        if not allow or cid.split(":")[0] in allow:
+            return cid
+        for a in self.aliases.get(cid, ()):
+            if a.split(":")[0] in allow:
+                return a
+        return None
+
+    def expand(self, chunk_ids: Iterable[str]) -> List[str]:
+        """Each hit followed by the near-duplicates collapsed into it (order kept, no repeats)."""
+        out, seen = [], set()
+        for cid in chunk_ids:
+            for c in [cid, *self.aliases.get(cid, ())]:
+                if c not in seen:
+                    seen.add(c)
+                    out.append(c)
+        return out
+
+    # --- retrieval primitives ---
+    def vec_search(self, qv: np.ndarray, topk: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+        """qv: (n, dim) normalized query vectors → (sims, idxs), each (n, topk)."""
+        if self.vectors is None:
+            return self.index.search(qv, topk)
+        # approximate codes pick the candidates; exact inner products order them
+        _, cand_all = self.index.search(qv, min(self.index.ntotal, topk * self.rescore_factor))
+        sims = np.full((len(qv), topk), -np.inf, dtype="float32")
+        idxs = np.full((len(qv), topk), -1, dtype="int64")
+        for qi, cand in enumerate(cand_all):
+            cand = np.sort(cand[cand >= 0])          # ascending rows: sequential mmap reads
+            exact = np.asarray(self.vectors[cand], dtype="float32") @ qv[qi]
+            order = np.argsort(-exact, kind="stable")[:topk]
+            sims[qi, :len(order)] = exact[order]
+            idxs[qi, :len(order)] = cand[order]
+        return sims, idxs
+
+    def bm25_search(self, q: str, topk: int = 50) -> List[Tuple[str, float]]:
+        scores = self.bm25.get_scores(tokenize_lex(q))
+        order = np.argsort(scores)[::-1][:topk]
+        return [(self.bm25_ids[i], float(scores[i])) for i in order]
+
+    def hybrid_scores(self, qset: List[str], allow_docs: Optional[Iterable[str]] = None,
+                      kvec: int = 50, klex: int = 50, fuse_top: int = 60,
+                      signals: Signals | None = None, qv: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """
+        Vector + BM25 per sub-query with RRF fusion, pooled (summed) across sub-queries.
+        All sub-queries are encoded (unless `qv` is given) and searched in one batch.
+        If `signals` is given it is filled with the best raw scores per chunk:
+          signals["cos"][chunk_id], signals["bm25"][chunk_id]  (max over sub-queries)
+        """
+        allow = set(allow_docs) if allow_docs else None
+        pooled: Dict[str, float] = {}
+        if not qset:
+            return pooled
+        if qv is None:
+            qv = self.encode(list(qset))
+        sims_all, idxs_all = self.vec_search(qv, topk=kvec)
+        for qi, q in enumerate(qset):
+            # vector
+            vec_pairs = []
+            for pos, (i, sim) in enumerate(zip(idxs_all[qi].tolist(), sims_all[qi].tolist()), start=1):
+                if i < 0:
+                    continue
+                cid = self._allowed(self.meta[i]["chunk_id"], allow)  # DOC filter
+                if cid is None:
+                    continue
+                vec_pairs.append((cid, pos))
+                if signals is not None:
+                    cos = signals.setdefault("cos", {})
+                    cos[cid] = max(cos.get(cid, -1.0), float(sim))
+            # bm25
+            bm25_pairs = []
+            for pos, (cid, sc) in enumerate(self.bm25_search(q, topk=klex), start=1):
+                cid = self._allowed(cid, allow)
+                if cid is None:
+                    continue
+                bm25_pairs.append((cid, pos))
+                if signals is not None:
+                    bm = signals.setdefault("bm25", {})
+                    bm[cid] = max(bm.get(cid, 0.0), float(sc))
+            # fuse (sum of RRF)
+            fused = rrf_fuse({"vec": dict(vec_pairs), "bm25": dict(bm25_pairs)}, k=fuse_top)
+            for cid, sc in fused.items():
+                pooled[cid] = pooled.get(cid, 0.0) + sc
+        return pooled
+
+    def search_sync(self, qset: List[str], allow_docs: Optional[Iterable[str]] = None,
+                    kvec: int = 50, klex: int = 50, fuse_top: int = 60,
+                    signals: Signals | None = None, expand_aliases: bool = False,
+                    qv: Optional[np.ndarray] = None) -> List[str]:
+        pooled = self.hybrid_scores(qset, allow_docs, kvec, klex, fuse_top, signals, qv)
+        ranked = [cid for cid, _ in sorted(pooled.items(), key=lambda x: x[1], reverse=True)]
+        return self.expand(ranked) if expand_aliases else ranked
+
+    async def search(self, qset: List[str], allow_docs: Optional[Iterable[str]] = None,
+                     kvec: int = 50, klex: int = 50, fuse_top: int = 60,
+                     signals: Signals | None = None, expand_aliases: bool = False) -> List[str]:
+        qset = list(qset)
+        allow = frozenset(allow_docs) if allow_docs else None
+        key = (id(self), tuple(qset), allow, kvec, klex, fuse_top, signals is not None, expand_aliases)
+
+        async def run():
+            sig: Signals | None = {} if signals is not None else None
+            qv = await self.embed(qset) if qset else None
+            ranked = await retrieval_executor.run(self.search_sync, qset, allow, kvec, klex, fuse_top, sig,
+                                                  expand_aliases, qv)
+            return ranked, sig
+
+        ranked, sig = await _SEARCH_FLIGHT.do(key, run)
+        if signals is not None and sig:
+            for kind, scores in sig.items():
+                signals.setdefault(kind, {}).update(scores)
+        return list(ranked)
+
+    # --- chunk records ---
+    def chunk(self, chunk_id: str) -> Dict[str, Any] | None:
+        return load_chunk_record(chunk_id)
+
+    async def chunks(self, chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Any] | None]:
+        return {cid: load_chunk_record(cid) for cid in chunk_ids}
+
+
+# --- Cached handle (load once, reuse across requests) ---
+# With RAG_RETRIEVAL_URL / RAG_RETRIEVAL_UDS set, the handle is a client for the retrieval
+# sidecar (python -m app.rag.engine.server) instead of an in-process index.
+_INDEX: Union[RagIndex, "RemoteIndex", None] = None
+_INDEX_LOCK = asyncio.Lock()
+
+async def get_index() -> Union[RagIndex, "RemoteIndex"]:
+    global _INDEX
+    if _INDEX is not None:
+        return _INDEX
+    async with _INDEX_LOCK:
+        if _INDEX is not None:
+            return _INDEX
+        if RETRIEVAL_URL or RETRIEVAL_UDS:
+            from app.rag.engine.remote import RemoteIndex
+            _INDEX = RemoteIndex(url=RETRIEVAL_URL, uds=RETRIEVAL_UDS)
+            return _INDEX
+        # offload heavy I/O/CPU to a worker
+        _INDEX = await asyncio.to_thread(RagIndex.load)
+        return _INDEX
@@ -0,0 +1,170 @@
+# app/rag/engine/orchestrator.py
+# Component 08 pipeline:
+#   plan -> hybrid retrieve (RRF) -> rerank -> relevance filter -> pack
+#   -> sufficiency gate -> compose -> validate (inline | background | off)
+# With an LLM circuit open (app/core/breaker.py) each LLM stage falls back locally:
+# question-as-query plan, hybrid (RRF) order instead of rerank, estimator sufficiency,
+# and an extractive answer from the top passages.
+from __future__ import annotations
+
+import time
+from typing import Any, Dict
+
+from app.core.breaker import CircuitOpen
+from app.core.metrics import metrics
+from app.rag.engine.config import ALLOW_GENERAL, MAX_GENERAL_P, VALIDATE_MODE, SUFFICIENCY_THRESHOLD
+from app.rag.engine.executor import RetrievalBusy, retrieval_executor
+from app.rag.engine.index import RagIndex, get_index
+from app.rag.engine.stages import (
+    compose_answer_question, default_plan, extractive_answer, llm_plan_queries, llm_rerank,
+    llm_relevance_filter, pack_context, llm_answer, llm_validate,
+)
+from app.rag.engine.sufficiency import sufficiency_gate
+
+
+class _StageTimer:
+    """Wall-clock per stage (ms), also exported as rag.<stage>_ms timings."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._t = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        ms = round((now - self._t) * 1000, 1)
+        self.timings[stage] = ms
+        metrics.observe(f"rag.{stage}_ms", ms)
+        self._t = now
+
+
+async def component8_rag_answer(*, user_question: str, prev_enc: str | None = None, top:int=10, kvec:int=50, klex:int=50,
+                                doc:str=None, step=None, validate: str | None = None,
+                                index: RagIndex | None = None) -> Dict[str,Any]:
+    """
+    Returns:
+      { "used": bool, "answer_md": str, "sources": [{"chunk_id":..., "breadcrumb":...}, ...],
+        "timings": {stage: ms, ...} }
+    With validate="background" the draft is returned as answer_md together with
+      "pending_validation": {"question", "kept_ids", "draft", "records"}
+    so the caller can run llm_validate off the critical path.
+    "degraded": [stage, ...] lists the LLM stages replaced by local fallbacks (circuit open).
+    Raises RetrievalBusy when the retrieval executor is saturated.
+    """
+    validate = (validate or VALIDATE_MODE).lower()
+    # shed load before spending a planner call on a retrieval that would be rejected
+    if retrieval_executor.saturated():
+        metrics.incr("retrieval.rejected")
+        raise RetrievalBusy("retrieval executor saturated")
+    timer = _StageTimer()
+
+    print("=="*30);print(f" ----| Starting Component 8 |")
+    print(" ------| Previous Question: ", prev_enc)
+    if step: await step(2.4, "RAG: initializing")
+
+    # load index (cached)
+    idx = index or await get_index()
+    timer.lap("load")
+
+    if step: await step(2.5, "RAG: planning-------------------")
+    degraded = []
+    try:
+        plan = await llm_plan_queries(user_question, prev_enc)
+    except CircuitOpen as e:
+        print(" ------| Planner skipped:", e)
+        plan, degraded = default_plan(user_question, "llm-circuit-open"), degraded + ["plan"]
+    qset = plan.get("queries", [user_question])
+    print(" ------| Queries: ", qset)
+    timer.lap("plan")
+
+    # optional document filter
+    allow_docs = {doc} if doc else None
+    print(" ------| Allowed Docs: ", allow_docs)
+
+    answer_question = compose_answer_question(user_question, prev_enc, plan)
+    print(" ------| Composed Question: ", answer_question)
+
+    # retrieval pool (runs in a worker thread so the loop stays responsive)
+    if step: await step(2.6, "RAG: retrieving-------------------")
+    signals: Dict[str, Dict[str, float]] = {}
+    ranked_ids = await idx.search(qset, allow_docs, kvec, klex, 60, signals)
+    # chunk text through the index handle: a sidecar client fetches it, no local chunk files
+    records = await idx.chunks(ranked_ids[:50])
+    timer.lap("retrieve")
+
+    # LLM rerank
+    if step: await step(2.7, "RAG: rerank-------------------")
+    try:
+        chosen = await llm_rerank(user_question, ranked_ids, idx.meta_map, topn=max(12, top), records=records)
+    except CircuitOpen as e:
+        print(" ------| Rerank skipped:", e)
+        chosen, degraded = ranked_ids[:max(12, top)], degraded + ["rerank"]   # top-k hybrid order
+    print(" ------| Chosen LLM Rerank: ", chosen)
+    timer.lap("rerank")
+
+    # strict relevance filter
+    if step: await step(2.8, "RAG: relevance filter-------------------")
+    stitched = await llm_relevance_filter(user_question, chosen, idx.meta_map, keep_cap=12)
+    print(" ------| Relavence Filter Stitched: ", stitched)
+    missing = [cid for cid in stitched if cid not in records]
+    if missing:
+        records.update(await idx.chunks(missing))
+    timer.lap("filter")
+
+    # pack context
+    if step: await step(2.85, "RAG: packing context-------------------")
+    context_str, included = pack_context(stitched, token_limit=6000, records=records)
+    print(f" ------| ContextStr: {context_str}")
+    timer.lap("pack")
+
+    # sufficiency & GK window
+    if step: await step(2.9, "RAG: sufficiency-------------------")
+    suff = await sufficiency_gate(user_question, stitched, context_str, signals, records=records)
+    allow_general_final = (ALLOW_GENERAL or plan.get("allow_general_knowledge", False)) and (suff["sufficiency"] < SUFFICIENCY_THRESHOLD)
+    print(" ------| Allow General Knowledge: ", allow_general_final)
+    print(" ------| Sufficiency Gate: ", suff)
+    timer.lap("sufficiency")
+
+    # compose
+    if step: await step(3.0, "RAG: composing")
+    try:
+        draft = await llm_answer(
+            answer_question, context_str, style_plan=plan,
+            allow_general=allow_general_final,
+            max_general_fraction=MAX_GENERAL_P,
+            sufficiency=suff["sufficiency"],
+            missing_aspects=suff.get("missing_aspects", []),
+        )
+    except CircuitOpen as e:
+        print(" ------| Composer skipped:", e)
+        draft, degraded = extractive_answer(included), degraded + ["compose"]
+        validate = "off"   # nothing generated to check
+    timer.lap("compose")
+
+    # validate
+    pending_validation = None
+    if validate == "background":
+        final = draft
+        pending_validation = {"question": answer_question, "kept_ids": stitched, "draft": draft,
+                              "records": {cid: records.get(cid) for cid in stitched}}
+    elif validate == "off":
+        final = draft
+    else:
+        if step: await step(3.1, "RAG: validating")
+        try:
+            final = await llm_validate(answer_question, stitched, draft, records=records)
+        except CircuitOpen:
+            final = draft
+        timer.lap("validate")
+
+    # sources (compact: id + breadcrumb) built from included records
+    sources = [{"chunk_id": rec.get("chunk_id"), "breadcrumb": rec.get("breadcrumb","")} for rec in included]
+    print(" ------| Sources Used: ", sources)
+    print(" ------| Stage timings (ms): ", timer.timings)
+
+    out = {"used": True, "answer_md": final, "sources": sources, "timings": timer.timings}
+    if degraded:
+        out["degraded"] = degraded
+        metrics.incr("rag.degraded_turns")
+    if pending_validation:
+        out["pending_validation"] = pending_validation
+    return out
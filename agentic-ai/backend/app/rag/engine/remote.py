@@ -0,0 +1,119 @@
+# app/rag/engine/remote.py
+# Client for the retrieval sidecar (engine/server.py). Same async surface the
+# orchestrator and smalltalk use on RagIndex (search / embed / chunks / meta_map / expand),
+# over one pooled HTTP connection set (TCP on localhost or a Unix domain socket).
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+import numpy as np
+
+from app.rag.engine.config import RETRIEVAL_TIMEOUT
+from app.rag.engine.executor import RetrievalBusy
+from app.core.singleflight import SingleFlight
+
+Signals = Dict[str, Dict[str, float]]
+
+_SEARCH_FLIGHT = SingleFlight("rag.remote_search")   # identical concurrent searches share a round trip
+
+
+class RemoteIndex:
+    """
+    meta_map / aliases are filled from search responses (only rows that were returned),
+    so a worker never holds the full meta table, the model, FAISS or BM25.
+    Chunk records come from the sidecar as well (chunks()), so no 4_chunks/ file is read
+    or cached here.
+    """
+
+    def __init__(self, url: str = "", uds: str = "", timeout: float = RETRIEVAL_TIMEOUT,
+                 max_connections: int = 32):
+        self.base_url = url.rstrip("/") if url else "http://rag-retrieval"
+        self.uds = uds or None
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.meta_map: Dict[str, Dict[str, Any]] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # pooled connections belong to one event loop; CLIs may call asyncio.run() repeatedly
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            transport = httpx.AsyncHTTPTransport(uds=self.uds, retries=1, limits=self.limits)
+            self._client = httpx.AsyncClient(base_url=self.base_url, transport=transport, timeout=self.timeout)
+            self._loop = loop
+        return self._client
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        r = await self._http().post(path, json=payload)
+        if r.status_code == 503:   # sidecar's executor is saturated
+            raise RetrievalBusy(r.json().get("detail", "retrieval sidecar busy"))
+        r.raise_for_status()
+        return r.json()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _remember(self, meta: Dict[str, Dict[str, Any]]) -> None:
+        self.meta_map.update(meta)
+        for cid, m in meta.items():
+            if m.get("aliases"):
+                self.aliases[cid] = m["aliases"]
+
+    # --- same surface as RagIndex ---
+    async def health(self) -> Dict[str, Any]:
+        r = await self._http().get("/health")
+        r.raise_for_status()
+        return r.json()
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        out = await self._post("/embed", {"texts": list(texts)})
+        return np.asarray(out["vectors"], dtype="float32")
+
+    async def search_many(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Several searches in one round trip. Each request: {qset, allow_docs?, kvec?, klex?,
+        fuse_top?, signals?: bool, expand_aliases?: bool}; each result: {ranked, signals, meta}.
+        """
+        out = await self._post("/search", {"requests": requests})
+        for res in out["results"]:
+            self._remember(res.get("meta") or {})
+        return out["results"]
+
+    async def search(self, qset: List[str], allow_docs: Optional[Iterable[str]] = None,
+                     kvec: int = 50, klex: int = 50, fuse_top: int = 60,
+                     signals: Signals | None = None, expand_aliases: bool = False) -> List[str]:
+        req = {"qset": list(qset), "allow_docs": sorted(allow_docs) if allow_docs else None,
+               "kvec": kvec, "klex": klex, "fuse_top": fuse_top,
+               "signals": signals is not None, "expand_aliases": expand_aliases}
+        key = (id(self), tuple(req["qset"]), tuple(req["allow_docs"] or ()), kvec, klex, fuse_top,
+               req["signals"], expand_aliases)
+        res = await _SEARCH_FLIGHT.do(key, lambda: self._search_one(req))
+        if signals is not None:
+            for kind, scores in (res.get("signals") or {}).items():
+                signals.setdefault(kind, {}).update(scores)
+        return list(res["ranked"])
+
+    async def _search_one(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self.search_many([req]))[0]
+
+    async def chunks(self, chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Any] | None]:
+        ids = list(dict.fromkeys(chunk_ids))
+        if not ids:
+            return {}
+        out = await self._post("/chunks", {"ids": ids})
+        return out["chunks"]
+
+    def expand(self, chunk_ids: Iterable[str]) -> List[str]:
+        out, seen = [], set()
+        for cid in chunk_ids:
+            for c in [cid, *self.aliases.get(cid, ())]:
+                if c not in seen:
+                    seen.add(c)
+                    out.append(c)
+        return out
@@ -0,0 +1,115 @@
+# app/rag/engine/server.py
+# Retrieval sidecar: one process owns the embedder, FAISS, BM25 and meta, and serves
+# every API worker over a Unix domain socket or localhost HTTP. Worker memory stays
+# flat as uvicorn scales, and query embeddings from all workers share the sidecar's
+# EmbeddingBatcher.
+#
+#   python -m app.rag.engine.server --uds /tmp/rag-retrieval.sock
+#   python -m app.rag.engine.server --port 8765
+#   then run the API with RAG_RETRIEVAL_UDS=/tmp/rag-retrieval.sock (or RAG_RETRIEVAL_URL=http://127.0.0.1:8765)
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+
+from app.core.metrics import metrics
+from app.rag.engine.executor import RetrievalBusy
+from app.rag.engine.index import RagIndex, load_chunk_record
+
+
+class SearchRequest(BaseModel):
+    qset: List[str]
+    allow_docs: Optional[List[str]] = None
+    kvec: int = 50
+    klex: int = 50
+    fuse_top: int = 60
+    signals: bool = False
+    expand_aliases: bool = False
+
+
+class SearchBatch(BaseModel):
+    requests: List[SearchRequest] = Field(default_factory=list)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class ChunksRequest(BaseModel):
+    ids: List[str]
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="rag-retrieval")
+    state: Dict[str, RagIndex] = {}
+
+    @app.on_event("startup")
+    async def load_index():
+        state["idx"] = await asyncio.to_thread(RagIndex.load)
+
+    async def _search(idx: RagIndex, r: SearchRequest) -> Dict[str, Any]:
+        signals: Dict[str, Dict[str, float]] | None = {} if r.signals else None
+        ranked = await idx.search(r.qset, set(r.allow_docs) if r.allow_docs else None,
+                                  r.kvec, r.klex, r.fuse_top, signals, r.expand_aliases)
+        meta = {cid: idx.meta_map[cid] for cid in ranked if cid in idx.meta_map}
+        return {"ranked": ranked, "signals": signals, "meta": meta}
+
+    @app.get("/health")
+    async def health():
+        idx = state.get("idx")
+        if idx is None:
+            return {"ok": False}
+        return {"ok": True, "pid": os.getpid(), "chunks": len(idx.meta),
+                "vector_store": (idx.cfg.get("vector_store") or {}).get("type", "flat")}
+
+    @app.get("/metrics")
+    async def get_metrics():
+        return metrics.snapshot()
+
+    @app.post("/search")
+    async def search(batch: SearchBatch):
+        metrics.incr("retrieval.search_requests", len(batch.requests))
+        try:
+            results = await asyncio.gather(*(_search(state["idx"], r) for r in batch.requests))
+        except RetrievalBusy as e:
+            raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+        return {"results": list(results)}
+
+    @app.post("/embed")
+    async def embed(req: EmbedRequest):
+        try:
+            vecs = await state["idx"].embed(req.texts)
+        except RetrievalBusy as e:
+            raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+        return {"vectors": vecs.tolist()}
+
+    @app.post("/chunks")
+    async def chunks(req: ChunksRequest):
+        return {"chunks": {cid: load_chunk_record(cid) for cid in req.ids}}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="RAG retrieval sidecar")
+    ap.add_argument("--uds", default=os.environ.get("RAG_RETRIEVAL_UDS", ""), help="Unix domain socket path")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    if args.uds:
+        if os.path.exists(args.uds):
+            os.unlink(args.uds)
+        uvicorn.run(create_app(), uds=args.uds, log_level="warning")
+    else:
+        uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
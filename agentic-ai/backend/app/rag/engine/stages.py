@@ -0,0 +1,393 @@
+# app/rag/engine/stages.py
+# Phase-05 stages: query planning, LLM rerank / relevance filter, sufficiency gate,
+# context packing, answer composition and validation. All LLM calls are async.
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import llm
+from app.rag.engine.config import PLANNER_MODEL, RERANK_MODEL, LLM_MODEL
+from app.rag.engine.index import load_chunk_record
+
+Records = Dict[str, Optional[Dict[str, Any]]]
+
+
+def _record(cid: str, records: Optional[Records]) -> Optional[Dict[str, Any]]:
+    """Chunk record from the ones fetched through the index handle, else from the local chunk files."""
+    return records.get(cid) if records is not None else load_chunk_record(cid)
+
+
+def compose_answer_question(current: str, prev: Optional[str], plan: Dict[str, Any]) -> str:
+    """
+    Build the exact question the writer/validator should answer.
+    If the planner linked the previous turn, include it strictly as context.
+    """
+    if prev and plan.get("link_prev"):
+        prev_short = prev.strip()
+        if len(prev_short) > 500:
+            prev_short = prev_short[:500] + "..."
+        return (
+            f"{current}\n\n"
+            "[Context from previous turn — use ONLY to clarify the current prompt; "
+            "do NOT answer it independently.]\n"
+            f"Previous question: {prev_short}"
+        )
+    return current
+
+def default_plan(question: str, why: str) -> Dict[str, Any]:
+    """Planner-free plan: the question itself as the only query, default presentation."""
+    return {
+        "link_prev": False,
+        "why": why,
+        "queries": [question],
+        "doc_filters": [],
+        "style": "concise",
+        "tone": "plain",
+        "format": ["sections", "bullets"],
+        "audience": "practitioner",
+        "allow_general_knowledge": False,
+        "notes": "",
+    }
+
+async def llm_plan_queries(
+    question: str,
+    prev_enc: str | None = None,
+) -> Dict[str, Any]:
+    """
+    Multi-query + presentation plan with previous-turn awareness (LLM-only).
+    If prev_enc is provided, the planner decides whether the current question
+    depends on/relates to it. The returned `queries` reflect that decision.
+    """
+    sys_msg = (
+        "You are a query planner for a private RAG system.\n"
+        "You may be given the previous user question from the same chat.\n"
+        "First decide if the current question depends on or is meaningfully related "
+        "to the previous one. ONLY if related, incorporate it when creating sub-queries.\n\n"
+        "Return STRICT JSON with fields:\n"
+        "{\n"
+        "  \"link_prev\": true|false,\n"
+        "  \"why\": \"short reason\",\n"
+        "  \"queries\": [\"...\"],\n"
+        "  \"doc_filters\": [\"DOC01\"|\"DOC02\"|\"DOC03\"...],\n"
+        "  \"style\": \"concise|tutorial|step_by_step|deep_dive|executive_summary\",\n"
+        "  \"tone\": \"plain|technical|persuasive\",\n"
+        "  \"format\": [\"bullets\"|\"table\"|\"sections\"|\"detailed_report\"|\"summary_with_table\"|\"infographic_style\"],\n"
+        "  \"audience\": \"novice|practitioner|expert\",\n"
+        "  \"allow_general_knowledge\": false,\n"
+        "  \"notes\": \"short\"\n"
+        "}\n"
+        "Rules:\n"
+        "- If NOT related, ignore the previous turn entirely and plan queries only from the current question.\n"
+        "- Keep queries specific and disjoint; 2–4 items.\n"
+        "- Prefer entity- and facet-focused sub-queries."
+    )
+
+    payload = { "question": question }
+    if prev_enc is not None:
+        payload["previous_question"] = prev_enc
+
+    user_msg = json.dumps(payload, ensure_ascii=False)
+
+    resp = await llm.respond(
+        tag="c08.plan",
+        model=PLANNER_MODEL,
+        input=[
+            {"role": "system", "content": sys_msg},
+            {"role": "user", "content": user_msg},
+        ],
+        cache=True,
+        cacheable=True,
+        hedge=True,
+    )
+    text = resp.output_text
+
+    # Robust parse; conservative fallback = treat as unrelated.
+    try:
+        out = json.loads(text)
+    except Exception:
+        out = default_plan(question, "planner-json-parse-failed; defaulting to unrelated")
+
+    # Normalize defaults if fields are missing
+    out.setdefault("link_prev", False)
+    out.setdefault("why", "")
+    out.setdefault("queries", [question])
+    out.setdefault("doc_filters", [])
+    out.setdefault("style", "concise")
+    out.setdefault("tone", "plain")
+    out.setdefault("format", ["sections", "bullets"])
+    out.setdefault("audience", "practitioner")
+    out.setdefault("allow_general_knowledge", False)
+    out.setdefault("notes", "")
+    return out
+
+async def llm_rerank(question: str, candidate_ids: List[str], meta_map: Dict[str,Any], topn=10,
+                     records: Optional[Records] = None):
+    """
+    Ask LLM to pick the best chunk_ids. Provide compact snippets (breadcrumb + first ~400 chars).
+    """
+    items = []
+    for cid in candidate_ids[:50]:  # bound prompt size
+        m = meta_map[cid]
+        rec = _record(cid, records)
+        if not rec: 
+            continue
+        txt = rec["text"].strip().replace("\r","")
+        snippet = txt[:400]
+        items.append({
+            "chunk_id": cid,
+            "breadcrumb": m.get("breadcrumb",""),
+            "doc_id": m["doc_id"],
+            "snippet": snippet
+        })
+    sys_msg = (
+        "You are a retrieval reranker. "
+        "Given the user's question and a list of candidates, select the most directly useful chunk_ids. "
+        "Return JSON: { \"selected\": [\"chunk_id\", ...] }."
+    )
+    user_msg = json.dumps({"question": question, "candidates": items}, ensure_ascii=False)
+    # print("===========|||| Prompt for the Reranker:\n", user_msg)
+    resp = await llm.respond(
+        tag="c08.rerank",
+        model=RERANK_MODEL,
+        input=[{"role":"system","content":sys_msg},
+               {"role":"user","content":user_msg}],
+    )
+    try:
+        data = json.loads(resp.output_text)
+        chosen = data.get("selected", [])
+    except Exception:
+        chosen = [c["chunk_id"] for c in items[:10]]
+    return chosen
+
+async def llm_relevance_filter(question: str, candidate_ids: List[str], meta_map: Dict[str,Any], keep_cap: int=12) -> List[str]:
+    """
+    Strict filter: keep only directly helpful chunks.
+    """
+    # items = []
+    # for cid in candidate_ids:
+    #     rec = load_chunk_record(cid)
+    #     if not rec: 
+    #         continue
+    #     snippet = rec["text"].strip().replace("\r","")[:350]
+    #     items.append({
+    #         "chunk_id": cid,
+    #         "breadcrumb": rec.get("breadcrumb",""),
+    #         "snippet": snippet
+    #     })
+    # sys_msg = (
+    #     "You are a strict relevance filter for a RAG retriever. "
+    #     "Return JSON: { \"keep\": [\"chunk_id\", ...], \"drop\": [\"chunk_id\", ...] }. "
+    #     "Keep only chunks that directly help answer the question; drop tangents/duplicates."
+    # )
+    # user_msg = json.dumps({"question": question, "candidates": items}, ensure_ascii=False)
+    # resp = await llm.respond(
+    #     model=RERANK_MODEL,
+    #     input=[{"role":"system","content":sys_msg},
+    #            {"role":"user","content":user_msg}],
+    # )
+    # try:
+    #     data = json.loads(resp.output_text)
+    #     keep = data.get("keep", [])
+    #     if keep:
+    #         return keep
+    # except Exception:
+    #     pass
+    # return candidate_ids[:keep_cap]
+
+    return candidate_ids
+
+async def llm_sufficiency_gate(question: str, kept_ids: List[str], records: Optional[Records] = None) -> Dict[str,Any]:
+    """
+    Estimate if RAG evidence is sufficient. Returns:
+      { "sufficiency": float[0..1], "missing_aspects": [str, ...], "source": "llm" | "heuristic" }
+    source="heuristic" when the model's reply could not be parsed (count-based fallback score).
+    """
+    summaries = []
+    for cid in kept_ids[:16]:
+        rec = _record(cid, records)
+        if not rec: 
+            continue
+        title = rec.get("breadcrumb") or " > ".join(rec.get("section_path", []))
+        s = rec["text"].strip().replace("\r","")[:280]
+        summaries.append({"chunk_id": cid, "title": title, "summary": s})
+    sys_msg = (
+        "You are a coverage estimator. Given a question and short evidence summaries, "
+        "return JSON { \"sufficiency\": 0.0-1.0, \"missing_aspects\": [\"...\"] }. "
+        "Be strict: if key parts seem missing, use ≤ 0.6."
+    )
+    user_msg = json.dumps({"question": question, "evidence": summaries}, ensure_ascii=False)
+    resp = await llm.respond(
+        tag="c08.sufficiency",
+        model=RERANK_MODEL,
+        input=[{"role":"system","content":sys_msg},
+               {"role":"user","content":user_msg}],
+    )
+    try:
+        data = json.loads(resp.output_text)
+        s = float(data.get("sufficiency", 0.5))
+        missing = data.get("missing_aspects", [])
+        return {"sufficiency": max(0.0, min(1.0, s)), "missing_aspects": missing, "source": "llm"}
+    except Exception:
+        # fallback heuristic identical to before
+        s = 0.4 + min(len(kept_ids), 10) * 0.05  # 0.4..0.9
+        return {"sufficiency": max(0.0, min(1.0, s)), "missing_aspects": [], "source": "heuristic"}
+
+def extractive_answer(included: List[Dict[str, Any]], top: int = 5, chars: int = 320) -> str:
+    """
+    LLM-free answer: the top retrieved passages, quoted with their breadcrumbs.
+    Used when the composer model is unavailable (circuit open).
+    """
+    if not included:
+        return ""
+    parts = ["The answer service is temporarily limited, so here are the most relevant passages I found:\n"]
+    for rec in included[:top]:
+        title = rec.get("breadcrumb") or " > ".join(rec.get("section_path", [])) or rec.get("chunk_id", "")
+        text = " ".join(rec.get("text", "").split())
+        if len(text) > chars:
+            text = text[:chars].rsplit(" ", 1)[0] + "…"
+        parts.append(f"- **{title}**: {text}")
+    return "\n".join(parts)
+
+def pack_context(chunk_ids: List[str], token_limit=6000,
+                 records: Optional[Records] = None) -> Tuple[str, List[Dict[str,Any]]]:
+    """
+    Build the context string under a token-ish budget using length as proxy.
+    (Preserves original: bracketed id header, returns `included` as full chunk records.)
+    """
+    ctx_parts: List[str] = []
+    included: List[Dict[str,Any]] = []
+    total_chars = 0
+    for cid in chunk_ids:
+        rec = _record(cid, records)
+        if not rec:
+            continue
+        title = rec.get("breadcrumb") or " > ".join(rec.get("section_path", []))
+        block = f"[{cid}] {title}\n{rec['text']}\n"
+        new_total = total_chars + len(block)
+        if new_total > token_limit * 4:  # rough char->token proxy
+            break
+        ctx_parts.append(block)
+        included.append(rec)
+        total_chars = new_total
+    return "\n---\n".join(ctx_parts), included
+
+async def llm_answer(question: str, context_str: str, style_plan: Dict[str,Any],
+                     allow_general: bool, max_general_fraction: float,
+                     sufficiency: float, missing_aspects: List[str]) -> str:
+    """
+    Compose a clean, style-aware answer. No inline bracketed IDs.
+    """
+    # style knobs (preserved)
+    style = style_plan.get("style", "concise")
+    tone  = style_plan.get("tone", "plain")
+    # fmt   = style_plan.get("format", ["sections", "bullets"])
+    fmt   = style_plan.get("format", "auto")
+    audience = style_plan.get("audience", "practitioner")
+    allow_gk = allow_general or style_plan.get("allow_general_knowledge", False)
+
+    # sys_msg = (
+    #     "You are a domain-grounded assistant. Use ONLY the provided context as primary evidence.\n"
+    #     f"If and only if coverage seems insufficient, you may add a small 'Background (general)' "
+    #     f"subsection using general knowledge, capped at {int(max_general_fraction*100)}% of the answer.\n\n"
+    #     "Policy for final answer:\n"
+    #     "- Do NOT include plans, step-by-step execution, commands, shell output, code blocks, or deployment instructions.\n"
+    #     "- Provide a final answer only; avoid “we will”, “next steps”, “let’s”, or similar planning/execution language.\n"
+    #     "- If a previous question is shown, treat it ONLY as context to clarify the current prompt. Always answer the current prompt explicitly.\n"
+    #     "- Keep it concise and user-facing. No pseudo-code or API calls. No production actions.\n\n"
+    #     "Small-talk exception:\n"
+    #     "- If the prompt is a brief greeting/pleasantry (e.g., “hi”, “hello”, “hey”, “thanks”, “good morning”), "
+    #     "reply in a friendly tone with ONE short response (1–2 sentences). Do NOT reference evidence and do NOT use sections.\n\n"
+    #     "Formatting policy (adaptive — NOT a fixed template):\n"
+    #     "- Default to short paragraphs. Use bullets ONLY when listing 3+ parallel items.\n"
+    #     "- Use a tiny 2–3 column table ONLY for explicit comparisons/trade-offs.\n"
+    #     "- Avoid headings unless the answer is long; never invent rigid headings like “Summary/Key Points/Details” unless the user asked.\n"
+    #     "- Keep structure minimal for short replies (≤2 sentences = just one short paragraph)."
+    # )
+    sys_msg = (
+        "You are a domain-grounded assistant. Use ONLY the provided context as primary evidence.\n"
+        f"If and only if coverage seems insufficient, you may add a small 'Background (general)' "
+        f"subsection using general knowledge, capped at {int(max_general_fraction*100)}% of the answer.\n\n"
+        "Policy for final answer:\n"
+        "- Do NOT include plans, step-by-step execution, commands, shell output, code blocks, or deployment instructions.\n"
+        "- Provide a final answer only; avoid “we will”, “next steps”, “let’s”, or similar planning/execution language.\n"
+        "- If a previous question is shown, treat it ONLY as context to clarify the current prompt. Always answer the current prompt explicitly.\n"
+        "- Keep it concise and user-facing. No pseudo-code or API calls. No production actions.\n\n"
+        "Small-talk exception:\n"
+        "- If the prompt is a brief greeting/pleasantry (e.g., “hi”, “hello”, “hey”, “thanks”, “good morning”), "
+        "reply in a friendly tone with ONE short response (1–2 sentences). Do NOT reference evidence and do NOT use sections.\n\n"
+        "Formatting policy (adaptive — NOT a fixed template):\n"
+        "- Default to short paragraphs.\n"
+        "- Use **bold section headings** where needed appropriately; keep them brief (2–5 words).\n"
+        "- You may prefix a single relevant emoji to a heading (e.g., 📌 **Overview**, ✅ **Recommendation**, ⚠️ **Caveats**); use sparingly (max one emoji per heading).\n"
+        "- Use bullets ONLY when listing 3+ parallel items.\n"
+        "- Use a tiny 2–3 column table ONLY for explicit comparisons/trade-offs.\n"
+        "- Do NOT force a rigid template like “Summary/Key Points/Details” unless the user explicitly asks for it.\n"
+        "- For very short replies (≤2 sentences), omit headings and bullet points entirely."
+    )
+
+    body_instructions = (
+        "Write the answer with an adaptive structure as per the formatting policy above.\n"
+        "- If the prompt IS small-talk: reply with ONE short friendly sentence (optionally ask how you can help). No headings, bullets, or evidence.\n"
+        "- Otherwise: prefer 1–3 short paragraphs; add bullets ONLY for enumerations; add a tiny table ONLY if comparing options.\n"
+        "- Keep it readable. Do NOT include bracketed ids in the body.\n"
+        "- If you use any general knowledge, add a final sub-section titled 'Background (general)'."
+    )
+    plan_blob = {
+        "style": style, "tone": tone, "format": fmt, "audience": audience,
+        "allow_general_knowledge": allow_gk, "sufficiency": sufficiency,
+        "missing_aspects": missing_aspects
+    }
+    user_msg = (
+        f"QUESTION (audience: {audience}, style: {style}, tone: {tone}, format: {fmt}):\n{question}\n\n"
+        f"INSTRUCTIONS:\n{body_instructions}\n\n"
+        "EVIDENCE (primary source):\n" + context_str
+    )
+    resp = await llm.respond(
+        tag="c08.answer",
+        model=LLM_MODEL,
+        input=[{"role":"system","content":sys_msg},
+               {"role":"user","content":user_msg}],
+    )
+    return resp.output_text
+
+async def llm_validate(question: str, kept_ids: List[str], draft: str, records: Optional[Records] = None) -> str:
+    """
+    Optional small self-check: ensure on-topic / no contradictions.
+    """
+    items = []
+    for cid in kept_ids[:10]:
+        rec = _record(cid, records)
+        if not rec:
+            continue
+        breadcrumb = rec.get("breadcrumb") or " > ".join(rec.get("section_path", []))
+        s = rec["text"].strip().replace("\r","")[:350]
+        items.append({"chunk_id": cid, "breadcrumb": breadcrumb, "snippet": s})
+    sys_msg = (
+        "You are a validator for a RAG answer. Return JSON exactly as:\n"
+        "{ \"on_topic\": true|false, \"contradiction\": true|false, \"revision\": \"\" }\n\n"
+        "Checks:\n"
+        "1) The draft must directly answer the CURRENT PROMPT (the provided 'question'). Any previous question in the text is context only.\n"
+        "2) No planning/execution language (e.g., 'let’s', 'we will', 'next steps'), no shell/CLI commands, and no fenced code blocks (```).\n"
+        "3) Structure must be ADAPTIVE: short replies should be a short paragraph; bullets used ONLY for enumerations; "
+        "tables ONLY for explicit comparisons; avoid rigid templates like 'Summary/Key Points/Details' unless explicitly requested.\n"
+        "4) If the prompt is small-talk (greeting/pleasantry), a single friendly sentence with no sections/evidence is acceptable.\n"
+        "5) The draft must not contradict the evidence snippets.\n\n"
+        "If any issue is found, provide a concise, user-facing 'revision' that fixes it (convert rigid templates to balanced paragraphs/bullets as appropriate). "
+        "Otherwise, leave 'revision' empty."
+    )
+    user_msg = json.dumps({"question": question, "evidence": items, "draft": draft}, ensure_ascii=False)
+    resp = await llm.respond(
+        tag="c08.validate",
+        model=RERANK_MODEL,
+        input=[{"role":"system","content":sys_msg},
+               {"role":"user","content":user_msg}],
+    )
+    try:
+        data = json.loads(resp.output_text)
+        if not data.get("on_topic", True) or data.get("contradiction", False):
+            if data.get("revision"):
+                return data["revision"]
+    except Exception:
+        pass
+    return draft
@@ -0,0 +1,121 @@
+# app/rag/engine/sufficiency.py
+# Sufficiency gate: decides whether general knowledge may supplement the evidence.
+# Either the LLM verdict (llm_sufficiency_gate) or a score-based estimate from
+# retrieval signals, calibrated offline by scripts/fit_sufficiency.py.
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.rag.engine.config import IDX, SUFFICIENCY_MODE, SUFFICIENCY_MODEL, SUFFICIENCY_LOG
+from app.rag.engine.index import tokenize_lex
+from app.core.breaker import CircuitOpen
+from app.rag.engine.stages import llm_sufficiency_gate
+
+SUFFICIENCY_FEATURES = ["top_cos", "mean_cos_top3", "top_bm25", "coverage", "kept_frac"]
+
+# hand-set defaults (used until fit_sufficiency.py has written a calibrated model)
+_DEFAULT_SUFF_MODEL = {
+    "features": SUFFICIENCY_FEATURES,
+    "weights": [4.0, 2.0, 0.6, 2.5, 1.0],
+    "bias": -4.2,
+    "fitted_on": 0,
+}
+_SUFF_MODEL: Dict[str, Any] | None = None
+
+_STOP = {
+    "a","an","the","and","or","of","to","in","on","for","with","is","are","was","were","be","it","this","that",
+    "what","which","who","how","why","when","where","do","does","did","i","me","my","you","your","we","our",
+    "can","could","should","would","about","as","at","by","from","into","vs","versus","between","there","any",
+}
+
+def load_sufficiency_model() -> Dict[str, Any]:
+    global _SUFF_MODEL
+    if _SUFF_MODEL is None:
+        model = dict(_DEFAULT_SUFF_MODEL)
+        if SUFFICIENCY_MODEL.exists():
+            try:
+                data = json.loads(SUFFICIENCY_MODEL.read_text(encoding="utf-8"))
+                if data.get("features") == SUFFICIENCY_FEATURES and len(data.get("weights", [])) == len(SUFFICIENCY_FEATURES):
+                    model = data
+                else:
+                    print(" ------| Sufficiency model feature mismatch; using defaults")
+            except Exception as e:
+                print(" ------| Sufficiency model load error:", e)
+        _SUFF_MODEL = model
+    return _SUFF_MODEL
+
+def sufficiency_features(question: str, kept_ids: List[str], context_str: str,
+                         signals: Dict[str, Dict[str, float]], keep_cap: int = 12) -> Dict[str, float]:
+    """
+    Retrieval-side signals for the kept evidence:
+      top_cos / mean_cos_top3  best dense cosine similarities of kept chunks (any sub-query)
+      top_bm25                 log1p of the best BM25 score of kept chunks
+      coverage                 share of content query terms present in the packed context
+      kept_frac                kept chunks / keep_cap
+    """
+    cos_map = signals.get("cos", {})
+    bm_map = signals.get("bm25", {})
+    cos = sorted((cos_map.get(c, 0.0) for c in kept_ids), reverse=True)
+    bms = [bm_map.get(c, 0.0) for c in kept_ids]
+    terms = {t for t in tokenize_lex(question) if t not in _STOP and len(t) > 1}
+    ctx_terms = set(tokenize_lex(context_str)) if terms else set()
+    return {
+        "top_cos": round(cos[0], 4) if cos else 0.0,
+        "mean_cos_top3": round(float(np.mean(cos[:3])), 4) if cos else 0.0,
+        "top_bm25": round(float(np.log1p(max(bms))), 4) if bms else 0.0,
+        "coverage": round(len(terms & ctx_terms) / len(terms), 4) if terms else 1.0,
+        "kept_frac": round(min(len(kept_ids), keep_cap) / keep_cap, 4),
+    }
+
+def estimate_sufficiency(features: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Logistic score over the retrieval features; same output shape as llm_sufficiency_gate.
+    """
+    model = load_sufficiency_model()
+    z = model["bias"] + sum(w * features.get(f, 0.0) for f, w in zip(model["features"], model["weights"]))
+    s = 1.0 / (1.0 + np.exp(-z))
+    return {"sufficiency": round(float(max(0.0, min(1.0, s))), 4), "missing_aspects": [], "source": "estimator"}
+
+def log_sufficiency(question: str, features: Dict[str, float], llm_suff: float, est_suff: float | None,
+                    source: str = "llm") -> None:
+    """
+    One calibration row. source: where llm_sufficiency came from; only "llm" rows are real
+    model verdicts (fit_sufficiency.py drops the rest, e.g. "heuristic" parse fallbacks).
+    """
+    path = SUFFICIENCY_LOG or (str(IDX / "sufficiency_log.jsonl") if SUFFICIENCY_MODE == "shadow" else "")
+    if not path:
+        return
+    row = {"question": question, "features": features, "llm_sufficiency": llm_suff, "estimate": est_suff,
+           "source": source}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(" ------| Sufficiency log error:", e)
+
+async def sufficiency_gate(question: str, kept_ids: List[str], context_str: str,
+                           signals: Dict[str, Dict[str, float]],
+                           records: Dict[str, Dict[str, Any] | None] | None = None) -> Dict[str, Any]:
+    """
+    Dispatch on RAG_SUFFICIENCY_MODE (llm | estimator | shadow).
+    """
+    feats = sufficiency_features(question, kept_ids, context_str, signals)
+    if SUFFICIENCY_MODE == "estimator":
+        est = estimate_sufficiency(feats)
+        print(" ------| Sufficiency (estimator): ", est["sufficiency"], feats)
+        return est
+    try:
+        suff = await llm_sufficiency_gate(question, kept_ids, records=records)
+    except CircuitOpen:
+        est = estimate_sufficiency(feats)
+        print(" ------| Sufficiency (estimator, LLM circuit open): ", est["sufficiency"])
+        return est
+    est = estimate_sufficiency(feats) if SUFFICIENCY_MODE == "shadow" else None
+    # file append: keep it off the event loop
+    await asyncio.to_thread(log_sufficiency, question, feats, suff["sufficiency"],
+                            est["sufficiency"] if est else None, suff.get("source", "llm"))
+    return suff
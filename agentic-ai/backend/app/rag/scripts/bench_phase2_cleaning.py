@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark + equivalence check for Phase 2 cleaning.
+
+Runs the multi-pass path (clean_md_by_mode + the original line-indexed
+build_blocks) against CleaningEngine on every 2_docling markdown file, per mode,
+and verifies that clean text and blocks are identical.
+
+Usage:
+  python scripts\\bench_phase2_cleaning.py
+  python scripts\\bench_phase2_cleaning.py --mode aggressive --runs 5 --repeat 8
+  python scripts\\bench_phase2_cleaning.py --rules my_rules.json
+  (--repeat N concatenates each document N times)
+"""
+import sys, json, time, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import phase2_clean_pipeline as p2
+
+BASE = Path(__file__).resolve().parents[1]
+
+# ---------- reference (pre-engine) block builder ----------
+def build_blocks_reference(markdown_text: str, doc_id: str, version: str):
+    """
+    Produce blocks while preserving internal line breaks for paragraphs
+    (paragraph text is joined with '\n' instead of spaces).
+    """
+    blocks = []
+    section_path = []
+    lines = markdown_text.splitlines()
+
+    def add(bt, text, level=None):
+        blk = {
+            "doc_id": doc_id,
+            "version": version,
+            "block_index": len(blocks),
+            "block_type": bt,
+            "text": text,                    # exact text (no strip)
+            "section_path": section_path[:]  # copy
+        }
+        if level is not None:
+            blk["heading_level"] = level
+        blocks.append(blk)
+
+    i = 0
+    while i < len(lines):
+        ln = lines[i]
+
+        # code fence block
+        if p2.FENCE_RE.match(ln):
+            fence = [ln]; i += 1
+            while i < len(lines):
+                fence.append(lines[i])
+                if p2.FENCE_RE.match(lines[i]):
+                    i += 1; break
+                i += 1
+            add("code", "\n".join(fence))
+            continue
+
+        # table block
+        if "|" in ln and (i+1 < len(lines) and p2.TABLE_SEP.match(lines[i+1])):
+            tbl = [ln, lines[i+1]]; i += 2
+            while i < len(lines) and lines[i].strip() != "":
+                tbl.append(lines[i]); i += 1
+            add("table", "\n".join(tbl))
+            if i < len(lines) and lines[i].strip() == "":
+                i += 1
+            continue
+
+        # heading (store full heading line as text)
+        m = p2.HEADING_RE.match(ln)
+        if m:
+            hashes, title = m.groups()
+            level = len(hashes)
+            if len(section_path) >= level:
+                section_path = section_path[:level-1]
+            section_path.append(title.strip())
+            add("heading", ln, level)
+            i += 1
+            continue
+
+        # blank lines -> passthrough? We skip creating blocks for pure blanks.
+        if ln.strip() == "":
+            i += 1
+            continue
+
+        # list items (store exact line minus trailing newline)
+        if p2.BULLET_RE.match(ln) or p2.NUM_RE.match(ln):
+            add("list_item", ln.rstrip("\n"))
+            i += 1
+            continue
+
+        # paragraph: preserve original line breaks using '\n'
+        para = [ln.rstrip("\n")]
+        j = i + 1
+        while j < len(lines):
+            nxt = lines[j]
+            # stop on structural markers
+            if (nxt.strip() == "" or p2.HEADING_RE.match(nxt) or p2.BULLET_RE.match(nxt) or
+                p2.NUM_RE.match(nxt) or p2.FENCE_RE.match(nxt) or
+                ("|" in nxt and (j+1 < len(lines) and p2.TABLE_SEP.match(lines[j+1])))):
+                break
+            para.append(nxt.rstrip("\n")); j += 1
+        add("paragraph", "\n".join(para))
+        i = j
+
+    return blocks
+
+
+# ---------- harness ----------
+def run_reference(raw, mode, rules, doc_id, version):
+    text = p2.clean_md_by_mode(raw, mode, rules)
+    return text, build_blocks_reference(text, doc_id, version)
+
+def run_engine(raw, mode, rules, doc_id, version):
+    return p2.CleaningEngine(mode, rules).run(raw, doc_id, version)
+
+def best_of(fn, runs):
+    best, out = float("inf"), None
+    for _ in range(runs):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", nargs="*", default=["lossless", "safe", "aggressive"])
+    ap.add_argument("--rules", default=str(BASE / "0_phase0" / "cleaning_rules.json"))
+    ap.add_argument("--repeat", type=int, default=1, help="concatenate each document N times")
+    ap.add_argument("--runs", type=int, default=3, help="best-of-N timing")
+    args = ap.parse_args()
+
+    rules = p2.read_rules(Path(args.rules))
+    docs = []
+    for d in sorted(p for p in (BASE / "2_docling").glob("DOC*") if p.is_dir()):
+        md_path, version = p2.latest_md(d)
+        if md_path:
+            docs.append((d.name, version, p2.read_text_preserve_newlines(md_path) * max(1, args.repeat)))
+    if not docs:
+        print("No Phase-01 markdown under 2_docling/. Run Phase 1 first.", file=sys.stderr)
+        sys.exit(1)
+    mb = sum(len(raw.encode("utf-8")) for _, _, raw in docs) / 1e6
+    print(f"{len(docs)} docs x{args.repeat}, {mb:.2f} MB")
+
+    ok = True
+    print(f"{'mode':<11} {'reference':>12} {'engine':>12} {'speedup':>8}  identical")
+    for mode in args.mode:
+        t_ref = t_eng = 0.0
+        same = True
+        for doc_id, version, raw in docs:
+            tr, ref = best_of(lambda: run_reference(raw, mode, rules, doc_id, version), args.runs)
+            te, eng = best_of(lambda: run_engine(raw, mode, rules, doc_id, version), args.runs)
+            t_ref, t_eng = t_ref + tr, t_eng + te
+            if ref[0] != eng[0] or json.dumps(ref[1]) != json.dumps(eng[1]):
+                same = False
+                print(f"  mismatch: {doc_id} ({mode})", file=sys.stderr)
+        ok = ok and same
+        print(f"{mode:<11} {mb / t_ref:>7.1f} MB/s {mb / t_eng:>7.1f} MB/s {t_ref / max(t_eng, 1e-9):>7.2f}x  {same}")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
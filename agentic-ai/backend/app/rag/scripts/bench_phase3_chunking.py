@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark + equivalence check for Phase 3 token accounting.
+
+Runs the original chunker (re-tokenizes the whole growing buffer on every block,
+and every chunk again for overlap / embedding counts) against build_chunks with
+the IncrementalCounter, on the same Phase-02 blocks, and verifies that the
+finalized rows are byte-identical (created_at excluded).
+
+Usage:
+  python scripts\\bench_phase3_chunking.py                      # DOC04, as-is
+  python scripts\\bench_phase3_chunking.py --doc DOC04 --repeat 4 --runs 3
+  (--repeat N concatenates the document N times to simulate longer sections)
+"""
+import sys, json, time, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import phase3_chunking as p3
+
+BASE = Path(__file__).resolve().parents[1]
+
+# ---------- reference (pre-incremental) chunker ----------
+def build_chunks_reference(blocks, cfg, count_tokens=None):
+    count_tokens = count_tokens or p3.count_tokens
+    tgt  = int(cfg.get("target_tokens", 800))
+    mx   = int(cfg.get("max_tokens", 1100))
+    mn   = int(cfg.get("min_tokens", 150))
+    ovlp = int(cfg.get("overlap_tokens", 80))
+    incl_headings = bool(cfg.get("include_headings_in_text", False))
+    break_on_level = int(cfg.get("break_on_heading_level", 0))
+
+    chunks = []
+    buf = {"blocks": [], "text": "", "tokens": 0, "start": None}
+
+    def flush_chunk():
+        if not buf["blocks"]:
+            return
+        bl = buf["blocks"]
+        chunks.append({
+            "_blocks": [b["block_index"] for b in bl],
+            "block_start_index": buf["start"],
+            "block_end_index": bl[-1]["block_index"],
+            "text": buf["text"],
+            "token_count": buf["tokens"],
+            "section_path": p3.choose_section_path(bl),
+            "contains_table": any(b["block_type"]=="table" for b in bl),
+            "contains_code":  any(b["block_type"]=="code"  for b in bl),
+            "chunk_type": "table" if len(bl)==1 and bl[0]["block_type"]=="table" else (
+                          "code" if len(bl)==1 and bl[0]["block_type"]=="code" else "text"),
+        })
+        buf.update(blocks=[], text="", tokens=0, start=None)
+
+    def add_content_block(b):
+        if b["block_type"] in ("table","code"):
+            flush_chunk()
+            chunks.append({
+                "_blocks": [b["block_index"]],
+                "block_start_index": b["block_index"],
+                "block_end_index": b["block_index"],
+                "text": b["text"],
+                "token_count": count_tokens(b["text"]),
+                "section_path": b.get("section_path", []),
+                "contains_table": (b["block_type"]=="table"),
+                "contains_code":  (b["block_type"]=="code"),
+                "chunk_type": b["block_type"],
+            })
+            return
+        candidate = (buf["text"] + ("\n\n" if buf["text"] else "") + b["text"]).rstrip()
+        cand_tokens = count_tokens(candidate)
+        if buf["start"] is None:
+            buf["start"] = b["block_index"]
+        if buf["blocks"] and cand_tokens > mx and buf["tokens"] >= mn:
+            flush_chunk()
+            buf.update(blocks=[b], text=b["text"], tokens=count_tokens(b["text"]), start=b["block_index"])
+        else:
+            buf["blocks"].append(b)
+            buf["text"], buf["tokens"] = candidate, cand_tokens
+        if buf["tokens"] >= tgt:
+            flush_chunk()
+
+    for b in blocks:
+        if b["block_type"] == "heading":
+            if break_on_level and int(b.get("heading_level", 999)) <= break_on_level:
+                flush_chunk()
+            if incl_headings:
+                add_content_block(b)
+            continue
+        add_content_block(b)
+    flush_chunk()
+
+    if ovlp > 0 and len(chunks) > 1:
+        for i in range(1, len(chunks)):
+            if chunks[i]["chunk_type"] != "text":
+                continue
+            prev_words = chunks[i-1]["text"].split()
+            if len(prev_words) > ovlp:
+                prefix = " ".join(prev_words[-ovlp:])
+                if not chunks[i]["text"].startswith(prefix):
+                    chunks[i]["text"] = prefix + "\n\n" + chunks[i]["text"]
+                    chunks[i]["token_count"] = count_tokens(chunks[i]["text"])
+                    chunks[i]["overlap_with_prev"] = ovlp
+    return chunks
+
+# ---------- harness ----------
+def rows_bytes(rows):
+    out = []
+    for r in rows:
+        r = dict(r)
+        r.pop("created_at", None)
+        out.append(json.dumps(r, ensure_ascii=False))
+    return "\n".join(out).encode("utf-8")
+
+def repeat_blocks(blocks, n):
+    out, k = [], 0
+    for _ in range(n):
+        for b in blocks:
+            out.append({**b, "block_index": k})
+            k += 1
+    return out
+
+def run_reference(doc_id, version, blocks, cfg):
+    chunks = build_chunks_reference(blocks, cfg)
+    return p3.finalize_chunks(doc_id, version, chunks, cfg, counter=None)
+
+def run_incremental(doc_id, version, blocks, cfg, stats=None):
+    pc = p3.IncrementalCounter()
+    chunks = p3.build_chunks(blocks, cfg, counter=pc)
+    rows = p3.finalize_chunks(doc_id, version, chunks, cfg, counter=pc)
+    if stats is not None:
+        stats.update(batched=len(pc.memo) - pc.lazy, lazy=pc.lazy)
+    return rows
+
+def best_of(fn, runs):
+    best, out = float("inf"), None
+    for _ in range(runs):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--doc", default="DOC04")
+    ap.add_argument("--repeat", type=int, default=1, help="concatenate the document N times")
+    ap.add_argument("--runs", type=int, default=3, help="best-of-N timing")
+    ap.add_argument("--target", type=int, default=None, help="override target_tokens (larger → longer buffers)")
+    ap.add_argument("--max", type=int, default=None, help="override max_tokens")
+    args = ap.parse_args()
+
+    blocks_path = p3.latest_file(BASE / "3_clean" / args.doc, "_blocks.jsonl")
+    if not blocks_path:
+        print(f"No Phase-02 blocks for {args.doc}. Run Phase 2 first.", file=sys.stderr)
+        sys.exit(1)
+    parts = blocks_path.stem.split("_")
+    version = parts[1] if len(parts) >= 2 else ""
+    blocks = repeat_blocks(p3.read_blocks_jsonl(blocks_path), max(1, args.repeat))
+
+    cfg = p3.load_config(BASE / "0_phase0" / "chunking_config.json")
+    if args.target is not None: cfg["target_tokens"] = args.target
+    if args.max    is not None: cfg["max_tokens"]    = args.max
+
+    if not p3.IncrementalCounter().exact:
+        print("NOTE: tiktoken/regex unavailable — both paths use the fallback tokenizer.")
+
+    chars = sum(len(b.get("text", "")) for b in blocks)
+    print(f"{args.doc} x{args.repeat}: {len(blocks)} blocks, {chars:,} chars, "
+          f"target={cfg['target_tokens']} max={cfg['max_tokens']}")
+
+    t_ref, ref = best_of(lambda: run_reference(args.doc, version, blocks, cfg), args.runs)
+    t_inc, inc = best_of(lambda: run_incremental(args.doc, version, blocks, cfg), args.runs)
+
+    identical = rows_bytes(ref) == rows_bytes(inc)
+    stats = {}
+    run_incremental(args.doc, version, blocks, cfg, stats)
+    print(f"reference  : {t_ref*1000:9.1f} ms  ({len(ref)} chunks)")
+    print(f"incremental: {t_inc*1000:9.1f} ms  ({len(inc)} chunks; "
+          f"{stats['batched']} pieces batch-encoded, {stats['lazy']} encoded one by one)")
+    print(f"speedup    : {t_ref / max(t_inc, 1e-9):.1f}x")
+    print(f"identical  : {identical}")
+    if not identical:
+        for a, b in zip(ref, inc):
+            if rows_bytes([a]) != rows_bytes([b]):
+                print("first mismatch:", a["chunk_id"], {k: (a.get(k), b.get(k)) for k in a
+                      if k not in ("created_at", "text", "embedding_text") and a.get(k) != b.get(k)})
+                break
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
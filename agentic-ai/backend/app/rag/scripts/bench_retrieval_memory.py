@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Retrieval memory footprint + per-query allocation churn.
+
+Part 1 loads the Phase-04 index the way RagIndex.load does, one component at a time,
+and records for each step:
+  rss_mb     process RSS growth (includes C/C++ allocations: torch, FAISS, numpy)
+  py_mb      Python-heap growth seen by tracemalloc (dicts/lists/strings: meta, BM25)
+  py_peak_mb tracemalloc peak during the step (transient parsing overhead)
+Components: torch/sentence-transformers import, embedder weights, FAISS index (+ mmap'd
+re-score vectors), BM25 object, meta rows, bm25 ids, the RagIndex handle (meta_map, aliases).
+
+Part 2 replays N queries through RagIndex.search_sync and reports, per query, the
+tracemalloc peak above the pre-query baseline (allocation churn), the bytes still held
+afterwards (growth; chunk-record cache included when --with-chunks), and latency.
+
+Usage:
+  python scripts\\bench_retrieval_memory.py
+  python scripts\\bench_retrieval_memory.py --queries 200 --with-chunks --out 5_index\\memory_report.json
+  python scripts\\bench_retrieval_memory.py --qfile questions.jsonl   # {"q": ...} per line
+"""
+import sys, os, gc, json, time, pickle, argparse, tracemalloc
+from pathlib import Path
+
+# make `app.*` importable when run as a script (backend root)
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+import numpy as np
+
+from app.rag.engine.config import IDX
+from app.rag.engine.index import RagIndex, load_meta, load_chunk_record
+
+MB = 1024 * 1024
+
+# ---------- RSS ----------
+def rss_bytes() -> int:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0   # no portable RSS source; py_* columns still apply
+
+class Step:
+    """Context manager measuring RSS + tracemalloc deltas for one load step."""
+
+    def __init__(self, name: str, rows: list):
+        self.name, self.rows = name, rows
+
+    def __enter__(self):
+        gc.collect()
+        tracemalloc.reset_peak()
+        self.rss0 = rss_bytes()
+        self.py0 = tracemalloc.get_traced_memory()[0]
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        secs = time.perf_counter() - self.t0
+        gc.collect()
+        cur, peak = tracemalloc.get_traced_memory()
+        self.rows.append({
+            "component": self.name,
+            "rss_mb": round((rss_bytes() - self.rss0) / MB, 2),
+            "py_mb": round((cur - self.py0) / MB, 2),
+            "py_peak_mb": round((peak - self.py0) / MB, 2),
+            "seconds": round(secs, 3),
+        })
+        return False
+
+# ---------- part 1: load footprint ----------
+def load_footprint(idx_dir: Path):
+    rows = []
+    with Step("import torch + sentence-transformers", rows):
+        import faiss
+        from sentence_transformers import SentenceTransformer
+    cfg = json.loads((idx_dir / "index_config.json").read_text(encoding="utf-8"))
+    with Step(f"embedder ({cfg['model_name'].split('/')[-1]})", rows):
+        model = SentenceTransformer(cfg["model_name"])
+    with Step(f"faiss ({(cfg.get('vector_store') or {}).get('type', 'flat')})", rows):
+        index = faiss.read_index(str(idx_dir / "vector.faiss"))
+        rescore = (cfg.get("vector_store") or {}).get("rescore_vectors")
+        vectors = np.load(idx_dir / rescore, mmap_mode="r") if rescore and (idx_dir / rescore).exists() else None
+    with Step("bm25 (BM25Okapi pickle)", rows):
+        with open(idx_dir / "bm25.pkl", "rb") as f:
+            bm25 = pickle.load(f)
+    with Step("meta rows (meta.jsonl)", rows):
+        meta = load_meta(idx_dir / "meta.jsonl")
+        alias_path = idx_dir / "aliases.jsonl"
+        alias_meta = load_meta(alias_path) if alias_path.exists() else None
+    with Step("bm25 doc ids", rows):
+        bm25_ids = json.loads((idx_dir / "bm25_doc_ids.json").read_text(encoding="utf-8"))
+    with Step("RagIndex handle (meta_map, aliases)", rows):
+        idx = RagIndex(meta, bm25, bm25_ids, model, index, cfg, alias_meta, vectors)
+    sizes = {
+        "vectors": int(index.ntotal),
+        "faiss_code_bytes": int(index.ntotal * getattr(index, "code_size", 4 * index.d)),
+        "files_mb": {p.name: round(p.stat().st_size / MB, 2) for p in sorted(idx_dir.iterdir()) if p.is_file()},
+    }
+    return idx, rows, sizes
+
+# ---------- part 2: per-query churn ----------
+def default_queries(idx: RagIndex, n: int):
+    """Breadcrumbs of indexed chunks as stand-in questions (deterministic)."""
+    crumbs = list(dict.fromkeys(m.get("breadcrumb") or m["chunk_id"] for m in idx.meta))
+    rng = np.random.default_rng(0)
+    return [crumbs[i] for i in rng.integers(0, len(crumbs), size=n)]
+
+def replay(idx: RagIndex, queries, with_chunks: bool, warmup: int = 3):
+    for q in queries[:warmup]:
+        idx.search_sync([q])
+    gc.collect()
+    start_rss, start_py = rss_bytes(), tracemalloc.get_traced_memory()[0]
+    per = []
+    for q in queries:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        ranked = idx.search_sync([q])
+        if with_chunks:
+            for cid in ranked[:12]:
+                load_chunk_record(cid)
+        ms = (time.perf_counter() - t0) * 1000
+        cur, peak = tracemalloc.get_traced_memory()
+        per.append((peak - before, cur - before, ms))
+    gc.collect()
+    churn = np.array([p[0] for p in per], dtype=float)
+    held  = np.array([p[1] for p in per], dtype=float)
+    lat   = np.array([p[2] for p in per], dtype=float)
+    return {
+        "queries": len(queries),
+        "churn_kb_mean": round(churn.mean() / 1024, 1),
+        "churn_kb_p95": round(float(np.percentile(churn, 95)) / 1024, 1),
+        "held_kb_mean": round(held.mean() / 1024, 2),
+        "py_growth_mb": round((tracemalloc.get_traced_memory()[0] - start_py) / MB, 3),
+        "rss_growth_mb": round((rss_bytes() - start_rss) / MB, 2),
+        "latency_ms_p50": round(float(np.percentile(lat, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(lat, 95)), 2),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--idx", default=str(IDX), help="Phase-04 index directory")
+    ap.add_argument("--queries", type=int, default=100, help="queries to replay")
+    ap.add_argument("--qfile", default=None, help='JSONL of {"q": ...} (default: chunk breadcrumbs)')
+    ap.add_argument("--with-chunks", action="store_true", help="also load the top-12 chunk records per query")
+    ap.add_argument("--out", default=None, help="write the report as JSON")
+    args = ap.parse_args()
+
+    tracemalloc.start()
+    base_rss = rss_bytes()
+    idx, rows, sizes = load_footprint(Path(args.idx))
+
+    print(f"Load footprint ({sizes['vectors']} vectors, FAISS codes {sizes['faiss_code_bytes']/MB:.2f} MB)")
+    print(f"  {'component':<40} {'rss MB':>8} {'py MB':>8} {'py peak':>8} {'s':>7}")
+    for r in rows:
+        print(f"  {r['component']:<40} {r['rss_mb']:>8.2f} {r['py_mb']:>8.2f} {r['py_peak_mb']:>8.2f} {r['seconds']:>7.2f}")
+    total_rss = (rss_bytes() - base_rss) / MB
+    print(f"  {'total':<40} {total_rss:>8.2f} {sum(r['py_mb'] for r in rows):>8.2f}")
+
+    if args.qfile:
+        with open(args.qfile, encoding="utf-8") as f:
+            qs = [json.loads(l).get("q") or json.loads(l).get("question") for l in f if l.strip()]
+        queries = (qs * (args.queries // max(1, len(qs)) + 1))[:args.queries]
+    else:
+        queries = default_queries(idx, args.queries)
+    q = replay(idx, queries, args.with_chunks)
+    print(f"\nReplay ({q['queries']} queries{', + chunk records' if args.with_chunks else ''})")
+    print(f"  alloc churn / query : {q['churn_kb_mean']:.1f} KB mean, {q['churn_kb_p95']:.1f} KB p95")
+    print(f"  held after query    : {q['held_kb_mean']:.2f} KB mean")
+    print(f"  growth over replay  : py {q['py_growth_mb']:.3f} MB, rss {q['rss_growth_mb']:.2f} MB")
+    print(f"  latency             : p50 {q['latency_ms_p50']:.2f} ms, p95 {q['latency_ms_p95']:.2f} ms")
+
+    if args.out:
+        report = {"load": rows, "load_total_rss_mb": round(total_rss, 2), "sizes": sizes, "replay": q}
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nReport written to {args.out}")
+
+if __name__ == "__main__":
+    main()
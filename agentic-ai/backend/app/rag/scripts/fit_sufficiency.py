@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Fit the score-based sufficiency estimator against logged LLM verdicts.
+
+Inputs:
+  5_index/sufficiency_log.jsonl   ← written by the RAG engine in RAG_SUFFICIENCY_MODE=shadow
+                                    (or wherever RAG_SUFFICIENCY_LOG points)
+                                    one row: {"features": {...}, "llm_sufficiency": float, "source": "llm", ...}
+                                    (rows whose score is not a real LLM verdict, e.g. source="heuristic"
+                                    parse fallbacks or legacy rows without a source, are skipped)
+
+Outputs:
+  5_index/sufficiency_model.json  ← {"features", "weights", "bias", "fitted_on", "metrics", "fitted_at"}
+
+Logistic regression on the LLM score as a soft target (cross-entropy), so the
+estimate stays on the LLM's 0..1 scale and the 0.7 general-knowledge threshold
+keeps its meaning. Plain numpy gradient descent; the logs are small.
+
+Usage:
+  python fit_sufficiency.py [--log PATH] [--out PATH] [--l2 0.01] [--iters 5000] [--holdout 0.2]
+"""
+import os, sys, json, argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from app.rag.engine.config import IDX, SUFFICIENCY_THRESHOLD as THRESHOLD  # noqa: E402
+from app.rag.engine.sufficiency import SUFFICIENCY_FEATURES as FEATURES  # noqa: E402
+
+def load_rows(path: Path):
+    X, y, skipped = [], [], 0
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if r.get("source") != "llm":
+                skipped += 1
+                continue
+            feats = r.get("features") or {}
+            if r.get("llm_sufficiency") is None or any(k not in feats for k in FEATURES):
+                continue
+            X.append([float(feats[k]) for k in FEATURES])
+            y.append(float(r["llm_sufficiency"]))
+    if skipped:
+        print(f"Skipped {skipped} rows that are not LLM verdicts (source != 'llm')")
+    return np.array(X, dtype=np.float64), np.array(y, dtype=np.float64)
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+def fit(X, y, l2=0.01, iters=5000, lr=0.5):
+    # standardize for stable steps, then fold the scaling back into raw-feature weights
+    mu, sd = X.mean(axis=0), X.std(axis=0)
+    sd[sd == 0] = 1.0
+    Z = (X - mu) / sd
+    w = np.zeros(Z.shape[1])
+    b = float(np.log(max(y.mean(), 1e-3) / max(1 - y.mean(), 1e-3)))
+    n = len(y)
+    for _ in range(iters):
+        p = sigmoid(Z @ w + b)
+        g = p - y
+        w -= lr * ((Z.T @ g) / n + l2 * w)
+        b -= lr * g.mean()
+    weights = w / sd
+    bias = b - float((w * mu / sd).sum())
+    return weights, bias
+
+def evaluate(X, y, weights, bias):
+    if len(y) == 0:
+        return {}
+    p = sigmoid(X @ weights + bias)
+    agree = float(((p >= THRESHOLD) == (y >= THRESHOLD)).mean())
+    return {
+        "n": int(len(y)),
+        "mae": round(float(np.abs(p - y).mean()), 4),
+        "decision_agreement": round(agree, 4),   # same side of the 0.7 GK threshold as the LLM
+        "llm_sufficient_rate": round(float((y >= THRESHOLD).mean()), 4),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.environ.get("RAG_SUFFICIENCY_LOG") or str(IDX / "sufficiency_log.jsonl"))
+    ap.add_argument("--out", default=os.environ.get("RAG_SUFFICIENCY_MODEL") or str(IDX / "sufficiency_model.json"))
+    ap.add_argument("--l2", type=float, default=0.01)
+    ap.add_argument("--iters", type=int, default=5000)
+    ap.add_argument("--holdout", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=13)
+    args = ap.parse_args()
+
+    log_path = Path(args.log)
+    if not log_path.exists():
+        print(f"No log at {log_path}. Run the API with RAG_SUFFICIENCY_MODE=shadow first.", file=sys.stderr)
+        sys.exit(1)
+
+    X, y = load_rows(log_path)
+    if len(y) < 20:
+        print(f"Only {len(y)} usable rows in {log_path}; need at least 20.", file=sys.stderr)
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(y))
+    n_hold = int(len(y) * args.holdout)
+    hold, train = order[:n_hold], order[n_hold:]
+
+    weights, bias = fit(X[train], y[train], l2=args.l2, iters=args.iters)
+    metrics = {"train": evaluate(X[train], y[train], weights, bias),
+               "holdout": evaluate(X[hold], y[hold], weights, bias)}
+
+    # final model on all rows
+    weights, bias = fit(X, y, l2=args.l2, iters=args.iters)
+    model = {
+        "features": FEATURES,
+        "weights": [round(float(w), 6) for w in weights],
+        "bias": round(float(bias), 6),
+        "fitted_on": int(len(y)),
+        "metrics": metrics,
+        "fitted_at": datetime.utcnow().isoformat() + "Z",
+    }
+    Path(args.out).write_text(json.dumps(model, indent=2), encoding="utf-8")
+
+    print(f"Fitted on {len(y)} rows → {args.out}")
+    for k, v in zip(FEATURES, model["weights"]):
+        print(f"  {k:>14}: {v:+.4f}")
+    print(f"  {'bias':>14}: {model['bias']:+.4f}")
+    print("Train:  ", metrics["train"])
+    print("Holdout:", metrics["holdout"])
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # (see file header for usage)
 # pip install docling pandas pypdf
+#   python scripts\phase1_docling_ingest.py --workers 4 --retries 1
 
 # Phase 1 — Docling ingestion
 import argparse, sys, csv, json, hashlib
@@ -79,6 +80,18 @@ def build_converter():
         print("Original error:", e, file=sys.stderr)
         sys.exit(2)
 
+# one converter per process (the main process in serial mode, each worker with --workers N)
+_CONVERTER = None
+
+def get_converter():
+    global _CONVERTER
+    if _CONVERTER is None:
+        _CONVERTER = build_converter()
+    return _CONVERTER
+
+def _init_worker():
+    get_converter()
+
 def read_registry(registry_csv: Path):
     rows = []
     import csv
@@ -89,10 +102,106 @@ def read_registry(registry_csv: Path):
                 rows.append(r)
     return rows
 
+def convert_doc(r, base: Path, out_root: Path):
+    """Convert one registry row → Markdown + JSON + stats.json. Returns the stats row (raises on failure)."""
+    doc_id = r["doc_id"]
+    version = r.get("version") or datetime.utcnow().strftime("%Y%m%d")
+    rel = r["filename"]
+    pdf_path = base / rel
+
+    out_dir = out_root / doc_id
+    out_dir.mkdir(parents=True, exist_ok=True)
+    md_path = out_dir / f"{doc_id}_{version}.md"
+    json_path = out_dir / f"{doc_id}_{version}.json"
+    stats_path = out_dir / "stats.json"
+
+    md, js = to_markdown_and_json(get_converter(), pdf_path)
+
+    md_path.write_text(md, encoding="utf-8")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(js, f, ensure_ascii=False, indent=2)
+
+    stats = {
+        "doc_id": doc_id,
+        "version": version,
+        "filename": rel,
+        "page_count": page_count_pdf(pdf_path),
+        "bytes_markdown": md_path.stat().st_size,
+        "checksum_pdf": sha256sum(pdf_path),
+        "converted_at": datetime.utcnow().isoformat() + "Z"
+    }
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+def run_docs(items, fn, args_of, workers: int, retries: int, initializer=None):
+    """
+    Run fn(*args_of(item)) for every (doc_id, item), serially or on a process pool.
+    Progress is printed as documents finish; failed documents are retried (on a fresh
+    pool) up to `retries` more times without restarting the batch.
+    Returns ({doc_id: result}, {doc_id: error}).
+    """
+    results, errors = {}, {}
+    pending = list(items)
+    total = len(pending)
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"Retrying {len(pending)} failed document(s) (attempt {attempt + 1}/{retries + 1}) ...", flush=True)
+        failed = []
+
+        def done(doc_id, item, res=None, err=None):
+            if err is None:
+                results[doc_id] = res
+                errors.pop(doc_id, None)
+                print(f"[{doc_id}] OK  ({len(results)}/{total})", flush=True)
+            else:
+                errors[doc_id] = err
+                failed.append((doc_id, item))
+                print(f"[{doc_id}] FAILED: {err}", file=sys.stderr, flush=True)
+
+        if workers <= 1:
+            for doc_id, item in pending:
+                try:
+                    done(doc_id, item, res=fn(*args_of(item)))
+                except Exception as e:
+                    done(doc_id, item, err=e)
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=initializer) as ex:
+                futs = {ex.submit(fn, *args_of(item)): (doc_id, item) for doc_id, item in pending}
+                for fut in as_completed(futs):
+                    doc_id, item = futs[fut]
+                    try:
+                        done(doc_id, item, res=fut.result())
+                    except Exception as e:   # includes BrokenProcessPool → retried on a new pool
+                        done(doc_id, item, err=e)
+        pending = failed
+    return results, errors
+
+def write_manifest(path: Path, rows):
+    """Merge rows into the manifest (one line per doc_id, sorted), replacing it atomically."""
+    merged = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                row = json.loads(line)
+                merged[row["doc_id"]] = row
+            except Exception:
+                continue
+    for row in rows:
+        merged[row["doc_id"]] = row
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text("".join(json.dumps(merged[k]) + "\n" for k in sorted(merged)), encoding="utf-8")
+    tmp.replace(path)
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--only", nargs="*", default=None, help="Process only these DOCIDs (e.g., DOC01 DOC03).")
     parser.add_argument("--rebuild", action="store_true", help="Re-convert even if outputs exist.")
+    parser.add_argument("--workers", type=int, default=1, help="Convert documents in N processes (one converter each).")
+    parser.add_argument("--retries", type=int, default=1, help="Retry failed documents this many times.")
     args = parser.parse_args()
 
     base = Path(__file__).resolve().parents[1]
@@ -107,62 +216,31 @@ def main():
     if args.only:
         rows = [r for r in rows if r["doc_id"] in set(args.only)]
 
-    converter = build_converter()
-
-    manifest_path = out_root / "manifest.jsonl"
-    with open(manifest_path, "w", encoding="utf-8") as mf:
-        pass  # truncate
-
+    todo = []
     for r in rows:
         doc_id = r["doc_id"]
         version = r.get("version") or datetime.utcnow().strftime("%Y%m%d")
-        rel = r["filename"]
-        pdf_path = base / rel
+        pdf_path = base / r["filename"]
         if not pdf_path.exists():
             print(f"[{doc_id}] Missing file: {pdf_path}", file=sys.stderr)
             continue
-
         out_dir = out_root / doc_id
-        out_dir.mkdir(parents=True, exist_ok=True)
-        md_path = out_dir / f"{doc_id}_{version}.md"
-        json_path = out_dir / f"{doc_id}_{version}.json"
-        stats_path = out_dir / "stats.json"
-
-        if not args.rebuild and md_path.exists() and json_path.exists():
+        if not args.rebuild and (out_dir / f"{doc_id}_{version}.md").exists() and (out_dir / f"{doc_id}_{version}.json").exists():
             print(f"[{doc_id}] Skipping (already exists). Use --rebuild to force.")
             continue
-
-        print(f"[{doc_id}] Converting {pdf_path.name} → Markdown + JSON ...")
-        try:
-            md, js = to_markdown_and_json(converter, pdf_path)
-        except Exception as e:
-            print(f"[{doc_id}] Docling conversion failed: {e}", file=sys.stderr)
-            continue
-
-        md_path.write_text(md, encoding="utf-8")
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(js, f, ensure_ascii=False, indent=2)
-
-        pc = page_count_pdf(pdf_path)
-        bytes_md = md_path.stat().st_size
-        checksum = sha256sum(pdf_path)
-
-        stats = {
-            "doc_id": doc_id,
-            "version": version,
-            "filename": rel,
-            "page_count": pc,
-            "bytes_markdown": bytes_md,
-            "checksum_pdf": checksum,
-            "converted_at": datetime.utcnow().isoformat() + "Z"
-        }
-        with open(stats_path, "w", encoding="utf-8") as f:
-            json.dump(stats, f, indent=2)
-
-        with open(out_root / "manifest.jsonl", "a", encoding="utf-8") as mf:
-            mf.write(json.dumps(stats) + "\n")
-
-        print(f"[{doc_id}] OK  → {md_path.name}, {json_path.name}")
+        todo.append((doc_id, r))
+
+    if todo:
+        if args.workers <= 1:
+            get_converter()
+        print(f"Converting {len(todo)} document(s) with {max(1, args.workers)} worker(s) ...", flush=True)
+        results, errors = run_docs(todo, convert_doc, lambda r: (r, base, out_root),
+                                   workers=args.workers, retries=args.retries, initializer=_init_worker)
+        out_root.mkdir(parents=True, exist_ok=True)
+        write_manifest(out_root / "manifest.jsonl", results.values())
+        if errors:
+            print(f"Failed after retries: {' '.join(sorted(errors))}", file=sys.stderr)
+            sys.exit(1)
 
     print("Done. Outputs under 2_docling/. Manifest at 2_docling/manifest.jsonl")
 
@@ -23,11 +23,16 @@ Usage (Windows CMD):
   python scripts\phase2_clean_pipeline.py
   python scripts\phase2_clean_pipeline.py --only DOC01 DOC02
   python scripts\phase2_clean_pipeline.py --mode safe --rebuild
+  python scripts\phase2_clean_pipeline.py --rebuild --workers 4
 """
 import argparse, sys, json, re, unicodedata, shutil
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from phase1_docling_ingest import run_docs, write_manifest
+
 # ---------- Parsers ----------
 HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
 BULLET_RE  = re.compile(r'^\s*([-*+•])\s+(.*)$')
@@ -55,6 +60,7 @@ def read_text_preserve_newlines(p: Path) -> str:
         return f.read()
 
 # ---------- Optional cleaning (only in safe/aggressive) ----------
+# Multi-pass reference; clean_doc() runs the equivalent single-pass CleaningEngine below.
 def normalize_text_nfkc(s: str) -> str:
     return unicodedata.normalize("NFKC", s)
 
@@ -168,14 +174,54 @@ def clean_md_by_mode(raw_md: str, mode: str, rules: dict) -> str:
     return s
 
 # ---------- Block builder (preserves content lines) ----------
+# One match per line instead of FENCE/HEADING/BULLET/NUM/blank tests one by one.
+# Alternatives are in the builders' precedence order; lines never contain "\n".
+_LINE_KIND = re.compile(r'(?P<fence>`{3,})|(?P<heading>#{1,6}\s)|(?P<item>\s*(?:[-*+•]|\d+[\.\)])\s)|(?P<blank>\s*\Z)')
+
+def classify_line(ln: str) -> str:
+    """fence | heading | item | blank | text"""
+    m = _LINE_KIND.match(ln)
+    return m.lastgroup if m else "text"
+
+class _Peek:
+    """(line, kind) iterator with k-line lookahead (None = end of input)."""
+
+    def __init__(self, pairs):
+        self._next = iter(pairs).__next__
+        self.buf = deque()
+
+    def peek(self, k=0):
+        buf = self.buf
+        while len(buf) <= k:
+            try:
+                buf.append(self._next())
+            except StopIteration:
+                return None
+        return buf[k]
+
+    def next(self):
+        if self.buf:
+            return self.buf.popleft()
+        try:
+            return self._next()
+        except StopIteration:
+            return None
+
 def build_blocks(markdown_text: str, doc_id: str, version: str):
     """
     Produce blocks while preserving internal line breaks for paragraphs
     (paragraph text is joined with '\n' instead of spaces).
     """
+    return build_blocks_from_lines(markdown_text.splitlines(), doc_id, version)
+
+def build_blocks_from_lines(lines, doc_id: str, version: str):
+    """build_blocks() over an iterable of lines (consumed lazily)."""
+    return _build_blocks(((ln, classify_line(ln)) for ln in lines), doc_id, version)
+
+def _build_blocks(pairs, doc_id: str, version: str):
     blocks = []
     section_path = []
-    lines = markdown_text.splitlines()
+    it = _Peek(pairs)
 
     def add(bt, text, level=None):
         blk = {
@@ -190,77 +236,319 @@ def build_blocks(markdown_text: str, doc_id: str, version: str):
             blk["heading_level"] = level
         blocks.append(blk)
 
-    i = 0
-    while i < len(lines):
-        ln = lines[i]
+    def starts_table(ln, k):
+        nxt = it.peek(k)
+        return "|" in ln and nxt is not None and TABLE_SEP.match(nxt[0])
+
+    cur = it.next()
+    while cur is not None:
+        ln, kind = cur
 
         # code fence block
-        if FENCE_RE.match(ln):
-            fence = [ln]; i += 1
-            while i < len(lines):
-                fence.append(lines[i])
-                if FENCE_RE.match(lines[i]):
-                    i += 1; break
-                i += 1
+        if kind == "fence":
+            fence = [ln]
+            while True:
+                nxt = it.next()
+                if nxt is None:
+                    break
+                fence.append(nxt[0])
+                if nxt[1] == "fence":
+                    break
             add("code", "\n".join(fence))
+            cur = it.next()
             continue
 
         # table block
-        if "|" in ln and (i+1 < len(lines) and TABLE_SEP.match(lines[i+1])):
-            tbl = [ln, lines[i+1]]; i += 2
-            while i < len(lines) and lines[i].strip() != "":
-                tbl.append(lines[i]); i += 1
+        if starts_table(ln, 0):
+            tbl = [ln, it.next()[0]]
+            while it.peek() is not None and it.peek()[1] != "blank":
+                tbl.append(it.next()[0])
             add("table", "\n".join(tbl))
-            if i < len(lines) and lines[i].strip() == "":
-                i += 1
+            if it.peek() is not None:
+                it.next()   # the blank line ending the table
+            cur = it.next()
             continue
 
         # heading (store full heading line as text)
-        m = HEADING_RE.match(ln)
-        if m:
-            hashes, title = m.groups()
+        if kind == "heading":
+            hashes, title = HEADING_RE.match(ln).groups()
             level = len(hashes)
             if len(section_path) >= level:
                 section_path = section_path[:level-1]
             section_path.append(title.strip())
             add("heading", ln, level)
-            i += 1
+            cur = it.next()
             continue
 
         # blank lines -> passthrough? We skip creating blocks for pure blanks.
-        if ln.strip() == "":
-            i += 1
+        if kind == "blank":
+            cur = it.next()
             continue
 
         # list items (store exact line minus trailing newline)
-        if BULLET_RE.match(ln) or NUM_RE.match(ln):
+        if kind == "item":
             add("list_item", ln.rstrip("\n"))
-            i += 1
+            cur = it.next()
             continue
 
         # paragraph: preserve original line breaks using '\n'
         para = [ln.rstrip("\n")]
-        j = i + 1
-        while j < len(lines):
-            nxt = lines[j]
+        while True:
+            nxt = it.peek()
             # stop on structural markers
-            if (nxt.strip() == "" or HEADING_RE.match(nxt) or BULLET_RE.match(nxt) or
-                NUM_RE.match(nxt) or FENCE_RE.match(nxt) or
-                ("|" in nxt and (j+1 < len(lines) and TABLE_SEP.match(lines[j+1])))):
+            if nxt is None or nxt[1] != "text" or starts_table(nxt[0], 1):
                 break
-            para.append(nxt.rstrip("\n")); j += 1
+            para.append(it.next()[0].rstrip("\n"))
         add("paragraph", "\n".join(para))
-        i = j
+        cur = it.next()
 
     return blocks
 
+# ---------- Single-pass engine ----------
+_DEHYPHEN_TAIL = re.compile(r'([A-Za-z])-\r?\n\Z')
+
+class CleaningEngine:
+    """
+    clean_md_by_mode() + build_blocks() in one streaming pass per document, with the
+    user rules compiled once (remove rules combined into a single regex).
+
+    Pass 1 walks the "\n"-terminated segments once: NFKC (only where needed),
+    dehyphenation at segment joins, splitlines, line classification and the line
+    counts that remove_repeated_lines needs. Pass 2 is a generator chain over
+    (line, kind) pairs (repeated-line drop → soft-wrap merge → remove rules → block
+    builder), so the clean text and the blocks come out together. Replace rules are
+    whole-text substitutions applied in order, so with replace rules present blocks
+    are built from the substituted text instead.
+
+    Output is identical to the multi-pass functions above, including the trailing
+    blank-line quirks of their splitlines()/"\n".join() round trips.
+    """
+
+    def __init__(self, mode: str, rules: dict):
+        self.mode = mode
+        self.remove = []
+        for pat in rules.get("remove_lines_matching", []):
+            try:
+                self.remove.append(re.compile(pat))
+            except re.error:
+                pass
+        self.remove_any = None
+        if self.remove:
+            try:
+                # numbered/named back-references would break once patterns are combined
+                if not any(re.search(r'\\[1-9]|\(\?P=', rx.pattern) for rx in self.remove):
+                    self.remove_any = re.compile("|".join(f"(?:{rx.pattern})" for rx in self.remove))
+            except re.error:
+                self.remove_any = None
+        self.replace = []
+        for r in rules.get("replace", []):
+            pat, repl = r.get("pattern"), r.get("repl","")
+            if not pat: continue
+            try:
+                self.replace.append((re.compile(pat), repl))
+            except re.error:
+                pass
+
+    # --- pass 1 ---
+    def _normalize(self, raw_md: str):
+        """
+        (text, pairs, freq) for s = dehyphenate(NFKC(raw_md)):
+        text == s, pairs == [(ln, kind) for ln in s.splitlines()], freq = line counts.
+        """
+        parts, pairs, freq = [], [], {}
+        count = self.mode == "aggressive"
+
+        def emit(chunk):
+            parts.append(chunk)
+            for ln in chunk.splitlines():
+                m = _LINE_KIND.match(ln)
+                pairs.append((ln, m.lastgroup if m else "text"))
+                if count:
+                    k = ln.strip()
+                    if 0 < len(k) <= 80:
+                        freq[k] = freq.get(k,0)+1
+
+        pending, guard = "", 0   # guard: chars before it were consumed by the previous join
+        segs = raw_md.split("\n")
+        last = len(segs) - 1
+        for n, seg in enumerate(segs):
+            if n < last:
+                seg += "\n"
+            if not seg.isascii() and not unicodedata.is_normalized("NFKC", seg):
+                seg = unicodedata.normalize("NFKC", seg)
+            if pending:
+                m = None
+                if seg and "a" <= seg[0] <= "z" and (pending.endswith("-\n") or pending.endswith("-\r\n")):
+                    m = _DEHYPHEN_TAIL.search(pending, max(guard, len(pending) - 4))
+                if m:
+                    keep = m.start() + 1
+                    pending = pending[:keep] + seg
+                    guard = keep + 1
+                    continue
+                emit(pending)
+            pending, guard = seg, 0
+        if pending:
+            emit(pending)
+        return "".join(parts), pairs, freq
+
+    # --- pass 2 stages ---
+    @staticmethod
+    def _drop_repeated(pairs, drop):
+        if not drop:
+            yield from pairs
+            return
+        held = None
+        for pair in pairs:
+            if pair[0].strip() in drop:
+                continue
+            if held is not None:
+                yield held
+            held = pair
+        if held is not None and held[0] != "":   # "\n".join(...).splitlines() loses a trailing ""
+            yield held
+
+    @staticmethod
+    def _merge_soft_wraps(pairs):
+        it = _Peek(pairs)
+        buf, merged = None, False
+        in_fence = False
+
+        def flushed():
+            # a merged line can read as a heading/list item ("1." + " step"), so re-classify it
+            return (buf, classify_line(buf)) if merged else (buf, "text")
+
+        cur = it.next()
+        while cur is not None:
+            ln, kind = cur
+            if kind == "fence":
+                if buf is not None:
+                    yield flushed(); buf = None
+                yield cur
+                in_fence = not in_fence
+            elif in_fence:
+                yield cur
+            elif "|" in ln and it.peek() is not None and TABLE_SEP.match(it.peek()[0]):
+                if buf is not None:
+                    yield flushed(); buf = None
+                yield cur
+                while it.peek() is not None and it.peek()[1] != "blank":
+                    yield it.next()
+                if it.peek() is not None:
+                    yield it.next()
+            elif kind == "heading" or kind == "item":
+                if buf is not None:
+                    yield flushed(); buf = None
+                yield cur
+            elif kind == "blank":
+                if buf is not None:
+                    yield flushed(); buf = None
+                yield ("", "blank")
+            elif buf is None:
+                buf, merged = ln.rstrip("\n"), False
+            else:
+                buf += " " + ln.strip()
+                merged = True
+            cur = it.next()
+        if buf is not None:
+            yield flushed()
+
+    def _remove_lines(self, pairs):
+        if not self.remove:
+            yield from pairs
+            return
+        matches = self.remove_any.search if self.remove_any else (lambda ln: any(rx.search(ln) for rx in self.remove))
+        tail = []   # lines after the last kept non-empty line; only these can be hit by the trailing-"" quirk
+        for pair in pairs:
+            if pair[0] != "" and not matches(pair[0]):
+                yield from (t for t in tail if not matches(t[0]))
+                tail = []
+                yield pair
+            else:
+                tail.append(pair)
+        # replay apply_user_rules' per-rule splitlines()/join on the tail
+        for rx in self.remove:
+            if tail and tail[-1][0] == "":
+                tail.pop()
+            tail = [t for t in tail if not rx.search(t[0])]
+        yield from tail
+
+    @staticmethod
+    def _splitlines_view(pairs, out):
+        """Record lines into `out` and yield the pairs of "\n".join(lines).splitlines()."""
+        held = None
+        for pair in pairs:
+            out.append(pair[0])
+            if held is not None:
+                yield held
+            held = pair
+        if held is not None and held[0] != "":
+            yield held
+
+    def run(self, raw_md: str, doc_id: str, version: str):
+        """(clean_text, blocks)"""
+        if self.mode == "lossless":
+            return raw_md, build_blocks(raw_md, doc_id, version)
+        text, pairs, freq = self._normalize(raw_md)
+        if self.mode != "aggressive":
+            return text, _build_blocks(pairs, doc_id, version)
+
+        drop = {k for k,v in freq.items() if v >= 5}
+        stream = self._remove_lines(self._merge_soft_wraps(self._drop_repeated(pairs, drop)))
+        if self.replace:
+            text = "\n".join(ln for ln, _ in stream)
+            for rx, repl in self.replace:
+                try:
+                    text = rx.sub(repl, text)
+                except re.error:
+                    pass
+            return text, build_blocks(text, doc_id, version)
+        out = []
+        blocks = _build_blocks(self._splitlines_view(stream, out), doc_id, version)
+        return "\n".join(out), blocks
+
 # ---------- Main ----------
+def clean_doc(d: Path, outroot: Path, mode: str, rules: dict):
+    """Clean one 2_docling/<DOCID> dir → clean.md + blocks.jsonl. Returns the stats row (raises on failure)."""
+    md_path, version = latest_md(d)
+    out_dir = outroot / d.name
+    out_dir.mkdir(parents=True, exist_ok=True)
+    clean_md_path = out_dir / f"{d.name}_{version}_clean.md"
+    blocks_path   = out_dir / f"{d.name}_{version}_blocks.jsonl"
+
+    raw_md = read_text_preserve_newlines(md_path)
+    cleaned, blks = CleaningEngine(mode, rules).run(raw_md, d.name, version)
+    if mode == "lossless":
+        # Byte-for-byte copy to preserve content exactly
+        raw_copy(md_path, clean_md_path)
+    else:
+        clean_md_path.write_text(cleaned, encoding="utf-8", newline="\n")
+
+    # Blocks come from the same pass (text itself is never altered by block building)
+    with open(blocks_path, "w", encoding="utf-8", newline="\n") as f:
+        for b in blks:
+            f.write(json.dumps(b, ensure_ascii=False) + "\n")
+
+    return {
+        "doc_id": d.name, "version": version,
+        "paragraphs": sum(1 for b in blks if b["block_type"]=="paragraph"),
+        "headings":   sum(1 for b in blks if b["block_type"]=="heading"),
+        "list_items": sum(1 for b in blks if b["block_type"]=="list_item"),
+        "tables":     sum(1 for b in blks if b["block_type"]=="table"),
+        "blocks":     len(blks),
+        "mode":       mode,
+        "clean_md":   str(clean_md_path),
+        "blocks_jsonl": str(blocks_path),
+        "cleaned_at": datetime.utcnow().isoformat()+"Z"
+    }
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--only", nargs="*", default=None, help="Process only these DOCIDs")
     ap.add_argument("--rebuild", action="store_true", help="Rebuild even if outputs exist")
     ap.add_argument("--mode", choices=["lossless","safe","aggressive"], default="lossless",
                     help="Cleaning mode (default: lossless — NO content changes)")
+    ap.add_argument("--workers", type=int, default=1, help="Clean documents in N processes")
+    ap.add_argument("--retries", type=int, default=1, help="Retry failed documents this many times")
     args = ap.parse_args()
 
     base = Path(__file__).resolve().parents[1]
@@ -274,54 +562,28 @@ def main():
     if args.only:
         docs = [p for p in docs if p.name in set(args.only)]
 
-    stats = []
+    todo = []
     for d in docs:
         md_path, version = latest_md(d)
         if not md_path:
             print(f"[{d.name}] No markdown found. Run Phase 1 first.", file=sys.stderr)
             continue
-
         out_dir = outroot / d.name
-        out_dir.mkdir(parents=True, exist_ok=True)
-        clean_md_path = out_dir / f"{d.name}_{version}_clean.md"
-        blocks_path   = out_dir / f"{d.name}_{version}_blocks.jsonl"
-
-        if not args.rebuild and clean_md_path.exists() and blocks_path.exists():
+        if not args.rebuild and (out_dir / f"{d.name}_{version}_clean.md").exists() \
+                and (out_dir / f"{d.name}_{version}_blocks.jsonl").exists():
             print(f"[{d.name}] Skipping (already cleaned). Use --rebuild to force.")
             continue
+        todo.append((d.name, d))
 
-        if args.mode == "lossless":
-            # Byte-for-byte copy to preserve content exactly
-            raw_copy(md_path, clean_md_path)
-            md_text_for_blocks = read_text_preserve_newlines(md_path)
-        else:
-            raw_md = read_text_preserve_newlines(md_path)
-            cleaned = clean_md_by_mode(raw_md, args.mode, rules)
-            clean_md_path.write_text(cleaned, encoding="utf-8", newline="\n")
-            md_text_for_blocks = cleaned
-
-        # Build blocks without altering text
-        blks = build_blocks(md_text_for_blocks, d.name, version)
-        with open(blocks_path, "w", encoding="utf-8", newline="\n") as f:
-            for b in blks:
-                f.write(json.dumps(b, ensure_ascii=False) + "\n")
-
-        doc_stats = {
-            "doc_id": d.name, "version": version,
-            "paragraphs": sum(1 for b in blks if b["block_type"]=="paragraph"),
-            "headings":   sum(1 for b in blks if b["block_type"]=="heading"),
-            "list_items": sum(1 for b in blks if b["block_type"]=="list_item"),
-            "tables":     sum(1 for b in blks if b["block_type"]=="table"),
-            "blocks":     len(blks),
-            "mode":       args.mode,
-            "clean_md":   str(clean_md_path),
-            "blocks_jsonl": str(blocks_path),
-            "cleaned_at": datetime.utcnow().isoformat()+"Z"
-        }
-        stats.append(doc_stats)
-        print(f"[{d.name}] mode={args.mode} → blocks={doc_stats['blocks']}")
+    results, errors = run_docs(todo, clean_doc, lambda d: (d, outroot, args.mode, rules),
+                               workers=args.workers, retries=args.retries)
+    for doc_id in sorted(results):
+        print(f"[{doc_id}] mode={args.mode} → blocks={results[doc_id]['blocks']}")
 
-    (outroot / "stats.jsonl").write_text("\n".join(json.dumps(s) for s in stats), encoding="utf-8")
+    write_manifest(outroot / "stats.jsonl", results.values())
+    if errors:
+        print(f"Failed after retries: {' '.join(sorted(errors))}", file=sys.stderr)
+        sys.exit(1)
     print("Done. Outputs in 3_clean/.")
 
 if __name__ == "__main__":
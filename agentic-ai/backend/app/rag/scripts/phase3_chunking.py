@@ -24,17 +24,152 @@ from pathlib import Path
 from datetime import datetime
 
 # ---------- tokenization ----------
-def _get_token_fn():
-    """Prefer tiktoken (accurate). Fallback to a regex tokenizer."""
+def _get_encoding():
+    """Prefer tiktoken (accurate). None → fallback regex tokenizer."""
     try:
         import tiktoken
-        enc = tiktoken.get_encoding("cl100k_base")
-        return lambda s: len(enc.encode(s))
+        return tiktoken.get_encoding("cl100k_base")
     except Exception:
-        tokre = re.compile(r"\w+|[^\w\s]", re.UNICODE)
-        return lambda s: len(tokre.findall(s))
+        return None
 
-count_tokens = _get_token_fn()
+def _get_token_fn(enc):
+    if enc is not None:
+        return lambda s: len(enc.encode(s))
+    tokre = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+    return lambda s: len(tokre.findall(s))
+
+_ENC = _get_encoding()
+count_tokens = _get_token_fn(_ENC)
+
+class IncrementalCounter:
+    """
+    Exact token counts for chunk candidates derived from per-block counts.
+
+    tiktoken splits text with its pre-token regex and runs BPE on each piece
+    independently. With the cl100k pattern a letter followed by a non-letter always
+    ends a piece, whatever surrounds it, so at such an "anchor" position p:
+        count(text) == count(text[:p]) + count(text[p:])
+    prime() cuts every block of a document at its last anchor and encodes all the
+    pieces (block heads, block tails, and the tail-separator-head junction of each
+    pair of neighbouring blocks) in one encode_ordinary_batch call. A chunk's count
+    is then a sum of memoized pieces: start() and extend() only look pieces up, and
+    only encode text prime() could not foresee (the rare block without an anchor).
+    Overlap and breadcrumb prefixes are batched the same way via prefetch().
+
+    Falls back to count_tokens() when tiktoken/regex are unavailable, the split
+    check in prime() fails, or a text could contain special tokens.
+    """
+
+    def __init__(self, enc=None, token_fn=None):
+        self.enc = enc if enc is not None else _ENC
+        self.token_fn = token_fn or count_tokens
+        self.exact = False
+        self.memo = {}
+        self.lazy = 0            # texts encoded outside a batch (for the benchmark)
+        if self.enc is not None and r"\p{L}++" in getattr(self.enc, "_pat_str", ""):
+            try:
+                import regex
+                self._first = regex.compile(r"\p{L}(?=\P{L})")
+                self._last  = regex.compile(r"(?r)\p{L}(?=\P{L})")
+                self.exact = True
+            except Exception:
+                self.exact = False
+
+    def count(self, text):
+        n = self.memo.get(text)
+        if n is None:
+            if not self.exact or "<|" in text:
+                return self.token_fn(text)
+            n = self.memo[text] = len(self.enc.encode_ordinary(text))
+            self.lazy += 1
+        return n
+
+    def prefetch(self, texts):
+        """Encode every text not memoized yet in one encode_ordinary_batch call."""
+        if not self.exact:
+            return
+        todo = [t for t in dict.fromkeys(texts) if t not in self.memo and "<|" not in t]
+        if todo:
+            for t, toks in zip(todo, self.enc.encode_ordinary_batch(todo)):
+                self.memo[t] = len(toks)
+
+    def prime(self, texts, sample=64):
+        """
+        Batch-encode the anchor pieces of a document's content blocks (in order) so
+        start()/extend() over any run of neighbouring blocks are memo lookups. A sample
+        of whole blocks rides along to check that the splits add up; otherwise fall
+        back to full re-tokenization.
+        """
+        if not self.exact:
+            return
+        texts = [t for t in texts if t and "<|" not in t]
+        pieces, checks, prev_tails = [], [], ()
+        for t in texts:
+            # a block is rstripped whenever it ends a candidate, but a buffer restarted
+            # after a flush holds it raw
+            tails = []
+            for v in dict.fromkeys((t.rstrip(), t)):
+                p = self.last_anchor(v)
+                if p:
+                    pieces += [v[:p], v[p:]]
+                    tails.append(v[p:])
+                    if len(checks) < sample:
+                        checks.append((v, p))
+                else:
+                    pieces.append(v)
+            s = t.rstrip()
+            p = self.last_anchor(s)
+            pieces += [tail + "\n\n" + (s[:p] if p else s) for tail in prev_tails]
+            prev_tails = tails
+        self.prefetch(pieces + [v for v, _ in checks])
+        for v, p in checks:
+            if self.memo[v] != self.memo[v[:p]] + self.memo[v[p:]]:
+                print("IncrementalCounter: anchor split mismatch; using full re-tokenization", file=sys.stderr)
+                self.exact = False
+                self.memo.clear()
+                return
+
+    def first_anchor(self, text):
+        m = self._first.search(text) if self.exact else None
+        return m.end() if m else None
+
+    def last_anchor(self, text, start=0):
+        m = self._last.search(text, start) if self.exact else None
+        return m.end() if m else None
+
+    def start(self, text):
+        """(tokens, anchor) for a fresh buffer; anchor = (pos, tokens before pos) or None."""
+        p = self.last_anchor(text) if "<|" not in text else None
+        if not p:
+            return self.count(text), None
+        head = self.count(text[:p])
+        return head + self.count(text[p:]), (p, head)
+
+    def extend(self, anchor, old_len, new_text):
+        """
+        Count new_text, which starts with the old buffer text (old_len chars, whose
+        last anchor is `anchor`). Returns (tokens, new anchor).
+        """
+        if anchor is None or len(new_text) < old_len or "<|" in new_text[max(0, old_len - 1):]:
+            return self.start(new_text)
+        p0, head = anchor
+        p1 = self.last_anchor(new_text, max(p0, old_len - 1))
+        if not p1 or p1 <= p0:
+            return head + self.count(new_text[p0:]), anchor
+        mid = self.count(new_text[p0:p1])
+        return head + mid + self.count(new_text[p1:]), (p1, head + mid)
+
+    def prepend_pieces(self, prefix, text):
+        """The texts prepend(prefix, text, ...) will count (for prefetch)."""
+        q = self.first_anchor(text) if "<|" not in prefix else None
+        return [prefix + text[:q], text[:q]] if q else [prefix + text]
+
+    def prepend(self, prefix, text, total):
+        """Count prefix + text, given text's own count."""
+        q = self.first_anchor(text) if "<|" not in prefix else None
+        if not q:
+            return self.count(prefix + text)
+        return self.count(prefix + text[:q]) + total - self.count(text[:q])
 
 # ---------- utils ----------
 def latest_file(dirpath: Path, suffix: str):
@@ -71,7 +206,7 @@ def breadcrumb_from(sp, depth=2, joiner=" > "):
     return joiner.join(sp[-depth:])
 
 # ---------- chunker ----------
-def build_chunks(blocks, cfg):
+def build_chunks(blocks, cfg, counter=None):
     tgt  = int(cfg.get("target_tokens", 800))
     mx   = int(cfg.get("max_tokens", 1100))
     mn   = int(cfg.get("min_tokens", 150))
@@ -79,14 +214,20 @@ def build_chunks(blocks, cfg):
     incl_headings = bool(cfg.get("include_headings_in_text", False))
     break_on_level = int(cfg.get("break_on_heading_level", 0))
 
+    pc = counter or IncrementalCounter()
+    pc.prime([b["text"] for b in blocks
+              if b["block_type"] not in ("table", "code") and (b["block_type"] != "heading" or incl_headings)])
+    pc.prefetch([b["text"] for b in blocks if b["block_type"] in ("table", "code")])
+
     chunks = []
     buf_blocks = []
     buf_text = ""
     buf_tokens = 0
+    buf_anchor = None        # (pos, tokens before pos) in buf_text, for incremental counting
     buf_start_idx = None
 
     def flush_chunk():
-        nonlocal buf_blocks, buf_text, buf_tokens, buf_start_idx
+        nonlocal buf_blocks, buf_text, buf_tokens, buf_anchor, buf_start_idx
         if not buf_blocks:
             return None
         start_bi = buf_start_idx
@@ -104,16 +245,16 @@ def build_chunks(blocks, cfg):
                           "code" if len(buf_blocks)==1 and buf_blocks[0]["block_type"]=="code" else "text")
         }
         chunks.append(ch)
-        buf_blocks, buf_text, buf_tokens, buf_start_idx = [], "", 0, None
+        buf_blocks, buf_text, buf_tokens, buf_anchor, buf_start_idx = [], "", 0, None, None
         return ch
 
     def add_content_block(b):
-        nonlocal buf_blocks, buf_text, buf_tokens, buf_start_idx
+        nonlocal buf_blocks, buf_text, buf_tokens, buf_anchor, buf_start_idx
         # tables/code are atomic
         if b["block_type"] in ("table","code"):
             flush_chunk()
             txt = b["text"]
-            tokens = count_tokens(txt)
+            tokens = pc.count(txt)
             chunks.append({
                 "_blocks": [b["block_index"]],
                 "block_start_index": b["block_index"],
@@ -129,7 +270,11 @@ def build_chunks(blocks, cfg):
 
         # paragraph/list_item
         candidate = (buf_text + ("\n\n" if buf_text else "") + b["text"]).rstrip()
-        cand_tokens = count_tokens(candidate)
+        # only the text after the buffer's last anchor is encoded (linear overall)
+        if buf_text:
+            cand_tokens, cand_anchor = pc.extend(buf_anchor, len(buf_text), candidate)
+        else:
+            cand_tokens, cand_anchor = pc.start(candidate)
         if buf_start_idx is None:
             buf_start_idx = b["block_index"]
 
@@ -138,12 +283,13 @@ def build_chunks(blocks, cfg):
             flush_chunk()
             buf_blocks = [b]
             buf_text   = b["text"]
-            buf_tokens = count_tokens(buf_text)
+            buf_tokens, buf_anchor = pc.start(buf_text)
             buf_start_idx = b["block_index"]
         else:
             buf_blocks.append(b)
             buf_text = candidate
             buf_tokens = cand_tokens
+            buf_anchor = cand_anchor
 
         # if we reached target, flush (allowing a little slack)
         if buf_tokens >= tgt:
@@ -172,22 +318,111 @@ def build_chunks(blocks, cfg):
 
     # token-overlap between consecutive text chunks (doesn't mutate originals)
     if ovlp > 0 and len(chunks) > 1:
+        texts = [ch["text"] for ch in chunks]
+        prefixes = {}
         for i in range(1, len(chunks)):
             if chunks[i]["chunk_type"] != "text":
                 continue
-            prev_text = chunks[i-1]["text"]
-            this_text = chunks[i]["text"]
+            prev_text = texts[i-1]
+            this_text = texts[i]
             # simple word-based overlap (cheap + safe)
             prev_words = prev_text.split()
             if len(prev_words) > ovlp:
                 prefix = " ".join(prev_words[-ovlp:])
                 if not this_text.startswith(prefix):
-                    chunks[i]["text"] = prefix + "\n\n" + this_text
-                    chunks[i]["token_count"] = count_tokens(chunks[i]["text"])
-                    chunks[i]["overlap_with_prev"] = ovlp
-
+                    prefixes[i] = prefix + "\n\n"
+                    texts[i] = prefix + "\n\n" + this_text
+        # texts first, counts after: every prefixed chunk is counted from one batch
+        pc.prefetch([t for i, pre in prefixes.items() for t in pc.prepend_pieces(pre, chunks[i]["text"])])
+        for i, pre in prefixes.items():
+            chunks[i]["token_count"] = pc.prepend(pre, chunks[i]["text"], chunks[i]["token_count"])
+            chunks[i]["text"] = texts[i]
+            chunks[i]["overlap_with_prev"] = ovlp
     return chunks
 
+def load_config(cfg_path: Path):
+    # defaults
+    cfg = {
+        "target_tokens": 800,
+        "max_tokens": 1100,
+        "min_tokens": 150,
+        "overlap_tokens": 80,
+        "include_headings_in_text": False,
+        "embed_with_breadcrumbs": True,
+        "breadcrumb_depth": 2,
+        "breadcrumb_joiner": " > ",
+        "break_on_heading_level": 2
+    }
+    if cfg_path.exists():
+        try:
+            cfg.update(json.loads(cfg_path.read_text(encoding="utf-8")))
+        except Exception:
+            pass
+    return cfg
+
+# ---------- finalize ----------
+def finalize_chunks(doc_id, version, chunks, cfg, counter=None):
+    """Chunk rows as written to 4_chunks/ (ids, breadcrumbs, embedding text, config)."""
+    final = []
+    if counter is not None and cfg["embed_with_breadcrumbs"]:
+        pieces = []
+        for ch in chunks:
+            bc = breadcrumb_from(ch["section_path"], cfg["breadcrumb_depth"], cfg["breadcrumb_joiner"])
+            if bc:
+                pieces += counter.prepend_pieces(f"{bc}\n\n", ch["text"])
+        counter.prefetch(pieces)
+    for i, ch in enumerate(chunks):
+        text = ch["text"]
+        sp = ch["section_path"]
+        bc = breadcrumb_from(sp, cfg["breadcrumb_depth"], cfg["breadcrumb_joiner"])
+
+        # Text used for embeddings (breadcrumbs only affect *embedding*, not visible text)
+        embedding_text = f"{bc}\n\n{text}" if (cfg["embed_with_breadcrumbs"] and bc) else text
+
+        section_key = "|".join(sp) if sp else ""
+
+        if embedding_text == text:
+            embedding_tokens = ch["token_count"]
+        elif counter is not None:
+            embedding_tokens = counter.prepend(f"{bc}\n\n", text, ch["token_count"])
+        else:
+            embedding_tokens = count_tokens(embedding_text)
+
+        chunk_meta = {
+            "chunk_id": chunk_id(doc_id, version, i, ch["block_start_index"], ch["block_end_index"], text),
+            "doc_id": doc_id,
+            "version": version,
+            "chunk_index": i,
+            "block_start_index": ch["block_start_index"],
+            "block_end_index": ch["block_end_index"],
+            "text": text,                                   # clean, visible text
+            "embedding_text": embedding_text,               # for embedding/indexing
+            "token_count": ch["token_count"],
+            "embedding_token_count": embedding_tokens,
+            "section_path": sp,
+            "breadcrumb": bc,
+            "section_group_id": section_key,                # helps fetch neighbor chunks in same section
+            "chunk_type": ch["chunk_type"],
+            "contains_table": ch["contains_table"],
+            "contains_code": ch["contains_code"],
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "config": {
+                "target_tokens": cfg["target_tokens"],
+                "max_tokens": cfg["max_tokens"],
+                "min_tokens": cfg["min_tokens"],
+                "overlap_tokens": cfg["overlap_tokens"],
+                "include_headings_in_text": cfg["include_headings_in_text"],
+                "embed_with_breadcrumbs": cfg["embed_with_breadcrumbs"],
+                "breadcrumb_depth": cfg["breadcrumb_depth"],
+                "breadcrumb_joiner": cfg["breadcrumb_joiner"],
+                "break_on_heading_level": cfg["break_on_heading_level"]
+            }
+        }
+        if "overlap_with_prev" in ch:
+            chunk_meta["overlap_with_prev"] = ch["overlap_with_prev"]
+        final.append(chunk_meta)
+    return final
+
 # ---------- main ----------
 def main():
     ap = argparse.ArgumentParser()
@@ -206,23 +441,7 @@ def main():
     cfg_path    = base / "0_phase0" / "chunking_config.json"
     out_root.mkdir(parents=True, exist_ok=True)
 
-    # defaults
-    cfg = {
-        "target_tokens": 800,
-        "max_tokens": 1100,
-        "min_tokens": 150,
-        "overlap_tokens": 80,
-        "include_headings_in_text": False,
-        "embed_with_breadcrumbs": True,
-        "breadcrumb_depth": 2,
-        "breadcrumb_joiner": " > ",
-        "break_on_heading_level": 2
-    }
-    if cfg_path.exists():
-        try:
-            cfg.update(json.loads(cfg_path.read_text(encoding="utf-8")))
-        except Exception:
-            pass
+    cfg = load_config(cfg_path)
     # CLI overrides
     if args.target  is not None: cfg["target_tokens"] = args.target
     if args.max     is not None: cfg["max_tokens"]    = args.max
@@ -257,53 +476,10 @@ def main():
             continue
 
         blocks = read_blocks_jsonl(blocks_path)
-        chunks = build_chunks(blocks, cfg)
-
-        # finalize each chunk
-        final = []
-        for i, ch in enumerate(chunks):
-            text = ch["text"]
-            sp = ch["section_path"]
-            bc = breadcrumb_from(sp, cfg["breadcrumb_depth"], cfg["breadcrumb_joiner"])
-
-            # Text used for embeddings (breadcrumbs only affect *embedding*, not visible text)
-            embedding_text = f"{bc}\n\n{text}" if (cfg["embed_with_breadcrumbs"] and bc) else text
-
-            section_key = "|".join(sp) if sp else ""
-
-            chunk_meta = {
-                "chunk_id": chunk_id(d.name, version, i, ch["block_start_index"], ch["block_end_index"], text),
-                "doc_id": d.name,
-                "version": version,
-                "chunk_index": i,
-                "block_start_index": ch["block_start_index"],
-                "block_end_index": ch["block_end_index"],
-                "text": text,                                   # clean, visible text
-                "embedding_text": embedding_text,               # for embedding/indexing
-                "token_count": ch["token_count"],
-                "embedding_token_count": count_tokens(embedding_text),
-                "section_path": sp,
-                "breadcrumb": bc,
-                "section_group_id": section_key,                # helps fetch neighbor chunks in same section
-                "chunk_type": ch["chunk_type"],
-                "contains_table": ch["contains_table"],
-                "contains_code": ch["contains_code"],
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "config": {
-                    "target_tokens": cfg["target_tokens"],
-                    "max_tokens": cfg["max_tokens"],
-                    "min_tokens": cfg["min_tokens"],
-                    "overlap_tokens": cfg["overlap_tokens"],
-                    "include_headings_in_text": cfg["include_headings_in_text"],
-                    "embed_with_breadcrumbs": cfg["embed_with_breadcrumbs"],
-                    "breadcrumb_depth": cfg["breadcrumb_depth"],
-                    "breadcrumb_joiner": cfg["breadcrumb_joiner"],
-                    "break_on_heading_level": cfg["break_on_heading_level"]
-                }
-            }
-            if "overlap_with_prev" in ch:
-                chunk_meta["overlap_with_prev"] = ch["overlap_with_prev"]
-            final.append(chunk_meta)
+        pc = IncrementalCounter()
+        chunks = build_chunks(blocks, cfg, counter=pc)
+
+        final = finalize_chunks(d.name, version, chunks, cfg, counter=pc)
 
         with open(out_chunks, "w", encoding="utf-8") as f:
             for row in final:
@@ -7,19 +7,33 @@ Inputs:
 
 Outputs:
   5_index/
-    vector.faiss                ← FAISS index (inner product, vectors L2-normalized)
+    vector.faiss                ← FAISS index (inner product, vectors L2-normalized; codes per --vector-store)
+    vectors.npy                 ← (compressed stores) original float32 vectors, mmap'd for exact re-scoring
     meta.jsonl                  ← one JSON per row in FAISS with chunk metadata
     bm25.pkl                    ← rank_bm25 BM25Okapi object
     bm25_doc_ids.json           ← list[str] mapping bm25 corpus index → chunk_id
     index_config.json           ← model + settings
     stats.json                  ← sizes, counts
+    aliases.jsonl               ← (--dedup) meta of collapsed near-duplicates, each with "alias_of"
+
+  --dedup        collapse near-duplicate chunks (MinHash/LSH over word 5-gram shingles, verified
+                 with exact Jaccard >= --dedup-threshold) into one indexed representative; the
+                 representative's meta row lists its "aliases" so retrieval can expand a hit.
+  --vector-store flat (default, float32) | fp16 | sq8 (8-bit scalar) | pq (product quantization).
+                 Compressed stores keep only the codes in RAM; search over-fetches
+                 rescore_factor x topk candidates and re-scores them exactly against
+                 vectors.npy, which the API opens with mmap (pages shared between workers).
+                 Recall@10 vs exact and bytes/vector for every store are printed and saved
+                 to stats.json "vector_store_report".
+  --incremental  reuse the stored vectors of documents whose chunk file (sha256, recorded
+                 in index_config.json "doc_sources") and embed model are unchanged; only
+                 new/changed documents are embedded. BM25 is always rebuilt (cheap).
 """
-import os, sys, json, re, pickle, hashlib
+import os, sys, json, re, pickle, hashlib, argparse, zlib
 from pathlib import Path
 from datetime import datetime
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from rank_bm25 import BM25Okapi
 
 try:
@@ -37,8 +51,36 @@ OUT_ROOT.mkdir(parents=True, exist_ok=True)
 MODEL_NAME = os.environ.get("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH", "128"))
 USE_EMBEDDING_TEXT = True  # use chunk["embedding_text"] if present; else fallback to chunk["text"]
+DEDUP_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.7"))
+DEDUP_SHINGLE   = 5      # words per shingle
+DEDUP_PERM      = 128    # MinHash permutations (= 32 LSH bands x 4 rows)
+DEDUP_BANDS     = 32
+VECTOR_STORE    = os.environ.get("RAG_VECTOR_STORE", "flat")
+RESCORE_FACTOR  = int(os.environ.get("RAG_RESCORE_FACTOR", "4"))
+PQ_SUBVECTOR_DIMS = 8    # pq: one 8-bit code per 8 dims (384-dim → 48 bytes/vector)
+STORE_TYPES = ["flat", "fp16", "sq8", "pq"]
 
 # -------------------- io helpers --------------------
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def doc_sources(chunks_root: Path):
+    """{doc_id: {"files": [...], "sha256": ...}} over the chunk files load_all_chunks reads."""
+    files = {}
+    for fp in sorted(chunks_root.glob("DOC*/*_chunks.jsonl")):
+        files.setdefault(fp.parent.name, []).append(fp)
+    out = {}
+    for doc_id, fps in files.items():
+        h = hashlib.sha256()
+        for fp in fps:
+            h.update(fp.name.encode("utf-8") + b"\0" + sha256_file(fp).encode("ascii"))
+        out[doc_id] = {"files": [fp.name for fp in fps], "sha256": h.hexdigest()}
+    return out
+
 def load_all_chunks(chunks_root: Path):
     files = sorted(chunks_root.glob("DOC*/*_chunks.jsonl"))
     if not files:
@@ -67,51 +109,269 @@ def tokenize_for_bm25(text: str):
     # simple, robust tokenizer
     return re.findall(r"[A-Za-z0-9_]+", text.lower())
 
+# -------------------- near-duplicates --------------------
+def shingles(text: str, k: int = DEDUP_SHINGLE):
+    words = tokenize_for_bm25(text)
+    return {" ".join(words[i:i+k]) for i in range(max(1, len(words) - k + 1))} if words else set()
+
+def minhash_signatures(shingle_sets, num_perm: int = DEDUP_PERM, seed: int = 1):
+    """(n, num_perm) uint64 MinHash signatures; (a*x + b) mod (2^61 - 1) over crc32 shingle hashes."""
+    prime = np.uint64((1 << 61) - 1)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+    sigs = np.full((len(shingle_sets), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for i, sh in enumerate(shingle_sets):
+        if not sh:
+            continue
+        x = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in sh), dtype=np.uint64, count=len(sh))
+        sigs[i] = ((np.outer(x, a) + b) % prime).min(axis=0)
+    return sigs
+
+def near_duplicate_clusters(texts, sizes, threshold: float = DEDUP_THRESHOLD, bands: int = DEDUP_BANDS):
+    """
+    {representative index: [alias indices]} for chunks with Jaccard >= threshold.
+    LSH banding proposes candidate pairs, exact shingle Jaccard confirms them. Clusters are
+    built greedily around representatives (largest chunk first) so similarity never chains.
+    """
+    sets = [shingles(t) for t in texts]
+    sigs = minhash_signatures(sets)
+    rows_per_band = sigs.shape[1] // bands
+    cand = {}
+    for bnd in range(bands):
+        buckets = {}
+        for i in range(len(sets)):
+            if sets[i]:
+                key = sigs[i, bnd*rows_per_band:(bnd+1)*rows_per_band].tobytes()
+                buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for x in members:
+                for y in members:
+                    if x != y:
+                        cand.setdefault(x, set()).add(y)
+
+    clusters, assigned = {}, set()
+    for i in sorted(range(len(sets)), key=lambda i: (-sizes[i], i)):
+        if i in assigned:
+            continue
+        assigned.add(i)
+        for j in sorted(cand.get(i, ())):
+            if j not in assigned and len(sets[i] & sets[j]) / len(sets[i] | sets[j]) >= threshold:
+                clusters.setdefault(i, []).append(j)
+                assigned.add(j)
+    return clusters
+
+def meta_row(r):
+    return {
+        "chunk_id": r["chunk_id"],
+        "doc_id": r["doc_id"],
+        "version": r.get("version",""),
+        "section_path": r["section_path"],
+        "breadcrumb": r.get("breadcrumb",""),
+        "section_group_id": r.get("section_group_id",""),
+        "chunk_type": r.get("chunk_type","text"),
+        "token_count": r.get("token_count", 0)
+    }
+
+# -------------------- vector stores --------------------
+def build_vector_index(vecs: np.ndarray, store: str):
+    """FAISS inner-product index holding `vecs` as float32 / fp16 / 8-bit scalar / PQ codes."""
+    n, dim = vecs.shape
+    if store == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif store in ("fp16", "sq8"):
+        qt = faiss.ScalarQuantizer.QT_fp16 if store == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(dim, qt, faiss.METRIC_INNER_PRODUCT)
+    elif store == "pq":
+        m = dim // PQ_SUBVECTOR_DIMS if dim % PQ_SUBVECTOR_DIMS == 0 else 1
+        nbits = 8 if n >= 256 else max(1, n.bit_length() - 1)  # k-means needs >= 2^nbits points
+        index = faiss.IndexPQ(dim, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        index.pq.cp.min_points_per_centroid = 1   # small corpora: train anyway, without the warning
+    else:
+        raise ValueError(f"unknown vector store: {store}")
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = vecs if n <= 50_000 else vecs[np.sort(rng.choice(n, 50_000, replace=False))]
+        index.train(sample)
+    index.add(vecs)
+    return index
+
+def index_bytes(index) -> int:
+    """Resident size of a FAISS index (its serialized size: codes + codebooks)."""
+    return int(faiss.serialize_index(index).size)
+
+def rescored_search(index, vecs: np.ndarray, qv: np.ndarray, topk: int, factor: int):
+    """Over-fetch factor*topk candidates from `index`, re-rank them by exact inner product."""
+    k2 = min(index.ntotal, topk * factor)
+    _, idxs = index.search(qv, k2)
+    out = np.full((len(qv), topk), -1, dtype="int64")
+    for qi in range(len(qv)):
+        cand = idxs[qi][idxs[qi] >= 0]
+        exact = vecs[cand] @ qv[qi]
+        order = np.argsort(-exact, kind="stable")[:topk]
+        out[qi, :len(order)] = cand[order]
+    return out
+
+def vector_store_report(vecs: np.ndarray, k: int = 10, queries: int = 200, factor: int = RESCORE_FACTOR):
+    """
+    Recall@k vs exact search, with and without re-scoring, and RAM per store type.
+    Queries are a sample of the indexed vectors themselves, so recall measures how well
+    each chunk's exact neighbourhood survives compression.
+    """
+    n = len(vecs)
+    rng = np.random.default_rng(0)
+    qv = vecs[np.sort(rng.choice(n, min(queries, n), replace=False))]
+    k = min(k, n)
+    _, truth = build_vector_index(vecs, "flat").search(qv, k)
+    def recall(found):
+        return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())]))
+    report = {}
+    for store in STORE_TYPES:
+        index = build_vector_index(vecs, store)
+        _, approx = index.search(qv, k)
+        size = index_bytes(index)
+        report[store] = {
+            "ram_bytes": size,
+            "bytes_per_vector": round(size / n, 1),
+            "k": k,
+            "recall": round(recall(approx), 4),
+            "recall_rescored": 1.0 if store == "flat" else round(recall(rescored_search(index, vecs, qv, k, factor)), 4),
+        }
+    return report
+
+def load_previous_vectors(out_root: Path):
+    """(index_config, {chunk_id: vector}) of the existing index, or (None, {})."""
+    try:
+        cfg = json.loads((out_root / "index_config.json").read_text(encoding="utf-8"))
+        meta = [json.loads(l) for l in (out_root / "meta.jsonl").read_text(encoding="utf-8").splitlines() if l.strip()]
+        rescore = (cfg.get("vector_store") or {}).get("rescore_vectors")
+        if rescore and (out_root / rescore).exists():
+            vecs = np.load(out_root / rescore)   # originals: compressed codes would lose precision
+        else:
+            index = faiss.read_index(str(out_root / "vector.faiss"))
+            if (cfg.get("vector_store") or {}).get("type", "flat") != "flat":
+                return None, {}
+            vecs = index.reconstruct_n(0, index.ntotal)
+    except Exception:
+        return None, {}
+    if len(vecs) != len(meta):
+        return None, {}
+    return cfg, {m["chunk_id"]: vecs[i] for i, m in enumerate(meta)}
+
 # -------------------- main build --------------------
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incremental", action="store_true",
+                    help="Re-embed only documents whose chunk file or embed model changed")
+    ap.add_argument("--dedup", action="store_true", help="Collapse near-duplicate chunks before indexing")
+    ap.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, help="Jaccard threshold (word 5-grams)")
+    ap.add_argument("--vector-store", choices=STORE_TYPES, default=VECTOR_STORE,
+                    help="How vectors are held in the FAISS index (compressed stores re-score from vectors.npy)")
+    ap.add_argument("--rescore-factor", type=int, default=RESCORE_FACTOR,
+                    help="Candidates fetched per requested hit before exact re-scoring")
+    ap.add_argument("--no-store-report", action="store_true", help="Skip the recall-vs-memory comparison")
+    args = ap.parse_args()
+
     print("Loading chunks...")
     rows = load_all_chunks(CHUNKS_ROOT)
     print(f"  loaded {len(rows)} chunks")
+    sources = doc_sources(CHUNKS_ROOT)
+
+    # --- near-duplicate collapse (index one representative, keep the rest as aliases) ---
+    alias_rows, dedup = [], None
+    if args.dedup:
+        clusters = near_duplicate_clusters([r["text"] for r in rows], [r.get("token_count", 0) for r in rows],
+                                           threshold=args.dedup_threshold)
+        drop = set()
+        for rep, members in clusters.items():
+            rows[rep]["aliases"] = [rows[j]["chunk_id"] for j in members]
+            for j in members:
+                alias_rows.append({**meta_row(rows[j]), "alias_of": rows[rep]["chunk_id"]})
+                drop.add(j)
+        rows = [r for i, r in enumerate(rows) if i not in drop]
+        dedup = {"threshold": args.dedup_threshold, "shingle_words": DEDUP_SHINGLE, "num_perm": DEDUP_PERM,
+                 "clusters": len(clusters), "collapsed": len(drop)}
+        print(f"  dedup: {len(drop)} near-duplicates collapsed into {len(clusters)} representatives "
+              f"(Jaccard >= {args.dedup_threshold}) → {len(rows)} indexed")
 
     # choose field to embed and to index by BM25
     embed_texts = [(r.get("embedding_text") if USE_EMBEDDING_TEXT and r.get("embedding_text") else r["text"]) for r in rows]
     bm25_texts  = embed_texts  # breadcrumbs help lexical too
 
+    # --- reuse vectors of unchanged documents ---
+    reused = {}
+    if args.incremental:
+        prev_cfg, prev_vecs = load_previous_vectors(OUT_ROOT)
+        if prev_cfg and prev_cfg.get("model_name") == MODEL_NAME and prev_cfg.get("use_embedding_text") == USE_EMBEDDING_TEXT:
+            prev_src = prev_cfg.get("doc_sources", {})
+            same = {d for d, src in sources.items() if prev_src.get(d, {}).get("sha256") == src["sha256"]}
+            reused = {i: prev_vecs[r["chunk_id"]] for i, r in enumerate(rows)
+                      if r["doc_id"] in same and r["chunk_id"] in prev_vecs}
+            print(f"  incremental: {len(same)}/{len(sources)} docs unchanged, reusing {len(reused)} vectors")
+        else:
+            print("  incremental: no compatible previous index (model/config changed) → full build")
+    todo = [i for i in range(len(rows)) if i not in reused]
+
     # --- embeddings ---
-    print(f"Loading embedding model: {MODEL_NAME}")
-    model = SentenceTransformer(MODEL_NAME)
-    dim = model.get_sentence_embedding_dimension()
+    model, dim = None, None
+    if todo or not reused:
+        print(f"Loading embedding model: {MODEL_NAME}")
+        from sentence_transformers import SentenceTransformer  # only when something needs embedding
+        model = SentenceTransformer(MODEL_NAME)
+        dim = model.get_sentence_embedding_dimension()
+    else:
+        dim = len(next(iter(reused.values())))
     print(f"  embedding dim = {dim}")
 
-    vecs = []
-    for i in range(0, len(embed_texts), BATCH_SIZE):
-        batch = embed_texts[i:i+BATCH_SIZE]
-        emb = model.encode(batch, show_progress_bar=True, normalize_embeddings=True)  # cosine via inner product
-        vecs.append(emb.astype("float32"))
-    vecs = np.vstack(vecs)  # shape (N, dim)
+    vecs = np.zeros((len(rows), dim), dtype="float32")
+    for i, v in reused.items():
+        vecs[i] = v
+    for s in range(0, len(todo), BATCH_SIZE):
+        batch = todo[s:s+BATCH_SIZE]
+        emb = model.encode([embed_texts[i] for i in batch], show_progress_bar=True, normalize_embeddings=True)  # cosine via inner product
+        vecs[batch] = emb.astype("float32")
+    print(f"  embedded {len(todo)} chunks")
 
     # sanity
     assert vecs.shape[0] == len(rows), "vector count ≠ rows"
 
     # FAISS index (IP with normalized vectors == cosine similarity)
-    index = faiss.IndexFlatIP(dim)
-    index.add(vecs)
+    index = build_vector_index(vecs, args.vector_store)
     faiss.write_index(index, str(OUT_ROOT / "vector.faiss"))
+    store = {"type": args.vector_store, "ram_bytes": index_bytes(index), "rescore_vectors": None}
+    rescore_path = OUT_ROOT / "vectors.npy"
+    if args.vector_store != "flat":
+        np.save(rescore_path, vecs)
+        store.update(rescore_vectors=rescore_path.name, rescore_factor=args.rescore_factor)
+    elif rescore_path.exists():
+        rescore_path.unlink()
+    print(f"  vector store: {args.vector_store}, {store['ram_bytes']/1024:.1f} KiB in RAM "
+          f"({store['ram_bytes']/max(1, len(rows)):.0f} B/vector)")
+
+    store_report = None
+    if not args.no_store_report and len(rows):
+        store_report = vector_store_report(vecs, factor=args.rescore_factor)
+        print(f"  {'store':<6} {'B/vector':>9} {'recall@10':>10} {'rescored':>9}")
+        for name, r in store_report.items():
+            print(f"  {name:<6} {r['bytes_per_vector']:>9.1f} {r['recall']:>10.4f} {r['recall_rescored']:>9.4f}")
 
     # persist meta in SAME ORDER as added to FAISS
     meta_path = OUT_ROOT / "meta.jsonl"
     with meta_path.open("w", encoding="utf-8") as f:
         for r in rows:
-            f.write(json.dumps({
-                "chunk_id": r["chunk_id"],
-                "doc_id": r["doc_id"],
-                "version": r.get("version",""),
-                "section_path": r["section_path"],
-                "breadcrumb": r.get("breadcrumb",""),
-                "section_group_id": r.get("section_group_id",""),
-                "chunk_type": r.get("chunk_type","text"),
-                "token_count": r.get("token_count", 0)
-            }, ensure_ascii=False) + "\n")
+            m = meta_row(r)
+            if r.get("aliases"):
+                m["aliases"] = r["aliases"]
+            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+
+    # collapsed near-duplicates (not in FAISS/BM25; resolvable from their representative)
+    alias_path = OUT_ROOT / "aliases.jsonl"
+    if alias_rows:
+        with alias_path.open("w", encoding="utf-8") as f:
+            for m in alias_rows:
+                f.write(json.dumps(m, ensure_ascii=False) + "\n")
+    elif alias_path.exists():
+        alias_path.unlink()
 
     # BM25
     print("Building BM25...")
@@ -129,16 +389,25 @@ def main():
         "vec_dim": dim,
         "normalize_vectors": True,
         "use_embedding_text": USE_EMBEDDING_TEXT,
+        "doc_sources": sources,
+        "dedup": dedup,
+        "vector_store": store,
         "built_at": datetime.utcnow().isoformat()+"Z"
     }
     (OUT_ROOT / "index_config.json").write_text(json.dumps(cfg, indent=2), encoding="utf-8")
 
     stats = {
         "chunks": len(rows),
+        "collapsed": len(alias_rows),
+        "embedded": len(todo),
+        "reused": len(reused),
         "vec_dim": dim,
         "faiss_index": "vector.faiss",
         "bm25": "bm25.pkl",
-        "meta": "meta.jsonl"
+        "meta": "meta.jsonl",
+        "dedup": dedup,
+        "vector_store": store,
+        "vector_store_report": store_report
     }
     (OUT_ROOT / "stats.json").write_text(json.dumps(stats, indent=2), encoding="utf-8")
     print("Done. Index written to 5_index/")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+r"""
+RAG ingestion pipeline runner (content-addressed, incremental)
+
+Runs phase1 → phase2 → phase3 → phase4 only where something changed. Every
+(document, stage) gets an input key that chains the upstream key with the
+stage's own inputs:
+
+  docling : PDF sha256 (corpus_registry.csv checksum) + version
+  clean   : docling key + cleaning_rules.json + --mode
+  chunk   : clean key   + chunking_config.json
+  index   : all chunk keys + embed model (RAG_EMBED_MODEL) + --dedup + RAG_VECTOR_STORE
+
+A stage re-runs for a document when its key differs from the one recorded in
+pipeline_state.json or its outputs are missing; downstream stages follow
+automatically because their keys include the upstream key. Stages run as the
+existing phase scripts (--only <stale docs> --rebuild); the index is updated
+with phase4 --incremental (only changed documents are re-embedded).
+
+Usage (Windows CMD):
+  python scripts\pipeline.py                 # run stale stages
+  python scripts\pipeline.py --dry-run       # show the plan only
+  python scripts\pipeline.py --only DOC04
+  python scripts\pipeline.py --workers 4      # fan out phase1/phase2 per document
+  python scripts\pipeline.py --force chunk   # treat a stage (and downstream) as stale
+  python scripts\pipeline.py --adopt         # record existing outputs as up to date (first use)
+"""
+import argparse, sys, os, json, csv, hashlib, subprocess, time
+from pathlib import Path
+from datetime import datetime
+
+BASE    = Path(__file__).resolve().parents[1]
+SCRIPTS = Path(__file__).resolve().parent
+PHASE0  = BASE / "0_phase0"
+STATE   = BASE / "pipeline_state.json"
+
+STAGES = ["docling", "clean", "chunk"]   # per document; "index" is global
+SCRIPT = {
+    "docling": "phase1_docling_ingest.py",
+    "clean":   "phase2_clean_pipeline.py",
+    "chunk":   "phase3_chunking.py",
+    "index":   "phase4_build_index.py",
+}
+EMBED_MODEL = os.environ.get("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+VECTOR_STORE = os.environ.get("RAG_VECTOR_STORE", "flat")   # read by phase4 as its --vector-store default
+
+# ---------- hashing ----------
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_digest(path: Path) -> str:
+    return sha256_file(path) if path.exists() else "missing"
+
+def key_of(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8") + b"\0")
+    return h.hexdigest()[:16]
+
+# ---------- registry / outputs ----------
+def read_registry(path: Path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [r for r in csv.DictReader(f) if str(r.get("is_current", "true")).lower() in ("true", "1", "yes")]
+
+def outputs(stage: str, doc_id: str, version: str):
+    if stage == "docling":
+        d = BASE / "2_docling" / doc_id
+        return [d / f"{doc_id}_{version}.md", d / f"{doc_id}_{version}.json"]
+    if stage == "clean":
+        d = BASE / "3_clean" / doc_id
+        return [d / f"{doc_id}_{version}_clean.md", d / f"{doc_id}_{version}_blocks.jsonl"]
+    if stage == "chunk":
+        return [BASE / "4_chunks" / doc_id / f"{doc_id}_{version}_chunks.jsonl"]
+    return [BASE / "5_index" / n for n in ("vector.faiss", "meta.jsonl", "bm25.pkl", "index_config.json")]
+
+def compute_keys(rows, mode: str):
+    """{doc_id: {"version", "docling", "clean", "chunk"}}"""
+    rules = file_digest(PHASE0 / "cleaning_rules.json")
+    chunk_cfg = file_digest(PHASE0 / "chunking_config.json")
+    keys = {}
+    for r in rows:
+        doc_id, version = r["doc_id"], r.get("version", "")
+        pdf = BASE / r["filename"]
+        checksum = r.get("checksum") or (sha256_file(pdf) if pdf.exists() else "missing")
+        k = {"version": version, "docling": key_of("docling", checksum, version)}
+        k["clean"] = key_of("clean", k["docling"], rules, mode)
+        k["chunk"] = key_of("chunk", k["clean"], chunk_cfg)
+        keys[doc_id] = k
+    return keys
+
+def index_key_of(state, opts: str = "") -> str:
+    """The index is built from whatever chunks are on disk, i.e. the recorded chunk keys."""
+    docs = state["docs"]
+    return key_of("index", EMBED_MODEL, VECTOR_STORE, opts, *(f"{d}:{docs[d].get('chunk')}" for d in sorted(docs)))
+
+# ---------- state ----------
+def load_state():
+    if STATE.exists():
+        try:
+            return json.loads(STATE.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    return {"docs": {}, "index": None}
+
+def save_state(state):
+    tmp = STATE.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(STATE)
+
+def plan(keys, state, force=None, index_opts=""):
+    """Stale docs per stage, and whether the index must be updated."""
+    forced = STAGES.index(force) if force in STAGES else (len(STAGES) if force == "index" else None)
+    stale = {s: [] for s in STAGES}
+    for doc_id, k in keys.items():
+        rec = state["docs"].get(doc_id, {})
+        for i, s in enumerate(STAGES):
+            if (forced is not None and i >= forced) or rec.get(s) != k[s] \
+                    or not all(p.exists() for p in outputs(s, doc_id, k["version"])):
+                stale[s].append(doc_id)
+    index_stale = force is not None or any(stale["chunk"]) or state.get("index") != index_key_of(state, index_opts) \
+        or not all(p.exists() for p in outputs("index", "", ""))
+    return stale, index_stale
+
+# ---------- run ----------
+def run_stage(stage: str, extra):
+    cmd = [sys.executable, str(SCRIPTS / SCRIPT[stage])] + extra
+    print(f"\n=== {stage}: {' '.join(cmd[1:])}")
+    t0 = time.perf_counter()
+    rc = subprocess.call(cmd, cwd=str(BASE))
+    return rc, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--only", nargs="*", default=None, help="Limit to these DOCIDs")
+    ap.add_argument("--mode", choices=["lossless", "safe", "aggressive"], default="lossless",
+                    help="Phase 2 cleaning mode (part of the clean key)")
+    ap.add_argument("--force", choices=STAGES + ["index"], default=None,
+                    help="Treat this stage and everything downstream as stale")
+    ap.add_argument("--workers", type=int, default=1, help="Processes for the docling/clean stages")
+    ap.add_argument("--dedup", action="store_true", help="Collapse near-duplicate chunks in the index (phase4 --dedup)")
+    ap.add_argument("--dry-run", action="store_true", help="Print the plan and exit")
+    ap.add_argument("--adopt", action="store_true",
+                    help="Record current keys for docs whose outputs exist, without running anything")
+    args = ap.parse_args()
+
+    registry = PHASE0 / "corpus_registry.csv"
+    if not registry.exists():
+        print("Registry not found at", registry, file=sys.stderr)
+        sys.exit(1)
+    rows = read_registry(registry)
+    if args.only:
+        rows = [r for r in rows if r["doc_id"] in set(args.only)]
+
+    keys = compute_keys(rows, args.mode)
+    index_args = ["--incremental"] + (["--dedup"] if args.dedup else [])
+    index_opts = " ".join(index_args[1:])
+    state = load_state()
+
+    if args.adopt:
+        for doc_id, k in keys.items():
+            rec = state["docs"].setdefault(doc_id, {})
+            for s in STAGES:
+                if all(p.exists() for p in outputs(s, doc_id, k["version"])):
+                    rec[s] = k[s]
+        if all(p.exists() for p in outputs("index", "", "")):
+            state["index"] = index_key_of(state, index_opts)
+        save_state(state)
+        print(f"Adopted existing outputs for {len(keys)} docs → {STATE.name}")
+        return
+
+    stale, index_stale = plan(keys, state, args.force, index_opts)
+    print("Plan:")
+    for s in STAGES:
+        print(f"  {s:<8}: {' '.join(stale[s]) or '-'}")
+    print(f"  {'index':<8}: {'update' if index_stale else '-'}")
+    if args.dry_run:
+        return
+
+    report = []
+    failed = set()
+    for s in STAGES:
+        docs = [d for d in stale[s] if d not in failed]
+        if not docs:
+            report.append({"stage": s, "docs": [], "seconds": 0.0, "status": "fresh"})
+            continue
+        extra = ["--only", *docs, "--rebuild"] + (["--mode", args.mode] if s == "clean" else [])
+        if s in ("docling", "clean") and args.workers > 1:
+            extra += ["--workers", str(args.workers)]
+        t_start = time.time()
+        rc, secs = run_stage(s, extra)
+        ok = []
+        for d in docs:
+            outs = outputs(s, d, keys[d]["version"])
+            if rc == 0 and all(p.exists() and p.stat().st_mtime >= t_start - 1 for p in outs):
+                state["docs"].setdefault(d, {})[s] = keys[d][s]
+                ok.append(d)
+            else:
+                failed.add(d)
+                state["docs"].setdefault(d, {}).pop(s, None)
+        save_state(state)
+        report.append({"stage": s, "docs": docs, "seconds": round(secs, 2),
+                       "status": "ok" if len(ok) == len(docs) else f"failed: {' '.join(sorted(set(docs) - set(ok)))}"})
+
+    if index_stale:
+        if failed:
+            print(f"\nSkipping index update: upstream failures for {' '.join(sorted(failed))}", file=sys.stderr)
+            report.append({"stage": "index", "docs": [], "seconds": 0.0, "status": "skipped"})
+        else:
+            rc, secs = run_stage("index", index_args)
+            if rc == 0:
+                state["index"] = index_key_of(state, index_opts)
+            if rc != 0:
+                failed.add("index")
+            report.append({"stage": "index", "docs": ["*"], "seconds": round(secs, 2), "status": "ok" if rc == 0 else f"failed ({rc})"})
+    else:
+        report.append({"stage": "index", "docs": [], "seconds": 0.0, "status": "fresh"})
+
+    state["last_run"] = {"at": datetime.utcnow().isoformat() + "Z", "stages": report}
+    save_state(state)
+
+    print("\nStage timings:")
+    print(f"  {'stage':<8} {'docs':>5} {'seconds':>9}  status")
+    for r in report:
+        print(f"  {r['stage']:<8} {len(r['docs']):>5} {r['seconds']:>9.2f}  {r['status']}")
+    print(f"  {'total':<8} {'':>5} {sum(r['seconds'] for r in report):>9.2f}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
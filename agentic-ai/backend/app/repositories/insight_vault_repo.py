@@ -8,9 +8,13 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import TypeAdapter
 
 from app.core.settings import settings
+from app.core.singleflight import SingleFlight
 from app.db.init_db import INSIGHT_VAULT
 from app.models.insights import InsightBatch, Insight, InsightAnswer
 
+# concurrent loads of the same vault version share one query + validation (results are read-only)
+_BATCHES_FLIGHT = SingleFlight("insight_vault")
+
 
 class InsightVaultRepo:
     """
@@ -26,11 +30,13 @@ class InsightVaultRepo:
     # ---------- Basic reads ----------
 
     async def list_active_batches(self) -> List[InsightBatch]:
-        cur = self.col.find({"vaultVersion": self.version, "isActive": True})
-        docs = await cur.to_list(None)
-        # Validate/normalize via Pydantic
-        adapter = TypeAdapter(List[InsightBatch])
-        return adapter.validate_python(docs)
+        async def load():
+            cur = self.col.find({"vaultVersion": self.version, "isActive": True})
+            docs = await cur.to_list(None)
+            # Validate/normalize via Pydantic
+            adapter = TypeAdapter(List[InsightBatch])
+            return adapter.validate_python(docs)
+        return list(await _BATCHES_FLIGHT.do((self.db.name, self.version), load))
 
     async def get_batch(self, batchId: str) -> Optional[InsightBatch]:
         doc = await self.col.find_one(
@@ -0,0 +1,16 @@
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.db.init_db import LLM_CACHE
+
+async def get_cached_response(db: AsyncIOMotorDatabase, key: str) -> dict | None:
+    # TTL deletion runs about once a minute, so check expiry here as well
+    return await db[LLM_CACHE].find_one({"key": key, "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0})
+
+async def put_cached_response(db: AsyncIOMotorDatabase, key: str, kind: str, model: str, response: dict, ttl_s: int):
+    now = datetime.utcnow()
+    await db[LLM_CACHE].update_one(
+        {"key": key},
+        {"$set": {"kind": kind, "model": model, "response": response,
+                  "created_at": now, "expires_at": now + timedelta(seconds=ttl_s)}},
+        upsert=True,
+    )
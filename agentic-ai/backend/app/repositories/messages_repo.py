@@ -47,6 +47,31 @@ async def list_messages(db: AsyncIOMotorDatabase, user_id: str, chat_id: str) ->
         out.append(m)
     return out
 
+async def get_last_assistant_context(db: AsyncIOMotorDatabase, user_id: str, chat_id: str) -> Dict[str, Optional[dict]]:
+    """
+    One round trip for what a turn needs to know about the assistant's previous messages:
+      "last":       the most recent assistant message (content + enc_question), or None
+      "actionable": the most recent one the user may be answering (an encouragement question
+                    or a survey; surveyType + enc_question), or None
+    """
+    cur = db[MESSAGES].aggregate([
+        {"$match": {"chat_id": ObjectId(chat_id), "user_id": ObjectId(user_id), "role": "assistant"}},
+        {"$sort": {"created_at": -1}},
+        {"$facet": {
+            "last": [{"$limit": 1}, {"$project": {"content": 1, "enc_question": 1}}],
+            "actionable": [
+                {"$match": {"$or": [
+                    {"enc_question": {"$exists": True, "$ne": ""}},
+                    {"surveyType": {"$exists": True, "$ne": None}},
+                ]}},
+                {"$limit": 1},
+                {"$project": {"surveyType": 1, "enc_question": 1, "created_at": 1}},
+            ],
+        }},
+    ])
+    res = (await cur.to_list(1) or [{}])[0]
+    return {k: (res.get(k) or [None])[0] for k in ("last", "actionable")}
+
 def _bsonify(obj):
     # Convert Pydantic models (and any nested structures) to plain JSON-like values
     if isinstance(obj, BaseModel):
@@ -99,6 +124,8 @@ async def insert_message(
     blocks: object | None = None,
     sources: object | None = None,
     scope_label: str | None = None,
+    validation: str | None = None,
+    usage: dict | None = None,
 ):
     doc = {
         "user_id": ObjectId(user_id),
@@ -127,6 +154,12 @@ async def insert_message(
     if scope_label is not None:
         doc["scope_label"] = scope_label
 
+    if validation is not None:
+        doc["validation"] = validation   # "pending" while background validation runs
+
+    if usage is not None:
+        doc["usage"] = usage             # per-turn LLM tokens / cost / time (not sent to the frontend)
+
     res = await db[MESSAGES].insert_one(doc)
     # print("Inserted message ID:", res)
     return str(res.inserted_id)
@@ -175,4 +208,35 @@ async def update_insight_survey_message_with_submission_by_id(
 
     res = await db[MESSAGES].update_one(filt, update)
     # Treat a matched-but-not-modified case (same payload) as success
-    return res.matched_count == 1
\ No newline at end of file
+    return res.matched_count == 1
+
+async def set_message_validation(
+    db: AsyncIOMotorDatabase,
+    *,
+    user_id: str,
+    chat_id: str,
+    msg_id: str,
+    status: Literal["passed", "revised", "failed"],
+    content: str | None = None,
+) -> bool:
+    """
+    Records the outcome of background validation on an assistant message.
+    When the validator produced a revision, the stored content is replaced
+    (the original draft is kept under draft_content).
+    """
+    filt = {
+        "_id": ObjectId(msg_id),
+        "user_id": ObjectId(user_id),
+        "chat_id": ObjectId(chat_id),
+        "role": "assistant",
+    }
+    update: Dict[str, Any] = {"$set": {"validation": status, "updated_at": datetime.utcnow()}}
+    if content is not None:
+        doc = await db[MESSAGES].find_one(filt, projection={"content": 1})
+        if not doc:
+            return False
+        update["$set"]["content"] = content
+        update["$set"]["draft_content"] = doc.get("content", "")
+
+    res = await db[MESSAGES].update_one(filt, update)
+    return res.matched_count == 1
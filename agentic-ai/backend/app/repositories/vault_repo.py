@@ -2,13 +2,22 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.db.init_db import SEGMENT_VAULT, CONFIG
 from app.models.vault import SegmentVaultVersion
 from typing import List, Dict, Any, Optional
+from app.core.singleflight import SingleFlight
+
+# concurrent identical vault reads share one round trip (results are read-only)
+_VAULT_FLIGHT = SingleFlight("vault")
 
 async def get_active_vault_version(db: AsyncIOMotorDatabase) -> str | None:
-    cfg = await db[CONFIG].find_one({"_id": "segment_vault"})
-    return cfg.get("latest_version") if cfg else None
+    async def load():
+        cfg = await db[CONFIG].find_one({"_id": "segment_vault"})
+        return cfg.get("latest_version") if cfg else None
+    return await _VAULT_FLIGHT.do((db.name, "active_version"), load)
 
 async def get_vault_by_version(db: AsyncIOMotorDatabase, version: str) -> dict | None:
-    return await db[SEGMENT_VAULT].find_one({"vault_version": version}, {"_id": 0})
+    return await _VAULT_FLIGHT.do(
+        (db.name, "vault", version),
+        lambda: db[SEGMENT_VAULT].find_one({"vault_version": version}, {"_id": 0}),
+    )
 
 async def set_active_vault(db: AsyncIOMotorDatabase, version: str) -> None:
     await db[CONFIG].update_one({"_id": "segment_vault"},
@@ -0,0 +1,108 @@
+# app/services/gate_classifier.py
+# Local tier of the C05 decision gate: a linear model (logistic regression, or a calibrated
+# nearest-centroid direction) over the MiniLM embedding the RAG index already loaded.
+# Fitted offline by scripts/train_gate_classifier.py from logged LLM gate verdicts.
+# Confident in-scope cases (GATE_CLASSIFIER_MIN_CONFIDENCE) are decided here in ~1 ms; the
+# rest, and every out-of-scope verdict, go to the LLM gate (app/core/routing.py "local" tier).
+# LLM verdicts are logged as training rows in "shadow" and "on" mode; in "on" mode the rows
+# cover only what the classifier deferred, i.e. the cases it still gets wrong or is unsure of.
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.core.settings import settings
+from app.rag.engine.config import IDX
+
+MODE = settings.GATE_CLASSIFIER_MODE.lower()
+MODEL_PATH = Path(settings.GATE_CLASSIFIER_MODEL or str(IDX / "gate_classifier.json"))
+LOG_PATH = settings.GATE_CLASSIFIER_LOG or (str(IDX / "gate_log.jsonl") if MODE != "off" else "")
+
+_MODEL: Optional[Dict[str, Any]] = None
+_LOADED = False
+
+
+def gate_text(user_msg: str, prev_enc: str = "") -> str:
+    """
+    What gets embedded: a short reply ("python", "yes") is only in scope given the question
+    it answers, so the previous encouragement question is prepended when there is one.
+    Keep in sync with scripts/train_gate_classifier.py (it imports this).
+    """
+    user_msg = (user_msg or "").strip()
+    prev_enc = (prev_enc or "").strip()
+    return f"Q: {prev_enc}\nA: {user_msg}" if prev_enc else user_msg
+
+
+def load_gate_model() -> Optional[Dict[str, Any]]:
+    """{"kind", "embed_model", "dim", "weights", "bias", ...} or None when no model has been fitted."""
+    global _MODEL, _LOADED
+    if not _LOADED:
+        _LOADED = True
+        if MODEL_PATH.exists():
+            try:
+                data = json.loads(MODEL_PATH.read_text(encoding="utf-8"))
+                if len(data.get("weights") or []) != int(data.get("dim", -1)):
+                    raise ValueError("weights/dim mismatch")
+                data["_w"] = np.asarray(data["weights"], dtype=np.float32)
+                _MODEL = data
+                print(f" ------| Gate classifier loaded ({data.get('kind')}, fitted on {data.get('fitted_on')} rows)")
+            except Exception as e:
+                print(" ------| Gate classifier load error:", e)
+        else:
+            print(f" ------| No gate classifier at {MODEL_PATH}; LLM gate only")
+    return _MODEL
+
+
+async def predict(user_msg: str, prev_enc: str = "") -> Optional[Tuple[bool, float]]:
+    """(proceed, P(in scope)) or None when there is no model (or the encoder is unavailable)."""
+    model = load_gate_model()
+    if model is None:
+        return None
+    t0 = time.perf_counter()
+    try:
+        # Reuse the MiniLM model already loaded for RAG (no second copy in memory)
+        from app.rag.engine import get_index
+        idx = await get_index()
+        v = (await idx.embed([gate_text(user_msg, prev_enc)]))[0]
+    except Exception as e:
+        print(" ------| Gate classifier embed error:", e)
+        return None
+    if v.shape[0] != model["_w"].shape[0]:
+        print(" ------| Gate classifier dim mismatch; re-run scripts/train_gate_classifier.py")
+        return None
+    p = float(1.0 / (1.0 + np.exp(-(float(np.dot(model["_w"], v)) + model["bias"]))))
+    metrics.observe("gate.local_ms", round((time.perf_counter() - t0) * 1000, 2))
+    return p >= 0.5, p
+
+
+def confidence(p_in_scope: float) -> float:
+    return max(p_in_scope, 1.0 - p_in_scope)
+
+
+def log_gate_decision(user_msg: str, prev_enc: str, prev_survey_type: Optional[str],
+                      verdict: Dict[str, Any], local: Optional[Tuple[bool, float]]) -> None:
+    """One training row per LLM gate verdict (never for verdicts the classifier made itself)."""
+    if not LOG_PATH:
+        return
+    row = {
+        "text": user_msg,
+        "prev_enc": prev_enc,
+        "prev_survey_type": prev_survey_type,
+        "proceed": bool(verdict.get("proceed")),
+        "llm_confidence": verdict.get("confidence"),
+        "local_p": round(local[1], 4) if local else None,
+        "ts": datetime.utcnow().isoformat() + "Z",
+    }
+    if local is not None:
+        metrics.incr("gate.shadow.agree" if local[0] == row["proceed"] else "gate.shadow.disagree")
+    try:
+        with open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(" ------| Gate log error:", e)
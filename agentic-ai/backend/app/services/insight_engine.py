@@ -2,12 +2,16 @@
 from __future__ import annotations
 import re
 import json
+import time
+import hashlib
 from typing import Dict, List, Tuple
 
-from app.core.openai_client import client, REQUEST_TIMEOUT
+from app.core import llm
+from app.core.openai_client import REQUEST_TIMEOUT
 from app.core.settings import settings, get_insights_model
 from app.repositories.insight_vault_repo import InsightVaultRepo
 from app.repositories.chat_insights_repo import ChatInsightsRepo
+from app.core.singleflight import SingleFlight
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 
@@ -36,6 +40,47 @@ Rules:
 - Output JSON only. No prose.
 """
 
+# Stage-01 prompt prefix, built per vault version: SYSTEM_PROMPT + the serialized Vault
+# Pack form a byte-identical system message on every turn (so the provider's prompt cache
+# can reuse it) and the user's text comes last. The insight index used to validate the
+# decisions is built from the same read. The vault can be edited in place (seed scripts,
+# manual fixes) by another process, so the prefix is re-read every INSIGHT_PREFIX_TTL_S;
+# the content hash tells whether the rebuild changed anything.
+_PREFIX: Dict[Tuple[str, str], Tuple[float, str, Tuple[str, Dict[str, Dict]]]] = {}   # -> (built_at, sha, value)
+_PREFIX_FLIGHT = SingleFlight("stage01_prefix")
+
+async def stage01_prefix(db: AsyncIOMotorDatabase) -> Tuple[str, Dict[str, Dict]]:
+    """(system message content, insight index) for settings.INSIGHT_VAULT_VERSION."""
+    key = (db.name, settings.INSIGHT_VAULT_VERSION)
+    hit = _PREFIX.get(key)
+    if hit is not None and time.monotonic() - hit[0] < settings.INSIGHT_PREFIX_TTL_S:
+        return hit[2]
+
+    async def build():
+        repo = InsightVaultRepo(db)
+        vault_pack = await repo.build_vault_pack()
+        index = await repo.build_insight_index()
+        system = f"{SYSTEM_PROMPT}\nVAULT_PACK:\n{json.dumps(vault_pack, ensure_ascii=False, separators=(',', ':'))}\n"
+        sha = hashlib.sha256(system.encode("utf-8")).hexdigest()[:12]
+        prev = _PREFIX.get(key)
+        if prev is None or prev[1] != sha:
+            print(f" ------| Stage-01 prefix {'rebuilt' if prev else 'built'} for vault {key[1]}: "
+                  f"{len(system)} chars, {len(index)} insights, sha {sha}")
+        _PREFIX[key] = (time.monotonic(), sha, (system, index))
+        return _PREFIX[key][2]
+
+    try:
+        return await _PREFIX_FLIGHT.do(key, build)
+    except Exception as e:
+        if hit is None:
+            raise
+        print(" ------| Stage-01 prefix refresh failed; keeping the cached one:", e)
+        return hit[2]
+
+def invalidate_stage01_prefix() -> None:
+    """Drop the cached prefixes; the next turn re-reads the vault (call after editing it in-process)."""
+    _PREFIX.clear()
+
 def _coerce_matched_answer_id(v):
     # Accept JSON null or the literal string "null"
     if v is None:
@@ -86,7 +131,6 @@ async def stage01_auto_infer(
       - batch expansion (MUST)
       - return pendingByBatch + stats + touchedBatchIds
     """
-    vault_repo = InsightVaultRepo(db)
     pcch_repo = ChatInsightsRepo(db)
     vaultVersion = settings.INSIGHT_VAULT_VERSION
 
@@ -98,31 +142,31 @@ async def stage01_auto_infer(
     print(" ------| Already taken Insights:", already_taken)
     print(" ------| Already pending Insights:", already_pending)
 
-    # 2) Build Vault Pack (active items only)
-    vault_pack = await vault_repo.build_vault_pack()
+    # 2) Vault Pack (active items only), precomputed with the system prompt as a stable prefix
+    system_content, insight_index = await stage01_prefix(db)
 
-    # 3) LLM call (strict JSON only)
+    # 3) LLM call (strict JSON only); the user's text goes last, after the cacheable prefix
     user_content = f"""USER:
 TEXT:
 <<<
 {user_text}
 >>>
-
-VAULT_PACK:
-{json.dumps(vault_pack, ensure_ascii=False)}
 """
 
     # print("========User content:", user_content[:500], "...")
-    comp = await client.chat.completions.create(
+    comp = await llm.chat(
+        tag="c07.stage01",
         model=get_insights_model(),
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": system_content},
             {"role": "user", "content": user_content},
         ],
         response_format={"type": "json_object"},
         temperature=float(settings.INSIGHTS_TEMPERATURE),
         top_p=float(settings.INSIGHTS_TOP_P),
         timeout=REQUEST_TIMEOUT,
+        # routes turns sharing the prefix to the same cache (extra_body: works on any SDK version)
+        extra_body={"prompt_cache_key": f"stage01:{settings.INSIGHT_VAULT_VERSION}"},
     )
 
     raw = comp.choices[0].message.content
@@ -135,8 +179,6 @@ VAULT_PACK:
     print(" ------| LLM decisions count:", len(decisions))
     print(" ------| LLM decisions sample:", decisions[:3])
 
-    # Pre-build an insight index for validation
-    insight_index = await vault_repo.build_insight_index()
     print(" ------| Pre-Built Insight index size:", len(insight_index))
 
     auto_taken_count = 0
@@ -1,7 +1,9 @@
 # intent_llm.py
 import json
 from typing import Tuple
-from app.core.openai_client import client, DEFAULT_MODEL, REQUEST_TIMEOUT
+from app.core import llm
+from app.core.routing import Escalate, routed
+from app.core.openai_client import REQUEST_TIMEOUT
 
 # SYSTEM_PROMPT = (
 #     "You are a precise boolean classifier for a single chat message.\n"
@@ -104,9 +106,22 @@ INTENT_SCHEMA = {
 def _coerce_bool(v) -> bool:
     return True if v is True else False
 
-async def detect_intents_llm(message: str) -> Tuple[bool, bool]:
-    comp = await client.chat.completions.create(
-        model=DEFAULT_MODEL,
+def _parse_intents(comp) -> Tuple[Tuple[bool, bool, str | None], float]:
+    try:
+        data = json.loads(comp.choices[0].message.content)
+        result = (_coerce_bool(data["employment_intent"]), _coerce_bool(data["skills_intent"]), data["ec_hit"])
+    except (TypeError, ValueError, KeyError, IndexError) as e:
+        raise Escalate(f"intents: {type(e).__name__}") from e
+    try:
+        conf = float(data.get("confidence", 0.0))
+    except (TypeError, ValueError):
+        conf = 0.0
+    return result, conf
+
+async def _ask_intents(message: str, model: str):
+    return await llm.chat(
+        tag="c06.intent",
+        model=model,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": message},
@@ -114,6 +129,10 @@ async def detect_intents_llm(message: str) -> Tuple[bool, bool]:
         response_format={"type": "json_schema", "json_schema": INTENT_SCHEMA},
         temperature=0,
         timeout=REQUEST_TIMEOUT,
+        cache=True,
+        hedge=True,
     )
-    data = json.loads(comp.choices[0].message.content)
-    return _coerce_bool(data["employment_intent"]), _coerce_bool(data["skills_intent"]), data["ec_hit"]
+
+async def detect_intents_llm(message: str) -> Tuple[bool, bool, str | None]:
+    # small model first; the schema's confidence field decides whether OPENAI_MODEL re-checks it
+    return await routed("intent", lambda model: _ask_intents(message, model), _parse_intents)
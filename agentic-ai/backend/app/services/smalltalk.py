@@ -0,0 +1,233 @@
+# app/services/smalltalk.py
+# Fast path for trivial turns ("hi", "thanks", a bare survey-option reply).
+# Such turns skip Component 08 (RAG) entirely and get a templated reply
+# (or one short LLM call when FAST_PATH_REPLY_MODE="llm").
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.core import llm
+from app.core.openai_client import DEFAULT_MODEL, REQUEST_TIMEOUT
+from app.core.settings import settings
+from app.services.textnorm import normalize
+
+MAX_WORDS = 6  # anything longer is treated as a real question
+
+# ---------- Regex tier (no model needed) ----------
+_GREETING_RE = re.compile(
+    r"^(hi+|hello+|hey+|hiya|howdy|yo|greetings|good (morning|afternoon|evening|day))"
+    r"( there| all| everyone| again)?$"
+)
+_THANKS_RE = re.compile(
+    r"^(thanks?|thank you|thank u|thx|ty|cheers|many thanks|thanks a lot|thank you so much|much appreciated)"
+    r"( so much| a lot| again)?$"
+)
+# acks are also the usual "yes" to a question: they only count as acks when the previous
+# assistant turn asked nothing (see _asked)
+_ACK_RE = re.compile(r"^(ok|okay|k|cool|got it|sounds good|alright|awesome|understood|great|nice|sure|perfect)$")
+_FAREWELL_RE = re.compile(r"^(bye|goodbye|see you|see ya|good night|later|talk later|cya)( later| soon)?$")
+
+# ---------- Embedding tier (nearest centroid on the RAG encoder) ----------
+EXEMPLARS: Dict[str, List[str]] = {
+    "greeting": ["hi", "hello there", "hey, how are you", "good morning", "hi, nice to meet you"],
+    "thanks": ["thanks", "thank you very much", "thanks for the help", "appreciate it", "that was helpful, thanks"],
+    "ack": ["ok", "got it", "sounds good", "makes sense", "alright, cool"],
+    "farewell": ["bye", "see you later", "goodbye for now", "talk to you tomorrow"],
+    # negative class: anything that deserves the full pipeline
+    "question": [
+        "what is data science",
+        "which skills should I learn first",
+        "explain machine learning to me",
+        "how do I become a data scientist",
+        "I struggle with statistics",
+        "what does a data analyst do",
+    ],
+}
+
+TEMPLATES: Dict[str, str] = {
+    "greeting": "Hi there! I'm here to help you map out your data science path — tell me about your role, your skills, or what you'd like to explore.",
+    "thanks": "You're welcome! Happy to help with anything else on your data science journey.",
+    "ack": "Got it, thanks!",
+    "farewell": "Goodbye for now — come back anytime to keep building your data science plan.",
+    "survey_reply": "Thanks — I've noted that.",
+}
+
+_CENTROIDS: Optional[Dict[str, np.ndarray]] = None
+_CENTROIDS_LOCK = asyncio.Lock()
+
+
+def _regex_kind(t: str) -> Optional[str]:
+    if _GREETING_RE.match(t):
+        return "greeting"
+    if _THANKS_RE.match(t):
+        return "thanks"
+    if _ACK_RE.match(t):
+        return "ack"
+    if _FAREWELL_RE.match(t):
+        return "farewell"
+    return None
+
+
+# where an option list starts in an encouragement question ("...—choose one of: A, B, or C",
+# "... — is it A, B, or C?", "... such as A or B?")
+_LIST_LEAD_RE = re.compile(r"[:—–]|\b(?:is it|such as|like|e\.g\.|including|between|either)\b", re.IGNORECASE)
+_PAREN_RE = re.compile(r"\(([^)]*)\)")
+_QUESTION_WORDS = {"what", "which", "how", "where", "when", "why", "who", "do", "does", "are", "is",
+                   "would", "could", "should", "can", "will", "for", "to", "since", "given"}
+
+
+def offered_options(question: str) -> List[str]:
+    """
+    The answer options an encouragement question lists, normalized
+    ("Reading, Videos, or Hands-on practice" -> ["reading", "videos", "hands-on practice"]).
+    Empty unless at least two options can be told apart from the surrounding wording.
+    """
+    q = question or ""
+    # a parenthetical list wins; "(reply with the exact words)" is not one
+    lists = [p for p in _PAREN_RE.findall(q) if "," in p or " or " in p]
+    q = _PAREN_RE.sub(" ", q)
+    if lists:
+        region = lists[-1]
+    else:
+        leads = list(_LIST_LEAD_RE.finditer(q))
+        region = q[leads[-1].end():] if leads else q
+    region = re.split(r"[?.!]", region, maxsplit=1)[0]
+
+    parts = re.split(r"\s*,\s*(?:(?:or|and)\s+)?|\s+or\s+", region, flags=re.IGNORECASE)
+    out: List[str] = []
+    for part in parts:
+        opt = normalize(part)
+        words = opt.split()
+        # lead-in clauses ("for this role", "which skill would you pick") are not options
+        if not words or len(words) > MAX_WORDS - 1 or words[0] in _QUESTION_WORDS or len(opt) < 2:
+            continue
+        out.append(opt)
+    return out if len(out) >= 2 else []
+
+
+def _option_key(opt: str) -> str:
+    """Hyphens and spaces are interchangeable in a reply ("hands on practice" = "hands-on practice")."""
+    return " ".join(opt.replace("-", " ").split())
+
+
+def _is_survey_option_reply(t: str, prev_enc: str) -> bool:
+    """
+    A bare reply that is exactly one of the options listed in the previous
+    encouragement question (e.g. "Videos" to "... Reading, Videos, or Hands-on practice ...").
+    """
+    return bool(prev_enc) and _option_key(t) in {_option_key(o) for o in offered_options(prev_enc)}
+
+
+def _asked(prev_enc: str, prev_assistant: str) -> bool:
+    """Whether the previous assistant turn ended in a question (then "ok" / "sure" answer it)."""
+    return "?" in prev_assistant if (prev_assistant or "").strip() else bool(prev_enc)
+
+
+async def _get_index():
+    # Reuse the MiniLM model already loaded for RAG (no second copy in memory)
+    from app.rag.engine import get_index
+    return await get_index()
+
+
+async def _get_centroids(idx) -> Dict[str, np.ndarray]:
+    global _CENTROIDS
+    if _CENTROIDS is not None:
+        return _CENTROIDS
+    async with _CENTROIDS_LOCK:
+        if _CENTROIDS is not None:
+            return _CENTROIDS
+        out = {}
+        for label, texts in EXEMPLARS.items():
+            c = (await idx.embed(texts)).mean(axis=0)
+            out[label] = c / (np.linalg.norm(c) or 1.0)
+        _CENTROIDS = out
+        return _CENTROIDS
+
+
+async def _embedding_kind(t: str) -> Optional[str]:
+    idx = await _get_index()
+    centroids = await _get_centroids(idx)
+    qv = (await idx.embed([t]))[0]
+    sims = {label: float(np.dot(qv, c)) for label, c in centroids.items()}
+    best = max(sims, key=sims.get)
+    if best == "question":
+        return None
+    if sims[best] < settings.FAST_PATH_MIN_SIM:
+        return None
+    if sims[best] - sims["question"] < settings.FAST_PATH_MIN_MARGIN:
+        return None
+    return best
+
+
+async def classify_turn(user_msg: str, *, prev_enc: str = "", prev_assistant: str = "") -> Optional[str]:
+    """
+    Returns the trivial-turn kind ("greeting" | "thanks" | "ack" | "farewell" | "survey_reply")
+    or None when the message should go through the full RAG pipeline.
+    prev_assistant: the previous assistant message; after a question, "ok"/"sure" are answers.
+    """
+    t = normalize(user_msg)
+    if not t or len(t.split()) > MAX_WORDS:
+        return None
+
+    kind = _regex_kind(t)
+    if kind is None and _is_survey_option_reply(t, prev_enc):
+        return "survey_reply"
+    if kind is None:
+        try:
+            kind = await _embedding_kind(t)
+        except Exception as e:
+            print(" ------| Fast path classifier error:", e)
+            return None
+    if kind == "ack" and _asked(prev_enc, prev_assistant):
+        return None   # an answer to the question: full pipeline
+    return kind
+
+
+async def fast_reply(kind: str, user_msg: str) -> str:
+    """Templated reply, or one short LLM call when configured (template on any failure)."""
+    template = TEMPLATES.get(kind, TEMPLATES["ack"])
+    if settings.FAST_PATH_REPLY_MODE != "llm" or kind == "survey_reply":
+        return template
+    try:
+        resp = await llm.chat(
+            tag="fast_path.reply",
+            model=DEFAULT_MODEL,
+            messages=[
+                {"role": "system", "content": (
+                    "You are a friendly data science career coach. The user sent a brief pleasantry. "
+                    "Reply with ONE short friendly sentence; you may offer help with their data science path. "
+                    "No headings, no bullets."
+                )},
+                {"role": "user", "content": user_msg},
+            ],
+            temperature=0.7,
+            max_tokens=60,
+            timeout=REQUEST_TIMEOUT,
+        )
+        text = (resp.choices[0].message.content or "").strip()
+        return text or template
+    except Exception:
+        return template
+
+
+def record_turn(*, fast_path: bool, elapsed_ms: float) -> None:
+    """
+    Track the fast-path share of traffic and the latency it saves
+    (saved = running mean of full turns − this fast turn).
+    """
+    metrics.incr("turns.total")
+    if fast_path:
+        metrics.incr("turns.fast_path")
+        metrics.observe("turns.fast_path_ms", elapsed_ms)
+        full_avg = metrics.mean("turns.full_ms")
+        if full_avg is not None:
+            metrics.incr("turns.fast_path_saved_ms", max(0.0, full_avg - elapsed_ms))
+    else:
+        metrics.observe("turns.full_ms", elapsed_ms)
+    total = metrics.count("turns.total")
+    metrics.gauge("turns.fast_path_share", round(metrics.count("turns.fast_path") / total, 4) if total else 0.0)
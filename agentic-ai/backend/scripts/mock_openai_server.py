@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible stand-in for load and latency testing of /messages without spending tokens.
+
+Serves the two endpoints the app uses, POST /v1/chat/completions and POST /v1/responses
+(both with stream=true as SSE), and answers each prompt family with a schema-valid
+JSON/text output:
+
+  gate        C05 decision gate            {"proceed", "confidence"}
+  intent      C06 intent classifier        {"employment_intent", "skills_intent", "ec_hit", "confidence"}
+  stage01     C07 insight auto-inference   {"decisions": []}
+  c10         C10 encouragement question   {"stage", "question"}
+  plan        C08 query planner            {"link_prev", "queries": [question], ...}
+  rerank      C08 reranker                 {"selected": first candidate ids}
+  sufficiency C08 sufficiency gate         {"sufficiency", "missing_aspects"}
+  answer      C08 composer                 a few paragraphs of text
+  validate    C08 validator                {"on_topic": true, "contradiction": false, "revision": ""}
+  other       anything else (fast-path reply, ...)
+
+Behaviour per family comes from --config (JSON); "default" applies to families not listed:
+  {
+    "latency": {"default": {"dist": "lognormal", "median_ms": 400, "sigma": 0.5},
+                "answer":  {"dist": "uniform", "lo_ms": 1500, "hi_ms": 4000}},     # dist: fixed | uniform | lognormal
+    "errors":  {"default": {"429": 0.01, "500": 0.01, "timeout": 0.0}},            # probabilities per request
+    "scripts": {"gate": [{"proceed": false, "message": "Out of scope."}, {"proceed": true}]},  # cycled, dict → JSON
+    "stream":  {"ttft_ms": 250, "token_ms": 12}
+  }
+"timeout" holds the request for --hang-s, past the client's OPENAI_REQUEST_TIMEOUT. Usage
+reports ~4 chars/token, and a system prompt seen before counts as cached prompt tokens
+(1024 + 128·n, as the provider's prefix cache does).
+
+Usage (from agentic-ai/backend):
+  python -m scripts.mock_openai_server --port 8099 [--config mock.json] [--latency-ms 400] [--error-rate 0.02]
+  then run the API with OPENAI_BASE_URL=http://127.0.0.1:8099/v1 (any OPENAI_API_KEY)
+  GET /mock/stats → requests / errors / mean latency per family
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAMILIES = ["gate", "intent", "stage01", "c10", "plan", "rerank", "sufficiency", "answer", "validate", "other"]
+
+# first match wins; markers are taken from the app's own prompts
+_MARKERS: List[Tuple[str, str]] = [
+    ("stage01", "VAULT_PACK"),
+    ("intent", "precise boolean classifier"),
+    ("gate", "Decision Gate"),
+    ("plan", "query planner for a private RAG system"),
+    ("rerank", "retrieval reranker"),
+    ("sufficiency", "coverage estimator"),
+    ("validate", "validator for a RAG answer"),
+    ("answer", "domain-grounded assistant"),
+]
+_C10_STAGE_RE = re.compile(r'"stage"\s*:\s*"(employment_category|skills|insights)"')
+
+_ANSWER = (
+    "**Overview**\n\nData science combines statistics, programming and domain knowledge to turn data into "
+    "decisions. Most roles expect solid Python and SQL, a working grasp of probability and statistics, and "
+    "the ability to communicate results clearly.\n\n"
+    "**Where to focus**\n\n- Python with pandas and NumPy\n- SQL for analysis\n- Statistics and experiment design\n\n"
+    "Start with the area you use least today and build small projects around it."
+)
+
+
+def _flatten(content: Any) -> str:
+    """Message / input content → text (string, or a list of {"type": ..., "text": ...} parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(_flatten(p.get("text") or p.get("content") if isinstance(p, dict) else p) for p in content)
+    return "" if content is None else str(content)
+
+
+def _messages(body: Dict[str, Any]) -> List[Dict[str, str]]:
+    """(role, text) pairs from chat.completions `messages` or responses `instructions` + `input`."""
+    if "messages" in body:
+        return [{"role": m.get("role", "user"), "text": _flatten(m.get("content"))} for m in body["messages"]]
+    out = [{"role": "system", "text": body["instructions"]}] if body.get("instructions") else []
+    inp = body.get("input")
+    if isinstance(inp, str):
+        return out + [{"role": "user", "text": inp}]
+    for m in inp or []:
+        out.append({"role": m.get("role", "user"), "text": _flatten(m.get("content"))})
+    return out
+
+
+def classify(msgs: List[Dict[str, str]]) -> str:
+    text = "\n".join(m["text"] for m in msgs)
+    for family, marker in _MARKERS:
+        if marker in text:
+            return family
+    if _C10_STAGE_RE.search(text):
+        return "c10"
+    return "other"
+
+
+def _user_json(msgs: List[Dict[str, str]]) -> Dict[str, Any]:
+    for m in reversed(msgs):
+        if m["role"] == "user":
+            try:
+                data = json.loads(m["text"])
+                return data if isinstance(data, dict) else {}
+            except ValueError:
+                return {}
+    return {}
+
+
+def generate(family: str, msgs: List[Dict[str, str]]) -> str:
+    """A schema-valid output for the family, filled from the request where that matters."""
+    if family == "gate":
+        return json.dumps({"proceed": True, "confidence": 0.95})
+    if family == "intent":
+        text = (msgs[-1]["text"] if msgs else "").lower()
+        return json.dumps({
+            "employment_intent": "data scien" in text or "role" in text,
+            "skills_intent": any(k in text for k in ("skill", "python", "sql", "learn")),
+            "ec_hit": "ec_ds" if "data scientist" in text else None,
+            "confidence": 0.9,
+        })
+    if family == "stage01":
+        return json.dumps({"decisions": []})
+    if family == "c10":
+        stage = _C10_STAGE_RE.search("\n".join(m["text"] for m in msgs)).group(1)
+        question = {
+            "employment_category": "Which employment category describes your current role best?",
+            "skills": "Which of these skill areas would you like to strengthen first?",
+            "insights": "Which learning format works best for you right now?",
+        }[stage]
+        return json.dumps({"stage": stage, "question": question})
+    if family == "plan":
+        q = _user_json(msgs).get("question") or "data science"
+        return json.dumps({
+            "link_prev": False, "why": "mock planner", "queries": [q], "doc_filters": [],
+            "style": "concise", "tone": "plain", "format": ["sections", "bullets"],
+            "audience": "practitioner", "allow_general_knowledge": False, "notes": "",
+        })
+    if family == "rerank":
+        cands = _user_json(msgs).get("candidates") or []
+        return json.dumps({"selected": [c.get("chunk_id") for c in cands[:8] if isinstance(c, dict)]})
+    if family == "sufficiency":
+        return json.dumps({"sufficiency": 0.8, "missing_aspects": []})
+    if family == "validate":
+        return json.dumps({"on_topic": True, "contradiction": False, "revision": ""})
+    if family == "answer":
+        return _ANSWER
+    return "Happy to help — tell me a bit about your role or the skills you want to build."
+
+
+class MockConfig:
+    def __init__(self, cfg: Dict[str, Any], seed: Optional[int] = None):
+        self.latency: Dict[str, Dict[str, Any]] = cfg.get("latency") or {}
+        self.errors: Dict[str, Dict[str, float]] = cfg.get("errors") or {}
+        self.stream: Dict[str, float] = {"ttft_ms": 250.0, "token_ms": 12.0, **(cfg.get("stream") or {})}
+        self.hang_s: float = float(cfg.get("hang_s", 120.0))
+        self.rng = random.Random(seed)
+        self._scripts = {
+            fam: itertools.cycle([o if isinstance(o, str) else json.dumps(o) for o in outs])
+            for fam, outs in (cfg.get("scripts") or {}).items() if outs
+        }
+
+    def _for(self, table: Dict[str, Any], family: str) -> Dict[str, Any]:
+        return table.get(family) or table.get("default") or {}
+
+    def delay_s(self, family: str) -> float:
+        d = self._for(self.latency, family)
+        dist = d.get("dist", "fixed")
+        if dist == "uniform":
+            ms = self.rng.uniform(float(d.get("lo_ms", 0)), float(d.get("hi_ms", 0)))
+        elif dist == "lognormal":
+            ms = float(d.get("median_ms", 0)) * self.rng.lognormvariate(0.0, float(d.get("sigma", 0.5)))
+        else:
+            ms = float(d.get("ms", 0))
+        return max(0.0, ms) / 1000
+
+    def fault(self, family: str) -> Optional[str]:
+        """"429" | "500" | "timeout" | None, drawn from the family's error rates."""
+        r, acc = self.rng.random(), 0.0
+        for kind, p in self._for(self.errors, family).items():
+            acc += float(p)
+            if r < acc:
+                return kind
+        return None
+
+    def scripted(self, family: str) -> Optional[str]:
+        it = self._scripts.get(family)
+        return next(it) if it else None
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _chunks(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="mock-openai")
+    stats: Dict[str, Dict[str, float]] = {f: {"requests": 0, "errors": 0, "latency_ms": 0.0} for f in FAMILIES}
+    seen_prefixes: set = set()
+
+    def usage(msgs: List[Dict[str, str]], output: str) -> Tuple[int, int, int]:
+        prompt = sum(_tokens(m["text"]) for m in msgs)
+        system = next((m["text"] for m in msgs if m["role"] in ("system", "developer")), "")
+        cached = 0
+        if system and _tokens(system) >= 1024:
+            if system in seen_prefixes:
+                cached = 1024 + (_tokens(system) - 1024) // 128 * 128
+            seen_prefixes.add(system)
+        return prompt, _tokens(output), cached
+
+    async def handle(request: Request, api: str):
+        body = await request.json()
+        msgs = _messages(body)
+        family = classify(msgs)
+        st = stats[family]
+        st["requests"] += 1
+        t0 = time.perf_counter()
+
+        fault = config.fault(family)
+        if fault == "timeout":
+            st["errors"] += 1
+            await asyncio.sleep(config.hang_s)
+        if fault in ("429", "500"):
+            st["errors"] += 1
+            await asyncio.sleep(config.delay_s(family) / 4)
+            kind = "rate_limit_exceeded" if fault == "429" else "server_error"
+            return JSONResponse({"error": {"message": f"mock {fault}", "type": kind, "code": kind}},
+                                status_code=int(fault), headers={"retry-after": "1"} if fault == "429" else None)
+
+        output = config.scripted(family) or generate(family, msgs)
+        model = body.get("model", "mock")
+        prompt_t, completion_t, cached_t = usage(msgs, output)
+        rid = uuid.uuid4().hex[:24]
+
+        if body.get("stream"):
+            gen = _stream_chat if api == "chat" else _stream_responses
+            return StreamingResponse(gen(config, family, st, t0, rid, model, output, (prompt_t, completion_t, cached_t)),
+                                     media_type="text/event-stream")
+
+        await asyncio.sleep(config.delay_s(family))
+        st["latency_ms"] += (time.perf_counter() - t0) * 1000
+        if api == "chat":
+            return _chat_body(rid, model, output, prompt_t, completion_t, cached_t)
+        return _response_body(rid, model, output, prompt_t, completion_t, cached_t)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await handle(request, "chat")
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        return await handle(request, "responses")
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return {f: {"requests": int(s["requests"]), "errors": int(s["errors"]),
+                    "mean_latency_ms": round(s["latency_ms"] / max(1, s["requests"] - s["errors"]), 1)}
+                for f, s in stats.items() if s["requests"]}
+
+    return app
+
+
+def _chat_usage(prompt_t: int, completion_t: int, cached_t: int) -> Dict[str, Any]:
+    return {"prompt_tokens": prompt_t, "completion_tokens": completion_t, "total_tokens": prompt_t + completion_t,
+            "prompt_tokens_details": {"cached_tokens": cached_t}}
+
+
+def _responses_usage(prompt_t: int, completion_t: int, cached_t: int) -> Dict[str, Any]:
+    return {"input_tokens": prompt_t, "output_tokens": completion_t, "total_tokens": prompt_t + completion_t,
+            "input_tokens_details": {"cached_tokens": cached_t}, "output_tokens_details": {"reasoning_tokens": 0}}
+
+
+def _chat_body(rid, model, output, prompt_t, completion_t, cached_t) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{rid}", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+        "usage": _chat_usage(prompt_t, completion_t, cached_t),
+    }
+
+
+def _response_body(rid, model, output, prompt_t, completion_t, cached_t, status="completed") -> Dict[str, Any]:
+    return {
+        "id": f"resp_{rid}", "object": "response", "created_at": int(time.time()), "model": model,
+        "status": status, "error": None, "incomplete_details": None, "instructions": None,
+        "parallel_tool_calls": True, "tool_choice": "auto", "tools": [], "metadata": {},
+        "output": [] if status != "completed" else [{
+            "type": "message", "id": f"msg_{rid}", "status": "completed", "role": "assistant",
+            "content": [{"type": "output_text", "text": output, "annotations": []}],
+        }],
+        "usage": _responses_usage(prompt_t, completion_t, cached_t) if status == "completed" else None,
+    }
+
+
+def _sse(data: Any, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+
+
+async def _stream_chat(config, family, st, t0, rid, model, output, usage_t):
+    base = {"id": f"chatcmpl-{rid}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    await asyncio.sleep(config.stream["ttft_ms"] / 1000)
+    yield _sse({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+    for piece in _chunks(output):
+        await asyncio.sleep(config.stream["token_ms"] / 1000)
+        yield _sse({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+    yield _sse({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    yield _sse({**base, "choices": [], "usage": _chat_usage(*usage_t)})
+    yield _sse("[DONE]")
+    st["latency_ms"] += (time.perf_counter() - t0) * 1000
+
+
+async def _stream_responses(config, family, st, t0, rid, model, output, usage_t):
+    seq = itertools.count()
+    item_id = f"msg_{rid}"
+    created = _response_body(rid, model, output, *usage_t, status="in_progress")
+    yield _sse({"type": "response.created", "sequence_number": next(seq), "response": created}, "response.created")
+    await asyncio.sleep(config.stream["ttft_ms"] / 1000)
+    for piece in _chunks(output):
+        await asyncio.sleep(config.stream["token_ms"] / 1000)
+        yield _sse({"type": "response.output_text.delta", "sequence_number": next(seq), "item_id": item_id,
+                    "output_index": 0, "content_index": 0, "delta": piece, "logprobs": []},
+                   "response.output_text.delta")
+    yield _sse({"type": "response.output_text.done", "sequence_number": next(seq), "item_id": item_id,
+                "output_index": 0, "content_index": 0, "text": output, "logprobs": []}, "response.output_text.done")
+    done = _response_body(rid, model, output, *usage_t)
+    yield _sse({"type": "response.completed", "sequence_number": next(seq), "response": done}, "response.completed")
+    st["latency_ms"] += (time.perf_counter() - t0) * 1000
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="OpenAI-compatible mock server for load tests")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--config", default="", help="JSON file: latency / errors / scripts / stream per prompt family")
+    ap.add_argument("--latency-ms", type=float, default=None, help="default lognormal median (overrides config default)")
+    ap.add_argument("--sigma", type=float, default=0.5)
+    ap.add_argument("--error-rate", type=float, default=None, help="default share of 500s (overrides config default)")
+    ap.add_argument("--rate-limit-rate", type=float, default=None, help="default share of 429s")
+    ap.add_argument("--hang-s", type=float, default=None, help="how long a 'timeout' fault holds the request")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    cfg: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    if args.latency_ms is not None:
+        cfg.setdefault("latency", {})["default"] = {"dist": "lognormal", "median_ms": args.latency_ms, "sigma": args.sigma}
+    if args.error_rate is not None or args.rate_limit_rate is not None:
+        errs = cfg.setdefault("errors", {}).setdefault("default", {})
+        if args.error_rate is not None:
+            errs["500"] = args.error_rate
+        if args.rate_limit_rate is not None:
+            errs["429"] = args.rate_limit_rate
+    if args.hang_s is not None:
+        cfg["hang_s"] = args.hang_s
+
+    print(f" --| Mock OpenAI on http://{args.host}:{args.port}/v1 (families: {', '.join(FAMILIES)})")
+    uvicorn.run(create_app(MockConfig(cfg, seed=args.seed)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -150,6 +150,7 @@ async def main():
     if not existing:
         await db[INSIGHT_VAULT].insert_one(SAMPLE_BATCH)
         print(f"Seeded Insight Vault batch '{SAMPLE_BATCH['batchId']}' for version {SAMPLE_BATCH['vaultVersion']}")
+        print(f"Running API workers pick this up within INSIGHT_PREFIX_TTL_S ({settings.INSIGHT_PREFIX_TTL_S:.0f}s).")
     else:
         print("Insight Vault seed already present; nothing to do.")
 
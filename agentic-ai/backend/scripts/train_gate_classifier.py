@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Fit the local C05 gate classifier (app/services/gate_classifier.py) on logged LLM gate verdicts.
+
+Inputs:
+  app/rag/5_index/gate_log.jsonl      ← written by Component 5 in GATE_CLASSIFIER_MODE=shadow or on
+                                        (or wherever GATE_CLASSIFIER_LOG points)
+                                        one row: {"text", "prev_enc", "proceed", "llm_confidence", ...}
+
+Outputs:
+  app/rag/5_index/gate_classifier.json ← {"kind", "embed_model", "dim", "weights", "bias",
+                                          "fitted_on", "metrics", "fitted_at"}
+
+Texts are embedded with the RAG index's MiniLM encoder (index_config.json), exactly as the
+API does at request time (gate_text()). Two kinds, both stored as one linear score
+P(in scope) = sigmoid(w·v + b) over the normalized embedding:
+  logreg    L2-regularized logistic regression (plain numpy gradient descent)
+  centroid  nearest-centroid direction (in-scope mean − out-of-scope mean), with a 1-D
+            logistic fit on that margin so its confidence is calibrated too
+Rows with the same (text, prev_enc) keep their latest verdict.
+
+Usage (from agentic-ai/backend):
+  python -m scripts.train_gate_classifier [--log PATH] [--out PATH] [--kind logreg|centroid]
+         [--l2 0.01] [--iters 3000] [--holdout 0.2] [--min-confidence 0.9]
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app.rag.engine.config import IDX
+from app.services.gate_classifier import LOG_PATH, MODEL_PATH, gate_text
+
+
+def load_rows(path: Path):
+    latest = {}
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not r.get("text") or not isinstance(r.get("proceed"), bool):
+                continue
+            latest[(r["text"].strip().lower(), (r.get("prev_enc") or "").strip())] = r
+    rows = list(latest.values())
+    return [gate_text(r["text"], r.get("prev_enc") or "") for r in rows], np.array([float(r["proceed"]) for r in rows])
+
+
+def embed(texts, model_name):
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
+    return model.encode(texts, normalize_embeddings=True, batch_size=64, show_progress_bar=True).astype(np.float64)
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def fit_logreg(X, y, l2=0.01, iters=3000, lr=0.5):
+    w = np.zeros(X.shape[1])
+    b = float(np.log(max(y.mean(), 1e-3) / max(1 - y.mean(), 1e-3)))
+    n = len(y)
+    for _ in range(iters):
+        g = sigmoid(X @ w + b) - y
+        w -= lr * ((X.T @ g) / n + l2 * w)
+        b -= lr * g.mean()
+    return w, b
+
+
+def fit_centroid(X, y, iters=3000):
+    d = X[y == 1].mean(axis=0) - X[y == 0].mean(axis=0)
+    a, b = fit_logreg((X @ d)[:, None], y, l2=0.0, iters=iters)
+    return a[0] * d, b
+
+
+def evaluate(X, y, w, b, min_conf):
+    if len(y) == 0:
+        return {}
+    p = sigmoid(X @ w + b)
+    confident = np.maximum(p, 1 - p) >= min_conf
+    pred = p >= 0.5
+    return {
+        "n": int(len(y)),
+        "accuracy": round(float((pred == (y == 1)).mean()), 4),
+        # share of messages the API would decide locally, and how often those agree with the LLM
+        "local_share": round(float(confident.mean()), 4),
+        "local_accuracy": round(float((pred[confident] == (y[confident] == 1)).mean()), 4) if confident.any() else None,
+        # refusals decided locally that the LLM would have let through
+        "local_false_refusals": int((confident & ~pred & (y == 1)).sum()),
+        "in_scope_rate": round(float(y.mean()), 4),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=LOG_PATH or str(IDX / "gate_log.jsonl"))
+    ap.add_argument("--out", default=str(MODEL_PATH))
+    ap.add_argument("--kind", choices=["logreg", "centroid"], default="logreg")
+    ap.add_argument("--l2", type=float, default=0.01)
+    ap.add_argument("--iters", type=int, default=3000)
+    ap.add_argument("--holdout", type=float, default=0.2)
+    ap.add_argument("--min-confidence", type=float, default=0.9)
+    ap.add_argument("--seed", type=int, default=13)
+    args = ap.parse_args()
+
+    log_path = Path(args.log)
+    if not log_path.exists():
+        print(f"No log at {log_path}. Run the API with GATE_CLASSIFIER_MODE=shadow (or on) first.", file=sys.stderr)
+        sys.exit(1)
+
+    texts, y = load_rows(log_path)
+    if len(y) < 50 or y.min() == y.max():
+        print(f"Need at least 50 rows with both verdicts in {log_path} (have {len(y)}).", file=sys.stderr)
+        sys.exit(1)
+
+    cfg = json.loads((IDX / "index_config.json").read_text(encoding="utf-8"))
+    X = embed(texts, cfg["model_name"])
+
+    def fit(Xs, ys):
+        return fit_logreg(Xs, ys, l2=args.l2, iters=args.iters) if args.kind == "logreg" else fit_centroid(Xs, ys, args.iters)
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(y))
+    n_hold = int(len(y) * args.holdout)
+    hold, train = order[:n_hold], order[n_hold:]
+    w, b = fit(X[train], y[train])
+    metrics = {"train": evaluate(X[train], y[train], w, b, args.min_confidence),
+               "holdout": evaluate(X[hold], y[hold], w, b, args.min_confidence)}
+
+    # final model on all rows
+    w, b = fit(X, y)
+    model = {
+        "kind": args.kind,
+        "embed_model": cfg["model_name"],
+        "dim": int(X.shape[1]),
+        "weights": [round(float(v), 6) for v in w],
+        "bias": round(float(b), 6),
+        "fitted_on": int(len(y)),
+        "metrics": metrics,
+        "fitted_at": datetime.utcnow().isoformat() + "Z",
+    }
+    Path(args.out).write_text(json.dumps(model), encoding="utf-8")
+
+    print(f"Fitted {args.kind} on {len(y)} rows → {args.out}")
+    print("Train:  ", metrics["train"])
+    print("Holdout:", metrics["holdout"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Backend unit tests: pure logic only (no Mongo / OpenAI / sentence-transformers needed).
+# Async code is driven with asyncio.run() so the suite needs nothing beyond pytest.
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+DIM = 64
+
+
+class HashEncoder:
+    """Deterministic bag-of-words encoder with SentenceTransformer's encode() signature."""
+
+    def encode(self, texts, normalize_embeddings=True, **kw):
+        out = np.zeros((len(texts), DIM), dtype="float32")
+        for i, t in enumerate(texts):
+            for w in re.findall(r"[a-z0-9]+", t.lower()):
+                out[i, int(hashlib.md5(w.encode()).hexdigest(), 16) % DIM] += 1.0
+        n = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(n == 0, 1.0, n) if normalize_embeddings else out
+
+
+DOCS = {
+    "DOC01:0001": "python pandas dataframes for data analysis",
+    "DOC01:0002": "sql joins and window functions",
+    "DOC02:0001": "statistics hypothesis testing and p values",
+    "DOC02:0002": "machine learning with scikit learn pipelines",
+    "DOC03:0001": "career advice for junior data scientists",
+}
+
+
+@pytest.fixture
+def encoder():
+    return HashEncoder()
+
+
+@pytest.fixture
+def tiny_index(encoder):
+    """A RagIndex over DOCS with a flat FAISS index and real BM25 (no model download)."""
+    import faiss
+    from rank_bm25 import BM25Okapi
+
+    from app.rag.engine.index import RagIndex, tokenize_lex
+
+    ids = list(DOCS)
+    vecs = encoder.encode([DOCS[c] for c in ids])
+    index = faiss.IndexFlatIP(DIM)
+    index.add(vecs)
+    meta = [{"chunk_id": c, "doc_id": c.split(":")[0], "breadcrumb": c} for c in ids]
+    bm25 = BM25Okapi([tokenize_lex(DOCS[c]) for c in ids])
+    return RagIndex(meta, bm25, ids, encoder, index, {"model_name": "hash"})
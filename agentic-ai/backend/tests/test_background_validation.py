@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.api.routes import messages
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    rec = {"status": [], "events": []}
+
+    async def set_validation(db, *, user_id, chat_id, msg_id, status, content=None):
+        rec["status"].append((status, content))
+
+    async def publish(rid, evt):
+        rec["events"].append(evt)
+
+    monkeypatch.setattr(messages, "set_message_validation", set_validation)
+    monkeypatch.setattr(messages.broker, "publish", publish)
+    return rec
+
+
+PENDING = {"question": "what is sql", "kept_ids": ["DOC01:1"], "draft": "SQL is a query language."}
+
+
+def run(**kw):
+    asyncio.run(messages._validate_in_background(None, user_id="u", chat_id="c", msg_id="m1", rid="r1",
+                                                 pending=dict(PENDING), **kw))
+
+
+def test_revision_patches_message_and_is_pushed(monkeypatch, calls):
+    async def validate(q, ids, draft, records=None):
+        return "SQL is a language for querying relational databases."
+    monkeypatch.setattr(messages, "llm_validate", validate)
+    run()
+    assert calls["status"] == [("revised", "SQL is a language for querying relational databases.")]
+    assert calls["events"] == [{"type": "revision", "message_id": "m1",
+                                "content": "SQL is a language for querying relational databases."}]
+
+
+def test_unchanged_draft_is_marked_passed(monkeypatch, calls):
+    async def validate(q, ids, draft, records=None):
+        return draft
+    monkeypatch.setattr(messages, "llm_validate", validate)
+    run()
+    assert calls["status"] == [("passed", None)]
+    assert calls["events"] == [{"type": "validated", "message_id": "m1"}]
+
+
+def test_validator_error_marks_failed_and_closes_stream(monkeypatch, calls):
+    async def validate(q, ids, draft, records=None):
+        raise RuntimeError("provider down")
+    monkeypatch.setattr(messages, "llm_validate", validate)
+    run()
+    assert calls["status"] == [("failed", None)]
+    assert calls["events"] == [{"type": "validated", "message_id": "m1"}]
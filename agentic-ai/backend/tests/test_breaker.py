@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APITimeoutError, InternalServerError, RateLimitError
+
+from app.core import breaker as breaker_mod, llm
+from app.core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from app.core.deadline import request_deadline
+from app.core.settings import settings
+
+_models = itertools.count()
+
+
+def _status_error(cls, status):
+    req = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return cls("boom", response=httpx.Response(status, request=req), body=None)
+
+
+def _open(b):
+    for _ in range(b.threshold):
+        b.failure(b.acquire())
+    assert b.state == OPEN
+
+
+# ---------- state machine ----------
+def test_opens_after_consecutive_failures():
+    b = CircuitBreaker("m", failures=3, open_s=30, probes=1)
+    b.failure(b.acquire())
+    b.failure(b.acquire())
+    b.success(b.acquire())                    # a success resets the streak
+    b.failure(b.acquire())
+    b.failure(b.acquire())
+    assert b.state == CLOSED
+    b.failure(b.acquire())
+    assert b.state == OPEN and b.opened_count == 1
+    with pytest.raises(CircuitOpen):
+        b.acquire()
+    assert b.snapshot()["retry_in_s"] > 0
+
+
+def test_half_open_probe_success_closes():
+    b = CircuitBreaker("m", failures=1, open_s=0.01, probes=1)
+    _open(b)
+    time.sleep(0.02)
+    assert b.acquire() is True and b.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):          # probe budget in flight
+        b.acquire()
+    b.success(True)
+    assert b.state == CLOSED and b.probing == 0 and b.acquire() is False
+
+
+def test_half_open_probe_failure_reopens():
+    b = CircuitBreaker("m", failures=3, open_s=0.01, probes=1)
+    _open(b)
+    time.sleep(0.02)
+    b.failure(b.acquire())                    # one failure is enough while half-open
+    assert b.state == OPEN and b.opened_count == 2
+    with pytest.raises(CircuitOpen):
+        b.acquire()
+
+
+def test_released_probe_frees_the_slot():
+    b = CircuitBreaker("m", failures=1, open_s=0.01, probes=1)
+    _open(b)
+    time.sleep(0.02)
+    b.release(b.acquire())
+    assert b.state == HALF_OPEN and b.acquire() is True
+
+
+def test_registry_helpers():
+    name = f"registry-{next(_models)}"
+    assert not breaker_mod.is_open(name)
+    b = breaker_mod.breaker_for(name)
+    assert breaker_mod.breaker_for(name) is b
+    _open(b)
+    assert breaker_mod.is_open(name) and breaker_mod.breaker_states()[name]["state"] == OPEN
+
+
+# ---------- gateway ----------
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    name = f"breaker-model-{next(_models)}"
+    breaker_mod._BREAKERS[name] = CircuitBreaker(name, failures=2, open_s=30, probes=1)
+    return name
+
+
+class FakeCreate:
+    def __init__(self, *outcomes):
+        self.outcomes, self.calls = list(outcomes), []
+
+    async def __call__(self, **kw):
+        self.calls.append(kw)
+        out = self.outcomes.pop(0) if self.outcomes else SimpleNamespace(usage=None)
+        if isinstance(out, BaseException):
+            raise out
+        return out
+
+
+def _run(create, model, deadline=None):
+    async def go():
+        with request_deadline(deadline):
+            return await llm._call("chat", create, {"model": model, "messages": []})
+    return asyncio.run(go())
+
+
+def test_provider_failures_open_the_circuit_and_fail_fast(model):
+    create = FakeCreate(_status_error(InternalServerError, 500), _status_error(InternalServerError, 503))
+    for _ in range(2):
+        with pytest.raises(InternalServerError):
+            _run(create, model)
+    assert breaker_mod.breaker_for(model).state == OPEN
+    with pytest.raises(CircuitOpen):
+        _run(create, model)
+    assert len(create.calls) == 2             # the third call was never sent
+
+
+def test_rate_limits_do_not_count_as_failures(model):
+    create = FakeCreate(*(_status_error(RateLimitError, 429) for _ in range(3)))
+    for _ in range(3):
+        with pytest.raises(RateLimitError):
+            _run(create, model)
+    assert breaker_mod.breaker_for(model).state == CLOSED
+
+
+def test_timeouts_we_imposed_do_not_count(model):
+    timeout = APITimeoutError(httpx.Request("POST", "http://x"))
+    create = FakeCreate(*[timeout] * 5)
+    for _ in range(3):
+        with pytest.raises(APITimeoutError):
+            _run(create, model, deadline=5)   # the call's timeout was clamped to the deadline
+    assert breaker_mod.breaker_for(model).state == CLOSED
+    for _ in range(2):
+        with pytest.raises(APITimeoutError):
+            _run(create, model)               # unclamped: the provider was slow
+    assert breaker_mod.breaker_for(model).state == OPEN
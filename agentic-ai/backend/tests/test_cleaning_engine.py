@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from app.rag.scripts import bench_phase2_cleaning as bench
+
+p2 = bench.p2
+MODES = ["lossless", "safe", "aggressive"]
+
+SAMPLE = "\n".join([
+    "# Data Science Roadmap",
+    "",
+    "Page 3 of 40",
+    "The ﬁrst step is learn-",
+    "ing Python; the second is",
+    "SQL and statis-",
+    "Tics (not dehyphenated: capital).",
+    "Page 3 of 40",
+    "",
+    "## Skills",
+    "- pandas",
+    "- numpy",
+    "1. first",
+    "2) second",
+    "Page 3 of 40",
+    "",
+    "| a | b |",
+    "|---|---|",
+    "| 1 | 2 |",
+    "",
+    "```python",
+    "x = 1",
+    "Page 3 of 40",
+    "```",
+    "CONFIDENTIAL draft",
+    "a soft",
+    "wrapped line",
+    "Page 3 of 40",
+    "",
+    "",
+]) + "\r\nfull‑width ＡＢＣ\n\n"
+
+RULES = [
+    {"remove_lines_matching": [], "replace": []},
+    {"remove_lines_matching": [r"^CONFIDENTIAL", r"^\s*$"], "replace": []},
+    {"remove_lines_matching": [r"(draft)\s+\1", r"^Page \d+"], "replace": []},      # back-reference: not combined
+    {"remove_lines_matching": [r"^CONFIDENTIAL"], "replace": [{"pattern": r"\bSQL\b", "repl": "Structured Query Language"},
+                                                              {"pattern": "", "repl": "x"}]},
+    {"remove_lines_matching": ["(unclosed", r"^Page"], "replace": [{"pattern": "[bad", "repl": ""}]},   # invalid regexes are skipped
+]
+
+
+def _same(raw, mode, rules):
+    ref = bench.run_reference(raw, mode, rules, "DOC99", "20250101")
+    eng = bench.run_engine(raw, mode, rules, "DOC99", "20250101")
+    assert eng[0] == ref[0]
+    assert json.dumps(eng[1]) == json.dumps(ref[1])
+    return eng
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("rules", RULES)
+def test_engine_matches_multi_pass(mode, rules):
+    text, blocks = _same(SAMPLE, mode, rules)
+    assert blocks and blocks[0]["block_type"] == "heading"
+
+
+@pytest.mark.parametrize("raw", ["", "\n", "\n\n\n", "plain", "word-\nwrap", "x\n" * 6, "```\nunterminated fence\n"])
+@pytest.mark.parametrize("mode", MODES)
+def test_edge_inputs(raw, mode):
+    _same(raw, mode, RULES[1])
+
+
+def test_aggressive_actually_cleans():
+    text, blocks = _same(SAMPLE, "aggressive", RULES[0])
+    assert "Page 3 of 40" not in text             # repeated ≥ 5 times
+    assert "learning Python" in text and "first step" in text
+    assert "CONFIDENTIAL draft a soft wrapped line" in text
+    assert "CONFIDENTIAL" not in _same(SAMPLE, "aggressive", RULES[1])[0]
+    assert {b["block_type"] for b in blocks} >= {"heading", "list_item", "table", "code", "paragraph"}
+
+
+def test_invalid_rules_are_ignored():
+    eng = p2.CleaningEngine("aggressive", RULES[4])
+    assert [rx.pattern for rx in eng.remove] == [r"^Page"] and eng.replace == []
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_repo_documents(mode):
+    docs = [d for d in sorted((bench.BASE / "2_docling").glob("DOC*")) if d.is_dir() and p2.latest_md(d)[0]]
+    if not docs:
+        pytest.skip("no Phase-01 outputs")
+    rules = p2.read_rules(bench.BASE / "0_phase0" / "cleaning_rules.json")
+    for d in docs:
+        md_path, version = p2.latest_md(d)
+        raw = p2.read_text_preserve_newlines(md_path)
+        for r in (rules, RULES[2]):
+            ref = bench.run_reference(raw, mode, r, d.name, version)
+            eng = bench.run_engine(raw, mode, r, d.name, version)
+            assert eng[0] == ref[0] and json.dumps(eng[1]) == json.dumps(ref[1]), (d.name, mode)
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import llm
+from app.core.deadline import DeadlineExceeded, budget, remaining, request_deadline, run_stage, within
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+_models = itertools.count()
+
+
+def test_no_deadline_by_default():
+    assert remaining() is None and budget(1.0) is None
+    with request_deadline(None):
+        assert remaining() is None
+    with request_deadline(2):
+        assert 1.9 < remaining() <= 2.0 and 0.9 < budget(1.0) <= 1.0
+    assert remaining() is None
+
+
+def test_deadline_propagates_to_spawned_tasks():
+    async def go():
+        with request_deadline(3):
+            return await asyncio.ensure_future(asyncio.sleep(0, result=remaining()))
+
+    assert 2.9 < asyncio.run(go()) <= 3.0
+
+
+def test_within_returns_inside_budget():
+    async def go():
+        with request_deadline(1):
+            return await within(asyncio.sleep(0.01, result="ok"), stage="t.ok")
+
+    assert asyncio.run(go()) == "ok"
+
+
+def test_within_raises_when_budget_runs_out():
+    async def go():
+        with request_deadline(0.05):
+            await within(asyncio.sleep(1), stage="t.slow")
+
+    before = metrics.count("deadline.expired.t.slow")
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(go())
+    assert metrics.count("deadline.expired.t.slow") == before + 1
+
+
+def test_within_does_not_start_without_budget():
+    started = []
+
+    async def work():
+        started.append(1)
+
+    async def go():
+        with request_deadline(0.2):
+            await within(work(), stage="t.reserved", reserve=0.5)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(go())
+    assert started == []
+
+
+def test_within_keeps_inner_deadline_errors():
+    async def inner():
+        raise DeadlineExceeded("llm: request deadline passed")
+
+    async def go():
+        with request_deadline(1):
+            await within(inner(), stage="t.inner")
+
+    with pytest.raises(DeadlineExceeded, match="llm: request deadline passed"):
+        asyncio.run(go())
+
+
+def test_run_stage_falls_back():
+    async def go():
+        with request_deadline(0.05):
+            fast = await run_stage("t.fast", asyncio.sleep(0, result="real"), "fallback")
+            slow = await run_stage("t.stage", asyncio.sleep(1, result="real"), "fallback")
+        return fast, slow
+
+    assert asyncio.run(go()) == ("real", "fallback")
+
+
+def test_run_stage_propagates_other_errors():
+    async def boom():
+        raise ValueError("x")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_stage("t.err", boom(), "fallback"))
+
+
+# ---------- hedging ----------
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 50.0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 1000)
+    return f"hedge-model-{next(_models)}"
+
+
+def _resp(tag):
+    return SimpleNamespace(tag=tag, usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+
+
+def test_hedge_delay_uses_observed_quantile(model, monkeypatch):
+    assert llm.hedge_delay(model) == 0.05
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    for ms in (100, 100, 100, 100, 900):
+        metrics.observe(f"llm.latency_ms.{model}", ms)
+    assert llm.hedge_delay(model) == 0.9
+
+
+def test_fast_first_request_is_not_hedged(model):
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        return _resp("first")
+
+    assert asyncio.run(llm._hedged_call("chat", create, {"model": model, "messages": []})).tag == "first"
+    assert len(calls) == 1
+
+
+def test_slow_first_request_is_hedged_and_loser_cancelled(model):
+    calls, cancelled = [], []
+
+    async def create(**kw):
+        n = len(calls)
+        calls.append(kw)
+        try:
+            await asyncio.sleep(1.0 if n == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return _resp(f"call{n}")
+
+    won = metrics.count("llm.hedge.won")
+    resp = asyncio.run(llm._hedged_call("chat", create, {"model": model, "messages": []}))
+    assert resp.tag == "call1" and len(calls) == 2 and cancelled == [0]
+    assert metrics.count("llm.hedge.won") == won + 1
+
+
+def test_no_hedge_when_deadline_is_closer_than_delay(model):
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        await asyncio.sleep(0.1)
+        return _resp("only")
+
+    async def go():
+        with request_deadline(0.04):
+            return await llm._hedged_call("chat", create, {"model": model, "messages": []})
+
+    assert asyncio.run(go()).tag == "only" and len(calls) == 1
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.rag.scripts import phase4_build_index as p4
+
+BASE_TEXT = ("gradient boosting builds an ensemble of shallow decision trees where each new tree fits the "
+             "residual errors of the current model and a learning rate shrinks every update so the ensemble "
+             "generalizes better than a single deep tree trained on the same features")
+
+
+def _variant(text, drop_every):
+    words = text.split()
+    return " ".join(w for i, w in enumerate(words) if (i + 1) % drop_every)
+
+
+def test_shingles():
+    assert p4.shingles("") == set()
+    assert p4.shingles("one two") == {"one two"}                 # shorter than k: one shingle
+    assert p4.shingles("A b c d e f") == {"a b c d e", "b c d e f"}
+
+
+def test_minhash_estimates_jaccard():
+    a, b = p4.shingles(BASE_TEXT), p4.shingles(_variant(BASE_TEXT, 12))
+    sigs = p4.minhash_signatures([a, b, a, set()], num_perm=256)
+    assert sigs.shape == (4, 256) and sigs.dtype == np.uint64
+    assert (sigs[0] == sigs[2]).all()                             # deterministic
+    assert (sigs[3] == np.iinfo(np.uint64).max).all()             # empty set: untouched
+    exact = len(a & b) / len(a | b)
+    assert abs((sigs[0] == sigs[1]).mean() - exact) < 0.15
+
+
+def test_clusters_collapse_near_duplicates_around_the_largest():
+    texts = [
+        BASE_TEXT,
+        BASE_TEXT + " in practice",                               # near-duplicate, larger
+        "sql window functions compute running totals ranks and moving averages over ordered partitions "
+        "without collapsing rows the way group by aggregation does",
+        BASE_TEXT,                                                # exact duplicate
+        "",
+    ]
+    sizes = [len(t.split()) for t in texts]
+    clusters = p4.near_duplicate_clusters(texts, sizes, threshold=0.7)
+    assert clusters == {1: [0, 3]}
+
+
+def test_threshold_and_no_chaining():
+    words = [f"term{i}" for i in range(60)]
+    a, b, c = (" ".join(words[k:k + 40]) for k in (0, 10, 20))   # a~b and b~c overlap, a~c much less
+    sets = [p4.shingles(t) for t in (a, b, c)]
+    jac = lambda x, y: len(sets[x] & sets[y]) / len(sets[x] | sets[y])
+    assert jac(0, 2) < 0.5 <= min(jac(0, 1), jac(1, 2))
+    assert p4.near_duplicate_clusters([a, b, c], [3, 2, 1], threshold=0.9) == {}
+    # a (largest) takes b; c is not pulled into a's cluster through b
+    assert p4.near_duplicate_clusters([a, b, c], [3, 2, 1], threshold=0.5) == {0: [1]}
+    # with b as the representative both neighbours are direct matches
+    assert p4.near_duplicate_clusters([a, b, c], [2, 3, 1], threshold=0.5) == {1: [0, 2]}
+
+
+@pytest.fixture
+def aliased_index(tiny_index):
+    from app.rag.engine.index import RagIndex
+
+    meta = [dict(m) for m in tiny_index.meta]
+    meta[0]["aliases"] = ["DOC02:0009", "DOC03:0009"]
+    alias_meta = [{"chunk_id": "DOC02:0009", "doc_id": "DOC02", "alias_of": "DOC01:0001"},
+                  {"chunk_id": "DOC03:0009", "doc_id": "DOC03", "alias_of": "DOC01:0001"}]
+    return RagIndex(meta, tiny_index.bm25, tiny_index.bm25_ids, tiny_index.model, tiny_index.index,
+                    tiny_index.cfg, alias_meta)
+
+
+def test_index_expands_and_filters_through_aliases(aliased_index):
+    idx = aliased_index
+    assert idx.meta_map["DOC02:0009"]["alias_of"] == "DOC01:0001"
+    assert idx.expand(["DOC01:0001", "DOC02:0001", "DOC02:0009"]) == ["DOC01:0001", "DOC02:0009", "DOC03:0009", "DOC02:0001"]
+    assert idx._allowed("DOC01:0001", None) == "DOC01:0001"
+    assert idx._allowed("DOC01:0001", {"DOC03"}) == "DOC03:0009"
+    assert idx._allowed("DOC01:0002", {"DOC03"}) is None
+
+    q = ["python pandas dataframes"]
+    assert idx.search_sync(q)[0] == "DOC01:0001"
+    assert idx.search_sync(q, expand_aliases=True)[:3] == ["DOC01:0001", "DOC02:0009", "DOC03:0009"]
+    # the representative is remapped to an alias from an allowed document
+    hits = idx.search_sync(q, allow_docs=["DOC03"])
+    assert hits[0] == "DOC03:0009" and "DOC01:0001" not in hits
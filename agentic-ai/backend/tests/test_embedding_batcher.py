@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.rag.engine.batcher import EmbeddingBatcher
+
+
+class Recorder:
+    def __init__(self, encoder, fail_on=None):
+        self.encoder, self.fail_on, self.calls = encoder, fail_on, []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.fail_on and self.fail_on in texts:
+            raise RuntimeError("encoder blew up")
+        return self.encoder.encode(texts)
+
+
+async def _inline(fn, *args):
+    return fn(*args)
+
+
+def test_concurrent_callers_share_one_pass(encoder):
+    rec = Recorder(encoder)
+    b = EmbeddingBatcher(rec, max_batch=64, max_wait_ms=20, run=_inline)
+    reqs = [["python pandas"], ["sql joins", "python pandas"], ["statistics"], ["sql joins"]]
+
+    async def go():
+        return await asyncio.gather(*(b.embed(r) for r in reqs))
+
+    outs = asyncio.run(go())
+    assert len(rec.calls) == 1
+    assert rec.calls[0] == ["python pandas", "sql joins", "statistics"]      # duplicates encoded once
+    for r, out in zip(reqs, outs):
+        assert out.shape == (len(r), 64) and out.dtype == np.float32
+        assert np.allclose(out, encoder.encode(r))
+
+
+def test_max_batch_splits_passes(encoder):
+    rec = Recorder(encoder)
+    b = EmbeddingBatcher(rec, max_batch=2, max_wait_ms=20, run=_inline)
+
+    async def go():
+        return await asyncio.gather(*(b.embed([f"text {i}"]) for i in range(5)))
+
+    outs = asyncio.run(go())
+    assert [len(c) for c in rec.calls] == [2, 2, 1]
+    assert all(np.allclose(o, encoder.encode([f"text {i}"])) for i, o in enumerate(outs))
+
+
+def test_encoder_error_reaches_every_caller_and_worker_survives(encoder):
+    rec = Recorder(encoder, fail_on="boom")
+    b = EmbeddingBatcher(rec, max_batch=64, max_wait_ms=10, run=_inline)
+
+    async def go():
+        res = await asyncio.gather(b.embed(["boom"]), b.embed(["fine"]), return_exceptions=True)
+        after = await b.embed(["fine again"])
+        return res, after
+
+    (r1, r2), after = asyncio.run(go())
+    assert isinstance(r1, RuntimeError) and isinstance(r2, RuntimeError)
+    assert np.allclose(after, encoder.encode(["fine again"]))
+    assert b._pending == 0
+
+
+def test_cancelled_caller_does_not_break_the_batch(encoder):
+    b = EmbeddingBatcher(Recorder(encoder), max_batch=64, max_wait_ms=30, run=_inline)
+
+    async def go():
+        t1 = asyncio.ensure_future(b.embed(["cancel me"]))
+        t2 = asyncio.ensure_future(b.embed(["keep me"]))
+        await asyncio.sleep(0)
+        t1.cancel()
+        return await t2, t1
+
+    kept, t1 = asyncio.run(go())
+    assert t1.cancelled() and np.allclose(kept, encoder.encode(["keep me"]))
+
+
+def test_empty_input_and_new_event_loops(encoder):
+    rec = Recorder(encoder)
+    b = EmbeddingBatcher(rec, max_wait_ms=0, run=_inline)
+    assert asyncio.run(b.embed([])).shape == (0, 0)
+    assert rec.calls == []
+    # CLIs call asyncio.run() repeatedly: the worker is rebuilt on the new loop
+    for _ in range(2):
+        assert np.allclose(asyncio.run(b.embed(["again"])), encoder.encode(["again"]))
+
+
+def test_default_runs_off_the_loop(encoder):
+    import threading
+
+    seen = []
+
+    def enc(texts):
+        seen.append(threading.current_thread() is threading.main_thread())
+        return encoder.encode(texts)
+
+    out = asyncio.run(EmbeddingBatcher(enc, max_wait_ms=0).embed(["x"]))
+    assert out.shape == (1, 64) and seen == [False]
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import app.rag.engine as rag_engine
+from app.components import component5
+from app.core.metrics import metrics
+from app.services import gate_classifier
+
+
+@pytest.fixture
+def model_file(tmp_path, monkeypatch):
+    """Points the classifier at a fresh model file and forgets any loaded model."""
+    path = tmp_path / "gate_classifier.json"
+    monkeypatch.setattr(gate_classifier, "MODEL_PATH", path)
+    monkeypatch.setattr(gate_classifier, "_MODEL", None)
+    monkeypatch.setattr(gate_classifier, "_LOADED", False)
+    return path
+
+
+def _write(path, weights, bias=0.0, dim=None):
+    path.write_text(json.dumps({"kind": "logreg", "embed_model": "hash", "dim": len(weights) if dim is None else dim,
+                                "weights": [float(w) for w in weights], "bias": bias, "fitted_on": 100}))
+
+
+@pytest.fixture
+def index(tiny_index, monkeypatch):
+    async def get_index():
+        return tiny_index
+    monkeypatch.setattr(rag_engine, "get_index", get_index)
+    return tiny_index
+
+
+def test_gate_text_prepends_the_previous_question():
+    assert gate_classifier.gate_text(" python ") == "python"
+    assert gate_classifier.gate_text("yes", "Want to add skills?") == "Q: Want to add skills?\nA: yes"
+
+
+def test_no_model_means_llm_gate_only(model_file):
+    assert gate_classifier.load_gate_model() is None
+    assert asyncio.run(gate_classifier.predict("hello")) is None
+
+
+def test_mismatched_weights_are_rejected(model_file):
+    _write(model_file, [0.1] * 3, dim=4)
+    assert gate_classifier.load_gate_model() is None
+
+
+def test_predict_scores_in_and_out_of_scope(model_file, index, encoder):
+    direction = encoder.encode(["python pandas dataframes"])[0]
+    _write(model_file, direction * 20, bias=-5.0)
+    in_scope = asyncio.run(gate_classifier.predict("python pandas dataframes"))
+    off_topic = asyncio.run(gate_classifier.predict("the weather in paris"))
+    assert in_scope[0] is True and in_scope[1] > 0.9
+    assert off_topic[0] is False and off_topic[1] < 0.1
+    assert gate_classifier.confidence(in_scope[1]) == in_scope[1]
+    assert gate_classifier.confidence(off_topic[1]) == 1 - off_topic[1]
+
+
+def test_predict_abstains_on_dim_mismatch(model_file, index, encoder):
+    _write(model_file, [0.0] * (encoder.encode(["x"]).shape[1] + 1))
+    assert asyncio.run(gate_classifier.predict("python")) is None
+
+
+def test_predict_abstains_when_the_encoder_fails(model_file, monkeypatch):
+    _write(model_file, [0.0] * 8)
+
+    async def broken():
+        raise RuntimeError("index not built")
+
+    monkeypatch.setattr(rag_engine, "get_index", broken)
+    assert asyncio.run(gate_classifier.predict("python")) is None
+
+
+def test_log_gate_decision_rows_and_shadow_metrics(tmp_path, monkeypatch):
+    log = tmp_path / "gate_log.jsonl"
+    monkeypatch.setattr(gate_classifier, "LOG_PATH", str(log))
+    agree, disagree = metrics.count("gate.shadow.agree"), metrics.count("gate.shadow.disagree")
+    gate_classifier.log_gate_decision("python", "", None, {"proceed": True, "confidence": 0.8}, (True, 0.93))
+    gate_classifier.log_gate_decision("weather", "", None, {"proceed": False}, (True, 0.6))
+    gate_classifier.log_gate_decision("hi", "", None, {"proceed": True}, None)
+    rows = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [r["proceed"] for r in rows] == [True, False, True]
+    assert rows[0]["local_p"] == 0.93 and rows[0]["llm_confidence"] == 0.8 and rows[2]["local_p"] is None
+    assert metrics.count("gate.shadow.agree") == agree + 1
+    assert metrics.count("gate.shadow.disagree") == disagree + 1
+
+
+def test_log_gate_decision_off_without_a_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(gate_classifier, "LOG_PATH", "")
+    gate_classifier.log_gate_decision("python", "", None, {"proceed": True}, None)
+    assert list(tmp_path.iterdir()) == []
+
+
+# ---------- component 5 ----------
+def _gate(monkeypatch, tmp_path, pred):
+    """Run the C05 gate in "on" mode with a fixed local prediction. Returns (verdict, LLM calls, log rows)."""
+    calls, log = [], tmp_path / "gate_log.jsonl"
+
+    async def predict(user_msg, prev=""):
+        return pred
+
+    async def llm(**kw):
+        calls.append(kw["model"])
+        return json.dumps({"proceed": False, "message": "I can help with skills and careers. What would you like to learn?"})
+
+    async def step(*a):
+        pass
+
+    monkeypatch.setattr(gate_classifier, "MODE", "on")
+    monkeypatch.setattr(gate_classifier, "LOG_PATH", str(log))
+    monkeypatch.setattr(gate_classifier, "predict", predict)
+    monkeypatch.setattr(component5, "llm_complete_json", llm)
+    out = asyncio.run(component5.component5(db=None, chat_id="c", user_id="u", user_msg="weather", step=step, last=None))
+    rows = [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+    return out, calls, rows
+
+
+def test_confident_in_scope_is_decided_locally(monkeypatch, tmp_path):
+    out, calls, rows = _gate(monkeypatch, tmp_path, (True, 0.99))
+    assert out == {"proceed": True} and calls == [] and rows == []
+
+
+def test_out_of_scope_goes_to_the_llm_gate_and_is_logged(monkeypatch, tmp_path):
+    out, calls, rows = _gate(monkeypatch, tmp_path, (False, 0.01))
+    assert calls and out["proceed"] is False
+    assert out["message"] == "I can help with skills and careers. What would you like to learn."   # LLM explainer
+    assert rows[0]["proceed"] is False and rows[0]["local_p"] == 0.01
+
+
+def test_gate_log_is_written_off_the_event_loop(monkeypatch, tmp_path):
+    threads = []
+    write = gate_classifier.log_gate_decision
+
+    def spy(*args):
+        threads.append(threading.get_ident())
+        write(*args)
+
+    monkeypatch.setattr(gate_classifier, "log_gate_decision", spy)
+    _, _, rows = _gate(monkeypatch, tmp_path, (False, 0.01))
+    assert len(rows) == 1 and threads and threads[0] != threading.main_thread().ident
+
+
+# ---------- trainer ----------
+def test_trainer_fits_a_separable_log(tmp_path):
+    from scripts import train_gate_classifier as train
+
+    log = tmp_path / "gate_log.jsonl"
+    rows = [{"text": "Python ", "prev_enc": "", "proceed": False},
+            {"text": "python", "prev_enc": "", "proceed": True},   # same text: the latest verdict wins
+            {"text": "weather", "proceed": False},
+            {"text": "", "proceed": True}]                         # skipped: no text
+    log.write_text("\n".join(json.dumps(r) for r in rows) + "\nnot json\n")
+    texts, y = train.load_rows(log)
+    assert texts == ["python", "weather"] and list(y) == [1.0, 0.0]
+
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(1, 0.3, (40, 4)), rng.normal(-1, 0.3, (40, 4))])
+    y = np.array([1.0] * 40 + [0.0] * 40)
+    for w, b in (train.fit_logreg(X, y), train.fit_centroid(X, y)):
+        m = train.evaluate(X, y, w, b, min_conf=0.9)
+        assert m["accuracy"] == 1.0 and m["local_false_refusals"] == 0 and m["local_share"] > 0.5
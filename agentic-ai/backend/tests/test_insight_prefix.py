@@ -0,0 +1,90 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import insight_engine
+from app.core.settings import settings
+
+_dbs = itertools.count()
+
+
+class FakeVault:
+    """Stands in for InsightVaultRepo: a mutable pack, with a read counter."""
+
+    pack = {"batches": [], "insights": []}
+    reads = 0
+    fail = False
+
+    def __init__(self, db):
+        self.db = db
+
+    async def build_vault_pack(self):
+        if FakeVault.fail:
+            raise RuntimeError("mongo down")
+        FakeVault.reads += 1
+        return FakeVault.pack
+
+    async def build_insight_index(self):
+        return {i["insightId"]: {"batchId": i["batchId"]} for i in FakeVault.pack["insights"]}
+
+
+def _insight(iid):
+    return {"insightId": iid, "batchId": "b1", "question": f"{iid}?", "answers": {}}
+
+
+@pytest.fixture
+def vault(monkeypatch):
+    monkeypatch.setattr(insight_engine, "InsightVaultRepo", FakeVault)
+    FakeVault.pack = {"batches": [{"batchId": "b1", "name": "B"}], "insights": [_insight("q1")]}
+    FakeVault.reads, FakeVault.fail = 0, False
+    return SimpleNamespace(name=f"prefix-db-{next(_dbs)}")
+
+
+def test_prefix_is_built_once_and_shared(vault, monkeypatch):
+    monkeypatch.setattr(settings, "INSIGHT_PREFIX_TTL_S", 300.0)
+
+    async def go():
+        first = await asyncio.gather(*(insight_engine.stage01_prefix(vault) for _ in range(3)))
+        again = await insight_engine.stage01_prefix(vault)
+        return first, again
+
+    first, again = asyncio.run(go())
+    assert FakeVault.reads == 1
+    system, index = again
+    assert all(r == again for r in first)
+    assert system.startswith(insight_engine.SYSTEM_PROMPT) and '"insightId":"q1"' in system
+    assert list(index) == ["q1"]
+
+
+def test_vault_edits_show_up_after_the_ttl(vault, monkeypatch):
+    monkeypatch.setattr(settings, "INSIGHT_PREFIX_TTL_S", 300.0)
+    before, _ = asyncio.run(insight_engine.stage01_prefix(vault))
+    FakeVault.pack = {**FakeVault.pack, "insights": [_insight("q1"), _insight("q2")]}
+    assert asyncio.run(insight_engine.stage01_prefix(vault))[0] == before   # still fresh
+
+    monkeypatch.setattr(settings, "INSIGHT_PREFIX_TTL_S", 0.0)
+    after, index = asyncio.run(insight_engine.stage01_prefix(vault))
+    assert after != before and set(index) == {"q1", "q2"}
+
+
+def test_invalidate_forces_a_rebuild(vault, monkeypatch):
+    monkeypatch.setattr(settings, "INSIGHT_PREFIX_TTL_S", 300.0)
+    asyncio.run(insight_engine.stage01_prefix(vault))
+    FakeVault.pack = {**FakeVault.pack, "insights": [_insight("q9")]}
+    insight_engine.invalidate_stage01_prefix()
+    assert list(asyncio.run(insight_engine.stage01_prefix(vault))[1]) == ["q9"]
+
+
+def test_failed_refresh_keeps_the_cached_prefix(vault, monkeypatch):
+    monkeypatch.setattr(settings, "INSIGHT_PREFIX_TTL_S", 0.0)
+    cached = asyncio.run(insight_engine.stage01_prefix(vault))
+    FakeVault.fail = True
+    assert asyncio.run(insight_engine.stage01_prefix(vault)) == cached
+
+
+def test_first_build_failure_raises(vault):
+    FakeVault.fail = True
+    with pytest.raises(RuntimeError):
+        asyncio.run(insight_engine.stage01_prefix(vault))
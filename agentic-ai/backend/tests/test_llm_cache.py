@@ -0,0 +1,168 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from app.core import llm
+from app.core.llm_cache import ResponseCache, cache_key, deterministic
+from app.core.settings import settings
+
+
+def _completion(text="hi", total=12):
+    return ChatCompletion.model_validate({
+        "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": total - 2, "completion_tokens": 2, "total_tokens": total},
+    })
+
+
+def _kw(user="q", **extra):
+    return {"model": "m", "messages": [{"role": "system", "content": "sys"}, {"role": "user", "content": user}],
+            "temperature": 0, **extra}
+
+
+# ---------- keys ----------
+def test_key_ignores_transport_params_but_not_sampling_params():
+    assert cache_key("chat", _kw(timeout=5)) == cache_key("chat", _kw(timeout=30, user="q"))
+    assert cache_key("chat", _kw()) != cache_key("chat", _kw(max_tokens=10))
+    assert cache_key("chat", _kw()) != cache_key("chat", _kw(user="other"))
+    assert cache_key("chat", _kw()) != cache_key("responses", _kw())
+
+
+def test_key_separates_system_prompt():
+    a = _kw()
+    b = {**a, "messages": [{"role": "system", "content": "other"}, a["messages"][1]]}
+    ka, kb = cache_key("chat", a).split(":"), cache_key("chat", b).split(":")
+    assert ka[2] != kb[2] and ka[3] == kb[3]
+
+
+def test_deterministic():
+    assert deterministic({"temperature": 0}) and deterministic({"top_p": 0})
+    assert not deterministic({"temperature": 0.7}) and not deterministic({})
+
+
+# ---------- in-process tier ----------
+def test_lru_hit_and_eviction():
+    c = ResponseCache(size=2, ttl_s=60, use_mongo=False)
+
+    async def go():
+        c.put("a", "chat", "m", {"v": 1})
+        c.put("b", "chat", "m", {"v": 2})
+        assert await c.get("a") == {"v": 1}       # a becomes most recent
+        c.put("c", "chat", "m", {"v": 3})         # evicts b
+        return await c.get("a"), await c.get("b"), await c.get("c")
+
+    assert asyncio.run(go()) == ({"v": 1}, None, {"v": 3})
+
+
+def test_expired_entries_miss():
+    c = ResponseCache(size=4, ttl_s=60, use_mongo=False)
+    c._remember("k", {"v": 1}, time.time() - 1)
+    assert asyncio.run(c.get("k")) is None and "k" not in c._lru
+
+
+# ---------- Mongo tier ----------
+def test_mongo_hit_fills_lru(monkeypatch):
+    from app.repositories import llm_cache_repo
+    calls = []
+
+    async def fake_get(db, key):
+        calls.append(key)
+        return {"response": {"v": 9}, "expires_at": datetime.utcnow() + timedelta(seconds=60)}
+
+    monkeypatch.setattr(llm_cache_repo, "get_cached_response", fake_get)
+    c = ResponseCache(size=4, ttl_s=60, use_mongo=True)
+
+    async def go():
+        return await c.get("k"), await c.get("k")
+
+    assert asyncio.run(go()) == ({"v": 9}, {"v": 9})
+    assert calls == ["k"]                          # second read served by the LRU
+
+
+def test_mongo_failure_falls_back_to_lru_only(monkeypatch):
+    from app.repositories import llm_cache_repo
+    calls = []
+
+    async def slow_get(db, key):
+        calls.append(key)
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(llm_cache_repo, "get_cached_response", slow_get)
+    c = ResponseCache(size=4, ttl_s=60, use_mongo=True)
+
+    async def go():
+        t0 = time.monotonic()
+        first = await c.get("k")
+        elapsed = time.monotonic() - t0
+        second = await c.get("k")
+        return first, second, elapsed
+
+    first, second, elapsed = asyncio.run(go())
+    assert first is None and second is None
+    assert elapsed < 1.0                           # bounded by _MONGO_TIMEOUT_S
+    assert calls == ["k"] and not c._mongo_ok()    # Mongo skipped while marked down
+
+
+# ---------- gateway integration ----------
+@pytest.fixture
+def cache(monkeypatch):
+    c = ResponseCache(size=16, ttl_s=60, use_mongo=False)
+    monkeypatch.setattr(llm, "response_cache", c)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    return c
+
+
+def test_fetch_serves_repeat_requests_from_cache(cache):
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        return _completion("answer")
+
+    async def go():
+        kw = _kw(model="cache-model")
+        key = cache_key("chat", kw)
+        a = await llm._fetch("chat", create, dict(kw), key, True, False)
+        b = await llm._fetch("chat", create, dict(kw), key, True, False)
+        return a, b
+
+    a, b = asyncio.run(go())
+    assert len(calls) == 1
+    assert a.choices[0].message.content == b.choices[0].message.content == "answer"
+
+
+def test_fetch_refetches_stale_entries(cache, monkeypatch):
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        return _completion("fresh")
+
+    kw = _kw(model="cache-model-2")
+    key = cache_key("chat", kw)
+    cache._remember(key, {"unexpected": object()}, time.time() + 60)
+
+    def broken(**_):
+        raise TypeError("schema changed")
+
+    monkeypatch.setattr(llm._RESPONSE_TYPES["chat"], "construct", broken)
+    resp = asyncio.run(llm._fetch("chat", create, dict(kw), key, True, False))
+    assert len(calls) == 1 and resp.choices[0].message.content == "fresh"
+
+
+def test_sampled_requests_bypass_cache(cache):
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        return _completion()
+
+    async def go():
+        for _ in range(2):
+            await llm._shared_call("chat", create, _kw(model="cache-model-3", temperature=0.7), True, False, False)
+
+    asyncio.run(go())
+    assert len(calls) == 2 and not cache._lru
@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APITimeoutError, BadRequestError, RateLimitError
+
+from app.core import llm
+from app.core.deadline import DeadlineExceeded, request_deadline
+from app.core.settings import settings
+
+_models = itertools.count()
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A fresh model name per test: its own limiter and breaker."""
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(settings, "LLM_BACKOFF_MAX", 0.02)
+    return f"test-model-{next(_models)}"
+
+
+def _status_error(cls, status, headers=None):
+    req = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return cls("boom", response=httpx.Response(status, request=req, headers=headers or {}), body=None)
+
+
+def _resp(total=10):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=total - 2, completion_tokens=2, total_tokens=total))
+
+
+class FakeCreate:
+    def __init__(self, *outcomes):
+        self.outcomes, self.calls = list(outcomes), []
+
+    async def __call__(self, **kw):
+        self.calls.append(kw)
+        out = self.outcomes.pop(0) if self.outcomes else _resp()
+        if isinstance(out, BaseException):
+            raise out
+        return out
+
+
+# ---------- TokenBucket ----------
+def test_bucket_takes_available_tokens_without_waiting():
+    b = llm.TokenBucket(60)
+    assert asyncio.run(b.acquire(10)) == 0.0
+    assert 49.9 <= b.tokens <= 50.1
+
+
+def test_bucket_waits_for_the_deficit_fifo():
+    b = llm.TokenBucket(600)              # 10 tokens/s
+    b.tokens = 0.0
+
+    async def go():
+        order = []
+
+        async def take(name):
+            waited = await b.acquire(1)
+            order.append(name)
+            return waited
+
+        t0 = time.monotonic()
+        waits = await asyncio.gather(take("a"), take("b"), take("c"))
+        return order, waits, time.monotonic() - t0
+
+    order, waits, elapsed = asyncio.run(go())
+    assert order == ["a", "b", "c"]
+    assert waits == sorted(waits) and 0.25 <= waits[-1] <= 0.35
+    assert elapsed < 0.5                  # waiters sleep concurrently, not one after another
+
+
+def test_bucket_sleeps_outside_the_lock():
+    b = llm.TokenBucket(60)
+    b.tokens = 0.0
+
+    async def go():
+        t = asyncio.ensure_future(b.acquire(0.5))
+        await asyncio.sleep(0.05)
+        locked = b._lock.locked()
+        t.cancel()
+        return locked
+
+    assert asyncio.run(go()) is False
+
+
+def test_bucket_raises_and_refunds_when_wait_outlasts_deadline():
+    b = llm.TokenBucket(60)               # 1 token/s
+    b.tokens = 0.0
+
+    async def go():
+        with request_deadline(0.2):
+            t0 = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                await b.acquire(5)
+            return time.monotonic() - t0
+
+    assert asyncio.run(go()) < 0.05       # fails fast instead of sleeping
+    assert -0.1 <= b.tokens <= 0.5        # the reservation was given back
+
+
+def test_bucket_refunds_when_cancelled():
+    b = llm.TokenBucket(60)
+    b.tokens = 0.0
+
+    async def go():
+        t = asyncio.ensure_future(b.acquire(3))
+        await asyncio.sleep(0.02)
+        t.cancel()
+        await asyncio.gather(t, return_exceptions=True)
+
+    asyncio.run(go())
+    assert -0.1 <= b.tokens <= 0.5
+
+
+def test_bucket_caps_requests_at_capacity():
+    b = llm.TokenBucket(10)
+    assert asyncio.run(b.acquire(1000)) == 0.0 and b.tokens == pytest.approx(0.0, abs=0.01)
+
+
+# ---------- estimates / backoff ----------
+def test_estimate_tokens():
+    kw = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}
+    assert llm.estimate_tokens(kw) == 150
+    assert llm.estimate_tokens({"input": "abcd" * 10, "instructions": "abcd"}) == 11 + llm._DEFAULT_OUTPUT_TOKENS
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(settings, "LLM_BACKOFF_MAX", 8.0)
+    assert 0 <= llm.backoff_delay(3) <= 4.0
+    e = _status_error(RateLimitError, 429, {"retry-after": "7"})
+    assert llm.backoff_delay(0, e) >= 7.0
+
+
+# ---------- _call ----------
+def test_call_retries_retryable_errors(model):
+    create = FakeCreate(_status_error(RateLimitError, 429), APITimeoutError(httpx.Request("POST", "http://x")), _resp(42))
+    resp = asyncio.run(llm._call("chat", create, {"model": model, "messages": [], "max_tokens": 8}))
+    assert resp.usage.total_tokens == 42 and len(create.calls) == 3
+
+
+def test_call_does_not_retry_client_errors(model):
+    create = FakeCreate(_status_error(BadRequestError, 400))
+    with pytest.raises(BadRequestError):
+        asyncio.run(llm._call("chat", create, {"model": model, "messages": []}))
+    assert len(create.calls) == 1
+    lim = llm.limiter_for(model)
+    assert lim.tokens.tokens == pytest.approx(lim.tokens.capacity, rel=1e-3)   # budget refunded
+
+
+def test_call_clamps_timeout_to_deadline(model):
+    create = FakeCreate()
+
+    async def go():
+        with request_deadline(0.5):
+            return await llm._call("chat", create, {"model": model, "messages": [], "timeout": 30})
+
+    asyncio.run(go())
+    assert 0 < create.calls[0]["timeout"] <= 0.5
+
+
+def test_call_refunds_both_buckets_when_throttled_past_deadline(model):
+    lim = llm.limiter_for(model)
+    lim.tokens.tokens = 0.0
+    req_before = lim.requests.tokens
+    create = FakeCreate()
+
+    async def go():
+        with request_deadline(0.2):
+            await llm._call("chat", create, {"model": model, "messages": [], "max_tokens": 5000})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(go())
+    assert create.calls == []
+    assert lim.requests.tokens == pytest.approx(req_before, abs=0.5)
+    assert lim.tokens.tokens < 50
+
+
+def test_call_refunds_when_deadline_already_passed(model):
+    lim = llm.limiter_for(model)
+    create = FakeCreate()
+
+    async def go():
+        with request_deadline(0.001):
+            await asyncio.sleep(0.01)
+            await llm._call("chat", create, {"model": model, "messages": []})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(go())
+    assert create.calls == []
+    assert lim.requests.tokens == pytest.approx(lim.requests.capacity, abs=0.5)
+    assert lim.tokens.tokens == pytest.approx(lim.tokens.capacity, rel=1e-3)
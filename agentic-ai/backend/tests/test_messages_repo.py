@@ -0,0 +1,42 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.repositories.messages_repo import get_last_assistant_context
+
+USER, CHAT = str(ObjectId()), str(ObjectId())
+
+
+class FakeDB:
+    """db[MESSAGES].aggregate(pipeline) -> cursor with to_list(); records the pipeline."""
+
+    def __init__(self, result):
+        self.result, self.pipelines = result, []
+
+    def __getitem__(self, name):
+        return self
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        db = self
+
+        class Cursor:
+            async def to_list(self, n):
+                return db.result
+
+        return Cursor()
+
+
+def test_last_and_actionable_in_one_round_trip():
+    last = {"content": "Here you go.", "enc_question": ""}
+    actionable = {"enc_question": "Which skills next?", "surveyType": None}
+    db = FakeDB([{"last": [last], "actionable": [actionable]}])
+    assert asyncio.run(get_last_assistant_context(db, USER, CHAT)) == {"last": last, "actionable": actionable}
+    assert len(db.pipelines) == 1
+    assert db.pipelines[0][0]["$match"] == {"chat_id": ObjectId(CHAT), "user_id": ObjectId(USER), "role": "assistant"}
+
+
+def test_new_chat_has_no_context():
+    assert asyncio.run(get_last_assistant_context(FakeDB([{"last": [], "actionable": []}]), USER, CHAT)) == \
+        {"last": None, "actionable": None}
+    assert asyncio.run(get_last_assistant_context(FakeDB([]), USER, CHAT)) == {"last": None, "actionable": None}
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, InternalServerError, RateLimitError
+
+from scripts.mock_openai_server import FAMILIES, MockConfig, _MARKERS, classify, create_app, generate
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+
+
+def _client(mock_app) -> AsyncOpenAI:
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_app), base_url="http://mock")
+    return AsyncOpenAI(api_key="test", base_url="http://mock/v1", http_client=http, max_retries=0)
+
+
+def _msgs(system, user="hi"):
+    return [{"role": "system", "text": system}, {"role": "user", "text": user}]
+
+
+# ---------- prompt families ----------
+def test_markers_still_appear_in_the_app_prompts():
+    source = "\n".join(p.read_text(encoding="utf-8") for p in APP_DIR.rglob("*.py"))
+    assert [f for f, marker in _MARKERS if marker not in source] == []
+
+
+def test_every_family_gets_schema_valid_output():
+    from app.components.component10 import _build_ec_prompt
+
+    c10 = _build_ec_prompt(user_msg="hi", ec_options=[{"id": "ec_ds", "label": "Data scientist"}], language="en")
+    cases = {
+        "gate": _msgs("Decision Gate"),
+        "intent": _msgs("You are a precise boolean classifier", "I want to be a data scientist and learn python"),
+        "stage01": _msgs("VAULT_PACK:{}"),
+        "c10": [{"role": "user", "text": c10}],
+        "plan": _msgs("You are a query planner for a private RAG system", json.dumps({"question": "what is sql"})),
+        "rerank": _msgs("You are a retrieval reranker", json.dumps({"candidates": [{"chunk_id": "D:1"}]})),
+        "sufficiency": _msgs("coverage estimator"),
+        "validate": _msgs("validator for a RAG answer"),
+        "answer": _msgs("domain-grounded assistant"),
+        "other": _msgs("small talk"),
+    }
+    assert sorted(cases) == sorted(FAMILIES)
+    for family, msgs in cases.items():
+        assert classify(msgs) == family
+    assert json.loads(generate("intent", cases["intent"]))["ec_hit"] == "ec_ds"
+    assert json.loads(generate("c10", cases["c10"]))["stage"] == "employment_category"
+    assert json.loads(generate("plan", cases["plan"]))["queries"] == ["what is sql"]
+    assert json.loads(generate("rerank", cases["rerank"]))["selected"] == ["D:1"]
+    for family in ("gate", "stage01", "sufficiency", "validate"):
+        json.loads(generate(family, cases[family]))
+
+
+def test_config_latency_faults_and_scripts():
+    cfg = MockConfig({
+        "latency": {"default": {"dist": "fixed", "ms": 50}, "answer": {"dist": "uniform", "lo_ms": 10, "hi_ms": 20}},
+        "errors": {"gate": {"500": 1.0}},
+        "scripts": {"gate": [{"proceed": False}, "raw"]},
+    }, seed=1)
+    assert cfg.delay_s("plan") == 0.05 and 0.01 <= cfg.delay_s("answer") <= 0.02
+    assert cfg.fault("gate") == "500" and cfg.fault("plan") is None
+    assert [cfg.scripted("gate") for _ in range(3)] == ['{"proceed": false}', "raw", '{"proceed": false}']
+    assert cfg.scripted("plan") is None
+
+
+# ---------- HTTP ----------
+def test_chat_and_responses_endpoints():
+    mock = create_app(MockConfig({}))
+
+    async def go():
+        client = _client(mock)
+        chat = await client.chat.completions.create(
+            model="gpt-4o-mini", messages=[{"role": "system", "content": "Decision Gate"}, {"role": "user", "content": "hi"}])
+        resp = await client.responses.create(model="gpt-4o-mini", instructions="domain-grounded assistant", input="sql?")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=mock), base_url="http://mock") as http:
+            stats = (await http.get("/mock/stats")).json()
+        return chat, resp, stats
+
+    chat, resp, stats = asyncio.run(go())
+    assert json.loads(chat.choices[0].message.content)["proceed"] is True
+    assert chat.usage.prompt_tokens > 0 and chat.usage.total_tokens == chat.usage.prompt_tokens + chat.usage.completion_tokens
+    assert resp.output_text.startswith("**Overview**") and resp.usage.output_tokens > 0
+    assert stats["gate"]["requests"] == 1 and stats["answer"]["requests"] == 1
+
+
+def test_streaming_chat():
+    mock = create_app(MockConfig({"stream": {"ttft_ms": 0, "token_ms": 0}}))
+
+    async def go():
+        stream = await _client(mock).chat.completions.create(
+            model="m", messages=[{"role": "user", "content": "domain-grounded assistant"}], stream=True,
+            stream_options={"include_usage": True})
+        text, usage = "", None
+        async for chunk in stream:
+            if chunk.choices:
+                text += chunk.choices[0].delta.content or ""
+            usage = chunk.usage or usage
+        return text, usage
+
+    text, usage = asyncio.run(go())
+    assert text.startswith("**Overview**") and usage.completion_tokens > 0
+
+
+def test_repeated_long_system_prompt_counts_as_cached():
+    mock = create_app(MockConfig({}))
+    system = "VAULT_PACK:" + "x" * 4 * 1500
+
+    async def go():
+        client = _client(mock)
+        out = []
+        for _ in range(2):
+            r = await client.chat.completions.create(
+                model="m", messages=[{"role": "system", "content": system}, {"role": "user", "content": "hi"}])
+            out.append(r.usage.prompt_tokens_details.cached_tokens)
+        return out
+
+    assert asyncio.run(go()) == [0, 1024 + (1502 - 1024) // 128 * 128]
+
+
+def test_injected_errors():
+    mock = create_app(MockConfig({"errors": {"gate": {"429": 1.0}, "default": {"500": 1.0}}}))
+
+    async def go(system):
+        await _client(mock).chat.completions.create(
+            model="m", messages=[{"role": "system", "content": system}, {"role": "user", "content": "hi"}])
+
+    with pytest.raises(RateLimitError) as e:
+        asyncio.run(go("Decision Gate"))
+    assert e.value.response.headers["retry-after"] == "1"
+    with pytest.raises(InternalServerError):
+        asyncio.run(go("coverage estimator"))
+
+
+# ---------- /messages against the mock (needs MongoDB) ----------
+def _mongo_up() -> bool:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.core.settings import settings
+
+    async def ping():
+        client = AsyncIOMotorClient(settings.MONGO_URI, serverSelectionTimeoutMS=500)
+        try:
+            await client.admin.command("ping")
+            return True
+        except Exception:
+            return False
+        finally:
+            client.close()
+
+    return asyncio.run(ping())
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """run(prompts, mock_cfg) -> assistant replies, posted through /messages with the LLM gateway on the mock."""
+    if not _mongo_up():
+        pytest.skip("MongoDB is not reachable")
+    from app.core import breaker, llm
+    from app.core.llm_cache import ResponseCache
+    from app.core.settings import settings
+    from app.db import mongo
+
+    db_name = f"agentic_ai_test_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(settings, "MONGO_DB", db_name)
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(settings, "LLM_BACKOFF_MAX", 0.02)
+    monkeypatch.setattr(mongo, "_client", None)
+    monkeypatch.setattr(mongo, "_db", None)
+    monkeypatch.setattr(breaker, "_BREAKERS", {})
+    monkeypatch.setattr(llm, "response_cache", ResponseCache(use_mongo=False))
+
+    def run(prompts, mock_cfg=None):
+        async def go():
+            from app.main import app
+            from scripts import seed_insight_vault, seed_vault
+
+            monkeypatch.setattr(llm, "client", _client(create_app(MockConfig(mock_cfg or {}))))
+            try:
+                await seed_vault.main()
+                await seed_insight_vault.main()
+                async with app.router.lifespan_context(app):
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api",
+                                                 timeout=60) as api:
+                        tokens = (await api.post("/auth/signup", json={"email": f"{db_name}@example.com",
+                                                                       "password": "pw-123456"})).json()
+                        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+                        chat_id = (await api.post("/chats", json={}, headers=headers)).json()["id"]
+                        replies = []
+                        for p in prompts:
+                            r = await api.post(f"/messages/{chat_id}", json={"prompt": p}, headers=headers)
+                            assert r.status_code == 200, r.text
+                            replies.append(r.json())
+                        return replies
+            finally:
+                await mongo.get_client().drop_database(db_name)
+
+        return asyncio.run(go())
+
+    return run
+
+
+def test_messages_turn_in_scope(turn):
+    reply = turn(["I want to become a data scientist. Which skills should I learn first?"])[0]
+    assert reply["role"] == "assistant" and reply["content"]
+
+
+def test_messages_turn_refused_by_the_gate(turn):
+    reply = turn(["What is the weather in Paris tomorrow?"],
+                 {"scripts": {"gate": [{"proceed": False, "message": "Out of scope.", "confidence": 0.99}]}})[0]
+    assert reply["content"] == "Out of scope."
+
+
+def test_messages_turn_when_the_provider_fails(turn):
+    from app.components.component5 import FRIENDLY_FALLBACK
+
+    reply = turn(["Which skills matter for data engineering?"], {"errors": {"default": {"500": 1.0}}})[0]
+    assert reply["content"] == FRIENDLY_FALLBACK   # gate failed with no local verdict: refused, not a 500
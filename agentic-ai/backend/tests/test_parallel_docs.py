@@ -0,0 +1,74 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.rag.scripts import phase2_clean_pipeline as p2
+from app.rag.scripts.phase1_docling_ingest import run_docs, write_manifest
+
+DOCLING = Path(p2.__file__).resolve().parents[1] / "2_docling"
+
+
+def _square(x, marker=None):
+    if x < 0:
+        raise ValueError(f"bad {x}")
+    return x * x
+
+
+def _flaky(x, marker):
+    """Fails (or kills its worker) the first time it sees x, succeeds after."""
+    m = Path(marker) / str(x)
+    if not m.exists():
+        m.write_text("seen")
+        if x == 3:
+            os._exit(1)          # crashed worker → BrokenProcessPool for everything in flight
+        raise RuntimeError("first attempt")
+    return x * x
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_docs_collects_results_and_errors(workers):
+    items = [(f"DOC{i:02d}", i) for i in (1, 2, -3, 4)]
+    results, errors = run_docs(items, _square, lambda x: (x,), workers=workers, retries=1)
+    assert results == {"DOC01": 1, "DOC02": 4, "DOC04": 16}
+    assert list(errors) == ["DOC-3"] and isinstance(errors["DOC-3"], ValueError)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_docs_retries_failed_docs(tmp_path, workers, capsys):
+    xs = (1, 2) if workers == 1 else (1, 2, 3)
+    items = [(f"DOC{x:02d}", x) for x in xs]
+    results, errors = run_docs(items, _flaky, lambda x: (x, str(tmp_path)), workers=workers, retries=1)
+    assert results == {f"DOC{x:02d}": x * x for x in xs} and errors == {}
+    assert "Retrying" in capsys.readouterr().out
+
+    for x in xs:
+        (tmp_path / str(x)).unlink()
+    results, errors = run_docs(items, _flaky, lambda x: (x, str(tmp_path)), workers=workers, retries=0)
+    assert results == {} and set(errors) == {f"DOC{x:02d}" for x in xs}
+
+
+def test_write_manifest_merges_by_doc_id(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    write_manifest(path, [{"doc_id": "DOC02", "v": 1}, {"doc_id": "DOC01", "v": 1}])
+    path.write_text(path.read_text() + "not json\n")
+    write_manifest(path, [{"doc_id": "DOC02", "v": 2}, {"doc_id": "DOC03", "v": 1}])
+    rows = [json.loads(l) for l in path.read_text().splitlines()]
+    assert rows == [{"doc_id": "DOC01", "v": 1}, {"doc_id": "DOC02", "v": 2}, {"doc_id": "DOC03", "v": 1}]
+    assert not path.with_suffix(".jsonl.tmp").exists()
+
+
+def test_parallel_clean_matches_serial(tmp_path):
+    docs = sorted(p for p in DOCLING.glob("DOC*") if p.is_dir() and p2.latest_md(p)[0])[:3]
+    if not docs:
+        pytest.skip("no Phase-01 outputs")
+    rules = p2.read_rules(Path(p2.__file__).resolve().parents[1] / "0_phase0" / "cleaning_rules.json")
+    out = {}
+    for workers in (1, 3):
+        root = tmp_path / f"w{workers}"
+        results, errors = run_docs([(d.name, d) for d in docs], p2.clean_doc,
+                                   lambda d: (d, root, "aggressive", rules), workers=workers, retries=0)
+        assert errors == {} and set(results) == {d.name for d in docs}
+        out[workers] = {p.relative_to(root): p.read_bytes() for p in root.rglob("*") if p.is_file()}
+    assert out[1] and out[1] == out[3]
@@ -0,0 +1,145 @@
+import pytest
+import tiktoken
+
+from app.rag.scripts import bench_phase3_chunking as bench
+
+p3 = bench.p3
+
+# cl100k's pre-token pattern with a tiny byte-level vocabulary: the real BPE file needs a
+# download, but anchor additivity only depends on the pattern.
+CL100K_PAT = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+WORD_PAT = r"""\w+|[^\w\s]+|\s+"""
+
+
+def _toy_encoding(name, pat):
+    ranks = {bytes([i]): i for i in range(256)}
+    for tok in ["th", "he", "the", " t", " the", "in", "ing", "er", "an", "and", " a", " an", " and",
+                "on", "ion", "at", "ation", "\n\n", ". ", "es", "ed", " i", " in", "re", " re"]:
+        ranks.setdefault(tok.encode(), len(ranks))
+    return tiktoken.Encoding(name=name, pat_str=pat, mergeable_ranks=ranks, special_tokens={})
+
+
+TOY = _toy_encoding("toy_cl100k", CL100K_PAT)
+CFG = {**p3.load_config(p3.Path("/nonexistent")), "target_tokens": 120, "max_tokens": 160,
+       "min_tokens": 30, "overlap_tokens": 8}
+
+
+class _Spy:
+    """Encoding wrapper counting batch vs one-by-one encodes."""
+
+    def __init__(self, enc):
+        self.enc, self._pat_str, self.batches, self.singles = enc, enc._pat_str, 0, 0
+
+    def encode_ordinary(self, text):
+        self.singles += 1
+        return self.enc.encode_ordinary(text)
+
+    def encode_ordinary_batch(self, texts):
+        self.batches += 1
+        return self.enc.encode_ordinary_batch(texts)
+
+
+def _block(i, text, kind="paragraph", **kw):
+    return {"block_index": i, "block_type": kind, "text": text, "section_path": ["Skills", f"S{i // 7}"], **kw}
+
+
+def _blocks():
+    texts = [
+        "Python is the language most data teams start with, and pandas is where they stay.",
+        "SQL",                                   # no anchor: the whole block joins the junction
+        "Statistics: hypothesis tests, confidence intervals, and the bootstrap.   ",
+        "1.2.3 — 42",                            # no letters at all
+        "Don't skip version control; it's what makes experiments reproducible.\n",
+        "Docker, CI, and cloud basics (AWS/GCP) round out the stack",
+        "Communication matters as much as modelling.",
+    ]
+    blocks, k = [], 0
+    for rep in range(6):
+        blocks.append(_block(k, f"Section {rep}", "heading", heading_level=2 if rep % 2 else 3)); k += 1
+        for t in texts:
+            blocks.append(_block(k, f"{t} ({rep})" if rep % 3 == 1 else t)); k += 1
+        if rep % 2:
+            blocks.append(_block(k, "| a | b |\n|---|---|\n| 1 | 2 |", "table")); k += 1
+    return blocks
+
+
+def _reference(blocks, cfg, monkeypatch, fn):
+    monkeypatch.setattr(p3, "count_tokens", fn)
+    return bench.run_reference("DOC99", "20250101", blocks, cfg)
+
+
+def _incremental(blocks, cfg, counter):
+    chunks = p3.build_chunks(blocks, cfg, counter=counter)
+    return p3.finalize_chunks("DOC99", "20250101", chunks, cfg, counter=counter)
+
+
+def _toy_count(s):
+    return len(TOY.encode_ordinary(s))
+
+
+@pytest.mark.parametrize("incl_headings", [False, True])
+def test_matches_full_retokenization(monkeypatch, incl_headings):
+    cfg = {**CFG, "include_headings_in_text": incl_headings}
+    blocks = _blocks()
+    ref = _reference(blocks, cfg, monkeypatch, _toy_count)
+    pc = p3.IncrementalCounter(enc=TOY, token_fn=_toy_count)
+    assert pc.exact
+    inc = _incremental(blocks, cfg, pc)
+    assert bench.rows_bytes(inc) == bench.rows_bytes(ref)
+    assert len(ref) > 3 and any("overlap_with_prev" in r for r in ref)
+    for r in inc:
+        assert r["token_count"] == _toy_count(r["text"])
+        assert r["embedding_token_count"] == _toy_count(r["embedding_text"])
+
+
+def test_repo_document_matches(monkeypatch):
+    path = p3.latest_file(bench.BASE / "3_clean" / "DOC04", "_blocks.jsonl")
+    if not path:
+        pytest.skip("no Phase-02 blocks for DOC04")
+    blocks = p3.read_blocks_jsonl(path)
+    cfg = p3.load_config(bench.BASE / "0_phase0" / "chunking_config.json")
+    ref = _reference(blocks, cfg, monkeypatch, _toy_count)
+    inc = _incremental(blocks, cfg, p3.IncrementalCounter(enc=TOY, token_fn=_toy_count))
+    assert bench.rows_bytes(inc) == bench.rows_bytes(ref)
+
+
+def test_counts_come_from_batches():
+    blocks = [b for b in _blocks() if not b["text"].startswith(("SQL", "1.2.3"))]
+    spy = _Spy(TOY)
+    pc = p3.IncrementalCounter(enc=spy, token_fn=_toy_count)
+    _incremental(blocks, CFG, pc)
+    # prime (content pieces), tables, overlap prefixes, breadcrumbs
+    assert spy.batches == 4
+    assert spy.singles == 0
+
+
+def test_fallback_without_cl100k_pattern(monkeypatch):
+    words = _toy_encoding("toy_words", WORD_PAT)
+    fn = lambda s: len(words.encode_ordinary(s))
+    pc = p3.IncrementalCounter(enc=words, token_fn=fn)
+    assert not pc.exact
+    blocks = _blocks()
+    assert bench.rows_bytes(_incremental(blocks, CFG, pc)) == bench.rows_bytes(_reference(blocks, CFG, monkeypatch, fn))
+    assert pc.memo == {}
+
+
+class _NonAdditive:
+    """Claims the cl100k pattern but counts characters / 3: anchor splits do not add up."""
+    _pat_str = CL100K_PAT
+
+    def encode_ordinary(self, text):
+        return [0] * (len(text) // 3)
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(t) for t in texts]
+
+
+def test_split_mismatch_falls_back(monkeypatch, capsys):
+    fn = lambda s: len(s) // 3
+    pc = p3.IncrementalCounter(enc=_NonAdditive(), token_fn=fn)
+    assert pc.exact
+    blocks = _blocks()
+    inc = _incremental(blocks, CFG, pc)
+    assert not pc.exact
+    assert "anchor split mismatch" in capsys.readouterr().err
+    assert bench.rows_bytes(inc) == bench.rows_bytes(_reference(blocks, CFG, monkeypatch, fn))
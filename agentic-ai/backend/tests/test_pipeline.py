@@ -0,0 +1,155 @@
+import json
+import sys
+
+import pytest
+
+from app.rag.scripts import pipeline as pl
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """A throwaway rag/ tree: registry, phase-0 configs, one PDF per doc."""
+    phase0 = tmp_path / "0_phase0"
+    phase0.mkdir()
+    (phase0 / "cleaning_rules.json").write_text("{}")
+    (phase0 / "chunking_config.json").write_text('{"target_tokens": 800}')
+    (tmp_path / "1_raw").mkdir()
+    rows = []
+    for d in ("DOC01", "DOC02"):
+        (tmp_path / "1_raw" / f"{d}.pdf").write_bytes(d.encode())
+        rows.append(f"{d},20250101,1_raw/{d}.pdf,,true")
+    (phase0 / "corpus_registry.csv").write_text("doc_id,version,filename,checksum,is_current\n" + "\n".join(rows) + "\n")
+    monkeypatch.setattr(pl, "BASE", tmp_path)
+    monkeypatch.setattr(pl, "PHASE0", phase0)
+    monkeypatch.setattr(pl, "STATE", tmp_path / "pipeline_state.json")
+    return tmp_path
+
+
+def _write_outputs(stage, docs, version="20250101"):
+    for d in docs:
+        for p in pl.outputs(stage, d, version):
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text("x")
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Fake phase scripts: write outputs for the --only docs, except the ones listed in failing[stage]
+    (phase scripts report a bad document on stderr and keep going, so the exit code stays 0)."""
+    calls, failing = [], {}
+
+    def run_stage(stage, extra):
+        calls.append((stage, extra))
+        if stage == "index":
+            _write_outputs("index", [""])
+            return failing.get("index", 0), 0.01
+        docs = extra[extra.index("--only") + 1:extra.index("--rebuild")]
+        _write_outputs(stage, [d for d in docs if d not in failing.get(stage, ())])
+        return failing.get(stage + ":rc", 0), 0.01
+
+    monkeypatch.setattr(pl, "run_stage", run_stage)
+    return calls, failing
+
+
+def _main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["pipeline.py", *argv])
+    pl.main()
+
+
+def _keys(tree):
+    return pl.compute_keys(pl.read_registry(tree / "0_phase0" / "corpus_registry.csv"), "lossless")
+
+
+def test_keys_chain_downstream(tree):
+    before = _keys(tree)
+    (tree / "0_phase0" / "cleaning_rules.json").write_text('{"x": 1}')
+    after = _keys(tree)
+    for d in ("DOC01", "DOC02"):
+        assert after[d]["docling"] == before[d]["docling"]
+        assert after[d]["clean"] != before[d]["clean"]
+        assert after[d]["chunk"] != before[d]["chunk"]
+    (tree / "1_raw" / "DOC02.pdf").write_bytes(b"changed")
+    again = _keys(tree)
+    assert again["DOC01"] == after["DOC01"]
+    assert again["DOC02"]["docling"] != after["DOC02"]["docling"]
+
+
+def test_plan_stale_on_key_or_missing_output(tree):
+    keys = _keys(tree)
+    state = {"docs": {d: {s: keys[d][s] for s in pl.STAGES} for d in keys}, "index": None}
+    for s in pl.STAGES:
+        _write_outputs(s, keys)
+    _write_outputs("index", [""])
+    state["index"] = pl.index_key_of(state)
+    assert pl.plan(keys, state) == ({s: [] for s in pl.STAGES}, False)
+
+    pl.outputs("chunk", "DOC02", "20250101")[0].unlink()
+    stale, index_stale = pl.plan(keys, state)
+    assert stale == {"docling": [], "clean": [], "chunk": ["DOC02"]} and index_stale
+
+    stale, _ = pl.plan(keys, state, force="clean")
+    assert stale["docling"] == [] and stale["clean"] == ["DOC01", "DOC02"]
+    assert pl.plan(keys, state, index_opts="--dedup")[1]
+
+
+def test_run_records_keys_then_is_fresh(tree, stages, monkeypatch, capsys):
+    calls, _ = stages
+    _main(monkeypatch)
+    assert [c[0] for c in calls] == ["docling", "clean", "chunk", "index"]
+    state = json.loads(pl.STATE.read_text())
+    keys = _keys(tree)
+    assert all(state["docs"][d][s] == keys[d][s] for d in keys for s in pl.STAGES)
+    assert state["index"] == pl.index_key_of(state)
+    assert [r["status"] for r in state["last_run"]["stages"]] == ["ok"] * 4
+
+    calls.clear()
+    _main(monkeypatch)
+    assert calls == []
+    assert "total" in capsys.readouterr().out
+
+
+def test_failed_doc_not_recorded_and_index_skipped(tree, stages, monkeypatch):
+    calls, failing = stages
+    failing["clean"] = ("DOC02",)
+    with pytest.raises(SystemExit) as e:
+        _main(monkeypatch)
+    assert e.value.code == 1
+    state = json.loads(pl.STATE.read_text())
+    assert "clean" in state["docs"]["DOC01"] and "clean" not in state["docs"]["DOC02"]
+    # DOC02 is not handed to the chunk stage, and the index is not rebuilt over a partial corpus
+    chunk_call = next(extra for stage, extra in calls if stage == "chunk")
+    assert "DOC02" not in chunk_call
+    assert "index" not in [c[0] for c in calls]
+    assert state["index"] is None
+
+    failing.clear()
+    calls.clear()
+    _main(monkeypatch)
+    assert [(c[0], c[1][:3]) for c in calls[:2]] == [("clean", ["--only", "DOC02", "--rebuild"]),
+                                                     ("chunk", ["--only", "DOC02", "--rebuild"])]
+
+
+def test_dry_run_and_adopt(tree, stages, monkeypatch, capsys):
+    calls, _ = stages
+    _main(monkeypatch, "--dry-run")
+    assert calls == [] and not pl.STATE.exists()
+    assert "DOC01 DOC02" in capsys.readouterr().out
+
+    keys = _keys(tree)
+    for s in pl.STAGES:
+        _write_outputs(s, ["DOC01"])
+    _main(monkeypatch, "--adopt")
+    state = json.loads(pl.STATE.read_text())
+    assert state["docs"]["DOC01"] == {s: keys["DOC01"][s] for s in pl.STAGES}
+    assert state["docs"]["DOC02"] == {}
+    assert calls == []
+
+
+def test_nonzero_exit_fails_every_doc_of_the_stage(tree, stages, monkeypatch):
+    calls, failing = stages
+    failing["chunk:rc"] = 2
+    with pytest.raises(SystemExit):
+        _main(monkeypatch)
+    state = json.loads(pl.STATE.read_text())
+    assert all("chunk" not in state["docs"][d] and "clean" in state["docs"][d] for d in ("DOC01", "DOC02"))
+    assert "index" not in [c[0] for c in calls]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.rag.scripts import phase5_rag_cli as cli
+
+
+def _args(batch, out, concurrency=3, validate=None):
+    return SimpleNamespace(batch=str(batch), out=str(out), concurrency=concurrency, top=5, kvec=10, klex=10,
+                           doc=None, validate=validate)
+
+
+@pytest.fixture
+def questions(tmp_path):
+    p = tmp_path / "q.jsonl"
+    p.write_text("\n".join([
+        json.dumps({"id": "a", "q": "what is sql"}),
+        json.dumps({"question": "what is pandas"}),   # id defaults to the line number
+        "not json",
+        json.dumps({"id": "c", "q": "fail please"}),
+        json.dumps({"id": "d"}),                        # no question: skipped
+    ]) + "\n")
+    return p
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    seen = []
+
+    async def fake_index():
+        return object()
+
+    async def answer(*, user_question, index, **kw):
+        seen.append(user_question)
+        await asyncio.sleep(0)
+        if "fail" in user_question:
+            raise RuntimeError("boom")
+        return {"answer_md": f"A: {user_question}", "sources": [], "timings": {"retrieve": 1.0}}
+
+    monkeypatch.setattr(cli, "get_index", fake_index)
+    monkeypatch.setattr(cli, "component8_rag_answer", answer)
+    return seen
+
+
+def _rows(p):
+    return [json.loads(line) for line in p.read_text().splitlines()]
+
+
+def test_load_questions(questions):
+    rows = cli.load_questions(questions)
+    assert [(r["id"], r["q"]) for r in rows] == [("a", "what is sql"), ("2", "what is pandas"), ("c", "fail please")]
+
+
+def test_batch_writes_answers_and_errors(questions, tmp_path, engine):
+    out = tmp_path / "out.jsonl"
+    asyncio.run(cli.run_batch(_args(questions, out)))
+    rows = {r["id"]: r for r in _rows(out)}
+    assert rows["a"]["answer_md"] == "A: what is sql" and "elapsed_ms" in rows["a"]
+    assert rows["c"]["error"] == "RuntimeError: boom"
+    assert cli.completed_ids(out) == {"a", "2"}
+
+
+def test_rerun_skips_answered_and_retries_errors(questions, tmp_path, engine):
+    out = tmp_path / "out.jsonl"
+    asyncio.run(cli.run_batch(_args(questions, out)))
+    with out.open("a") as f:
+        f.write('{"id": "x", "q": "trunc')   # partial line from an interrupted run
+    engine.clear()
+    asyncio.run(cli.run_batch(_args(questions, out)))
+    assert engine == ["fail please"]
+    # the retried row starts on its own line and is readable
+    assert [r["id"] for r in _rows_lenient(out)].count("c") == 2
+
+
+def test_batch_validates_inline_unless_overridden(questions, tmp_path, monkeypatch):
+    modes = []
+
+    async def fake_index():
+        return object()
+
+    async def answer(*, validate, **kw):
+        modes.append(validate)
+        return {"answer_md": "A", "sources": [], "timings": {}}
+
+    monkeypatch.setattr(cli, "get_index", fake_index)
+    monkeypatch.setattr(cli, "component8_rag_answer", answer)
+    asyncio.run(cli.run_batch(_args(questions, tmp_path / "a.jsonl")))
+    assert set(modes) == {"inline"}   # never RAG_VALIDATE_MODE=background drafts
+    modes.clear()
+    asyncio.run(cli.run_batch(_args(questions, tmp_path / "b.jsonl", validate="off")))
+    assert set(modes) == {"off"}
+
+
+def _rows_lenient(p):
+    out = []
+    for line in p.read_text().splitlines():
+        try:
+            out.append(json.loads(line))
+        except json.JSONDecodeError:
+            pass
+    return out
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+from app.rag.engine import index as index_mod
+from app.rag.engine.index import load_chunk_record, rrf_fuse, tokenize_lex
+
+
+def test_tokenize_lex():
+    assert tokenize_lex("Scikit-Learn & SQL_2!") == ["scikit", "learn", "sql_2"]
+
+
+def test_rrf_fuse_sums_reciprocal_ranks():
+    scores = rrf_fuse({"vec": {"a": 1, "b": 2}, "bm25": {"b": 1}}, k=60)
+    assert scores["a"] == pytest.approx(1 / 61)
+    assert scores["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert rrf_fuse({}) == {}
+
+
+def test_hybrid_search_ranks_the_matching_chunk_first(tiny_index):
+    signals = {}
+    ranked = tiny_index.search_sync(["sql window functions"], signals=signals)
+    assert ranked[0] == "DOC01:0002"
+    assert signals["cos"]["DOC01:0002"] > 0.5 and signals["bm25"]["DOC01:0002"] > 0
+
+
+def test_doc_filter_excludes_other_documents(tiny_index):
+    ranked = tiny_index.search_sync(["sql window functions"], allow_docs={"DOC02"})
+    assert ranked and all(c.startswith("DOC02:") for c in ranked)
+
+
+def test_async_search_matches_sync(tiny_index):
+    async def go():
+        return await tiny_index.search(["hypothesis testing"])
+    assert asyncio.run(go()) == tiny_index.search_sync(["hypothesis testing"])
+
+
+def test_empty_query_set(tiny_index):
+    assert tiny_index.search_sync([]) == []
+
+
+def test_chunk_records_load_latest_file_and_miss_cleanly(tmp_path, monkeypatch):
+    doc = tmp_path / "DOC09"
+    doc.mkdir()
+    (doc / "20240101_chunks.jsonl").write_text(json.dumps({"chunk_id": "DOC09:1", "text": "old"}) + "\n")
+    (doc / "20250101_chunks.jsonl").write_text(json.dumps({"chunk_id": "DOC09:1", "text": "new"}) + "\n\n")
+    monkeypatch.setattr(index_mod, "CHUNKS", tmp_path)
+    index_mod.clear_chunk_cache()
+    try:
+        assert load_chunk_record("DOC09:1")["text"] == "new"
+        assert load_chunk_record("DOC09:2") is None
+        assert load_chunk_record("DOC10:1") is None
+    finally:
+        index_mod.clear_chunk_cache()
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.metrics import metrics
+from app.rag.engine.executor import RetrievalBusy, RetrievalExecutor
+
+
+def test_runs_off_the_loop_and_releases():
+    ex = RetrievalExecutor(workers=2, max_queue=1)
+
+    async def go():
+        return await ex.run(lambda a, b: (a + b, threading.current_thread().name), 2, 3)
+
+    value, thread = asyncio.run(go())
+    assert value == 5 and thread.startswith("retrieval")
+    assert ex.in_flight == 0
+    ex.shutdown()
+
+
+def test_errors_propagate_and_release():
+    ex = RetrievalExecutor(workers=1, max_queue=0)
+
+    def boom():
+        raise KeyError("nope")
+
+    async def go():
+        with pytest.raises(KeyError):
+            await ex.run(boom)
+        return await ex.run(lambda: "next")
+
+    assert asyncio.run(go()) == "next" and ex.in_flight == 0
+    ex.shutdown()
+
+
+def test_saturated_executor_rejects_instead_of_queueing():
+    ex = RetrievalExecutor(workers=1, max_queue=1)
+    gate = threading.Event()
+    before = metrics.count("retrieval.rejected")
+
+    async def go():
+        running = [asyncio.ensure_future(ex.run(gate.wait)) for _ in range(2)]
+        try:
+            await asyncio.sleep(0.05)
+            assert ex.saturated()
+            with pytest.raises(RetrievalBusy):
+                await ex.run(lambda: None)
+        finally:
+            gate.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(go())
+    assert metrics.count("retrieval.rejected") == before + 1
+    assert ex.in_flight == 0 and not ex.saturated()
+    ex.shutdown()
+
+
+def test_cancelled_caller_keeps_slot_until_fn_finishes():
+    ex = RetrievalExecutor(workers=1, max_queue=0)
+    gate = threading.Event()
+
+    async def go():
+        t = asyncio.ensure_future(ex.run(gate.wait))
+        await asyncio.sleep(0.05)
+        t.cancel()
+        await asyncio.sleep(0)
+        held = ex.in_flight            # the thread is still busy: the slot stays taken
+        gate.set()
+        for _ in range(100):
+            if ex.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        return held
+
+    assert asyncio.run(go()) == 1
+    assert ex.in_flight == 0
+    ex.shutdown()
+
+
+def test_shutdown_releases_queued_calls():
+    ex = RetrievalExecutor(workers=1, max_queue=3)
+    gate = threading.Event()
+
+    async def go():
+        tasks = [asyncio.ensure_future(ex.run(gate.wait)) for _ in range(4)]   # 1 running, 3 queued
+        try:
+            await asyncio.sleep(0.05)
+            assert ex.in_flight == 4
+            ex.shutdown()                   # queued futures are cancelled and never run
+            await asyncio.sleep(0.01)
+            assert ex.in_flight == 1        # only the running call still holds its slot
+        finally:
+            gate.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(go())
+    assert results[0] is True
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[1:])
+    deadline = time.time() + 2
+    while ex.in_flight and time.time() < deadline:
+        time.sleep(0.01)
+    assert ex.in_flight == 0
+
+    # a fresh pool is created on the next call
+    assert asyncio.run(ex.run(lambda: "again")) == "again"
+    ex.shutdown()
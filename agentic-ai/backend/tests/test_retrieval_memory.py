@@ -0,0 +1,74 @@
+import sys
+import tracemalloc
+
+import pytest
+
+from app.rag.scripts import bench_retrieval_memory as bench
+
+
+@pytest.fixture
+def traced():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_rss_sources(monkeypatch):
+    assert bench.rss_bytes() > 0
+    monkeypatch.setitem(sys.modules, "psutil", None)           # not installed → /proc/self/statm
+    assert bench.rss_bytes() > 0
+
+    def no_proc(*a, **kw):
+        raise OSError("no /proc")
+
+    monkeypatch.setattr(bench, "open", no_proc, raising=False)
+    assert bench.rss_bytes() == 0
+
+
+def test_step_measures_python_allocations(traced):
+    rows, keep = [], []
+    with bench.Step("alloc", rows):
+        keep.append(bytearray(4 * bench.MB))
+        transient = [bytearray(bench.MB) for _ in range(3)]
+        del transient
+    row = rows[0]
+    assert set(row) == {"component", "rss_mb", "py_mb", "py_peak_mb", "seconds"}
+    assert row["component"] == "alloc"
+    assert 3.9 <= row["py_mb"] <= 4.5
+    assert row["py_peak_mb"] >= 6.9
+
+
+def test_step_records_and_reraises_on_error(traced):
+    rows = []
+    with pytest.raises(ValueError):
+        with bench.Step("broken", rows):
+            raise ValueError("load failed")
+    assert rows[0]["component"] == "broken"
+
+
+def test_default_queries_are_deterministic(tiny_index):
+    a = bench.default_queries(tiny_index, 20)
+    assert a == bench.default_queries(tiny_index, 20) and len(a) == 20
+    assert set(a) <= {m["breadcrumb"] for m in tiny_index.meta}
+
+
+@pytest.mark.parametrize("with_chunks", [False, True])
+def test_replay_report(tiny_index, traced, with_chunks):
+    report = bench.replay(tiny_index, bench.default_queries(tiny_index, 15), with_chunks, warmup=2)
+    assert report["queries"] == 15
+    assert report["churn_kb_mean"] > 0 and report["churn_kb_p95"] >= report["churn_kb_mean"] * 0.5
+    assert report["latency_ms_p95"] >= report["latency_ms_p50"] >= 0
+    if not with_chunks:   # (chunk records stay in the per-doc cache by design)
+        # searching holds nothing once the query returns
+        assert report["held_kb_mean"] < 64
+
+
+def test_load_footprint_rows(tmp_path, traced):
+    pytest.importorskip("sentence_transformers")
+    from app.rag.engine.config import IDX
+
+    if not (IDX / "index_config.json").exists():
+        pytest.skip("no Phase-04 index")
+    idx, rows, sizes = bench.load_footprint(IDX)
+    assert [r["component"] for r in rows][-1] == "RagIndex handle (meta_map, aliases)"
+    assert sizes["vectors"] == len(idx.meta)
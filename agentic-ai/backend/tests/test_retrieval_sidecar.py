@@ -0,0 +1,168 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+
+from app.core import llm
+from app.core.breaker import CircuitOpen
+from app.rag.engine import orchestrator, server, stages
+from app.rag.engine.executor import RetrievalBusy
+from app.rag.engine.index import CHUNKS, RagIndex
+from app.rag.engine.remote import RemoteIndex
+
+
+@pytest.fixture
+def sidecar(tiny_index, monkeypatch):
+    meta = [dict(m) for m in tiny_index.meta]
+    meta[1]["aliases"] = ["DOC03:0009"]
+    idx = RagIndex(meta, tiny_index.bm25, tiny_index.bm25_ids, tiny_index.model, tiny_index.index,
+                   tiny_index.cfg, [{"chunk_id": "DOC03:0009", "doc_id": "DOC03", "alias_of": "DOC01:0002"}])
+    monkeypatch.setattr(RagIndex, "load", classmethod(lambda cls, *a: idx))
+    return server.create_app(), idx
+
+
+def _run(app, fn):
+    """Run fn(remote, calls) against the app in-process (startup hooks included)."""
+    calls = []
+
+    async def go():
+        async with app.router.lifespan_context(app):
+            async def record(request):
+                calls.append(request.url.path)
+
+            remote = RemoteIndex(url="http://sidecar")
+            remote._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://sidecar",
+                                               event_hooks={"request": [record]})
+            remote._loop = asyncio.get_running_loop()
+            try:
+                return await fn(remote, calls)
+            finally:
+                await remote.aclose()
+
+    return asyncio.run(go())
+
+
+def test_search_matches_in_process_index(sidecar):
+    app, idx = sidecar
+    q = ["sql joins window functions"]
+
+    async def fn(remote, calls):
+        health = await remote.health()
+        signals = {}
+        ranked = await remote.search(q, signals=signals)
+        expanded = await remote.search(q, expand_aliases=True)
+        filtered = await remote.search(q, allow_docs=["DOC03"])
+        return health, ranked, signals, expanded, filtered, remote
+
+    health, ranked, signals, expanded, filtered, remote = _run(app, fn)
+    assert health["ok"] and health["chunks"] == 5 and health["vector_store"] == "flat"
+    assert ranked == idx.search_sync(q)
+    local = {}
+    idx.search_sync(q, signals=local)
+    assert signals == local and set(signals) == {"cos", "bm25"}
+    assert expanded == idx.search_sync(q, expand_aliases=True)
+    assert expanded[:2] == ["DOC01:0002", "DOC03:0009"]
+    assert filtered[0] == "DOC03:0009"                          # alias of DOC01:0002 in an allowed doc
+    # only returned rows are mirrored locally
+    assert set(remote.meta_map) <= set(ranked) | set(expanded) | set(filtered)
+    assert remote.expand(["DOC01:0002"]) == ["DOC01:0002", "DOC03:0009"]
+
+
+def test_embed_and_chunks(sidecar, encoder):
+    app, _ = sidecar
+    path = sorted((CHUNKS / "DOC01").glob("*_chunks.jsonl"))
+    if not path:
+        pytest.skip("no 4_chunks for DOC01")
+    real = json.loads(path[-1].read_text(encoding="utf-8").splitlines()[0])["chunk_id"]
+
+    async def fn(remote, calls):
+        return await remote.embed(["python pandas"]), await remote.chunks([real, "DOC01:missing"])
+
+    vecs, chunks = _run(app, fn)
+    assert vecs.dtype == np.float32 and np.allclose(vecs, encoder.encode(["python pandas"]), atol=1e-6)
+    assert chunks[real]["chunk_id"] == real and chunks["DOC01:missing"] is None
+
+
+def test_identical_concurrent_searches_share_a_round_trip(sidecar):
+    app, _ = sidecar
+
+    async def fn(remote, calls):
+        res = await asyncio.gather(*(remote.search(["python pandas"]) for _ in range(4)))
+        return res, list(calls)
+
+    res, calls = _run(app, fn)
+    assert all(r == res[0] for r in res)
+    assert calls.count("/search") == 1
+
+
+def test_busy_sidecar_raises_retrieval_busy(sidecar, monkeypatch):
+    app, idx = sidecar
+
+    async def busy(*a, **kw):
+        raise RetrievalBusy("saturated")
+
+    monkeypatch.setattr(idx, "search", busy)
+    monkeypatch.setattr(idx, "embed", busy)
+
+    async def fn(remote, calls):
+        out = []
+        for call in (lambda: remote.search(["x"]), lambda: remote.embed(["x"])):
+            with pytest.raises(RetrievalBusy, match="saturated"):
+                await call()
+            out.append(True)
+        return out
+
+    assert _run(app, fn) == [True, True]
+
+
+def test_other_http_errors_propagate(sidecar):
+    app, _ = sidecar
+
+    async def fn(remote, calls):
+        with pytest.raises(httpx.HTTPStatusError):
+            await remote._post("/search", {"requests": [{"kvec": 3}]})   # qset missing → 422
+        return True
+
+    assert _run(app, fn)
+
+
+def test_rag_answer_reads_chunk_text_through_the_sidecar(sidecar, monkeypatch):
+    app, _ = sidecar
+    prompts = {}
+
+    def no_local_files(cid):
+        raise AssertionError("worker read a chunk file")
+
+    async def no_plan(*a, **kw):
+        raise CircuitOpen("planner off")
+
+    async def respond(*, tag, input, **kw):
+        prompts[tag] = input[-1]["content"]
+        reply = {"c08.rerank": json.dumps({"selected": ["DOC01:0002"]}),
+                 "c08.sufficiency": json.dumps({"sufficiency": 0.9}),
+                 "c08.answer": "Pandas is a Python library."}.get(tag, "{}")
+        return SimpleNamespace(output_text=reply)
+
+    monkeypatch.setattr(server, "load_chunk_record", lambda cid: {"chunk_id": cid, "text": f"body of {cid}",
+                                                                  "breadcrumb": cid})
+    monkeypatch.setattr(stages, "load_chunk_record", no_local_files)
+    monkeypatch.setattr(orchestrator, "llm_plan_queries", no_plan)
+    monkeypatch.setattr(llm, "respond", respond)
+
+    async def fn(remote, calls):
+        inline = await orchestrator.component8_rag_answer(user_question="python pandas", index=remote,
+                                                          validate="inline")
+        background = await orchestrator.component8_rag_answer(user_question="python pandas", index=remote,
+                                                              validate="background")
+        return inline, background, list(calls)
+
+    inline, background, calls = _run(app, fn)
+    assert inline["answer_md"] == "Pandas is a Python library."
+    assert inline["sources"] == [{"chunk_id": "DOC01:0002", "breadcrumb": "DOC01:0002"}]
+    for tag in ("c08.rerank", "c08.sufficiency", "c08.answer", "c08.validate"):
+        assert "body of DOC01:0002" in prompts[tag]
+    assert calls.count("/chunks") == 2                                   # one fetch per answer
+    assert background["pending_validation"]["records"]["DOC01:0002"]["text"] == "body of DOC01:0002"
@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import pytest
+
+from app.components import component10
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import metrics
+from app.core.openai_client import DEFAULT_MODEL
+from app.core.routing import Escalate, routed
+from app.core.settings import settings
+
+SMALL = "small-test-model"
+
+
+@pytest.fixture(autouse=True)
+def small_model(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_SMALL_MODEL", SMALL)
+    monkeypatch.setattr(settings, "LLM_ROUTE_MIN_CONFIDENCE", 0.7)
+
+
+def _route(name, answers, parse=None, local=None):
+    """answers: model -> raw output (or an exception to raise). Returns (result, models called)."""
+    called = []
+
+    async def call(model):
+        called.append(model)
+        out = answers[model]
+        if isinstance(out, BaseException):
+            raise out
+        return out
+
+    def default_parse(raw):
+        data = json.loads(raw)
+        return data["v"], data["conf"]
+
+    return asyncio.run(routed(name, call, parse or default_parse, local=local)), called
+
+
+def test_confident_small_answer_is_served():
+    res, called = _route("t.small", {SMALL: '{"v": "a", "conf": 0.9}'})
+    assert res == "a" and called == [SMALL]
+    assert metrics.count("route.t.small.served.small") >= 1
+
+
+def test_low_confidence_escalates_to_main_model():
+    res, called = _route("t.conf", {SMALL: '{"v": "a", "conf": 0.4}', DEFAULT_MODEL: '{"v": "b", "conf": 0.1}'})
+    assert res == "b" and called == [SMALL, DEFAULT_MODEL]   # the last tier is served whatever its confidence
+    assert metrics.count("route.t.conf.escalated.confidence") >= 1
+
+
+def test_parse_failures_and_errors_escalate():
+    def strict(raw):
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise Escalate("bad JSON") from e
+        return data["v"], data["conf"]
+
+    res, called = _route("t.parse", {SMALL: "not json", DEFAULT_MODEL: '{"v": "b", "conf": 1}'}, parse=strict)
+    assert res == "b" and called == [SMALL, DEFAULT_MODEL]
+    res, _ = _route("t.err", {SMALL: RuntimeError("boom"), DEFAULT_MODEL: '{"v": "c", "conf": 1}'})
+    assert res == "c" and metrics.count("route.t.err.escalated.error_RuntimeError") >= 1
+
+
+def test_last_tier_errors_propagate():
+    with pytest.raises(ValueError):
+        _route("t.last", {SMALL: '{"v": "a", "conf": 0.1}', DEFAULT_MODEL: ValueError("down")})
+
+
+def test_deadline_is_not_escalated():
+    with pytest.raises(DeadlineExceeded):
+        _route("t.deadline", {SMALL: DeadlineExceeded("no budget"), DEFAULT_MODEL: '{"v": "b", "conf": 1}'})
+
+
+def test_local_tier_first_and_abstain():
+    async def confident():
+        return "local", 0.95
+
+    async def abstain():
+        return None
+
+    res, called = _route("t.local", {}, local=confident)
+    assert res == "local" and called == []
+    res, called = _route("t.abstain", {SMALL: '{"v": "a", "conf": 0.9}'}, local=abstain)
+    assert res == "a" and called == [SMALL]
+
+
+def test_local_abstain_is_not_an_escalation():
+    async def abstain():
+        return None
+
+    async def unsure():
+        return "local", 0.5
+
+    _route("t.la", {SMALL: '{"v": "a", "conf": 0.9}'}, local=abstain)
+    _route("t.la", {SMALL: '{"v": "a", "conf": 0.9}'}, local=unsure)
+    assert metrics.count("route.t.la.local_abstain") == 2
+    assert metrics.count("route.t.la.escalated_calls") == 0
+    assert metrics.count("route.t.la.escalated.abstain") == 0
+    assert metrics.gauges["route.t.la.escalation_rate"] == 0
+    _route("t.la", {SMALL: '{"v": "a", "conf": 0.1}', DEFAULT_MODEL: '{"v": "b", "conf": 1}'}, local=abstain)
+    assert metrics.count("route.t.la.escalated_calls") == 1   # small -> large still escalates
+    assert metrics.gauges["route.t.la.escalation_rate"] == round(1 / 3, 4)
+
+
+def test_no_small_tier_when_unset(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_SMALL_MODEL", "")
+    res, called = _route("t.off", {DEFAULT_MODEL: '{"v": "b", "conf": 0.1}'})
+    assert res == "b" and called == [DEFAULT_MODEL]
+
+
+# ---------- C10 ----------
+def _c10(monkeypatch, answers, **kw):
+    called = []
+
+    async def fake_complete_json(*, model, **_):
+        called.append(model)
+        out = answers[model]
+        if isinstance(out, BaseException):
+            raise out
+        return json.dumps({"stage": "insights", "question": out})
+
+    monkeypatch.setattr(component10, "llm_complete_json", fake_complete_json)
+    res = asyncio.run(component10._call_llm_single_question("prompt", expect_stage=kw.pop("stage", "insights"), **kw))
+    return res, called
+
+
+OPTIONS = ["Reading", "Videos", "Audio/podcasts", "Hands-on practice"]
+
+
+def test_option_coverage():
+    assert component10._option_coverage("Reading, videos or hands-on practice?", OPTIONS) == 0.75
+    assert component10._option_coverage("Anything?", OPTIONS) == 0.0
+    assert component10._option_coverage("Anything?", []) == 1.0
+
+
+def test_c10_small_question_naming_the_options_is_served(monkeypatch):
+    q = "Is it reading, videos, audio/podcasts, or hands-on practice (reply with the exact words)?"
+    res, called = _c10(monkeypatch, {SMALL: q}, canonical=OPTIONS)
+    assert res == {"stage": "insights", "question": q} and called == [SMALL]
+
+
+def test_c10_partial_options_escalate(monkeypatch):
+    full = "Reading, videos, audio/podcasts or hands-on practice?"
+    res, called = _c10(monkeypatch, {SMALL: "Do you like reading or videos?", DEFAULT_MODEL: full}, canonical=OPTIONS)
+    assert res["question"] == full and called == [SMALL, DEFAULT_MODEL]
+
+
+def test_c10_without_options_goes_to_main_model(monkeypatch):
+    res, called = _c10(monkeypatch, {DEFAULT_MODEL: "Which role fits you best"}, stage="employment_category")
+    assert res == {"stage": "employment_category", "question": "Which role fits you best?"}
+    assert called == [DEFAULT_MODEL]
+
+
+def test_c10_falls_back_when_every_tier_fails(monkeypatch):
+    res, called = _c10(monkeypatch, {SMALL: RuntimeError("x"), DEFAULT_MODEL: RuntimeError("y")}, canonical=OPTIONS)
+    assert res == {"stage": "insights", "question": "Where do you feel most stuck within this area right now?"}
+    assert called == [SMALL, DEFAULT_MODEL]
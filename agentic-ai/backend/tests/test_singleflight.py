@@ -0,0 +1,145 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import llm
+from app.core.deadline import DeadlineExceeded, remaining, request_deadline
+from app.core.singleflight import SingleFlight
+from app.core.usage import _LEDGER, request_usage, usage_tag
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("t-share")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return {"v": 1}
+
+    async def go():
+        return await asyncio.gather(*(flight.join("k", work) for _ in range(3)))
+
+    out = asyncio.run(go())
+    assert len(runs) == 1 and len(flight) == 0
+    assert [c for _, c in out] == [False, True, True]
+    assert all(r is out[0][0] for r, _ in out)
+
+
+def test_errors_are_shared_and_nothing_is_cached():
+    flight = SingleFlight("t-err")
+    runs = []
+
+    async def boom():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("x")
+
+    async def go():
+        res = await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+        await flight.do("k", lambda: asyncio.sleep(0, result="ok"))
+        return res
+
+    res = asyncio.run(go())
+    assert all(isinstance(r, ValueError) for r in res) and len(runs) == 1
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    flight = SingleFlight("t-cancel")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def go():
+        first = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(go()) == "done"
+
+
+def test_shared_call_runs_without_the_request_deadline_or_ledger():
+    flight = SingleFlight("t-ctx")
+    seen = {}
+
+    async def work():
+        seen["left"], seen["ledger"] = remaining(), _LEDGER.get()
+        return 1
+
+    async def go():
+        with request_deadline(5), request_usage():
+            await flight.do("k", work)
+
+    asyncio.run(go())
+    assert seen == {"left": None, "ledger": None}
+
+
+def test_each_waiter_is_bounded_by_its_own_deadline():
+    flight = SingleFlight("t-deadline")
+
+    async def work():
+        await asyncio.sleep(0.2)
+        return "slow"
+
+    async def impatient():
+        with request_deadline(0.05):
+            return await flight.do("k", work)
+
+    async def go():
+        patient = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        res = await asyncio.gather(impatient(), return_exceptions=True)
+        return res[0], await patient
+
+    short, long = asyncio.run(go())
+    assert isinstance(short, DeadlineExceeded) and long == "slow"
+
+
+def test_expired_caller_does_not_start_the_work():
+    flight = SingleFlight("t-expired")
+    runs = []
+
+    async def work():
+        runs.append(1)
+
+    async def go():
+        with request_deadline(0.001):
+            await asyncio.sleep(0.01)
+            await flight.do("k", work)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(go())
+    assert runs == [] and len(flight) == 0
+
+
+# ---------- LLM gateway ----------
+def test_coalesced_llm_calls_charge_every_waiters_ledger():
+    calls = []
+
+    async def create(**kw):
+        calls.append(kw)
+        await asyncio.sleep(0.02)
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=100, total_tokens=1100))
+
+    kw = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "same"}], "temperature": 0}
+
+    async def turn(tag):
+        with request_deadline(5), request_usage() as ledger, usage_tag(tag):
+            await llm._shared_call("chat", create, dict(kw), False, False, False)
+        return ledger.summary()
+
+    async def go():
+        return await asyncio.gather(turn("c10.ask"), turn("c05.gate"))
+
+    first, second = asyncio.run(go())
+    assert len(calls) == 1
+    assert "timeout" not in calls[0]                        # not clamped to either request's deadline
+    assert first["calls"] == second["calls"] == 1
+    assert first["cost_usd"] == second["cost_usd"] > 0
+    assert first["by_stage"]["c10.ask"]["coalesced"] == 0
+    assert second["by_stage"]["c05.gate"]["coalesced"] == 1   # charged under the waiter's own tag
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services import smalltalk
+from app.services.smalltalk import classify_turn, offered_options
+
+INSIGHT_Q = "How do you prefer to learn—choose one of: Reading, Videos, or Hands-on practice (reply with the exact words)?"
+CREATIVE_Q = "Since you mentioned videos, how do you like to learn — is it Reading, Videos, or Hands-on practice? (reply with the exact words)"
+SKILLS_Q = "For this role, which skill areas would you like to prioritize next, Python, SQL or Statistics?"
+
+
+@pytest.fixture(autouse=True)
+def no_embedding_tier(monkeypatch):
+    # the embedding tier needs the RAG encoder; these tests cover the rule tiers
+    async def abstain(t):
+        return None
+    monkeypatch.setattr(smalltalk, "_embedding_kind", abstain)
+
+
+def classify(msg, **kw):
+    return asyncio.run(classify_turn(msg, **kw))
+
+
+@pytest.mark.parametrize("question, options", [
+    (INSIGHT_Q, ["reading", "videos", "hands-on practice"]),
+    (CREATIVE_Q, ["reading", "videos", "hands-on practice"]),
+    (SKILLS_Q, ["python", "sql", "statistics"]),
+    ("Which category fits you best: Data Scientist or Data Analyst?", ["data scientist", "data analyst"]),
+])
+def test_offered_options_parses_lists(question, options):
+    assert offered_options(question) == options
+
+
+@pytest.mark.parametrize("question", [
+    "",
+    "What is your goal for the next six months?",
+    "Tell me more about the Python projects you have worked on?",
+])
+def test_offered_options_needs_a_list(question):
+    assert offered_options(question) == []
+
+
+@pytest.mark.parametrize("reply", ["Videos", "hands-on practice", "  READING ", "Hands on practice!", "hands -  on practice"])
+def test_exact_option_is_survey_reply(reply):
+    assert classify(reply, prev_enc=INSIGHT_Q) == "survey_reply"
+
+
+@pytest.mark.parametrize("reply", ["or", "to", "prefer", "how do you prefer", "hands-on", "what is your goal"])
+def test_words_of_the_question_are_not_survey_replies(reply):
+    assert classify(reply, prev_enc=INSIGHT_Q) is None
+
+
+def test_skill_name_outside_option_list_goes_to_rag():
+    q = "Tell me more about the Python projects you have worked on?"
+    assert classify("python", prev_enc=q) is None
+
+
+@pytest.mark.parametrize("msg, kind", [("hi there", "greeting"), ("thanks a lot", "thanks"),
+                                       ("got it", "ack"), ("bye", "farewell")])
+def test_regex_tier(msg, kind):
+    assert classify(msg) == kind
+
+
+@pytest.mark.parametrize("word", ["great", "nice", "sure", "perfect", "ok", "got it"])
+def test_ack_after_a_statement(word):
+    assert classify(word, prev_assistant="Here is an overview of SQL joins.") == "ack"
+
+
+@pytest.mark.parametrize("word", ["great", "Sure", "perfect!", "ok", "Okay", "sounds good", "alright"])
+def test_ack_after_a_question_goes_to_rag(word):
+    assert classify(word, prev_assistant="Would you like a short roadmap for SQL?") is None
+    assert classify(word, prev_enc=SKILLS_Q) is None
+
+
+def test_embedding_ack_after_a_question_goes_to_rag(monkeypatch):
+    async def ack(t):
+        return "ack"
+    monkeypatch.setattr(smalltalk, "_embedding_kind", ack)
+    assert classify("makes sense then", prev_assistant="Want a learning roadmap?") is None
+    assert classify("makes sense then", prev_assistant="Here is the roadmap.") == "ack"
+
+
+def test_long_messages_are_never_trivial():
+    assert classify("thanks, now explain gradient boosting in detail please") is None
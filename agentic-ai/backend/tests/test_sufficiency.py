@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.breaker import CircuitOpen
+from app.rag.engine import sufficiency
+from app.rag.scripts import fit_sufficiency
+
+FEATS = {"top_cos": 0.8, "mean_cos_top3": 0.7, "top_bm25": 2.0, "coverage": 1.0, "kept_frac": 0.5}
+
+
+def test_fitter_uses_the_engine_feature_list():
+    assert fit_sufficiency.FEATURES is sufficiency.SUFFICIENCY_FEATURES
+
+
+def test_sufficiency_features():
+    f = sufficiency.sufficiency_features(
+        "python pandas", ["a", "b"], "pandas is a python library",
+        {"cos": {"a": 0.9, "b": 0.5}, "bm25": {"a": 3.0}}, keep_cap=4,
+    )
+    assert f == {"top_cos": 0.9, "mean_cos_top3": 0.7, "top_bm25": round(float(np.log1p(3.0)), 4),
+                 "coverage": 1.0, "kept_frac": 0.5}
+    assert sufficiency.sufficiency_features("x", [], "", {})["top_cos"] == 0.0
+
+
+def test_estimate_is_monotonic_in_evidence_quality():
+    weak = sufficiency.estimate_sufficiency({k: 0.0 for k in FEATS})
+    strong = sufficiency.estimate_sufficiency(FEATS)
+    assert 0.0 <= weak["sufficiency"] < strong["sufficiency"] <= 1.0
+    assert strong["source"] == "estimator"
+
+
+@pytest.fixture
+def shadow_log(tmp_path, monkeypatch):
+    path = tmp_path / "log.jsonl"
+    monkeypatch.setattr(sufficiency, "SUFFICIENCY_MODE", "shadow")
+    monkeypatch.setattr(sufficiency, "SUFFICIENCY_LOG", str(path))
+    return path
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_shadow_logs_llm_verdicts_with_source(monkeypatch, shadow_log):
+    async def gate(q, ids, records=None):
+        return {"sufficiency": 0.9, "missing_aspects": [], "source": "llm"}
+    monkeypatch.setattr(sufficiency, "llm_sufficiency_gate", gate)
+    out = asyncio.run(sufficiency.sufficiency_gate("q", ["a"], "ctx", {}))
+    assert out["sufficiency"] == 0.9
+    (row,) = _rows(shadow_log)
+    assert row["source"] == "llm" and row["llm_sufficiency"] == 0.9 and row["estimate"] is not None
+
+
+def test_heuristic_fallback_is_logged_as_heuristic(monkeypatch, shadow_log):
+    async def gate(q, ids, records=None):
+        return {"sufficiency": 0.45, "missing_aspects": [], "source": "heuristic"}
+    monkeypatch.setattr(sufficiency, "llm_sufficiency_gate", gate)
+    asyncio.run(sufficiency.sufficiency_gate("q", ["a"], "ctx", {}))
+    assert _rows(shadow_log)[0]["source"] == "heuristic"
+
+
+def test_log_write_runs_off_the_event_loop(monkeypatch, shadow_log):
+    threads = []
+    write = sufficiency.log_sufficiency
+
+    def spy(*args):
+        threads.append(threading.get_ident())
+        write(*args)
+
+    async def gate(q, ids, records=None):
+        return {"sufficiency": 0.9, "missing_aspects": [], "source": "llm"}
+
+    async def run():
+        await sufficiency.sufficiency_gate("q", ["a"], "ctx", {})
+        return threading.get_ident()
+
+    monkeypatch.setattr(sufficiency, "llm_sufficiency_gate", gate)
+    monkeypatch.setattr(sufficiency, "log_sufficiency", spy)
+    loop_thread = asyncio.run(run())
+    assert threads and threads[0] != loop_thread
+    assert len(_rows(shadow_log)) == 1
+
+
+def test_circuit_open_uses_estimator_and_logs_nothing(monkeypatch, shadow_log):
+    async def gate(q, ids, records=None):
+        raise CircuitOpen("open")
+    monkeypatch.setattr(sufficiency, "llm_sufficiency_gate", gate)
+    out = asyncio.run(sufficiency.sufficiency_gate("q", ["a"], "ctx", {}))
+    assert out["source"] == "estimator"
+    assert _rows(shadow_log) == []
+
+
+def test_fitter_skips_non_llm_rows_and_recovers_signal(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "log.jsonl"
+    with path.open("w") as f:
+        for _ in range(200):
+            feats = {k: float(rng.uniform(0, 1)) for k in fit_sufficiency.FEATURES}
+            y = 1.0 if feats["top_cos"] > 0.5 else 0.2
+            f.write(json.dumps({"features": feats, "llm_sufficiency": y, "source": "llm"}) + "\n")
+        for src in ("heuristic", None):
+            f.write(json.dumps({"features": FEATS, "llm_sufficiency": 0.9, "source": src}) + "\n")
+        f.write("not json\n")
+    X, y = fit_sufficiency.load_rows(path)
+    assert len(y) == 200
+    w, b = fit_sufficiency.fit(X, y, iters=2000)
+    m = fit_sufficiency.evaluate(X, y, w, b)
+    assert m["decision_agreement"] > 0.9
+    assert w[fit_sufficiency.FEATURES.index("top_cos")] > 0
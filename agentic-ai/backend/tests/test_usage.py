@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import usage
+from app.core.metrics import metrics
+from app.core.usage import cost_usd, record, request_usage, usage_tag, usage_tokens
+
+
+def test_cost_uses_input_output_and_cached_prices():
+    # gpt-4o-mini: 0.15 in, 0.60 out, 0.075 cached-in per 1M tokens
+    assert cost_usd("gpt-4o-mini", 1_000_000, 0) == pytest.approx(0.15)
+    assert cost_usd("gpt-4o-mini", 0, 1_000_000) == pytest.approx(0.60)
+    assert cost_usd("gpt-4o-mini", 1_000_000, 0, cached_tokens=400_000) == pytest.approx(0.6 * 0.15 + 0.4 * 0.075)
+    assert cost_usd("gpt-4o-mini", 100, 0, cached_tokens=1000) == pytest.approx(100 * 0.075 / 1e6)   # cached <= prompt
+
+
+def test_cost_for_dated_snapshots_and_unknown_models():
+    assert cost_usd("gpt-4.1-mini-2025-04-14", 1000, 1000) == cost_usd("gpt-4.1-mini", 1000, 1000)
+    assert cost_usd("gpt-4o-2024-08-06", 1000, 0) == cost_usd("gpt-4o", 1000, 0)   # not gpt-4o-mini
+    assert cost_usd("some-local-model", 1000, 1000) == 0.0
+
+
+def test_price_overrides(monkeypatch):
+    monkeypatch.setattr(usage.settings, "LLM_PRICES", '{"local": [1.0, 2.0]}')
+    prices = usage._prices()
+    assert prices["local"] == (1.0, 2.0, 1.0) and "gpt-4o" in prices
+    monkeypatch.setattr(usage.settings, "LLM_PRICES", "not json")
+    assert usage._prices() == usage._DEFAULT_PRICES
+
+
+def test_usage_tokens_chat_and_responses_shapes():
+    chat = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30, total_tokens=150,
+                                                 prompt_tokens_details=SimpleNamespace(cached_tokens=64)))
+    responses = SimpleNamespace(usage=SimpleNamespace(input_tokens=200, output_tokens=50,
+                                                      input_tokens_details=SimpleNamespace(cached_tokens=0)))
+    assert usage_tokens(chat) == (120, 30, 64)
+    assert usage_tokens(responses) == (200, 50, 0)
+    assert usage_tokens(SimpleNamespace(usage=None)) == (0, 0, 0)
+    assert usage_tokens(SimpleNamespace(usage=SimpleNamespace(prompt_tokens=None, completion_tokens=None))) == (0, 0, 0)
+
+
+def _resp(prompt, completion, cached=0):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion,
+                                                 prompt_tokens_details=SimpleNamespace(cached_tokens=cached)))
+
+
+def test_ledger_summary_by_stage():
+    with request_usage() as ledger:
+        with usage_tag("c10.ask"):
+            record("gpt-4o-mini", _resp(1000, 100, 500), 120.0)
+            record("gpt-4o-mini", None, 1.0, cached=True)
+        with usage_tag("c08.answer"):
+            record("gpt-4o", _resp(2000, 300), 800.0)
+    s = ledger.summary()
+    assert s["calls"] == 3 and s["prompt_tokens"] == 3000 and s["completion_tokens"] == 400
+    assert s["cached_tokens"] == 500 and s["llm_ms"] == 921.0
+    ask = s["by_stage"]["c10.ask"]
+    assert ask["calls"] == 2 and ask["cached"] == 1 and ask["prompt_tokens"] == 1000
+    assert ask["cost_usd"] == round(cost_usd("gpt-4o-mini", 1000, 100, 500), 6)
+    assert s["cost_usd"] == round(ask["cost_usd"] + s["by_stage"]["c08.answer"]["cost_usd"], 6)
+
+
+def test_record_exports_metrics_per_tag_without_a_ledger():
+    before = metrics.count("llm.usage.t.metrics.prompt_tokens")
+    with usage_tag("t.metrics"):
+        record("gpt-4o-mini", _resp(40, 10), 5.0)
+    assert metrics.count("llm.usage.t.metrics.prompt_tokens") == before + 40
+    assert metrics.count("llm.usage.t.metrics.cost_usd") > 0
+
+
+def test_disabled_scope_detaches_from_the_outer_ledger():
+    with request_usage() as outer:
+        with request_usage(False) as inner:
+            record("gpt-4o-mini", _resp(10, 1), 1.0)
+        assert inner is None
+    assert outer.calls == []
+
+
+def test_untagged_calls():
+    with request_usage() as ledger:
+        record("gpt-4o-mini", _resp(10, 1), 1.0)
+    assert list(ledger.summary()["by_stage"]) == [usage.UNTAGGED]
@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.rag.scripts import phase4_build_index as p4
+
+
+def _vectors(n=600, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(12, dim))
+    v = centers[rng.integers(0, 12, n)] + 0.35 * rng.normal(size=(n, dim))
+    return (v / np.linalg.norm(v, axis=1, keepdims=True)).astype("float32")
+
+
+@pytest.fixture(scope="module")
+def vecs():
+    return _vectors()
+
+
+@pytest.mark.parametrize("store", p4.STORE_TYPES)
+def test_every_store_indexes_all_vectors(vecs, store):
+    index = p4.build_vector_index(vecs, store)
+    assert index.ntotal == len(vecs)
+    if store in ("fp16", "sq8"):
+        assert p4.index_bytes(index) < p4.index_bytes(p4.build_vector_index(vecs, "flat"))
+
+
+def test_unknown_store_is_rejected(vecs):
+    with pytest.raises(ValueError):
+        p4.build_vector_index(vecs, "int4")
+
+
+def test_small_corpus_pq_trains(vecs):
+    index = p4.build_vector_index(vecs[:40], "pq")
+    assert index.ntotal == 40
+
+
+def test_report_rescoring_recovers_recall(vecs):
+    report = p4.vector_store_report(vecs, k=10, queries=50)
+    assert set(report) == set(p4.STORE_TYPES)
+    assert report["flat"]["recall"] == 1.0
+    for store in ("fp16", "sq8", "pq"):
+        assert report[store]["recall_rescored"] >= report[store]["recall"]
+        assert report[store]["recall_rescored"] >= 0.95
+    # (pq's codebook outweighs its codes at this corpus size)
+    assert report["sq8"]["bytes_per_vector"] < report["fp16"]["bytes_per_vector"] < report["flat"]["bytes_per_vector"]
+
+
+def _rag_index(vecs, store, tmp_path, encoder):
+    from app.rag.engine.index import RagIndex
+
+    index = p4.build_vector_index(vecs, store)
+    mm = None
+    if store != "flat":
+        np.save(tmp_path / "vectors.npy", vecs)
+        mm = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+    meta = [{"chunk_id": f"DOC01:{i:04d}", "doc_id": "DOC01"} for i in range(len(vecs))]
+    cfg = {"model_name": "hash", "vector_store": {"type": store, "rescore_vectors": "vectors.npy", "rescore_factor": 4}}
+    return RagIndex(meta, None, [], encoder, index, cfg, vectors=mm)
+
+
+@pytest.mark.parametrize("store", ["fp16", "sq8", "pq"])
+def test_vec_search_rescores_exactly(vecs, store, tmp_path, encoder):
+    exact = _rag_index(vecs, "flat", tmp_path, encoder)
+    idx = _rag_index(vecs, store, tmp_path, encoder)
+    qv = vecs[:20]
+    sims_x, idxs_x = exact.vec_search(qv, topk=10)
+    sims, idxs = idx.vec_search(qv, topk=10)
+    assert idxs.shape == (20, 10) and sims.dtype == np.float32
+    # similarities are exact inner products, in descending order
+    assert np.allclose(sims, np.einsum("qd,qkd->qk", qv, vecs[idxs]), atol=1e-5)
+    assert (np.diff(sims, axis=1) <= 1e-6).all()
+    overlap = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(idxs.tolist(), idxs_x.tolist())])
+    assert overlap >= 0.95
+
+
+def test_vec_search_pads_when_fewer_candidates(tmp_path, encoder):
+    vecs = _vectors(n=6)
+    idx = _rag_index(vecs, "sq8", tmp_path, encoder)
+    sims, idxs = idx.vec_search(vecs[:1], topk=10)
+    assert sorted(idxs[0][:6].tolist()) == list(range(6))
+    assert (idxs[0][6:] == -1).all() and np.isneginf(sims[0][6:]).all()
+
+
+def test_previous_vectors_come_from_originals(vecs, tmp_path):
+    import faiss
+
+    meta = [{"chunk_id": f"DOC01:{i:04d}"} for i in range(len(vecs))]
+    (tmp_path / "meta.jsonl").write_text("".join(json.dumps(m) + "\n" for m in meta))
+    faiss.write_index(p4.build_vector_index(vecs, "pq"), str(tmp_path / "vector.faiss"))
+    cfg = {"vector_store": {"type": "pq", "rescore_vectors": "vectors.npy"}}
+    (tmp_path / "index_config.json").write_text(json.dumps(cfg))
+    # no originals: lossy PQ reconstructions are never reused
+    assert p4.load_previous_vectors(tmp_path) == (None, {})
+    np.save(tmp_path / "vectors.npy", vecs)
+    got_cfg, prev = p4.load_previous_vectors(tmp_path)
+    assert got_cfg == cfg and np.array_equal(prev["DOC01:0007"], vecs[7])
+    np.save(tmp_path / "vectors.npy", vecs[:-1])          # out of sync with meta
+    assert p4.load_previous_vectors(tmp_path) == (None, {})
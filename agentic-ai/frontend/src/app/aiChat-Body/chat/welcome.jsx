@@ -1,5 +1,5 @@
 // src/app/aiChat-Body/chat/welcome.jsx
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { BRAIN } from "../../../assets";
 import AskField from "../../../components/chat/AskField";
@@ -8,10 +8,16 @@ import MessageList from "./messageList";
 import { messages as msgApi, chats, uia as uiaApi, getTokens } from "../../../lib/api";
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
+// how long the progress stream stays open for a background-validation result
+const VALIDATION_WAIT_MS = 60000;
 
 const Welcome = ({ chatId }) => {
   const navigate = useNavigate();
   const [messages, setMessages] = useState([]);
+  // background-validation revisions can arrive over SSE before the POST response has
+  // appended their message: keep them by message_id until it is appended
+  const appendedIds = useRef(new Set());
+  const pendingRevisions = useRef(new Map());
 
   // Load history only when we have a chatId
   useEffect(() => {
@@ -71,6 +77,12 @@ const handleSend = async ({ text }) => {
   });
 
   let es;
+  let keepStreamOpen = false;
+  let validationTimer;
+  const closeStream = () => {
+    clearTimeout(validationTimer);
+    try { es && es.close(); } catch {}
+  };
   try {
     let targetChatId = chatId;
 
@@ -125,7 +137,23 @@ const handleSend = async ({ text }) => {
                   : m
               )
             );
-            es.close();
+            // keep listening while the answer is validated in the background
+            if (data.validation !== "pending") closeStream();
+          } else if (data.type === "revision") {
+            // background validator revised the answer: swap the content in place,
+            // or hold it until the message is appended below
+            if (data.content != null) {
+              if (appendedIds.current.has(data.message_id)) {
+                setMessages((prev) =>
+                  prev.map((m) => (m.id === data.message_id ? { ...m, content: data.content } : m))
+                );
+              } else {
+                pendingRevisions.current.set(data.message_id, data.content);
+              }
+            }
+            closeStream();
+          } else if (data.type === "validated") {
+            closeStream();
           } else if (data.type === "error") {
             setMessages((prev) =>
               prev.map((m) =>
@@ -151,13 +179,23 @@ const handleSend = async ({ text }) => {
     // final request to send the message
     const asst = await msgApi.send(targetChatId, text, requestId);
 
-    // remove loader and append final assistant message
+    // the answer is validated in the background: keep the stream for its revision/validated
+    // event (whether or not the "done" event came first), but not forever
+    if (asst.validation === "pending" && es && es.readyState !== EventSource.CLOSED) {
+      keepStreamOpen = true;
+      validationTimer = setTimeout(closeStream, VALIDATION_WAIT_MS);
+    }
+
+    // remove loader and append final assistant message (with a revision that arrived first)
+    const revised = pendingRevisions.current.get(asst.id);
+    pendingRevisions.current.delete(asst.id);
+    appendedIds.current.add(asst.id);
     setMessages((prev) => prev.filter((m) => m._tempId !== tempId));
     append({
       id: asst.id,
       role: asst.role || "assistant",
       type: asst.type || (asst.surveyType ? "survey" : "text"),
-      content: asst.content ?? asst.content_md ?? "",
+      content: revised ?? asst.content ?? asst.content_md ?? "",
       survey: asst.survey,
       surveyType: asst.surveyType || null,
       enc_question: asst.enc_question || "",
@@ -178,7 +216,7 @@ const handleSend = async ({ text }) => {
     );
     append({ role: "assistant", type: "text", content: "Something went wrong reaching the server." });
   } finally {
-    try { es && es.close(); } catch {}
+    if (!keepStreamOpen) closeStream();
   }
 };
 